@@ -15,16 +15,67 @@
 # Lint as: python3
 
 import os
+import json
+import pickle
+import shutil
+import itertools
+import tempfile
+import collections
 from . import logging
 from tokenizers import Tokenizer
-from tokenizers.models import WordLevel
-from tokenizers.pre_tokenizers import WhitespaceSplit
-from tokenizers.trainers import WordLevelTrainer
-from .preprocess.music21jsb import preprocess_music21
-from .preprocess.encode import encode_songs_data, get_density_bins
+from .datasetmanifest import DatasetManifest, MANIFEST_FILE_NAME, SPLITS
+from .preprocess import music21jsb, midojsb
+from .preprocess.music21jsb import preprocess_music21, iterate_music21
+from .preprocess.midojsb import preprocess_mido, iterate_mido
+from .preprocess.parsecache import ParseCache
+from .preprocess.midiscan import REJECTION_STAGES
+from .preprocess.songarray import song_data_to_array
+from .preprocess.densitysketch import DensitySketch
+from .preprocess.songstore import SongStoreWriter
+from .preprocess.tokenwriter import TokenSequenceWriter
+from .preprocess.processpool import PipelineStage
+from .preprocess.vocabulary import create_tokenizer, get_grammar_tokens
+from .preprocess.encode import (
+    iterate_encoded_songs,
+    iterate_token_sequences,
+    get_density_bins,
+    get_density_bins_from_counts,
+    get_note_on_counts,
+)
 
 logger = logging.create_logger("datasetcreator")
 
+# Streaming counterparts of the preprocessing methods.
+ITERATE_METHODS = {preprocess_music21: iterate_music21, preprocess_mido: iterate_mido}
+
+# Versions of the parsers behind the preprocessing methods.
+PARSER_VERSIONS = {preprocess_music21: music21jsb.PARSER_VERSION, preprocess_mido: midojsb.PARSER_VERSION}
+
+# Number of MIDI files preprocessed and committed to the manifest at once.
+BATCH_SIZE = 100
+
+# Name of the file in the dataset directory holding the global density bins.
+DENSITY_BINS_FILE_NAME = "density_bins.json"
+
+# Name of the song store of each split in the dataset directory.
+SONG_STORE_NAMES = {split: f"songs_{split}" for split in SPLITS}
+
+# Number of encoded songs that may wait for being written when the stages are pipelined.
+ENCODED_QUEUE_SIZE = 16
+
+# Marks the end of a batch among the encoded songs.
+BATCH_END = "batch_end"
+
+# Config parameters determining how the MIDI files are parsed, which datasets created together must share.
+PARSE_SETTINGS = [
+    "json_data_method",
+    "parse_backend",
+    "parse_workers",
+    "parse_timeout",
+    "parse_cache_path",
+    "parse_cache_max_size",
+]
+
 
 class DatasetCreator:
     """
@@ -32,6 +83,7 @@ class DatasetCreator:
 
     Attributes:
         config: Configuration object specifying dataset creation parameters.
+        configs (list): Configuration objects of all datasets to create, starting with `config`.
     """
 
     def __init__(self, config):
@@ -39,43 +91,196 @@ class DatasetCreator:
         Initializes the DatasetCreator with a given configuration.
 
         Args:
-            config: Configuration object with parameters for dataset creation.
+            config: Configuration object with parameters for dataset creation, or a list of them to create
+                several datasets from one parse of the MIDI files.
         """
-        self.config = config
+        self.configs = list(config) if isinstance(config, (list, tuple)) else [config]
+        if not self.configs:
+            error_string = "At least one config is needed to create a dataset."
+            logger.error(error_string)
+            raise Exception(error_string)
+        self.config = self.configs[0]
 
     def create(self, datasets_path, overwrite=False):
         """
-        Initializes the DatasetCreator with a given configuration.
+        Creates the dataset.
+
+        Datasets created from MIDI files keep a manifest of the files they hold. Without overwrite, such a
+        dataset is resumed if its build was interrupted, and MIDI files added since are encoded and appended.
+
+        With several configs, a dataset is created for each of them from one parse of the MIDI files.
 
         Args:
-            config: Configuration object with parameters for dataset creation.
+            datasets_path (str): Path to the datasets folder with the "midi_files" folder.
+            overwrite (bool, optional): Whether to rebuild an existing dataset from scratch. Defaults to False.
         """
+        if len(self.configs) > 1:
+            self.__create_variants(datasets_path, overwrite)
+            return
+
+        # Prepare for getting music data as JSON
+        json_data_method, preprocess_midi_files = self.__resolve_json_data_method()
+
         # Ensure dataset paths exist
-        dataset_path = self.__prepare_paths(datasets_path, overwrite)
+        dataset_path = self.__prepare_paths(datasets_path, overwrite, preprocess_midi_files)
 
         if dataset_path is None and not overwrite:
             return
 
-        # Prepare for getting music data as JSON
-        json_data_method, preprocess_with_music21 = self.__resolve_json_data_method()
-
         # Get all MIDI files
         all_midi_files = self.__get_all_midi_files(datasets_path)
 
         # Process and save data with appropriate method
-        if preprocess_with_music21:
-            self.__process_with_music21(all_midi_files, dataset_path, overwrite)
+        if preprocess_midi_files:
+            self.__process_midi_files(json_data_method, all_midi_files, dataset_path, overwrite)
         else:
             songs_data_train, songs_data_valid = json_data_method()
             self.__process_and_save_data(songs_data_train, songs_data_valid, dataset_path)
 
-    def __prepare_paths(self, datasets_path, overwrite):
+    def __create_variants(self, datasets_path, overwrite):
+        """
+        Creates the dataset of each config from one parse of the MIDI files.
+
+        The configs must parse the MIDI files the same way. With a parse cache, each dataset is created like a
+        dataset created on its own: the first one parses the MIDI files into the cache, and the others read
+        them from it. Without one, datasets with the same pending MIDI files share a parse pass, which spools
+        the parsed batches to a temporary file and counts the notes for the global density bins of each
+        dataset. Each dataset is then encoded from the spool like a dataset created on its own, so its files
+        are the same. Streaming has no effect then, as the batches are read back from the spool one at a time
+        anyway.
+
+        Args:
+            datasets_path (str): Path to the datasets folder with the "midi_files" folder.
+            overwrite (bool): Whether to rebuild existing datasets from scratch.
+        """
+        dataset_names = [config.dataset_name for config in self.configs]
+        if len(set(dataset_names)) != len(dataset_names):
+            error_string = f"Datasets created together must have different names, but are {dataset_names}."
+            logger.error(error_string)
+            raise Exception(error_string)
+        for name in PARSE_SETTINGS:
+            values = [getattr(config, name) for config in self.configs]
+            if any(value != values[0] for value in values):
+                error_string = f"Datasets created together must share config parameter {name}, but it is {values}."
+                logger.error(error_string)
+                raise Exception(error_string)
+
+        variants = [DatasetCreator(config) for config in self.configs]
+        json_data_method, preprocess_midi_files = self.__resolve_json_data_method()
+
+        if not preprocess_midi_files:
+            # The songs are encoded once for each dataset, so they must be sequences, not generators.
+            songs_data_train, songs_data_valid = json_data_method()
+            for variant in variants:
+                dataset_path = variant.__prepare_paths(datasets_path, overwrite, False)
+                if dataset_path is not None:
+                    variant.__process_and_save_data(songs_data_train, songs_data_valid, dataset_path)
+            return
+
+        all_midi_files = self.__get_all_midi_files(datasets_path)
+        if self.config.parse_cache_path is not None:
+            for variant in variants:
+                dataset_path = variant.__prepare_paths(datasets_path, overwrite, True)
+                if dataset_path is not None:
+                    variant.__process_midi_files(json_data_method, all_midi_files, dataset_path, overwrite)
+            return
+
+        groups = collections.defaultdict(list)
+        for variant in variants:
+            dataset_path = variant.__prepare_paths(datasets_path, overwrite, True)
+            if dataset_path is None:
+                continue
+            manifest, midi_files = variant.__open_manifest(json_data_method, all_midi_files, dataset_path, overwrite)
+            groups[tuple(midi_files)].append((variant, manifest, dataset_path))
+
+        cache = self.__open_parse_cache()
+        rejections = collections.Counter()
+        for midi_files, group in groups.items():
+            logger.info(f"Parsing {len(midi_files)} MIDI files for {len(group)} datasets.")
+
+            # Datasets whose global density bins are not saved yet count the notes while the files are parsed.
+            density_bins = [None] * len(group)
+            sketches = {}
+            for index, (variant, _, dataset_path) in enumerate(group):
+                if variant.config.global_density_bins and midi_files:
+                    density_bins[index] = variant.__load_density_bins(dataset_path)
+                    if density_bins[index] is None:
+                        sketches[index] = DensitySketch()
+
+            with tempfile.TemporaryFile() as spool_file:
+                counters = [(group[index][0], sketch) for index, sketch in sketches.items()]
+                batches_number = self.__spool_batches(
+                    json_data_method, midi_files, cache, rejections, counters, spool_file
+                )
+
+                for index, (variant, manifest, dataset_path) in enumerate(group):
+                    logger.info(f"Encoding dataset {variant.config.dataset_name}.")
+                    if index in sketches:
+                        density_bins[index] = variant.__save_density_bins(sketches[index], dataset_path)
+                    stages = []
+                    parsed_batches = variant.__add_stage(
+                        "read",
+                        self.__read_spooled_batches(spool_file, batches_number),
+                        variant.config.pipeline_depth,
+                        stages,
+                    )
+                    encoded_items = variant.__add_stage(
+                        "encode",
+                        variant.__encode_batches(parsed_batches, density_bins[index]),
+                        ENCODED_QUEUE_SIZE,
+                        stages,
+                    )
+                    variant.__save_batches(manifest, dataset_path, batches_number, encoded_items, stages)
+
+        self.__log_parse_stats(cache, rejections)
+
+    def __spool_batches(self, preprocess_method, midi_files, cache, rejections, counters, spool_file):
+        """
+        Preprocesses the MIDI files batch by batch into a spool file, counting the notes of the training songs.
+
+        Args:
+            preprocess_method (callable): `preprocess_music21` or `preprocess_mido`.
+            midi_files (list): Paths to the MIDI files to process.
+            cache (ParseCache): Parse cache, or None.
+            rejections (collections.Counter): Counts the rejected files by stage.
+            counters (list): (DatasetCreator, DensitySketch) pairs, each sketch receiving the note on counts
+                of the windows of its creator.
+            spool_file (file): Binary file receiving the pickled batches.
+
+        Returns:
+            int: Number of batches in the spool file.
+        """
+        batches_number = 0
+        for midi_files_batch, results in self.__parse_batches(preprocess_method, midi_files, cache, rejections):
+            for creator, sketch in counters:
+                creator.__count_note_ons(results, sketch)
+            pickle.dump((midi_files_batch, results), spool_file, protocol=pickle.HIGHEST_PROTOCOL)
+            batches_number += 1
+        return batches_number
+
+    def __read_spooled_batches(self, spool_file, batches_number):
+        """
+        Reads the preprocessed batches back from a spool file.
+
+        Args:
+            spool_file (file): Binary file with the pickled batches.
+            batches_number (int): Number of batches in the file.
+
+        Yields:
+            tuple: (paths to the MIDI files of the batch, list of (path, song data or None) pairs).
+        """
+        spool_file.seek(0)
+        for _ in range(batches_number):
+            yield pickle.load(spool_file)
+
+    def __prepare_paths(self, datasets_path, overwrite, resumable):
         """
         Prepares the necessary directories for dataset creation.
 
         Args:
             datasets_path (str): Path to the datasets folder.
             overwrite (bool): Whether to overwrite existing datasets.
+            resumable (bool): Whether an existing dataset with a manifest can be resumed.
 
         Returns:
             str: Path to the dataset directory or None if dataset already exists.
@@ -85,6 +290,9 @@ class DatasetCreator:
 
         dataset_path = os.path.join(datasets_path, self.config.dataset_name)
         if os.path.exists(dataset_path) and not overwrite:
+            if resumable and os.path.exists(os.path.join(dataset_path, MANIFEST_FILE_NAME)):
+                logger.info("Dataset already exists, resuming it.")
+                return dataset_path
             logger.info("Dataset already exists.")
             return None
 
@@ -98,10 +306,12 @@ class DatasetCreator:
 
         Returns:
             tuple: A method for generating JSON data and a boolean indicating
-            whether to use music21 preprocessing.
+            whether the method preprocesses the MIDI files in batches.
         """
         if self.config.json_data_method == "preprocess_music21":
-            return None, True
+            return preprocess_music21, True
+        elif self.config.json_data_method == "preprocess_mido":
+            return preprocess_mido, True
         elif callable(self.config.json_data_method):
             return self.config.json_data_method, False
         else:
@@ -126,71 +336,497 @@ class DatasetCreator:
 
         return [os.path.join(midi_files_path, f) for f in os.listdir(midi_files_path) if f.endswith(".mid")]
 
-    def __process_with_music21(self, all_midi_files, dataset_path, overwrite):
+    def __process_midi_files(self, preprocess_method, all_midi_files, dataset_path, overwrite):
         """
-        Processes MIDI files using the music21 library and saves the results.
+        Processes MIDI files in batches using music21 or mido and saves the results.
+
+        After each batch, the token sequences are flushed to disk and the batch is committed to the manifest.
+        Only the MIDI files missing from the manifest are processed, and whatever an interrupted build wrote
+        after its last committed batch is discarded. The manifest counts the tokens of the training token
+        sequences, from which the tokenizer is built again only if the vocabulary changed.
+
+        With global density bins, the bins are computed before the first batch and saved with the dataset,
+        and resumed builds and files added later are encoded with the same bins.
+
+        With song stores, the encoded songs of each split are also written to a song store, flushed before
+        each batch is committed. A resumed build truncates the stores to the songs of the committed batches.
+
+        Parsing, encoding and writing are stages connected by generators. With a pipeline depth, parsing and
+        encoding run in their own threads with bounded queues between the stages, so that the next batch is
+        parsed while the songs of the current one are encoded and written. The statistics of each stage are
+        logged at the end.
 
         Args:
+            preprocess_method (callable): `preprocess_music21` or `preprocess_mido`.
             all_midi_files (list): List of paths to MIDI files.
             dataset_path (str): Path to the dataset directory.
             overwrite (bool): Whether to overwrite existing files.
         """
-        batch_size = 100
-        total_batches = (len(all_midi_files) + batch_size - 1) // batch_size
-        print(dataset_path)
-        train_file_path = os.path.join(dataset_path, "token_sequences_train.txt")
-        valid_file_path = os.path.join(dataset_path, "token_sequences_valid.txt")
+        manifest, midi_files = self.__open_manifest(preprocess_method, all_midi_files, dataset_path, overwrite)
+        cache = self.__open_parse_cache()
+
+        density_bins = None
+        if self.config.global_density_bins and midi_files:
+            density_bins = self.__get_global_density_bins(preprocess_method, midi_files, cache, dataset_path)
+
+        rejections = collections.Counter()
+        stages = []
+        if self.config.streaming:
+            encoded_items = self.__add_stage(
+                "parse and encode",
+                self.__stream_batches(preprocess_method, midi_files, cache, rejections, density_bins),
+                ENCODED_QUEUE_SIZE,
+                stages,
+            )
+        else:
+            parsed_batches = self.__add_stage(
+                "parse",
+                self.__parse_batches(preprocess_method, midi_files, cache, rejections),
+                self.config.pipeline_depth,
+                stages,
+            )
+            encoded_items = self.__add_stage(
+                "encode", self.__encode_batches(parsed_batches, density_bins), ENCODED_QUEUE_SIZE, stages
+            )
+        total_batches = (len(midi_files) + BATCH_SIZE - 1) // BATCH_SIZE
+        self.__save_batches(manifest, dataset_path, total_batches, encoded_items, stages)
+        self.__log_parse_stats(cache, rejections)
+
+    def __open_manifest(self, preprocess_method, all_midi_files, dataset_path, overwrite):
+        """
+        Opens the manifest of the dataset, removing the files of the previous build on overwrite.
+
+        Args:
+            preprocess_method (callable): `preprocess_music21` or `preprocess_mido`.
+            all_midi_files (list): List of paths to MIDI files.
+            dataset_path (str): Path to the dataset directory.
+            overwrite (bool): Whether to overwrite existing files.
 
+        Returns:
+            tuple: The DatasetManifest and the sorted paths to the MIDI files missing from it.
+        """
         if overwrite:
-            open(train_file_path, "w").close()
-            open(valid_file_path, "w").close()
+            for file_name in [MANIFEST_FILE_NAME, DENSITY_BINS_FILE_NAME]:
+                if os.path.exists(os.path.join(dataset_path, file_name)):
+                    os.remove(os.path.join(dataset_path, file_name))
+            for store_name in SONG_STORE_NAMES.values():
+                shutil.rmtree(os.path.join(dataset_path, store_name), ignore_errors=True)
+        manifest = DatasetManifest.open(dataset_path, self.__get_manifest_settings(preprocess_method))
+
+        midi_files = manifest.get_pending_files(sorted(all_midi_files))
+        logger.info(f"{len(manifest.files)} MIDI files are in the dataset, {len(midi_files)} are new.")
+        return manifest, midi_files
+
+    def __open_parse_cache(self):
+        """
+        Opens the parse cache of the config.
 
-        batch_index = 0
-        while True:
-            start_idx = batch_index * batch_size
-            end_idx = start_idx + batch_size
-            midi_files_batch = all_midi_files[start_idx:end_idx]
+        Returns:
+            ParseCache: The parse cache, or None if the config has none.
+        """
+        if self.config.parse_cache_path is None:
+            return None
+        return ParseCache(self.config.parse_cache_path, self.config.parse_cache_max_size)
 
-            if not midi_files_batch:
-                break
+    def __add_stage(self, name, items, max_queue_size, stages):
+        """
+        Runs a stage in its own thread if the stages are pipelined.
 
-            logger.info(f"Processing batch {batch_index + 1} of {total_batches} with {len(midi_files_batch)} files.")
-            songs_data_train, songs_data_valid, is_done = preprocess_music21(midi_files_batch)
+        Args:
+            name (str): Name of the stage.
+            items (iterable): Items produced by the stage.
+            max_queue_size (int): Maximum number of items waiting for the next stage.
+            stages (list): Receives the PipelineStage.
 
-            if not songs_data_train and not songs_data_valid:
-                batch_index += 1
-                if is_done:
-                    break
-                continue
+        Returns:
+            iterable: The PipelineStage, or the items if the stages are not pipelined.
+        """
+        if not self.config.pipeline_depth:
+            return items
+        stage = PipelineStage(name, items, max_queue_size)
+        stages.append(stage)
+        return stage
 
-            density_bins = get_density_bins(
-                songs_data_train,
-                self.config.window_size_bars,
-                self.config.hop_length_bars,
-                self.config.density_bins_number,
+    def __save_batches(self, manifest, dataset_path, total_batches, encoded_items, stages):
+        """
+        Writes the encoded songs, commits each batch to the manifest and builds the tokenizer if needed.
+
+        Args:
+            manifest (DatasetManifest): Manifest of the dataset.
+            dataset_path (str): Path to the dataset directory.
+            total_batches (int): Number of batches, for logging.
+            encoded_items (iterable): Encoded songs and batch ends like those of `__encode_batches`.
+            stages (list): PipelineStages producing the encoded songs, closed when done.
+        """
+        token_counts = collections.Counter(manifest.token_counts)
+        file_paths = {split: os.path.join(dataset_path, f"token_sequences_{split}.txt") for split in SPLITS}
+        token_writers = {}
+        song_writers = None
+        try:
+            for split, file_path in file_paths.items():
+                output_file = open(file_path, "ab")
+                output_file.truncate(manifest.sizes[split])
+                token_writers[split] = TokenSequenceWriter(output_file)
+
+            if self.config.song_store:
+                # Each file encoded into a split holds one song of its store.
+                song_writers = {
+                    split: SongStoreWriter(
+                        os.path.join(dataset_path, SONG_STORE_NAMES[split]),
+                        songs_number=sum(split in record for record in manifest.files.values()),
+                    )
+                    for split in SPLITS
+                }
+
+            # Write the encoded songs and commit each batch once all its songs are written.
+            byte_ranges = collections.defaultdict(dict)
+            batch_number = 0
+            for split, value in encoded_items:
+                if split != BATCH_END:
+                    self.__write_encoded_song(*value, split, token_writers, byte_ranges, token_counts, song_writers)
+                    continue
+
+                for token_writer in token_writers.values():
+                    token_writer.flush()
+                    os.fsync(token_writer.file.fileno())
+                for song_writer in (song_writers or {}).values():
+                    song_writer.flush()
+                file_records = {
+                    midi_file: {"status": "encoded" if midi_file in byte_ranges else "rejected"} for midi_file in value
+                }
+                for midi_file, split_byte_ranges in byte_ranges.items():
+                    file_records[midi_file].update(split_byte_ranges)
+                sizes = {split: token_writer.tell() for split, token_writer in token_writers.items()}
+                manifest.commit_batch(file_records, sizes, token_counts)
+                batch_number += 1
+                byte_ranges = collections.defaultdict(dict)
+                logger.info(f"Committed batch {batch_number} of {total_batches} to the manifest.")
+        finally:
+            # Close the consumers before their producers.
+            for stage in reversed(stages):
+                stage.close()
+            for token_writer in token_writers.values():
+                token_writer.close()
+            for song_writer in (song_writers or {}).values():
+                song_writer.close()
+
+        for stage in stages:
+            self.__log_stage_stats(stage)
+        for split, token_writer in token_writers.items():
+            self.__log_writer_stats(token_writer, split)
+
+        tokenizer_path = os.path.join(dataset_path, "tokenizer.json")
+        vocabulary = manifest.vocabulary | set(self.__get_grammar_tokens())
+        if os.path.exists(tokenizer_path) and self.__get_tokenizer_vocabulary(tokenizer_path) == vocabulary:
+            logger.info("Training vocabulary did not change, keeping the tokenizer.")
+        else:
+            self.__save_tokenizer(manifest.token_counts, dataset_path)
+
+    def __log_parse_stats(self, cache, rejections):
+        """
+        Logs the hits of the parse cache and the rejected MIDI files.
+
+        Args:
+            cache (ParseCache): Parse cache, or None.
+            rejections (collections.Counter): Rejected files by stage.
+        """
+        if cache is not None:
+            logger.info(f"Parse cache hits: {cache.hits}, misses: {cache.misses}.")
+        rejections_string = ", ".join(f"{stage}: {rejections[stage]}" for stage in REJECTION_STAGES)
+        logger.info(f"Rejected MIDI files by stage: {rejections_string}.")
+
+    def __get_manifest_settings(self, preprocess_method):
+        """
+        Collects the settings that determine the token sequences, which a resumed build must share.
+
+        Args:
+            preprocess_method (callable): `preprocess_music21` or `preprocess_mido`.
+
+        Returns:
+            dict: The settings.
+        """
+        encoding_method = self.config.encoding_method
+        return {
+            "encoding_method": encoding_method if isinstance(encoding_method, str) else encoding_method.__name__,
+            "parser_version": PARSER_VERSIONS[preprocess_method],
+            "window_size_bars": self.config.window_size_bars,
+            "hop_length_bars": self.config.hop_length_bars,
+            "density_bins_number": self.config.density_bins_number,
+            "transpositions_train": self.config.transpositions_train,
+            "permute_tracks": self.config.permute_tracks,
+            "global_density_bins": self.config.global_density_bins,
+            "song_store": self.config.song_store,
+            "encoding_seed": self.config.encoding_seed,
+        }
+
+    def __get_global_density_bins(self, preprocess_method, midi_files, cache, dataset_path):
+        """
+        Loads the density bins saved with the dataset, or computes them from the training songs of all batches.
+
+        The bins are computed in a counting pass that preprocesses the MIDI files one song at a time, keeps only
+        the note on counts of the training songs in a DensitySketch, and drops the songs. The encoding pass then
+        preprocesses the files again, reading them from the parse cache if there is one.
+
+        Args:
+            preprocess_method (callable): `preprocess_music21` or `preprocess_mido`.
+            midi_files (list): Paths to the MIDI files to process.
+            cache (ParseCache): Parse cache, or None.
+            dataset_path (str): Path to the dataset directory.
+
+        Returns:
+            list: The density bins, or None if there are no training songs.
+        """
+        density_bins = self.__load_density_bins(dataset_path)
+        if density_bins is not None:
+            return density_bins
+
+        if cache is None:
+            logger.info("Counting notes in a separate pass, the encoding pass parses the MIDI files again.")
+
+        sketch = DensitySketch()
+        total_batches = (len(midi_files) + BATCH_SIZE - 1) // BATCH_SIZE
+        for batch_index in range(total_batches):
+            midi_files_batch = midi_files[batch_index * BATCH_SIZE : (batch_index + 1) * BATCH_SIZE]
+            logger.info(f"Counting notes of batch {batch_index + 1} of {total_batches}.")
+            results = ITERATE_METHODS[preprocess_method](
+                midi_files_batch,
+                backend=self.config.parse_backend,
+                max_workers=self.config.parse_workers,
+                timeout=self.config.parse_timeout,
+                cache=cache,
             )
+            self.__count_note_ons(results, sketch)
+
+        return self.__save_density_bins(sketch, dataset_path)
+
+    def __load_density_bins(self, dataset_path):
+        """
+        Loads the density bins saved with the dataset.
 
-            self.__append_encoded_data(
-                songs_data_train,
-                train_file_path,
-                density_bins,
-                self.config.transpositions_train,
+        Args:
+            dataset_path (str): Path to the dataset directory.
+
+        Returns:
+            list: The density bins, or None if none are saved.
+        """
+        density_bins_path = os.path.join(dataset_path, DENSITY_BINS_FILE_NAME)
+        if not os.path.exists(density_bins_path):
+            return None
+        with open(density_bins_path, "r") as f:
+            density_bins = json.load(f)["density_bins"]
+        logger.info(f"Using the density bins saved with the dataset: {density_bins}.")
+        return density_bins
+
+    def __count_note_ons(self, results, sketch):
+        """
+        Adds the note on counts of the training songs of a preprocessed batch to a sketch.
+
+        Args:
+            results (iterable): (path, song data or None) pairs of the batch, only one song is held at a time.
+            sketch (DensitySketch): Receives the counts.
+        """
+        note_on_counts = [
+            (
+                None
+                if song_data is None
+                else get_note_on_counts(song_data, self.config.window_size_bars, self.config.hop_length_bars)
             )
-            logger.info(f"Appended training data for batch {batch_index} to {train_file_path}.")
+            for _, song_data in results
+        ]
 
-            self.__append_encoded_data(songs_data_valid, valid_file_path, density_bins, [0])
-            logger.info(f"Appended validation data for batch {batch_index} to {valid_file_path}.")
+        # Split on the parsed songs like the encoding pass does and only count the training songs.
+        for counts in note_on_counts[: int(0.8 * len(note_on_counts))]:
+            if counts is not None:
+                sketch.add(counts)
 
-            if is_done:
-                break
-            batch_index += 1
+    def __save_density_bins(self, sketch, dataset_path):
+        """
+        Computes the density bins from a sketch and saves them with the dataset.
+
+        Args:
+            sketch (DensitySketch): Note on counts of the training songs.
+            dataset_path (str): Path to the dataset directory.
+
+        Returns:
+            list: The density bins, or None if there are no training songs.
+        """
+        if sketch.counts_number == 0:
+            logger.warning("No training songs to compute global density bins from, computing them per batch.")
+            return None
 
-        tokenizer = self.__create_and_save_tokenizer([train_file_path], dataset_path)
+        density_bins = sketch.get_density_bins(self.config.density_bins_number)
+        logger.info(
+            f"Density bins {density_bins} from {sketch.counts_number} windows, "
+            f"off by at most {sketch.error_bound} notes from the exact percentiles."
+        )
+        with open(os.path.join(dataset_path, DENSITY_BINS_FILE_NAME), "w") as f:
+            json.dump(
+                {
+                    "density_bins": density_bins,
+                    "windows_number": sketch.counts_number,
+                    "error_bound": sketch.error_bound,
+                    "window_size_bars": self.config.window_size_bars,
+                    "hop_length_bars": self.config.hop_length_bars,
+                },
+                f,
+                indent=4,
+            )
+        return density_bins
+
+    def __parse_batches(self, preprocess_method, midi_files, cache, rejections):
+        """
+        Preprocesses the MIDI files batch by batch.
+
+        Args:
+            preprocess_method (callable): `preprocess_music21` or `preprocess_mido`.
+            midi_files (list): Paths to the MIDI files to process.
+            cache (ParseCache): Parse cache, or None.
+            rejections (collections.Counter): Counts the rejected files by stage.
+
+        Yields:
+            tuple: (paths to the MIDI files of the batch, list of (path, song data or None) pairs).
+        """
+        total_batches = (len(midi_files) + BATCH_SIZE - 1) // BATCH_SIZE
+        for batch_index in range(total_batches):
+            midi_files_batch = midi_files[batch_index * BATCH_SIZE : (batch_index + 1) * BATCH_SIZE]
+            logger.info(f"Processing batch {batch_index + 1} of {total_batches} with {len(midi_files_batch)} files.")
+            results = list(
+                ITERATE_METHODS[preprocess_method](
+                    midi_files_batch,
+                    backend=self.config.parse_backend,
+                    max_workers=self.config.parse_workers,
+                    timeout=self.config.parse_timeout,
+                    cache=cache,
+                    rejections=rejections,
+                )
+            )
+            yield midi_files_batch, results
+
+    def __encode_batches(self, parsed_batches, density_bins=None):
+        """
+        Encodes the songs of preprocessed batches.
+
+        Args:
+            parsed_batches (iterable): Batches from `__parse_batches`.
+            density_bins (list, optional): Global density bins, or None to compute them from the training
+                songs of each batch. Defaults to None.
+
+        Yields:
+            tuple: (split, (path, song data, token sequences)) for each encoded song, and
+            (`BATCH_END`, paths to the MIDI files of the batch) after the songs of each batch.
+        """
+        for midi_files_batch, results in parsed_batches:
+            # Split on the parsed songs like the preprocessing methods do, then drop the rejected ones.
+            split_index = int(0.8 * len(results))
+            results_train = [result for result in results[:split_index] if result[1] is not None]
+            results_valid = [result for result in results[split_index:] if result[1] is not None]
+
+            # A batch without valid files is not the end of the data, the next batch may have some.
+            if results_train or results_valid:
+                if self.config.compact_song_data:
+                    results_train = [
+                        (midi_file, song_data_to_array(song_data)) for midi_file, song_data in results_train
+                    ]
+                    results_valid = [
+                        (midi_file, song_data_to_array(song_data)) for midi_file, song_data in results_valid
+                    ]
+
+                batch_density_bins = density_bins
+                if batch_density_bins is None:
+                    batch_density_bins = get_density_bins(
+                        [song_data for _, song_data in results_train],
+                        self.config.window_size_bars,
+                        self.config.hop_length_bars,
+                        self.config.density_bins_number,
+                    )
+
+                yield from self.__encode_results(
+                    results_train, "train", batch_density_bins, self.config.transpositions_train
+                )
+                yield from self.__encode_results(results_valid, "valid", batch_density_bins, [0])
+            yield BATCH_END, midi_files_batch
+
+    def __stream_batches(self, preprocess_method, midi_files, cache, rejections, density_bins=None):
+        """
+        Processes the MIDI files batch by batch, one song at a time.
+
+        Each song is spooled to a temporary file as soon as it is converted, keeping only its note on counts
+        in memory. Once the density bins are known, the songs are read back one by one and encoded. The output
+        is the same as when processing the whole batch at once.
+
+        Args:
+            preprocess_method (callable): `preprocess_music21` or `preprocess_mido`.
+            midi_files (list): Paths to the MIDI files to process.
+            cache (ParseCache): Parse cache, or None.
+            rejections (collections.Counter): Counts the rejected files by stage.
+            density_bins (list, optional): Global density bins, or None to compute them from the training
+                songs of each batch. Defaults to None.
+
+        Yields:
+            tuple: The encoded songs and batch ends like `__encode_batches`.
+        """
+        iterate_method = ITERATE_METHODS[preprocess_method]
+        total_batches = (len(midi_files) + BATCH_SIZE - 1) // BATCH_SIZE
+        for batch_index in range(total_batches):
+            midi_files_batch = midi_files[batch_index * BATCH_SIZE : (batch_index + 1) * BATCH_SIZE]
+            logger.info(f"Streaming batch {batch_index + 1} of {total_batches} with {len(midi_files_batch)} files.")
+
+            with tempfile.TemporaryFile() as spool_file:
+                note_on_counts = []
+                for midi_file, song_data in iterate_method(
+                    midi_files_batch,
+                    backend=self.config.parse_backend,
+                    max_workers=self.config.parse_workers,
+                    timeout=self.config.parse_timeout,
+                    cache=cache,
+                    rejections=rejections,
+                ):
+                    if song_data is not None:
+                        if self.config.compact_song_data:
+                            song_data = song_data_to_array(song_data)
+                        # With global density bins, the counts are not needed, only which songs were parsed.
+                        if density_bins is None:
+                            counts = get_note_on_counts(
+                                song_data, self.config.window_size_bars, self.config.hop_length_bars
+                            )
+                        else:
+                            counts = []
+                        note_on_counts.append(counts)
+                    else:
+                        note_on_counts.append(None)
+                    pickle.dump((midi_file, song_data), spool_file, protocol=pickle.HIGHEST_PROTOCOL)
+
+                # Split on the parsed songs like the preprocessing methods do, then drop the rejected ones.
+                split_index = int(0.8 * len(note_on_counts))
+                if not all(counts is None for counts in note_on_counts):
+                    batch_density_bins = density_bins
+                    if batch_density_bins is None:
+                        distribution = [
+                            count for counts in note_on_counts[:split_index] if counts is not None for count in counts
+                        ]
+                        batch_density_bins = get_density_bins_from_counts(distribution, self.config.density_bins_number)
+
+                    spool_file.seek(0)
+                    results = (pickle.load(spool_file) for _ in range(len(note_on_counts)))
+                    results_train = itertools.islice(results, split_index)
+                    yield from self.__encode_results(
+                        (result for result in results_train if result[1] is not None),
+                        "train",
+                        batch_density_bins,
+                        self.config.transpositions_train,
+                    )
+                    yield from self.__encode_results(
+                        (result for result in results if result[1] is not None), "valid", batch_density_bins, [0]
+                    )
+            yield BATCH_END, midi_files_batch
 
     def __process_and_save_data(self, songs_data_train, songs_data_valid, dataset_path):
         """
         Processes and saves training and validation data.
 
+        The songs may be lists or any sequence of songs, such as the SongStoreReaders of a dataset built with
+        song stores, which encodes them again without parsing the MIDI files.
+
         Args:
             songs_data_train: Training data.
             songs_data_valid: Validation data.
@@ -203,30 +839,35 @@ class DatasetCreator:
             self.config.density_bins_number,
         )
 
+        # The tokenizer is built from the tokens of both splits.
+        token_counts = collections.Counter()
         train_file_path = os.path.join(dataset_path, "token_sequences_train.txt")
         self.__save_encoded_data(
             songs_data_train,
             train_file_path,
             density_bins,
             self.config.transpositions_train,
+            token_counts,
         )
 
         valid_file_path = os.path.join(dataset_path, "token_sequences_valid.txt")
-        self.__save_encoded_data(songs_data_valid, valid_file_path, density_bins, [0])
+        self.__save_encoded_data(songs_data_valid, valid_file_path, density_bins, [0], token_counts)
 
-        self.__create_and_save_tokenizer([train_file_path, valid_file_path], dataset_path)
+        self.__save_tokenizer(token_counts, dataset_path)
 
-    def __save_encoded_data(self, songs_data, path, density_bins, transpositions):
+    def __save_encoded_data(self, songs_data, path, density_bins, transpositions, token_counts):
         """
-        Encodes and saves song data to a file.
+        Encodes and saves song data to a file. Token sequences are written as they are encoded, so only the
+        sequences of one song are held in memory.
 
         Args:
             songs_data: Data to encode.
             path (str): File path to save data.
             density_bins: Density bins for encoding.
             transpositions (list): List of transpositions for augmentation.
+            token_counts (collections.Counter): Counts the tokens of the token sequences.
         """
-        token_sequences = encode_songs_data(
+        token_sequences = iterate_token_sequences(
             songs_data,
             transpositions=transpositions,
             permute=self.config.permute_tracks,
@@ -234,79 +875,142 @@ class DatasetCreator:
             hop_length_bars=self.config.hop_length_bars,
             density_bins=density_bins,
             bar_fill=False,
+            seed=self.config.encoding_seed,
+            max_workers=self.config.encode_workers,
         )
-        self.__save_token_sequences(token_sequences, path)
+        token_writer = TokenSequenceWriter(open(path, "wb"))
+        try:
+            for token_sequence in token_sequences:
+                token_writer.write(token_sequence)
+                token_counts.update(token_sequence)
+        finally:
+            token_writer.close()
+        self.__log_writer_stats(token_writer, os.path.basename(path))
 
-    def __append_encoded_data(self, songs_data, path, density_bins, transpositions):
+    def __encode_results(self, results, split, density_bins, transpositions):
         """
-        Encodes and appends song data to a file.
+        Encodes songs one at a time, so results may be a generator.
 
         Args:
-            songs_data: Data to encode.
-            path (str): File path to append data.
+            results: (path to the MIDI file, song data) pairs to encode.
+            split (str): Name of the split.
             density_bins: Density bins for encoding.
             transpositions (list): List of transpositions for augmentation.
+
+        Yields:
+            tuple: (split, (path, song data, token sequences)).
         """
-        token_sequences = encode_songs_data(
-            songs_data,
+        # Songs are identified by their file name, which does not change when the dataset is moved.
+        midi_files = collections.defaultdict(collections.deque)
+
+        def get_songs():
+            for midi_file, song_data in results:
+                midi_files[os.path.basename(midi_file)].append(midi_file)
+                yield os.path.basename(midi_file), song_data
+
+        encoded_songs = iterate_encoded_songs(
+            get_songs(),
             transpositions=transpositions,
             permute=self.config.permute_tracks,
             window_size_bars=self.config.window_size_bars,
             hop_length_bars=self.config.hop_length_bars,
             density_bins=density_bins,
             bar_fill=False,
+            seed=self.config.encoding_seed,
+            max_workers=self.config.encode_workers,
         )
-        self.__append_token_sequences(token_sequences, path)
+        for file_name, song_data, token_sequences in encoded_songs:
+            yield split, (midi_files[file_name].popleft(), song_data, token_sequences)
 
-    def __save_token_sequences(self, token_sequences, path):
+    def __write_encoded_song(
+        self, midi_file, song_data, token_sequences, split, token_writers, byte_ranges, token_counts, song_writers=None
+    ):
         """
-        Saves token sequences to a file.
+        Appends the token sequences of a song to the token sequence file of its split.
 
         Args:
-            token_sequences: List of token sequences.
-            path (str): File path to save the sequences.
+            midi_file (str): Path to the MIDI file.
+            song_data: Song data.
+            token_sequences (list): Token sequences of the song.
+            split (str): Name of the split.
+            token_writers (dict): TokenSequenceWriter of each split, appending to its token sequence file.
+            byte_ranges (dict): Receives the byte range of the token sequences of the MIDI file under split.
+            token_counts (collections.Counter): Counts the tokens of the training token sequences.
+            song_writers (dict, optional): SongStoreWriter of each split receiving the songs. Defaults to None.
         """
-        with open(path, "w") as file:
-            for token_sequence in token_sequences:
-                print(" ".join(token_sequence), file=file)
+        token_writer = token_writers[split]
+        start = token_writer.tell()
+        for token_sequence in token_sequences:
+            token_writer.write(token_sequence)
+            if split == "train":
+                token_counts.update(token_sequence)
+        byte_ranges[midi_file][split] = [start, token_writer.tell()]
+        if song_writers is not None:
+            song_writers[split].add(song_data)
+
+    def __log_stage_stats(self, stage):
+        """
+        Logs the throughput of a pipeline stage and how long it and the next stage waited for each other.
+
+        Args:
+            stage (PipelineStage): The stage.
+        """
+        stats = stage.get_stats()
+        logger.info(
+            f"Stage {stage.name}: {stats['items']} items at {stats['items_per_second']:.1f} items/s, busy for "
+            f"{stats['busy_seconds']:.1f} s, blocked by the next stage for {stats['blocked_seconds']:.1f} s, "
+            f"next stage waited for {stats['waiting_seconds']:.1f} s, queue depth mean "
+            f"{stats['mean_queue_depth']:.1f} and max {stats['max_queue_depth']} of {stage.max_queue_size}."
+        )
 
-    def __append_token_sequences(self, token_sequences, path):
+    def __log_writer_stats(self, token_writer, name):
         """
-        Appends token sequences to a file.
+        Logs the number of token sequences and bytes a writer wrote and its throughput.
 
         Args:
-            token_sequences: List of token sequences.
-            path (str): File path to append the sequences.
+            token_writer (TokenSequenceWriter): The writer.
+            name (str): Name of the written data.
         """
-        with open(path, "a") as file:
-            for token_sequence in token_sequences:
-                file.write(" ".join(token_sequence) + "\n")
+        stats = token_writer.get_stats()
+        logger.info(
+            f"Wrote {stats['sequences']} token sequences and {stats['bytes'] / 2**20:.1f} MiB of {name} in "
+            f"{stats['seconds']:.1f} s, {stats['sequences_per_second']:.0f} sequences/s."
+        )
+
+    def __get_grammar_tokens(self):
+        """
+        Lists the tokens the encoding can produce for a closed vocabulary.
 
-    def __create_and_save_tokenizer(self, files, dataset_path):
+        Returns:
+            list: The tokens, or an empty list without a closed vocabulary.
+        """
+        if not self.config.closed_vocabulary:
+            return []
+        return get_grammar_tokens(self.config.density_bins_number, self.config.transpositions_train)
+
+    def __save_tokenizer(self, token_counts, dataset_path):
         """
-        Creates and saves a tokenizer for the dataset.
+        Builds a tokenizer from the token counts and saves it to the dataset, without reading the token
+        sequence files again.
 
         Args:
-            files (list): List of files to use for training the tokenizer.
+            token_counts (dict): Number of occurrences of each token in the token sequences.
             dataset_path (str): Path to save the tokenizer.
         """
-        tokenizer = self.__create_tokenizer(files)
-        tokenizer_path = os.path.join(dataset_path, "tokenizer.json")
-        tokenizer.save(tokenizer_path)
+        tokenizer = create_tokenizer(token_counts, self.__get_grammar_tokens())
+        tokenizer.save(os.path.join(dataset_path, "tokenizer.json"))
+        logger.info(f"Saved tokenizer with {tokenizer.get_vocab_size()} tokens.")
 
-    def __create_tokenizer(self, files):
+    def __get_tokenizer_vocabulary(self, tokenizer_path):
         """
-        Creates a tokenizer from the given files.
+        Reads the tokens a saved tokenizer was trained on.
 
         Args:
-            files (list): List of files to train the tokenizer.
+            tokenizer_path (str): Path to the tokenizer file.
 
         Returns:
-            Tokenizer: A trained tokenizer object.
-        """
-        logger.info("Preparing tokenizer...")
-        tokenizer = Tokenizer(WordLevel(unk_token="[UNK]"))
-        tokenizer.pre_tokenizer = WhitespaceSplit()
-        trainer = WordLevelTrainer(special_tokens=["[UNK]", "[CLS]", "[SEP]", "[PAD]", "[MASK]"])
-        tokenizer.train(files=files, trainer=trainer)
-        return tokenizer
+            set: The tokens without the special tokens.
+        """
+        tokenizer = Tokenizer.from_file(tokenizer_path)
+        special_tokens = {added_token.content for added_token in tokenizer.get_added_tokens_decoder().values()}
+        return set(tokenizer.get_vocab()) - special_tokens
@@ -27,12 +27,34 @@ class DatasetCreatorBaseConfig:
     Attributes:
         dataset_name (str): Name of the dataset.
         encoding_method (str/callable): Method or string specifying the encoding type.
-        json_data_method (str/callable): Method or string for JSON data processing.
+        json_data_method (str/callable): Method or string for JSON data processing. "preprocess_music21"
+            and "preprocess_mido" produce the same data, the latter without parsing with music21.
         window_size_bars (int): Window size in bars for encoding.
         hop_length_bars (int): Hop length in bars for sliding windows.
         density_bins_number (int): Number of bins for density calculation.
         transpositions_train (list): List of integers representing transpositions.
         permute_tracks (bool): Whether to permute tracks during preprocessing.
+        parse_backend (str): "thread" or "process" backend for parsing MIDI files.
+        parse_workers (int): Number of parsing threads or processes.
+        parse_timeout (float): Maximum parsing time per MIDI file in seconds, or None for no limit.
+        parse_cache_path (str): Directory of the parse cache, or None to parse every MIDI file on each run.
+        parse_cache_max_size (int): Maximum size of the parse cache in bytes, or None for no limit.
+        compact_song_data (bool): Whether to hold song data as compact arrays while computing density bins and encoding.
+        streaming (bool): Whether to stream the songs of each batch through parsing and encoding one at a time,
+            spooling them to a temporary file instead of holding the batch in memory.
+        global_density_bins (bool): Whether to compute the density bins once from the training songs of all
+            batches, in a counting pass before encoding, instead of separately for each batch.
+        song_store (bool): Whether to also write the parsed songs of each split to a song store in the dataset
+            directory, from which they can be encoded again without parsing the MIDI files.
+        encode_workers (int): Number of encoding processes.
+        encoding_seed (int): Master seed of the random choices made while encoding, such as permuting the tracks.
+            Each song draws them from its own generator seeded from this seed and its file name, so the token
+            sequences do not depend on the number of encoding processes.
+        pipeline_depth (int): Number of parsed batches that may wait for being encoded. With a positive depth,
+            parsing, encoding and writing run as pipelined stages in their own threads, 0 runs them one after
+            the other.
+        closed_vocabulary (bool): Whether the tokenizer holds all tokens the encoding can produce, not only those
+            of the training token sequences. Time deltas are only added if they occur.
     """
 
     def __init__(
@@ -45,6 +67,19 @@ class DatasetCreatorBaseConfig:
         density_bins_number,
         transpositions_train,
         permute_tracks,
+        parse_backend="thread",
+        parse_workers=8,
+        parse_timeout=None,
+        parse_cache_path=None,
+        parse_cache_max_size=None,
+        compact_song_data=False,
+        streaming=False,
+        global_density_bins=True,
+        song_store=False,
+        encode_workers=1,
+        encoding_seed=0,
+        pipeline_depth=2,
+        closed_vocabulary=False,
     ):
         """
         Initializes the DatasetCreatorBaseConfig and validates its parameters.
@@ -58,6 +93,22 @@ class DatasetCreatorBaseConfig:
             density_bins_number (int): Number of density bins.
             transpositions_train (list): List of integers for training transpositions.
             permute_tracks (bool): Whether to permute tracks in preprocessing.
+            parse_backend (str, optional): "thread" or "process" parsing backend. Defaults to "thread".
+            parse_workers (int, optional): Number of parsing threads or processes. Defaults to 8.
+            parse_timeout (float, optional): Per file parsing timeout in seconds. Defaults to None.
+            parse_cache_path (str, optional): Directory of the parse cache. Defaults to None.
+            parse_cache_max_size (int, optional): Maximum size of the parse cache in bytes. Defaults to None.
+            compact_song_data (bool, optional): Whether to hold song data as compact arrays. Defaults to False.
+            streaming (bool, optional): Whether to stream the songs one at a time. Defaults to False.
+            global_density_bins (bool, optional): Whether to compute the density bins over all batches.
+                Defaults to True.
+            song_store (bool, optional): Whether to write the parsed songs to song stores. Defaults to False.
+            encode_workers (int, optional): Number of encoding processes. Defaults to 1.
+            encoding_seed (int, optional): Master seed of the random choices made while encoding. Defaults to 0.
+            pipeline_depth (int, optional): Number of parsed batches that may wait for being encoded, or 0 to
+                run the stages one after the other. Defaults to 2.
+            closed_vocabulary (bool, optional): Whether the tokenizer holds all tokens the encoding can produce.
+                Defaults to False.
         """
 
         # Check if the datasetname is fine.
@@ -107,6 +158,74 @@ class DatasetCreatorBaseConfig:
             logger.error(error_string)
             raise Exception(error_string)
 
+        if parse_backend not in ["thread", "process"]:
+            error_string = f"Config parameter parse_backend must be 'thread' or 'process', but is {parse_backend}."
+            logger.error(error_string)
+            raise Exception(error_string)
+
+        if not isinstance(parse_workers, int) or parse_workers < 1:
+            error_string = f"Config parameter parse_workers must be a positive integer, but is {parse_workers}."
+            logger.error(error_string)
+            raise Exception(error_string)
+
+        if parse_timeout is not None and (not isinstance(parse_timeout, (int, float)) or parse_timeout <= 0):
+            error_string = f"Config parameter parse_timeout must be a positive number or None, but is {parse_timeout}."
+            logger.error(error_string)
+            raise Exception(error_string)
+
+        if parse_cache_path is not None and not isinstance(parse_cache_path, str):
+            error_string = f"Config parameter parse_cache_path must be a string or None, but is {parse_cache_path}."
+            logger.error(error_string)
+            raise Exception(error_string)
+
+        if parse_cache_max_size is not None and (not isinstance(parse_cache_max_size, int) or parse_cache_max_size < 0):
+            error_string = (
+                f"Config parameter parse_cache_max_size must be a non negative integer or None, "
+                f"but is {parse_cache_max_size}."
+            )
+            logger.error(error_string)
+            raise Exception(error_string)
+
+        if not isinstance(compact_song_data, bool):
+            error_string = f"Config parameter compact_song_data must be a boolean, but is {compact_song_data}."
+            logger.error(error_string)
+            raise Exception(error_string)
+
+        if not isinstance(streaming, bool):
+            error_string = f"Config parameter streaming must be a boolean, but is {streaming}."
+            logger.error(error_string)
+            raise Exception(error_string)
+
+        if not isinstance(global_density_bins, bool):
+            error_string = f"Config parameter global_density_bins must be a boolean, but is {global_density_bins}."
+            logger.error(error_string)
+            raise Exception(error_string)
+
+        if not isinstance(song_store, bool):
+            error_string = f"Config parameter song_store must be a boolean, but is {song_store}."
+            logger.error(error_string)
+            raise Exception(error_string)
+
+        if not isinstance(closed_vocabulary, bool):
+            error_string = f"Config parameter closed_vocabulary must be a boolean, but is {closed_vocabulary}."
+            logger.error(error_string)
+            raise Exception(error_string)
+
+        if not isinstance(encode_workers, int) or encode_workers < 1:
+            error_string = f"Config parameter encode_workers must be a positive integer, but is {encode_workers}."
+            logger.error(error_string)
+            raise Exception(error_string)
+
+        if not isinstance(encoding_seed, int):
+            error_string = f"Config parameter encoding_seed must be an integer, but is {encoding_seed}."
+            logger.error(error_string)
+            raise Exception(error_string)
+
+        if not isinstance(pipeline_depth, int) or pipeline_depth < 0:
+            error_string = f"Config parameter pipeline_depth must be a non negative integer, but is {pipeline_depth}."
+            logger.error(error_string)
+            raise Exception(error_string)
+
         # Assign.
         self.dataset_name = dataset_name
         self.encoding_method = encoding_method
@@ -116,6 +235,19 @@ class DatasetCreatorBaseConfig:
         self.density_bins_number = density_bins_number
         self.transpositions_train = transpositions_train
         self.permute_tracks = permute_tracks
+        self.parse_backend = parse_backend
+        self.parse_workers = parse_workers
+        self.parse_timeout = parse_timeout
+        self.parse_cache_path = parse_cache_path
+        self.parse_cache_max_size = parse_cache_max_size
+        self.compact_song_data = compact_song_data
+        self.streaming = streaming
+        self.global_density_bins = global_density_bins
+        self.song_store = song_store
+        self.encode_workers = encode_workers
+        self.encoding_seed = encoding_seed
+        self.pipeline_depth = pipeline_depth
+        self.closed_vocabulary = closed_vocabulary
 
 
 class JSBDatasetCreatorTrackConfig(DatasetCreatorBaseConfig):
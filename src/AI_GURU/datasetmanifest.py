@@ -0,0 +1,225 @@
+# Copyright 2021 Tristan Behrens.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Lint as: python3
+
+import os
+import json
+import hashlib
+import collections
+from . import logging
+
+logger = logging.create_logger("datasetmanifest")
+
+# Name of the manifest file in the dataset directory.
+MANIFEST_FILE_NAME = "manifest.jsonl"
+
+# Version of the manifest format.
+MANIFEST_VERSION = 2
+
+# Splits of the dataset, each written to its own token sequence file.
+SPLITS = ["train", "valid"]
+
+
+class DatasetManifest:
+    """
+    Records which MIDI files a dataset was built from and where their token sequences were written, so that
+    an interrupted build can resume and new MIDI files can be added without encoding the others again.
+
+    The manifest is a journal of JSON lines. The first line holds the settings the dataset was built with.
+    Every further line commits one batch: the hash, status and output byte ranges of its files, the sizes of
+    the token sequence files after the batch, and the occurrences of each token the batch added to the training
+    token sequences, from which the tokenizer is built without reading them again.
+    Appending a line is the commit, so a build interrupted in the middle of a batch resumes from the last
+    complete line and discards whatever was written after it.
+
+    Attributes:
+        manifest_path (str): Path to the manifest file.
+        settings (dict): Settings the dataset was built with.
+        files (dict): Record of each MIDI file by file name.
+        sizes (dict): Size in bytes of the token sequence file of each split after the last batch.
+        token_counts (collections.Counter): Number of occurrences of each token in the training token sequences.
+    """
+
+    def __init__(self, manifest_path, settings):
+        """
+        Initializes an empty DatasetManifest. Use `open` to load or create the manifest file.
+
+        Args:
+            manifest_path (str): Path to the manifest file.
+            settings (dict): Settings the dataset is built with.
+        """
+        self.manifest_path = manifest_path
+        self.settings = settings
+        self.files = {}
+        self.sizes = {split: 0 for split in SPLITS}
+        self.token_counts = collections.Counter()
+
+    @classmethod
+    def open(cls, dataset_path, settings):
+        """
+        Loads the manifest of a dataset, or starts a new one if there is none.
+
+        Args:
+            dataset_path (str): Path to the dataset directory.
+            settings (dict): Settings the dataset is built with. Must be JSON serializable.
+
+        Returns:
+            DatasetManifest: The manifest.
+
+        Raises:
+            Exception: If the dataset was built with other settings.
+        """
+        manifest = cls(os.path.join(dataset_path, MANIFEST_FILE_NAME), settings)
+        lines = []
+        if os.path.exists(manifest.manifest_path):
+            with open(manifest.manifest_path, "rb") as f:
+                lines = f.read().split(b"\n")
+
+        # Without a complete header line, no batch was committed yet.
+        if len(lines) < 2:
+            manifest.__write_lines([{"version": MANIFEST_VERSION, "settings": settings}], mode="w")
+            return manifest
+
+        header = json.loads(lines[0])
+        if header.get("version") != MANIFEST_VERSION or header["settings"] != json.loads(json.dumps(settings)):
+            error_string = (
+                f"Dataset manifest {manifest.manifest_path} was written with other settings "
+                f"{header.get('settings')}. Create the dataset with overwrite=True to rebuild it."
+            )
+            logger.error(error_string)
+            raise Exception(error_string)
+
+        # Only lines ending with a newline were committed. An interrupted append leaves a partial last line.
+        committed_size = len(lines[0]) + 1
+        for line in lines[1:-1]:
+            try:
+                batch = json.loads(line)
+            except json.JSONDecodeError:
+                break
+            manifest.files.update(batch["files"])
+            manifest.sizes = batch["sizes"]
+            manifest.token_counts.update(batch["token_counts"])
+            committed_size += len(line) + 1
+
+        with open(manifest.manifest_path, "r+b") as f:
+            f.truncate(committed_size)
+        return manifest
+
+    @property
+    def vocabulary(self):
+        """
+        set: Tokens of the training token sequences.
+        """
+        return set(self.token_counts)
+
+    def get_file_state(self, midi_file):
+        """
+        Gets the hash, size and modification time of a MIDI file. The hash recorded in the manifest is reused
+        if the size and modification time did not change.
+
+        Args:
+            midi_file (str): Path to the MIDI file.
+
+        Returns:
+            dict: The "hash", "size" and "mtime_ns" of the file.
+        """
+        stat = os.stat(midi_file)
+        record = self.files.get(os.path.basename(midi_file))
+        if record is not None and record["size"] == stat.st_size and record["mtime_ns"] == stat.st_mtime_ns:
+            file_hash = record["hash"]
+        else:
+            file_hash = hash_file(midi_file)
+        return {"hash": file_hash, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+    def get_pending_files(self, midi_files):
+        """
+        Selects the MIDI files that are not in the dataset yet. Files that changed or were removed since
+        they were encoded are reported, but their token sequences are kept.
+
+        Args:
+            midi_files (list): Paths to all MIDI files.
+
+        Returns:
+            list: Paths to the MIDI files to process.
+        """
+        pending_files = []
+        changed_files = []
+        for midi_file in midi_files:
+            record = self.files.get(os.path.basename(midi_file))
+            if record is None:
+                pending_files.append(midi_file)
+            elif self.get_file_state(midi_file)["hash"] != record["hash"]:
+                changed_files.append(midi_file)
+
+        file_names = {os.path.basename(midi_file) for midi_file in midi_files}
+        removed_files_number = sum(1 for file_name in self.files if file_name not in file_names)
+        if changed_files or removed_files_number:
+            logger.warning(
+                f"{len(changed_files)} MIDI files changed and {removed_files_number} were removed since they were "
+                f"encoded. Their token sequences are kept, create the dataset with overwrite=True to rebuild it."
+            )
+        return pending_files
+
+    def commit_batch(self, file_records, sizes, token_counts):
+        """
+        Records a batch whose token sequences have been written and flushed to disk.
+
+        Args:
+            file_records (dict): Record of each MIDI file of the batch by path, with its "status" and
+                the byte ranges of its token sequences by split.
+            sizes (dict): Size in bytes of the token sequence file of each split after the batch.
+            token_counts (collections.Counter): Number of occurrences of each token in the training token
+                sequences, including those of the batch.
+        """
+        files = {}
+        for midi_file, record in file_records.items():
+            files[os.path.basename(midi_file)] = {**self.get_file_state(midi_file), **record}
+
+        batch_token_counts = dict(sorted((collections.Counter(token_counts) - self.token_counts).items()))
+        self.__write_lines([{"files": files, "sizes": sizes, "token_counts": batch_token_counts}], mode="a")
+        self.files.update(files)
+        self.sizes = dict(sizes)
+        self.token_counts = collections.Counter(token_counts)
+
+    def __write_lines(self, lines, mode):
+        """
+        Writes JSON lines to the manifest file and flushes them to disk.
+
+        Args:
+            lines (list): Objects to write, one per line.
+            mode (str): "w" to start a new manifest, "a" to append.
+        """
+        with open(self.manifest_path, mode) as f:
+            for line in lines:
+                f.write(json.dumps(line, separators=(",", ":")) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+
+def hash_file(midi_file):
+    """
+    Computes the SHA-256 of the content of a file.
+
+    Args:
+        midi_file (str): Path to the file.
+
+    Returns:
+        str: Hexadecimal digest.
+    """
+    digest = hashlib.sha256()
+    with open(midi_file, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
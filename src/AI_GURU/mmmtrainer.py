@@ -15,18 +15,14 @@
 # Lint as: python3
 
 import os
-import numpy as np
-import random
-import torch
-from typing import Dict
-from torch.utils.data.dataset import Dataset
 from tokenizers import Tokenizer
-from transformers import DataCollatorWithPadding
+from transformers import DataCollatorWithPadding, default_data_collator
 from transformers import Trainer, TrainingArguments
 from transformers import GPT2Config, GPT2LMHeadModel
 from transformers import PreTrainedTokenizerFast
-from tqdm import tqdm
 from .mmmtrainerconfig import MMMTrainerBaseConfig
+from .token_sequence_dataset import PackedTokenSequenceDataset, StreamingTokenSequenceDataset, TokenSequenceDataset
+from .token_sequence_batching import DynamicPaddingCollator, LengthGroupedTrainer, report_padding_fraction
 
 
 class MMMTrainer:
@@ -66,6 +62,39 @@ class MMMTrainer:
         elif self.config.framework == "tensorflow":
             assert False, "Implement!"
 
+    def __create_dataset(self, tokenizer, dataset_paths, simulate):
+        """
+        Creates a dataset of token sequence files, packed or padded as configured.
+
+        Args:
+            tokenizer (PreTrainedTokenizerFast): Tokenizer for encoding the sequences.
+            dataset_paths (list): Paths to the token sequence files.
+            simulate (bool): If True, uses a small subset of the dataset.
+
+        Returns:
+            TokenSequenceDataset: The dataset.
+        """
+        if self.config.sequence_packing:
+            return PackedTokenSequenceDataset(
+                tokenizer=tokenizer,
+                dataset_paths=dataset_paths,
+                block_size=self.config.pad_length,
+                simulate=simulate,
+                cache_dir=self.config.token_cache_dir,
+                tokenization_batch_size=self.config.tokenization_batch_size,
+                tokenization_threads=self.config.tokenization_threads,
+            )
+        return TokenSequenceDataset(
+            tokenizer=tokenizer,
+            dataset_paths=dataset_paths,
+            block_size=self.config.pad_length,
+            simulate=simulate,
+            cache_dir=self.config.token_cache_dir,
+            padding=not self.config.dynamic_padding,
+            tokenization_batch_size=self.config.tokenization_batch_size,
+            tokenization_threads=self.config.tokenization_threads,
+        )
+
     def __train_pytorch(self, output_path, simulate):
         """
         Implements the training process using PyTorch.
@@ -97,28 +126,36 @@ class MMMTrainer:
 
         # Prepare the training dataset.
         print("Preparing training dataset...")
-        dataset_train = TokenSequenceDataset(
-            tokenizer=pretrained_tokenizer,
-            dataset_paths=self.config.dataset_train_files,
-            block_size=self.config.pad_length,
-            simulate=simulate,
-        )
+        if self.config.streaming:
+            dataset_train = StreamingTokenSequenceDataset(
+                tokenizer=pretrained_tokenizer,
+                dataset_paths=self.config.dataset_train_files,
+                block_size=self.config.pad_length,
+                shuffle_buffer_size=self.config.shuffle_buffer_size,
+                simulate=simulate,
+                padding=not self.config.dynamic_padding,
+            )
+        else:
+            dataset_train = self.__create_dataset(pretrained_tokenizer, self.config.dataset_train_files, simulate)
 
         # Prepare the validation dataset.
         print("Preparing validate dataset...")
-        dataset_valid = TokenSequenceDataset(
-            tokenizer=pretrained_tokenizer,
-            dataset_paths=self.config.dataset_validate_files,
-            block_size=self.config.pad_length,
-            simulate=simulate,
-        )
+        dataset_valid = self.__create_dataset(pretrained_tokenizer, self.config.dataset_validate_files, simulate)
 
         # Prepare data collator.
-        data_collator = DataCollatorWithPadding(
-            tokenizer=pretrained_tokenizer,
-            padding="max_length",
-            max_length=self.config.pad_length,
-        )
+        if self.config.sequence_packing:
+            data_collator = default_data_collator
+        elif self.config.dynamic_padding:
+            # The streamed examples are not known in advance, so they are padded per batch without grouping.
+            if not self.config.streaming:
+                report_padding_fraction(dataset_train.lengths, self.config.batch_size, self.config.pad_length)
+            data_collator = DynamicPaddingCollator(pad_token_id=dataset_train.pad_token_id)
+        else:
+            data_collator = DataCollatorWithPadding(
+                tokenizer=pretrained_tokenizer,
+                padding="max_length",
+                max_length=self.config.pad_length,
+            )
 
         # Create the trainer.
         training_args = TrainingArguments(
@@ -126,6 +163,7 @@ class MMMTrainer:
             overwrite_output_dir=True,
             evaluation_strategy="steps",
             num_train_epochs=self.config.epochs,
+            max_steps=self.config.max_steps,
             per_gpu_train_batch_size=self.config.batch_size,
             save_steps=1_000,
             save_total_limit=2,
@@ -135,7 +173,8 @@ class MMMTrainer:
             load_best_model_at_end=True,
             save_strategy="steps",
         )
-        trainer = Trainer(
+        trainer_class = LengthGroupedTrainer if self.config.dynamic_padding and not self.config.streaming else Trainer
+        trainer = trainer_class(
             model=model,
             args=training_args,
             data_collator=data_collator,
@@ -149,106 +188,3 @@ class MMMTrainer:
         # Save the model.
         model_path = os.path.join(output_path, "best_model")
         trainer.save_model(model_path)
-
-
-class TokenSequenceDataset(Dataset):
-    """
-    Custom dataset class for tokenized sequences used in training.
-
-    Attributes:
-        tokenizer (PreTrainedTokenizerFast): Tokenizer used for encoding.
-        examples (list): List of encoded sequences with padding and truncation applied.
-    """
-
-    def __init__(self, tokenizer, dataset_paths, block_size, simulate=False):
-        """
-        Initializes the TokenSequenceDataset.
-
-        Args:
-            tokenizer (PreTrainedTokenizerFast): Tokenizer for encoding sequences.
-            dataset_paths (list): List of paths to input dataset files.
-            block_size (int): Maximum sequence length after padding.
-            simulate (bool): If True, uses a smaller dataset for simulation.
-        """
-
-        pad_token_id = tokenizer.encode("[PAD]")[0]
-        unk_token_id = tokenizer.encode("[UNK]")[0]
-
-        # Read all lines from all files.
-        lines = []
-        for dataset_path in dataset_paths:
-            assert os.path.isfile(dataset_path), f"Input file path {dataset_path} not found"
-            lines += open(dataset_path, "r").readlines()
-
-        # In simulation just use a few samples.
-        if simulate:
-            random.shuffle(lines)
-            lines = lines[:10]
-
-        # Turn lines into training examples. Also gather some statistics.
-        self.examples = []
-        unknown_tokens_set = []
-        unknown_tokens = []
-        tokens_count = 0
-        unknown_token_lines_count = 0
-        too_long_lines_count = 0
-        encoded_lengths = []
-        for line in tqdm(lines):
-
-            # Skip empty lines.
-            line = line.strip()
-            if line == "":
-                continue
-
-            # Encode the line.
-            encoded_line = tokenizer.encode(line)
-            encoded_lengths += [len(encoded_line)]
-            tokens_count += len(encoded_line)
-
-            # Create a warning about unknown tokens. And then skip the line.
-            if unk_token_id in encoded_line:
-                index = encoded_line.index(unk_token_id)
-                token = tokenizer.decode(encoded_line[index])
-                token = line.split()[index]
-                if token not in unknown_tokens_set:
-                    unknown_tokens_set += [token]
-                # logger.warning(f"Skipping line because of unknown token {token}")
-                unknown_tokens += [token]
-                unknown_token_lines_count += 1
-                continue
-
-            # Skip sequence if it is too long.
-            if len(encoded_line) > block_size:
-                # logger.warning(f"Skipping line because it is too long... {len(encoded_line)} > {block_size}")
-                too_long_lines_count += 1
-                continue
-
-            # Pad and truncate.
-            tensor = np.full((block_size,), pad_token_id, dtype=np.longlong)
-            tensor[: len(encoded_line)] = encoded_line
-            assert len(tensor) == block_size
-
-            self.examples += [
-                {
-                    "input_ids": torch.tensor(tensor, dtype=torch.long),
-                    "labels": torch.tensor(tensor, dtype=torch.long),
-                }
-            ]
-
-    def __len__(self):
-        """
-        Returns the number of examples in the dataset.
-        """
-        return len(self.examples)
-
-    def __getitem__(self, i) -> Dict[str, torch.tensor]:
-        """
-        Retrieves the i-th example from the dataset.
-
-        Args:
-            i (int): Index of the example to retrieve.
-
-        Returns:
-            Dict[str, torch.tensor]: Encoded sequence and labels.
-        """
-        return self.examples[i]
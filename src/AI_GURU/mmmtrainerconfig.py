@@ -27,7 +27,7 @@ class MMMTrainerBaseConfig:
         dataset_train_files (list): List of paths to training dataset files.
         dataset_validate_files (list): List of paths to validation dataset files.
         pad_length (int): Maximum padding length for input sequences.
-        shuffle_buffer_size (int): Buffer size for shuffling datasets.
+        shuffle_buffer_size (int): Buffer size for shuffling the streamed training dataset.
         batch_size (int): Batch size for training.
         epochs (int): Number of training epochs.
         n_head (int): Number of attention heads in the model.
@@ -35,6 +35,16 @@ class MMMTrainerBaseConfig:
         n_embd (int): Dimension of the embedding space.
         n_positions (int): Maximum number of positional encodings.
         n_ctx (int): Context size for input sequences.
+        token_cache_dir (str): Directory of the tokenized dataset files, or None for a "token_cache" directory
+            next to each file.
+        dynamic_padding (bool): Whether to batch the training examples by length and pad each batch to its
+            longest example instead of padding every example to `pad_length`.
+        sequence_packing (bool): Whether to pack consecutive sequences into blocks of `pad_length` tokens
+            instead of padding every example to `pad_length`.
+        streaming (bool): Whether to read the training files while training instead of loading them first.
+        max_steps (int): Number of training steps, replacing `epochs` if positive. Required when streaming.
+        tokenization_batch_size (int): Number of lines encoded together when tokenizing the dataset files.
+        tokenization_threads (int): Number of threads encoding batches of lines.
     """
 
     def __init__(
@@ -52,6 +62,13 @@ class MMMTrainerBaseConfig:
         n_embd=512,
         n_positions=1024,
         n_ctx=1024,
+        token_cache_dir=None,
+        dynamic_padding=False,
+        sequence_packing=False,
+        streaming=False,
+        max_steps=-1,
+        tokenization_batch_size=1000,
+        tokenization_threads=1,
     ):
         """
         Initializes the MMMTrainerBaseConfig with the provided parameters.
@@ -62,7 +79,7 @@ class MMMTrainerBaseConfig:
             dataset_train_files (list): List of training dataset file paths.
             dataset_validate_files (list): List of validation dataset file paths.
             pad_length (int): Maximum length of sequences after padding.
-            shuffle_buffer_size (int): Buffer size for dataset shuffling.
+            shuffle_buffer_size (int): Number of examples of the streamed training dataset shuffled together.
             batch_size (int): Batch size for training.
             epochs (int): Number of training epochs.
             n_head (int): Number of attention heads.
@@ -70,9 +87,24 @@ class MMMTrainerBaseConfig:
             n_embd (int): Dimension of embedding vectors.
             n_positions (int): Maximum number of positions for positional encoding.
             n_ctx (int): Maximum context size for input sequences.
+            token_cache_dir (str): Directory of the tokenized dataset files. Default is None, for a "token_cache"
+                directory next to each file.
+            dynamic_padding (bool): Whether to batch the training examples by length and pad each batch to its
+                longest example, masking the padding out of the loss. Default is False.
+            sequence_packing (bool): Whether to pack consecutive sequences into blocks of `pad_length` tokens,
+                masking the loss across sequences. Default is False.
+            streaming (bool): Whether to read and tokenize the training files while training, shuffling them
+                through a buffer of `shuffle_buffer_size` examples. Default is False.
+            max_steps (int): Number of training steps, replacing `epochs` if positive. The streamed dataset has
+                no length, so it is required when streaming. Default is -1.
+            tokenization_batch_size (int): Number of lines encoded together when tokenizing the dataset files
+                into their caches. Default is 1000.
+            tokenization_threads (int): Number of threads encoding batches of lines. Default is 1.
 
         Raises:
-            Exception: If the framework is invalid or dataset files are missing.
+            Exception: If the framework is invalid, dataset files are missing, both dynamic padding and
+                sequence packing are enabled, or streaming is enabled with sequence packing or without
+                `max_steps`.
             AssertionError: If `pad_length` exceeds `n_positions`.
         """
 
@@ -91,6 +123,19 @@ class MMMTrainerBaseConfig:
             error_string = f"Missing dataset files {missing_dataset_files}."
             raise Exception(error_string)
 
+        # Check that at most one way of removing the padding is enabled.
+        if dynamic_padding and sequence_packing:
+            error_string = "Dynamic padding and sequence packing cannot be enabled together."
+            raise Exception(error_string)
+
+        # Check that the number of steps of the streamed dataset is known.
+        if streaming and sequence_packing:
+            error_string = "Streaming and sequence packing cannot be enabled together."
+            raise Exception(error_string)
+        if streaming and max_steps <= 0:
+            error_string = "Streaming requires a positive max_steps, since the streamed dataset has no length."
+            raise Exception(error_string)
+
         assert pad_length <= n_positions
 
         self.framework = framework
@@ -106,6 +151,13 @@ class MMMTrainerBaseConfig:
         self.n_embd = n_embd
         self.n_positions = n_positions
         self.n_ctx = n_ctx
+        self.token_cache_dir = token_cache_dir
+        self.dynamic_padding = dynamic_padding
+        self.sequence_packing = sequence_packing
+        self.streaming = streaming
+        self.max_steps = max_steps
+        self.tokenization_batch_size = tokenization_batch_size
+        self.tokenization_threads = tokenization_threads
 
 
 class JSBTrackConfig(MMMTrainerBaseConfig):
@@ -0,0 +1,124 @@
+# Copyright 2021 Tristan Behrens.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Lint as: python3
+
+import math
+import collections
+import numpy as np
+
+
+class DensitySketch:
+    """
+    A streaming summary of note on counts, for computing density bins over a whole dataset in bounded memory.
+
+    Note on counts are small integers, so the sketch keeps how often each count occurs. As long as there are
+    at most `max_size` distinct counts, its quantiles equal `np.percentile` of all counts. Beyond that, counts
+    are merged into buckets of doubling width represented by their midpoints. Merging keeps the order of the
+    counts, so each quantile is then off by at most half a bucket width, `error_bound`.
+
+    Attributes:
+        max_size (int): Maximum number of buckets.
+        bucket_width (int): Width of the buckets, 1 while the quantiles are exact.
+        frequencies (collections.Counter): Number of counts in each bucket, by bucket index.
+        counts_number (int): Number of counts added.
+    """
+
+    def __init__(self, max_size=4096):
+        """
+        Initializes an empty DensitySketch.
+
+        Args:
+            max_size (int, optional): Maximum number of buckets. Defaults to 4096.
+        """
+        if not isinstance(max_size, int) or max_size < 2:
+            raise ValueError(f"max_size must be an integer of at least 2, but is {max_size}.")
+
+        self.max_size = max_size
+        self.bucket_width = 1
+        self.frequencies = collections.Counter()
+        self.counts_number = 0
+
+    @property
+    def error_bound(self):
+        """
+        Maximum difference between a quantile of the sketch and the exact quantile of the counts.
+        """
+        return (self.bucket_width - 1) / 2
+
+    def add(self, counts):
+        """
+        Adds note on counts.
+
+        Args:
+            counts (list): Non negative integer counts, as from `get_note_on_counts`.
+        """
+        bucket_width = self.bucket_width
+        self.frequencies.update(count // bucket_width for count in counts)
+        self.counts_number += len(counts)
+        while len(self.frequencies) > self.max_size:
+            self.__merge_buckets()
+
+    def get_quantile(self, percentile):
+        """
+        Computes a quantile with the linear interpolation of `np.percentile`.
+
+        Args:
+            percentile (float): Percentile between 0 and 100.
+
+        Returns:
+            float: The quantile.
+        """
+        bucket_indices = sorted(self.frequencies)
+        ranks = np.cumsum([self.frequencies[bucket_index] for bucket_index in bucket_indices])
+
+        def get_value(rank):
+            bucket_index = bucket_indices[int(np.searchsorted(ranks, rank, side="right"))]
+            return bucket_index * self.bucket_width + self.error_bound
+
+        # The same virtual index and interpolation as np.percentile.
+        virtual_index = (self.counts_number - 1) * (percentile / 100)
+        lower_rank = math.floor(virtual_index)
+        upper_rank = min(lower_rank + 1, self.counts_number - 1)
+        lower_value = get_value(lower_rank)
+        upper_value = get_value(upper_rank)
+        fraction = virtual_index - lower_rank
+        if fraction >= 0.5:
+            return float(upper_value - (upper_value - lower_value) * (1 - fraction))
+        return float(lower_value + (upper_value - lower_value) * fraction)
+
+    def get_density_bins(self, bins):
+        """
+        Computes density bins like `get_density_bins_from_counts` does from all counts.
+
+        Args:
+            bins (int): Number of density bins.
+
+        Returns:
+            list: List of density bin thresholds.
+        """
+        if self.counts_number == 0:
+            raise ValueError("Density distribution is empty. Ensure training data contains valid songs.")
+
+        return [self.get_quantile(i) for i in range(100 // bins, 100, 100 // bins)]
+
+    def __merge_buckets(self):
+        """
+        Doubles the bucket width, merging pairs of neighbouring buckets.
+        """
+        frequencies = collections.Counter()
+        for bucket_index, frequency in self.frequencies.items():
+            frequencies[bucket_index // 2] += frequency
+        self.frequencies = frequencies
+        self.bucket_width *= 2
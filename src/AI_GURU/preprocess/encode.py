@@ -15,12 +15,21 @@
 # Lint as: python3
 
 import itertools
+import collections
+import hashlib
 import numpy as np
 import random
 import json
+from .songarray import TrackArray, EVENT_TYPES, TIME_DELTA, to_delta
+from .processpool import TimeoutProcessPool
 
+# Tokens of the time deltas seen so far. There are only few distinct deltas after quantization.
+_time_delta_tokens = {}
 
-def encode_songs_data(songs_data, transpositions, permute, window_size_bars, hop_length_bars, density_bins, bar_fill):
+
+def encode_songs_data(
+    songs_data, transpositions, permute, window_size_bars, hop_length_bars, density_bins, bar_fill, seed=None
+):
     """
     Encodes songs into tokens without additional dataset context.
 
@@ -32,28 +41,164 @@ def encode_songs_data(songs_data, transpositions, permute, window_size_bars, hop
         hop_length_bars (int): Hop length between consecutive windows.
         density_bins (list): Density bins for note events.
         bar_fill (bool): Whether to include bar fills.
+        seed (int, optional): Master seed of the random choices of each song, see `iterate_encoded_songs`.
+            Defaults to None, using the global random state.
 
     Returns:
         list: List of token sequences representing all songs.
     """
+    return list(
+        iterate_token_sequences(
+            songs_data, transpositions, permute, window_size_bars, hop_length_bars, density_bins, bar_fill, seed
+        )
+    )
 
-    # This will be returned.
-    token_sequences = []
 
-    # Go through all songs.
-    for song_data in songs_data:
-        token_sequences += encode_song_data(
-            song_data,
-            transpositions,
-            permute,
-            window_size_bars,
-            hop_length_bars,
-            density_bins,
-            bar_fill,
-        )
+def iterate_token_sequences(
+    songs_data,
+    transpositions,
+    permute,
+    window_size_bars,
+    hop_length_bars,
+    density_bins,
+    bar_fill,
+    seed=None,
+    max_workers=1,
+):
+    """
+    Encodes songs into tokens like `encode_songs_data`, yielding the token sequences instead of collecting
+    them, so that only the sequences of one song are held at a time.
 
-    # Done.
-    return token_sequences
+    Args:
+        songs_data (iterable): Songs, e.g. a list, a generator or a SongStoreReader.
+        transpositions (list): List of transposition values.
+        permute (bool): Whether to permute tracks randomly.
+        window_size_bars (int): Number of bars in a window.
+        hop_length_bars (int): Hop length between consecutive windows.
+        density_bins (list): Density bins for note events.
+        bar_fill (bool): Whether to include bar fills.
+        seed (int, optional): Master seed of the random choices of each song, which is identified by its
+            index. Defaults to None, using the global random state.
+        max_workers (int, optional): Number of encoding processes. Requires a seed if more than 1. Defaults to 1.
+
+    Yields:
+        list: Token sequence.
+    """
+    if seed is None:
+        if max_workers != 1:
+            raise ValueError("Encoding songs in several processes requires a seed.")
+        for song_data in songs_data:
+            yield from encode_song_data(
+                song_data,
+                transpositions,
+                permute,
+                window_size_bars,
+                hop_length_bars,
+                density_bins,
+                bar_fill,
+            )
+        return
+
+    for _, _, token_sequences in iterate_encoded_songs(
+        enumerate(songs_data),
+        transpositions,
+        permute,
+        window_size_bars,
+        hop_length_bars,
+        density_bins,
+        bar_fill,
+        seed,
+        max_workers,
+    ):
+        yield from token_sequences
+
+
+def iterate_encoded_songs(
+    songs, transpositions, permute, window_size_bars, hop_length_bars, density_bins, bar_fill, seed, max_workers=1
+):
+    """
+    Encodes songs in worker processes, yielding the token sequences of each song in input order.
+
+    The random choices of each song, for permuting its tracks and for bar fill, are drawn from its own random
+    generator, seeded by `get_song_seed` from the master seed and the key of the song. The token sequences
+    therefore only depend on the songs and the seed, not on the number of workers or on which worker encodes
+    which song.
+
+    Args:
+        songs (iterable): (song key, song data) pairs. Keys identify the songs, e.g. by file name.
+        transpositions (list): List of transposition values.
+        permute (bool): Whether to permute tracks randomly.
+        window_size_bars (int): Number of bars in a window.
+        hop_length_bars (int): Hop length between consecutive windows.
+        density_bins (list): Density bins for note events.
+        bar_fill (bool): Whether to include bar fills.
+        seed (int): Master seed.
+        max_workers (int, optional): Number of encoding processes. With 1, songs are encoded in this process.
+            Defaults to 1.
+
+    Yields:
+        tuple: (song key, song data, list of token sequences).
+    """
+    parameters = (transpositions, permute, window_size_bars, hop_length_bars, density_bins, bar_fill, seed)
+    if max_workers == 1:
+        for song_key, song_data in songs:
+            yield song_key, song_data, _encode_song_task((song_key, song_data, parameters))
+        return
+
+    # Keep the songs in this process to yield them along with their token sequences, which come in order.
+    songs_in_flight = collections.deque()
+
+    def get_tasks():
+        for song_key, song_data in songs:
+            songs_in_flight.append((song_key, song_data))
+            yield song_key, song_data, parameters
+
+    pool = TimeoutProcessPool(_encode_song_task, max_workers=max_workers)
+    for token_sequences in pool.imap(get_tasks()):
+        song_key, song_data = songs_in_flight.popleft()
+        if token_sequences is None:
+            raise Exception(f"Failed to encode song {song_key}.")
+        yield song_key, song_data, token_sequences
+
+
+def get_song_seed(seed, song_key):
+    """
+    Derives the seed of a song from the master seed and the key of the song.
+
+    Args:
+        seed (int): Master seed.
+        song_key: Key identifying the song. Its string form is hashed.
+
+    Returns:
+        int: 64 bit seed.
+    """
+    digest = hashlib.sha256(f"{seed}\0{song_key}".encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "little")
+
+
+def _encode_song_task(task):
+    """
+    Encodes one song with its own random generator. Runs in the encoding processes.
+
+    Args:
+        task (tuple): (song key, song data, (transpositions, permute, window_size_bars, hop_length_bars,
+            density_bins, bar_fill, seed)).
+
+    Returns:
+        list: List of token sequences for the song.
+    """
+    song_key, song_data, parameters = task
+    transpositions, permute, window_size_bars, hop_length_bars, density_bins, bar_fill, seed = parameters
+    return encode_song_data(
+        song_data,
+        transpositions,
+        permute,
+        window_size_bars,
+        hop_length_bars,
+        density_bins,
+        bar_fill,
+        rng=random.Random(get_song_seed(seed, song_key)),
+    )
 
 
 def encode_song_data_singular(song_data, density):
@@ -147,7 +292,9 @@ def encode_event_data_no_transposition(event_data):
     return encode_event_data(event_data, 0)
 
 
-def encode_song_data(song_data, transpositions, permute, window_size_bars, hop_length_bars, density_bins, bar_fill):
+def encode_song_data(
+    song_data, transpositions, permute, window_size_bars, hop_length_bars, density_bins, bar_fill, rng=None
+):
     """
     Encodes a single song into token sequences with dataset context.
 
@@ -159,11 +306,16 @@ def encode_song_data(song_data, transpositions, permute, window_size_bars, hop_l
         hop_length_bars (int): Hop length between consecutive windows.
         density_bins (list): Density bins for note events.
         bar_fill (bool): Whether to include bar fills.
+        rng (random.Random, optional): Random generator for permuting the tracks and for bar fill.
+            Defaults to None, using the global random state.
 
     Returns:
         list: List of token sequences for the song.
     """
 
+    if rng is None:
+        rng = random
+
     # This will be returned.
     token_sequences = []
 
@@ -173,17 +325,37 @@ def encode_song_data(song_data, transpositions, permute, window_size_bars, hop_l
     # For iterating over the bars.
     bar_indices = get_bar_indices(bars, window_size_bars, hop_length_bars)
 
+    # Expand compact tracks once per song instead of once per window.
+    tracks_lists = {
+        track_data_index: track_data.to_lists()
+        for track_data_index, track_data in enumerate(song_data["tracks"])
+        if isinstance(track_data, TrackArray)
+    }
+
+    # The densities do not depend on the transposition, so they are binned once per track for all windows.
+    # Overlapping windows share bars, so each bar is encoded once per transposition and then reused.
+    # Bar fill hides a bar from the count of its window and replaces its events, so then neither is reused.
+    tracks_densities = None
+    tracks_bar_caches = [None] * len(song_data["tracks"])
+    if not bar_fill:
+        tracks_densities = [
+            get_window_densities(track_data, bar_indices, density_bins) for track_data in song_data["tracks"]
+        ]
+        tracks_bar_caches = [{} for _ in song_data["tracks"]]
+
     # Go through all combinations.
     count = 0
-    for (bar_start_index, bar_end_index), transposition in itertools.product(bar_indices, transpositions):
+    for (window_index, (bar_start_index, bar_end_index)), transposition in itertools.product(
+        enumerate(bar_indices), transpositions
+    ):
 
         # Start empty
         token_sequence = []
 
         # Do bar fill if necessary.
         if bar_fill:
-            track_data = random.choice(song_data["tracks"])
-            bar_data = random.choice(track_data["bars"][bar_start_index:bar_end_index])
+            track_data = rng.choice(song_data["tracks"])
+            bar_data = rng.choice(track_data["bars"][bar_start_index:bar_end_index])
             bar_data_fill = {"events": bar_data["events"]}
             bar_data["events"] = "bar_fill"
 
@@ -193,7 +365,7 @@ def encode_song_data(song_data, transpositions, permute, window_size_bars, hop_l
         # Get the indices. Permute if necessary.
         track_data_indices = list(range(len(song_data["tracks"])))
         if permute:
-            random.shuffle(track_data_indices)
+            rng.shuffle(track_data_indices)
 
         # Encode the tracks.
         for track_data_index in track_data_indices:
@@ -201,7 +373,14 @@ def encode_song_data(song_data, transpositions, permute, window_size_bars, hop_l
 
             # Encode the track. Insert density tokens. Also transpose.
             encoded_track_data = encode_track_data(
-                track_data, density_bins, bar_start_index, bar_end_index, transposition
+                track_data,
+                density_bins,
+                bar_start_index,
+                bar_end_index,
+                transposition,
+                tracks_lists.get(track_data_index),
+                tracks_densities[track_data_index][window_index] if tracks_densities is not None else None,
+                tracks_bar_caches[track_data_index],
             )
             token_sequence += encoded_track_data
 
@@ -216,16 +395,29 @@ def encode_song_data(song_data, transpositions, permute, window_size_bars, hop_l
     return token_sequences
 
 
-def encode_track_data(track_data, density_bins, bar_start_index, bar_end_index, transposition):
+def encode_track_data(
+    track_data,
+    density_bins,
+    bar_start_index,
+    bar_end_index,
+    transposition,
+    track_lists=None,
+    density=None,
+    bar_cache=None,
+):
     """
     Encodes track data for a single track within dataset context.
 
     Args:
-        track_data (dict): Dictionary representing track data.
+        track_data (dict/TrackArray): Dictionary representing track data, or a compact track.
         density_bins (list): Density bins for note events.
         bar_start_index (int): Starting bar index.
         bar_end_index (int): Ending bar index.
         transposition (int): Transposition value.
+        track_lists (tuple, optional): `TrackArray.to_lists` of a compact track, if already computed.
+        density (int, optional): Density bin of the window from `get_window_densities`, if already computed.
+        bar_cache (dict, optional): Tokens of the bars of the track encoded so far, by bar index and
+            transposition. Bars missing from it are encoded and added. Defaults to None.
 
     Returns:
         list: Token sequence for the track.
@@ -247,22 +439,30 @@ def encode_track_data(track_data, density_bins, bar_start_index, bar_end_index,
         tokens += ["INST=DRUMS"]
         transposition = 0
 
-    # Count note on events.
-    note_on_events = 0
-    for bar_data in track_data["bars"][bar_start_index:bar_end_index]:
-        if bar_data["events"] == "bar_fill":
-            continue
-        for event_data in bar_data["events"]:
-            if event_data["type"] == "NOTE_ON":
-                note_on_events += 1
-
-    # Determine density.
-    density = np.digitize(note_on_events, density_bins)
+    # Count note on events and determine density.
+    if density is None:
+        note_on_events = count_note_on_events(track_data, bar_start_index, bar_end_index)
+        density = np.digitize(note_on_events, density_bins)
     tokens += [f"DENSITY={density}"]
 
-    # Encode the bars.
-    for bar_data in track_data["bars"][bar_start_index:bar_end_index]:
-        tokens += encode_bar_data(bar_data, transposition)
+    # Encode the bars. Reuse the bars encoded for earlier windows if possible. Without a cache, compact tracks
+    # encode all events of the window at once.
+    if bar_cache is not None:
+        bars_number = track_data.bars_number if isinstance(track_data, TrackArray) else len(track_data["bars"])
+        for bar_index in range(bars_number)[bar_start_index:bar_end_index]:
+            bar_tokens = bar_cache.get((bar_index, transposition))
+            if bar_tokens is None:
+                if isinstance(track_data, TrackArray):
+                    bar_tokens = encode_bars_array(track_data, bar_index, bar_index + 1, transposition, track_lists)
+                else:
+                    bar_tokens = encode_bar_data(track_data["bars"][bar_index], transposition)
+                bar_cache[(bar_index, transposition)] = bar_tokens
+            tokens += bar_tokens
+    elif isinstance(track_data, TrackArray):
+        tokens += encode_bars_array(track_data, bar_start_index, bar_end_index, transposition, track_lists)
+    else:
+        for bar_data in track_data["bars"][bar_start_index:bar_end_index]:
+            tokens += encode_bar_data(bar_data, transposition)
 
     tokens += ["TRACK_END"]
 
@@ -273,14 +473,80 @@ def encode_bar_data(bar_data, transposition):
     tokens = []
     tokens += ["BAR_START"]
 
-    for event_data in bar_data["events"]:
-        tokens += [encode_event_data(event_data, transposition)]
+    # Compact bars are event arrays.
+    if isinstance(bar_data, np.ndarray):
+        tokens += encode_events_array(bar_data, transposition)
+    else:
+        for event_data in bar_data["events"]:
+            tokens += [encode_event_data(event_data, transposition)]
 
     tokens += ["BAR_END"]
 
     return tokens
 
 
+def encode_bars_array(track_data, bar_start_index, bar_end_index, transposition, track_lists=None):
+    """
+    Encodes a range of bars of a compact track. Produces the same tokens as `encode_bar_data` on each bar.
+
+    Args:
+        track_data (TrackArray): Compact track.
+        bar_start_index (int): Starting bar index.
+        bar_end_index (int): Ending bar index.
+        transposition (int): Transposition value.
+        track_lists (tuple, optional): `TrackArray.to_lists` of the track, if already computed.
+
+    Returns:
+        list: Token sequence for the bars.
+    """
+    bar_indices = range(track_data.bars_number)[bar_start_index:bar_end_index]
+    if not bar_indices:
+        return []
+
+    if track_lists is None:
+        bar_offsets = track_data.bar_offsets[bar_indices.start : bar_indices.stop + 1].tolist()
+        event_rows = track_data.events[bar_offsets[0] : bar_offsets[-1]].tolist()
+        bar_offsets = [bar_offset - bar_offsets[0] for bar_offset in bar_offsets]
+        bar_indices = range(len(bar_offsets) - 1)
+    else:
+        event_rows, bar_offsets = track_lists
+
+    tokens = []
+    for bar_index in bar_indices:
+        tokens.append("BAR_START")
+        for event_type, pitch, delta, denominator in event_rows[bar_offsets[bar_index] : bar_offsets[bar_index + 1]]:
+            if event_type == TIME_DELTA:
+                token = _time_delta_tokens.get((delta, denominator))
+                if token is None:
+                    token = "TIME_DELTA=" + str(to_delta(delta, denominator))
+                    _time_delta_tokens[(delta, denominator)] = token
+                tokens.append(token)
+            else:
+                tokens.append(EVENT_TYPES[event_type] + "=" + str(pitch + transposition))
+        tokens.append("BAR_END")
+    return tokens
+
+
+def encode_events_array(events, transposition):
+    """
+    Encodes compact events. Produces the same tokens as `encode_event_data` on the event dicts.
+
+    Args:
+        events (numpy.ndarray): Events with dtype `EVENT_DTYPE`.
+        transposition (int): Transposition value.
+
+    Returns:
+        list: Token sequence for the events.
+    """
+    tokens = []
+    for event_type, pitch, delta, denominator in events.tolist():
+        if event_type == TIME_DELTA:
+            tokens.append("TIME_DELTA=" + str(to_delta(delta, denominator)))
+        else:
+            tokens.append(EVENT_TYPES[event_type] + "=" + str(pitch + transposition))
+    return tokens
+
+
 def encode_event_data(event_data, transposition):
     if event_data["type"] == "NOTE_ON":
         return event_data["type"] + "=" + str(event_data["pitch"] + transposition)
@@ -304,26 +570,51 @@ def get_density_bins(songs_data, window_size_bars, hop_length_bars, bins):
         list: List of density bin thresholds.
     """
 
-    # Go through all songs and count the note on events for each window.\
+    # Go through all songs and count the note on events for each window.
     distribution = []
     for song_data in songs_data:
-        # Count the bars.
-        bars = get_bars_number(song_data)
+        distribution += get_note_on_counts(song_data, window_size_bars, hop_length_bars)
+
+    return get_density_bins_from_counts(distribution, bins)
+
+
+def get_note_on_counts(song_data, window_size_bars, hop_length_bars):
+    """
+    Counts the note on events of each track in each window of a song, for computing density bins.
+
+    Args:
+        song_data (dict): Dictionary representing a song.
+        window_size_bars (int): Number of bars in a window.
+        hop_length_bars (int): Hop length between consecutive windows.
+
+    Returns:
+        list: The counts. Windows of tracks without note on events are left out.
+    """
+    # Count the bars.
+    bars = get_bars_number(song_data)
 
-        # Iterate over over the tracks and the bars.
-        bar_indices = get_bar_indices(bars, window_size_bars, hop_length_bars)
-        for track_data in song_data["tracks"]:
-            for bar_start_index, bar_end_index in bar_indices:
+    # Count the notes of all windows of each track at once.
+    counts = []
+    bar_indices = get_bar_indices(bars, window_size_bars, hop_length_bars)
+    for track_data in song_data["tracks"]:
+        window_counts = count_windows_note_on_events(get_note_on_offsets(track_data), bar_indices)
 
-                # Go through the bars and count notes.
-                count = 0
-                for bar in track_data["bars"][bar_start_index:bar_end_index]:
-                    count += len([event for event in bar["events"] if event["type"] == "NOTE_ON"])
+        # Do not count empty tracks.
+        counts += window_counts[window_counts != 0].tolist()
+    return counts
 
-                # Do not count empty tracks.
-                if count != 0:
-                    distribution += [count]
 
+def get_density_bins_from_counts(distribution, bins):
+    """
+    Computes density bins from note on counts.
+
+    Args:
+        distribution (list): Note on counts from `get_note_on_counts`.
+        bins (int): Number of density bins.
+
+    Returns:
+        list: List of density bin thresholds.
+    """
     if len(distribution) == 0:
         raise ValueError("Density distribution is empty. Ensure training data contains valid songs.")
 
@@ -349,29 +640,15 @@ def get_density_bins_from_json_files(json_paths, window_size_bars, hop_length_ba
         list: List of density bin thresholds.
     """
 
-    # Go through all songs and count the note on events for each window.\
+    # Go through all songs and count the note on events for each window.
     distribution = []
     for json_path in json_paths:
 
         # Open the file and get the data.
-        song_data = json.load(open(json_path, "r"))
-
-        # Count the bars.
-        bars = get_bars_number(song_data)
-
-        # Iterate over over the tracks and the bars.
-        bar_indices = get_bar_indices(bars, window_size_bars, hop_length_bars)
-        for track_data in song_data["tracks"]:
-            for bar_start_index, bar_end_index in bar_indices:
-
-                # Go through the bars and count notes.
-                count = 0
-                for bar in track_data["bars"][bar_start_index:bar_end_index]:
-                    count += len([event for event in bar["events"] if event["type"] == "NOTE_ON"])
+        with open(json_path, "r") as f:
+            song_data = json.load(f)
 
-                # Do not count empty tracks.
-                if count != 0:
-                    distribution += [count]
+        distribution += get_note_on_counts(song_data, window_size_bars, hop_length_bars)
 
     # Compute the quantiles, which will become the density bins.
     quantiles = []
@@ -391,11 +668,98 @@ def get_bars_number(song_data):
     Returns:
         int: Maximum number of bars.
     """
-    bars = [len(track_data["bars"]) for track_data in song_data["tracks"]]
+    bars = [
+        track_data.bars_number if isinstance(track_data, TrackArray) else len(track_data["bars"])
+        for track_data in song_data["tracks"]
+    ]
     bars = max(bars)
     return bars
 
 
+def count_note_on_events(track_data, bar_start_index, bar_end_index):
+    """
+    Counts the note on events in a range of bars of a track. Bars used as bar fill are skipped.
+
+    Args:
+        track_data (dict/TrackArray): Track data or compact track.
+        bar_start_index (int): Starting bar index.
+        bar_end_index (int): Ending bar index.
+
+    Returns:
+        int: Number of note on events.
+    """
+    if isinstance(track_data, TrackArray):
+        return track_data.count_note_on_events(bar_start_index, bar_end_index)
+
+    note_on_events = 0
+    for bar_data in track_data["bars"][bar_start_index:bar_end_index]:
+        if bar_data["events"] == "bar_fill":
+            continue
+        for event_data in bar_data["events"]:
+            if event_data["type"] == "NOTE_ON":
+                note_on_events += 1
+    return note_on_events
+
+
+def get_note_on_offsets(track_data):
+    """
+    Counts the note on events before each bar of a track, so that the count of any range of bars is the
+    difference of two offsets. Bars used as bar fill are skipped.
+
+    Args:
+        track_data (dict/TrackArray): Track data or compact track.
+
+    Returns:
+        numpy.ndarray: Number of note on events before each bar, followed by the total.
+    """
+    if isinstance(track_data, TrackArray):
+        return track_data.note_on_offsets
+
+    bar_counts = [0]
+    for bar_data in track_data["bars"]:
+        if bar_data["events"] == "bar_fill":
+            bar_counts.append(0)
+        else:
+            bar_counts.append(sum(1 for event_data in bar_data["events"] if event_data["type"] == "NOTE_ON"))
+    return np.cumsum(bar_counts)
+
+
+def count_windows_note_on_events(note_on_offsets, bar_indices):
+    """
+    Counts the note on events in each window of a track. Gives the same counts as `count_note_on_events`
+    on each window, also for windows reaching past the last bar of the track.
+
+    Args:
+        note_on_offsets (numpy.ndarray): Result of `get_note_on_offsets`.
+        bar_indices (list): Windows from `get_bar_indices`.
+
+    Returns:
+        numpy.ndarray: Number of note on events of each window.
+    """
+    if not bar_indices:
+        return np.zeros(0, dtype=np.int64)
+
+    bars_number = len(note_on_offsets) - 1
+    bar_start_indices, bar_end_indices = np.minimum(np.array(bar_indices).T, bars_number)
+    return note_on_offsets[bar_end_indices] - note_on_offsets[bar_start_indices]
+
+
+def get_window_densities(track_data, bar_indices, density_bins):
+    """
+    Determines the density bin of each window of a track.
+
+    Args:
+        track_data (dict/TrackArray): Track data or compact track.
+        bar_indices (list): Windows from `get_bar_indices`.
+        density_bins (list): Density bins for note events.
+
+    Returns:
+        list: Density bin of each window.
+    """
+    note_on_counts = count_windows_note_on_events(get_note_on_offsets(track_data), bar_indices)
+    return np.digitize(note_on_counts, density_bins).tolist()
+
+
 def get_bar_indices(bars, window_size_bars, hop_length_bars):
     """
     Computes the start and end indices for sliding windows over bars.
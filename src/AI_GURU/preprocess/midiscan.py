@@ -0,0 +1,246 @@
+# Copyright 2021 Tristan Behrens.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Lint as: python3
+
+import struct
+from .. import logging
+
+logger = logging.create_logger("midiscan")
+
+# Frame rates music21 accepts for SMPTE time division.
+SMPTE_TICKS_PER_FRAME = [24, 25, 29, 30]
+
+# Stages at which preprocessing rejects MIDI files, in order: the header and chunk layout, the time signatures,
+# decoding the events with music21, parsing the score and converting it into song data.
+REJECTION_STAGES = ["structure", "meter", "decode", "parse", "song"]
+
+# The only meter preprocess_music21_song keeps. Songs without time signatures default to it.
+ACCEPTED_METER = "4/4"
+
+# Meta event types.
+META_TIME_SIGNATURE = 0x58
+
+# Number of data bytes of the channel messages by the high nibble of their status byte.
+CHANNEL_MESSAGE_LENGTHS = {0x80: 2, 0x90: 2, 0xA0: 2, 0xB0: 2, 0xC0: 1, 0xD0: 1, 0xE0: 2}
+
+
+class InvalidMidiError(Exception):
+    """Exception raised when the bytes of a MIDI file are structurally invalid."""
+
+    pass
+
+
+def check_midi_structure(data):
+    """
+    Checks the header and the chunk layout of a MIDI file without decoding any events.
+
+    Rejects everything music21 or mido would reject while reading the chunks: a missing or malformed
+    header, formats other than 0 and 1, unsupported SMPTE frame rates, no tracks, and track chunks
+    that are missing or truncated.
+
+    Args:
+        data (bytes): Content of the MIDI file.
+
+    Returns:
+        dict: The format, the number of tracks, the time division and the (start, end) byte range of each track.
+
+    Raises:
+        InvalidMidiError: If the file is structurally invalid.
+    """
+    if len(data) < 14 or data[:4] != b"MThd":
+        raise InvalidMidiError("MThd not found. Probably not a MIDI file.")
+
+    header_length, midi_format, tracks_number, division = struct.unpack(">LHHH", data[4:14])
+    if header_length != 6:
+        raise InvalidMidiError(f"Unexpected header length {header_length}.")
+    if midi_format not in (0, 1):
+        raise InvalidMidiError(f"Unsupported MIDI file format {midi_format}.")
+    if division & 0x8000 and division & 0xFF not in SMPTE_TICKS_PER_FRAME:
+        raise InvalidMidiError(f"Unsupported ticks per frame {division & 0xFF}.")
+    if tracks_number == 0:
+        raise InvalidMidiError("No tracks are defined.")
+
+    track_ranges = []
+    position = 8 + header_length
+    for track_index in range(tracks_number):
+        if position + 8 > len(data):
+            raise InvalidMidiError(f"Track {track_index} of {tracks_number} is missing.")
+        chunk_id, chunk_length = struct.unpack(">4sL", data[position : position + 8])
+        if chunk_id != b"MTrk":
+            raise InvalidMidiError(f"Track {track_index} does not start with MTrk.")
+        start = position + 8
+        end = start + chunk_length
+        if end > len(data):
+            raise InvalidMidiError(f"Track {track_index} is truncated.")
+        track_ranges.append((start, end))
+        position = end
+
+    return {
+        "format": midi_format,
+        "tracks_number": tracks_number,
+        "division": division,
+        "track_ranges": track_ranges,
+    }
+
+
+def scan_meters(data, structure=None):
+    """
+    Reads the meters music21 assigns to the parts of a MIDI file straight from its bytes, without decoding the notes.
+
+    Like music21, takes for each track with notes the time signatures of the preceding tracks without notes,
+    or its own time signatures if there are none. Tracks with notes but without time signatures default
+    to 4/4, and files without notes have no meters at all.
+
+    Args:
+        data (bytes): Content of the MIDI file.
+        structure (dict, optional): Result of `check_midi_structure`, if already computed. Defaults to None.
+
+    Returns:
+        set: The meters as "numerator/denominator" strings.
+
+    Raises:
+        InvalidMidiError: If the file is structurally invalid or the events cannot be walked unambiguously.
+    """
+    if structure is None:
+        structure = check_midi_structure(data)
+
+    conductor_meters = set()
+    meters = set()
+    for start, end in structure["track_ranges"]:
+        track_meters, track_has_notes = _scan_track(data, start, end)
+        if track_has_notes:
+            meters |= conductor_meters or track_meters or {ACCEPTED_METER}
+        else:
+            conductor_meters |= track_meters
+    return meters
+
+
+def prescan_midi_file(midi_file):
+    """
+    Checks a MIDI file from its raw bytes before any parsing: its header and chunk layout, and whether it
+    has the single 4/4 meter `preprocess_music21_song` requires. Files whose events cannot be walked are
+    left to the parser.
+
+    Args:
+        midi_file (str): Path to the MIDI file.
+
+    Returns:
+        str: None if the file passes, otherwise the stage that rejected it, "structure" or "meter".
+    """
+    try:
+        with open(midi_file, "rb") as f:
+            data = f.read()
+        structure = check_midi_structure(data)
+    except (OSError, InvalidMidiError) as e:
+        logger.warning(f"Invalid MIDI file: {midi_file}. Reason: {e}")
+        return "structure"
+
+    try:
+        meters = scan_meters(data, structure)
+    except InvalidMidiError as e:
+        logger.debug(f"Could not scan the meters of {midi_file}. Reason: {e}")
+        return None
+
+    if meters != {ACCEPTED_METER}:
+        logger.debug(f"Skipping {midi_file} because of meters {sorted(meters)}.")
+        return "meter"
+    return None
+
+
+def _scan_track(data, start, end):
+    """
+    Walks the events of a track, collecting its time signatures and checking whether it has notes.
+
+    Args:
+        data (bytes): Content of the MIDI file.
+        start (int): Index of the first byte of the track data.
+        end (int): Index after the last byte of the track data.
+
+    Returns:
+        tuple: (set of meters, whether the track has a note on event with nonzero velocity).
+
+    Raises:
+        InvalidMidiError: If an event is truncated or cannot be decoded unambiguously.
+    """
+    meters = set()
+    has_notes = False
+    running_status = None
+    position = start
+    while position < end:
+        _, position = _read_variable_length(data, position, end)
+        if position >= end:
+            raise InvalidMidiError("Event is truncated.")
+        status = data[position]
+
+        if status == 0xFF:
+            if position + 1 >= end:
+                raise InvalidMidiError("Meta event is truncated.")
+            meta_type = data[position + 1]
+            length, position = _read_variable_length(data, position + 2, end)
+            if meta_type == META_TIME_SIGNATURE:
+                if length != 4 or position + 2 > end or data[position] == 0:
+                    raise InvalidMidiError("Time signature is malformed.")
+                meters.add(f"{data[position]}/{2 ** data[position + 1]}")
+            position += length
+
+        elif status in (0xF0, 0xF7):
+            length, position = _read_variable_length(data, position + 1, end)
+            position += length
+
+        else:
+            if status & 0x80:
+                running_status = status
+                position += 1
+            elif running_status is None:
+                raise InvalidMidiError("Running status without a preceding status byte.")
+            else:
+                status = running_status
+
+            data_length = CHANNEL_MESSAGE_LENGTHS.get(status & 0xF0)
+            if data_length is None:
+                raise InvalidMidiError(f"Unexpected status byte {status:#x} in a track.")
+            if position + data_length > end:
+                raise InvalidMidiError("Channel message is truncated.")
+            if status & 0xF0 == 0x90 and data[position + 1] > 0:
+                has_notes = True
+            position += data_length
+
+    if position > end:
+        raise InvalidMidiError("Event is truncated.")
+    return meters, has_notes
+
+
+def _read_variable_length(data, position, end):
+    """
+    Reads a variable length quantity.
+
+    Args:
+        data (bytes): Content of the MIDI file.
+        position (int): Index of the first byte of the quantity.
+        end (int): Index after the last byte it may use.
+
+    Returns:
+        tuple: (value, index after the quantity).
+
+    Raises:
+        InvalidMidiError: If the quantity is truncated or longer than four bytes.
+    """
+    value = 0
+    for index in range(position, min(position + 4, end)):
+        byte = data[index]
+        value = (value << 7) | (byte & 0x7F)
+        if not byte & 0x80:
+            return value, index + 1
+    raise InvalidMidiError("Variable length quantity is truncated.")
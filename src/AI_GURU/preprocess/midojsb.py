@@ -0,0 +1,842 @@
+# Copyright 2021 Tristan Behrens.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Lint as: python3
+
+"""
+Fast MIDI ingestion without music21.
+
+Reads note events and meta events with mido and produces the same song data as
+`preprocess_music21`. To stay identical, the functions below mirror the steps music21 performs
+when importing a MIDI file: pairing note on/off events, grouping simultaneous notes into chords
+(which `preprocess_music21_measure` ignores), quantizing to sixteenths and eighth triplets,
+splitting the track into 4/4 measures, separating overlapping notes into voices and tying notes
+across bar lines.
+"""
+
+import math
+import threading
+from fractions import Fraction
+import mido
+from .. import logging
+from .preprocessutilities import events_to_events_data
+from .processpool import TimeoutProcessPool, imap_threads
+from .parsecache import get_cache_keys, is_cached, iterate_songs_data
+from .midiscan import prescan_midi_file
+
+logger = logging.create_logger("midojsb")
+
+# Version of music21 whose MIDI import the functions below mirror and were checked against. Check them again
+# against the music21 version of the requirements and update it when music21 changes.
+MUSIC21_VERSION = "9.3.0"
+
+# Identifies the song data produced by this module in the parse cache. Bump it when the output changes.
+PARSER_VERSION = f"midojsb-2-mido-{mido.version_info}-music21-{MUSIC21_VERSION}"
+
+# Quantization grid used by music21 when importing MIDI files: sixteenths and eighth triplets.
+QUARTER_LENGTH_DIVISORS = (4, 3)
+
+# Largest denominator music21 keeps for offsets and durations.
+LIMIT_OFFSET_DENOMINATOR = 65535
+
+# Length of a 4/4 bar in quarter notes.
+BAR_QUARTER_LENGTH = 4.0
+
+# Instrument names music21 assigns to the General MIDI programs.
+PROGRAM_INSTRUMENT_NAMES = (
+    ["Piano", "Piano", "Electric Piano", "Piano", "Electric Piano", "Electric Piano", "Harpsichord", "Clavichord"]
+    + ["Celesta", "Glockenspiel", "Glockenspiel", "Vibraphone", "Marimba", "Xylophone", "Tubular Bells", "Dulcimer"]
+    + ["Electric Organ"] * 3
+    + ["Pipe Organ", "Reed Organ", "Accordion", "Harmonica", "Accordion"]
+    + ["Acoustic Guitar"] * 2
+    + ["Electric Guitar"] * 6
+    + ["Acoustic Bass", "Electric Bass", "Electric Bass", "Fretless Bass"]
+    + ["Electric Bass"] * 4
+    + ["Violin", "Viola", "Violoncello", "Contrabass", "StringInstrument", "StringInstrument", "Harp", "Timpani"]
+    + ["StringInstrument"] * 4
+    + ["Choir", "Voice", "Voice", "Sampler", "Trumpet", "Trombone", "Tuba", "Trumpet", "Horn"]
+    + ["Brass"] * 3
+    + ["Soprano Saxophone", "Alto Saxophone", "Tenor Saxophone", "Baritone Saxophone"]
+    + ["Oboe", "English Horn", "Bassoon", "Clarinet", "Piccolo", "Flute", "Recorder", "Pan Flute", "Pan Flute"]
+    + ["Shakuhachi", "Whistle", "Ocarina"]
+    + ["Sampler"] * 24
+    + ["Sitar", "Banjo", "Shamisen", "Koto", "Kalimba", "Bagpipes", "Violin", "Shehnai", "Glockenspiel", "Agogo"]
+    + ["Steel Drum", "Woodblock", "Taiko", "Tom-Tom"]
+    + ["Sampler"] * 10
+)
+
+# Sort order music21 uses for elements at the same offset.
+_SORT_ORDER_INSTRUMENT = -25
+_SORT_ORDER_META = 1
+_SORT_ORDER_VOICE = 5
+_SORT_ORDER_NOTE = 20
+
+
+def preprocess_mido(midi_files, backend="thread", max_workers=8, timeout=None, cache=None, rejections=None):
+    """
+    Preprocesses a list of MIDI files into training and validation datasets without music21.
+
+    Takes the same arguments and returns the same data as `preprocess_music21`.
+
+    Args:
+        midi_files (list): List of file paths to MIDI files.
+        backend (str, optional): "thread" reads and converts the files with a thread pool, "process" does so
+            in worker processes that are killed once they exceed the timeout. Defaults to "thread".
+        max_workers (int, optional): Number of reading threads or processes. Defaults to 8.
+        timeout (float, optional): Maximum reading time per file in seconds. Defaults to None.
+        cache (ParseCache, optional): Parse cache to look up and store song data. Defaults to None.
+        rejections (collections.Counter, optional): Counts the rejected files by stage, see
+            `midiscan.REJECTION_STAGES`. Defaults to None.
+
+    Returns:
+        tuple: (training data, validation data, flag indicating if no valid files were found).
+    """
+    songs_data = [
+        song_data for _, song_data in iterate_mido(midi_files, backend, max_workers, timeout, cache, rejections)
+    ]
+    if not songs_data:
+        return [], [], True
+
+    logger.info(f"Processed {len(songs_data)} MIDI files.")
+
+    # Split on the read songs like preprocess_music21 does, then drop the rejected ones.
+    split_index = int(0.8 * len(songs_data))
+    songs_data_train = [song_data for song_data in songs_data[:split_index] if song_data is not None]
+    songs_data_valid = [song_data for song_data in songs_data[split_index:] if song_data is not None]
+
+    return songs_data_train, songs_data_valid, False
+
+
+def iterate_mido(midi_files, backend="thread", max_workers=8, timeout=None, cache=None, rejections=None):
+    """
+    Preprocesses MIDI files one at a time, yielding the song data of each file as soon as it is converted.
+
+    Takes the same arguments and yields the same data as `iterate_music21`.
+
+    Args:
+        midi_files (list): List of file paths to MIDI files.
+        backend (str, optional): "thread" or "process", see `preprocess_mido`. Defaults to "thread".
+        max_workers (int, optional): Number of reading threads or processes. Defaults to 8.
+        timeout (float, optional): Maximum reading time per file in seconds. Defaults to None.
+        cache (ParseCache, optional): Parse cache to look up and store song data. Defaults to None.
+        rejections (collections.Counter, optional): Counts the rejected files by stage, see
+            `midiscan.REJECTION_STAGES`. Defaults to None.
+
+    Yields:
+        tuple: (path, song data or None if the song was rejected), in input order. Invalid files are skipped.
+    """
+    cache_keys = get_cache_keys(cache, midi_files, PARSER_VERSION)
+
+    # Check the files that are not cached from their raw bytes first.
+    midi_files_to_keep = []
+    for midi_file in midi_files:
+        stage = None if is_cached(cache_keys, midi_file) else prescan_midi_file(midi_file)
+        if stage is None:
+            midi_files_to_keep.append(midi_file)
+        elif rejections is not None:
+            rejections[stage] += 1
+    midi_files_to_read = [file for file in midi_files_to_keep if not is_cached(cache_keys, file)]
+
+    if backend == "thread":
+        read_results = imap_threads(
+            lambda file: preprocess_mido_file_with_timeout(file, timeout), midi_files_to_read, max_workers
+        )
+    elif backend == "process":
+        pool = TimeoutProcessPool(preprocess_mido_file, max_workers=max_workers, timeout=timeout)
+        read_results = pool.imap(midi_files_to_read)
+    else:
+        error_string = f"Unexpected parse backend {backend}."
+        logger.error(error_string)
+        raise Exception(error_string)
+
+    yield from iterate_songs_data(cache, midi_files_to_keep, cache_keys, read_results, preprocess_mido_file, rejections)
+
+
+def preprocess_mido_file(midi_file):
+    """
+    Reads and preprocesses a single MIDI file. Rejects the files `is_valid_midi` rejects.
+
+    Args:
+        midi_file (str): Path to the MIDI file.
+
+    Returns:
+        tuple: (path, song data or None if the song is not in 4/4), or None if the file is invalid.
+    """
+    try:
+        midi_data = mido.MidiFile(midi_file)
+    except Exception as e:
+        logger.warning(f"Invalid MIDI file: {midi_file}. Reason: {e}")
+        return None
+
+    if midi_data.type == 2:
+        logger.warning(f"Unsupported MIDI file type: {midi_file} is type 2.")
+        return None
+
+    if not midi_data.tracks:
+        logger.warning(f"Failed to parse MIDI file: {midi_file}. Reason: no tracks are defined.")
+        return None
+
+    return midi_file, preprocess_mido_song(midi_data)
+
+
+def preprocess_mido_file_with_timeout(midi_file, timeout=None):
+    """
+    Reads and preprocesses a single MIDI file like `preprocess_mido_file`, giving up once it exceeds a timeout.
+
+    A thread cannot be killed, so a file past the timeout keeps its thread busy until it is done, but the
+    file is rejected right away.
+
+    Args:
+        midi_file (str): Path to the MIDI file.
+        timeout (float, optional): Maximum reading time in seconds. Defaults to None.
+
+    Returns:
+        tuple: (path, song data or None if the song is not in 4/4), or None if the file is invalid or timed out.
+    """
+    if timeout is None:
+        return preprocess_mido_file(midi_file)
+
+    result = [None]
+
+    def read_file():
+        result[0] = preprocess_mido_file(midi_file)
+
+    read_thread = threading.Thread(target=read_file, daemon=True)
+    read_thread.start()
+    read_thread.join(timeout)
+
+    if read_thread.is_alive():
+        logger.warning(f"Timeout while reading MIDI file: {midi_file}")
+        return None
+
+    return result[0]
+
+
+def preprocess_mido_song(midi_data):
+    """
+    Preprocesses a single MIDI file read by mido into song data.
+
+    Args:
+        midi_data (mido.MidiFile): The MIDI file.
+
+    Returns:
+        dict: Song data, or None if the song is not in 4/4.
+    """
+    ticks_per_quarter = midi_data.ticks_per_beat
+
+    # Like music21, tracks without notes only contribute meta events, which are copied into
+    # the parts of all tracks with notes that follow them.
+    conductor_elements = []
+    parts = []
+    meters = set()
+    for midi_track in midi_data.tracks:
+        events = _get_time_for_events(midi_track)
+        if not any(_is_note_on(message) for _, message in events):
+            conductor_elements += _get_meta_elements(events, ticks_per_quarter)
+            continue
+
+        conductor_meta_elements = [element for element in conductor_elements if element["class"] != "instrument"]
+        part = _midi_track_to_part(events, ticks_per_quarter, conductor_meta_elements)
+        meters |= part["meters"]
+        parts.append(part)
+
+    # Parts without an explicit time signature default to 4/4. Songs without parts have no meter at all.
+    meters = list(meters) or (["4/4"] if parts else [])
+    if len(meters) != 1:
+        logger.debug(f"Skipping because of multiple measures.")
+        return None
+    elif meters[0] != "4/4":
+        logger.debug(f"Skipping because of meter {meters[0]}.")
+        return None
+
+    song_data = {
+        "title": None,
+        "number": None,
+        "tracks": [preprocess_mido_part(part, part_index) for part_index, part in enumerate(parts)],
+    }
+
+    return song_data
+
+
+def preprocess_mido_part(part, part_index):
+    """
+    Preprocesses a part built from a MIDI track into track data.
+
+    Args:
+        part (dict): Part with its name and the notes of each measure.
+        part_index (int): Index of the part in the song.
+
+    Returns:
+        dict: Track data.
+    """
+    track_data = {"name": part["name"], "number": part_index, "bars": []}
+
+    for measure_notes in part["measures"]:
+        bar_data = preprocess_mido_measure(measure_notes)
+        if not bar_data["events"]:
+            bar_data = {"events": [{"type": "TIME_DELTA", "delta": 16.0}]}
+
+        track_data["bars"].append(bar_data)
+
+    if not track_data["bars"]:
+        logger.debug(f"Track '{part['name'] or 'Unknown'}' has no valid bars.")
+    return track_data
+
+
+def preprocess_mido_measure(measure_notes):
+    """
+    Preprocesses the notes of one measure into bar data.
+
+    Args:
+        measure_notes (list): (pitch, offset, quarter length) tuples in music21 iteration order.
+
+    Returns:
+        dict: Bar data.
+    """
+    events = []
+    for pitch, offset, quarter_length in measure_notes:
+        events.append(("NOTE_ON", pitch, 4 * offset))
+        events.append(("NOTE_OFF", pitch, 4 * offset + 4 * quarter_length))
+
+    if not events:
+        return {"events": []}
+
+    return {"events": events_to_events_data(events)}
+
+
+def _op_frac(value):
+    """
+    Represents an offset or quarter length like music21 does: as a float if it is
+    binary expressible, otherwise as a Fraction with a limited denominator.
+
+    Args:
+        value (float/Fraction/int): The value.
+
+    Returns:
+        float/Fraction: The value in music21 representation.
+    """
+    if isinstance(value, float) and value.as_integer_ratio()[1] <= LIMIT_OFFSET_DENOMINATOR:
+        return value
+    value = Fraction(value).limit_denominator(LIMIT_OFFSET_DENOMINATOR)
+    denominator = value.denominator
+    if denominator & (denominator - 1) == 0:
+        return value.numerator / denominator
+    return value
+
+
+def _nearest_multiple(n, unit):
+    """
+    Port of `music21.common.nearestMultiple`.
+
+    Args:
+        n (float): Value to quantize.
+        unit (float): Grid unit.
+
+    Returns:
+        tuple: (nearest multiple, absolute error, signed error).
+    """
+    mult = math.floor(n / unit)
+    half_unit = unit / 2.0
+    match_low = unit * mult
+    match_high = unit * (mult + 1)
+
+    if match_low <= n <= (match_low + half_unit):
+        return match_low, round(n - match_low, 7), round(n - match_low, 7)
+    return match_high, round(match_high - n, 7), round(n - match_high, 7)
+
+
+def _best_match(target, zero_allowed=True, gap_to_fill=0.0):
+    """
+    Port of the quantization match used by `music21.stream.Stream.quantize`.
+
+    Args:
+        target (float): Offset or quarter length to quantize.
+        zero_allowed (bool, optional): Whether zero is an allowed result. Defaults to True.
+        gap_to_fill (float, optional): Distance to the next element. Defaults to 0.0.
+
+    Returns:
+        float: The quantized value.
+    """
+    found = []
+    for divisor in QUARTER_LENGTH_DIVISORS:
+        tick = 1 / divisor
+        match, error, _ = _nearest_multiple(target, tick)
+        if not zero_allowed and match == 0.0:
+            match = tick
+            error = abs(round(target - match, 7))
+        if gap_to_fill % tick == 0:
+            remaining_gap = 0.0
+        else:
+            remaining_gap = max(gap_to_fill - match, 0.0)
+        found.append((remaining_gap, error, tick, match))
+    return min(found)[3]
+
+
+def _is_note_on(message):
+    return message.type == "note_on" and message.velocity > 0
+
+
+def _is_note_off(message):
+    return message.type == "note_off" or (message.type == "note_on" and message.velocity == 0)
+
+
+def _get_time_for_events(midi_track):
+    """
+    Converts the delta times of a track into absolute ticks.
+
+    Args:
+        midi_track (mido.MidiTrack): The track.
+
+    Returns:
+        list: (tick, message) tuples.
+    """
+    events = []
+    tick = 0
+    for message in midi_track:
+        tick += message.time
+        events.append((tick, message))
+    return events
+
+
+def _get_notes_from_events(events):
+    """
+    Pairs every note on event with the first matching note off event that follows it.
+
+    Args:
+        events (list): (tick, message) tuples.
+
+    Returns:
+        list: (tick on, tick off, pitch, channel) tuples in order of the note on events.
+    """
+    notes = []
+    pending = {}
+    for tick, message in events:
+        if _is_note_on(message):
+            note = [tick, None, message.note, message.channel]
+            notes.append(note)
+            pending.setdefault((message.note, message.channel), []).append(note)
+        elif _is_note_off(message):
+            waiting = pending.get((message.note, message.channel))
+            if waiting:
+                waiting.pop(0)[1] = tick
+    return [tuple(note) for note in notes if note[1] is not None]
+
+
+def _decode_text(text):
+    """
+    Decodes the text of a meta event the way music21 does.
+
+    Args:
+        text (str): Text decoded by mido as latin-1.
+
+    Returns:
+        str: The decoded text, or None if it is not valid UTF-8.
+    """
+    try:
+        return text.encode("latin-1").decode("utf-8").split("\x00")[0].strip()
+    except (UnicodeEncodeError, UnicodeDecodeError):
+        return None
+
+
+def _get_meta_elements(events, ticks_per_quarter):
+    """
+    Extracts the meta events music21 turns into stream elements.
+
+    Args:
+        events (list): (tick, message) tuples.
+        ticks_per_quarter (int): Resolution of the MIDI file.
+
+    Returns:
+        list: Element dicts with offset, sort order and class specific values.
+    """
+    elements = []
+    for tick, message in events:
+        element = {"offset": _op_frac(tick / ticks_per_quarter), "sort_order": _SORT_ORDER_META}
+        if message.type == "time_signature":
+            element.update({"class": "time_signature", "meter": f"{message.numerator}/{message.denominator}"})
+            element["sort_order"] = 4
+        elif message.type == "key_signature":
+            element.update({"class": "key_signature", "sort_order": 2})
+        elif message.type == "set_tempo":
+            element.update({"class": "tempo"})
+        elif message.type in ["track_name", "instrument_name"]:
+            decoded = _decode_text(message.name)
+            part_name, instrument_name = None, None
+            if decoded and not _is_generic_instrument_name(decoded):
+                if message.type == "track_name":
+                    part_name = decoded
+                else:
+                    instrument_name = decoded
+            element.update({"class": "instrument", "part_name": part_name, "instrument_name": instrument_name})
+            element["sort_order"] = _SORT_ORDER_INSTRUMENT
+        elif message.type == "program_change":
+            if message.channel == 9:
+                instrument_name = "Percussion"
+            else:
+                instrument_name = PROGRAM_INSTRUMENT_NAMES[message.program]
+            element.update({"class": "instrument", "part_name": None, "instrument_name": instrument_name})
+            element["sort_order"] = _SORT_ORDER_INSTRUMENT
+        else:
+            continue
+        elements.append(element)
+    return elements
+
+
+def _is_generic_instrument_name(name):
+    name = name.lower()
+    return (
+        name in ("instrument", "inst")
+        or name.replace("instrument ", "").isdigit()
+        or name.replace("inst ", "").isdigit()
+    )
+
+
+def _get_part_name(instruments):
+    """
+    Determines the part name like `music21.stream.Part.partName` after instrument deduplication.
+
+    Args:
+        instruments (list): Instrument element dicts.
+
+    Returns:
+        str: The part name, or None.
+    """
+    offsets = sorted(set(element["offset"] for element in instruments))
+    for offset in offsets:
+        group = [element for element in instruments if element["offset"] == offset]
+        part_names = set(element["part_name"] for element in group if element["part_name"] is not None)
+        instrument_names = set(
+            element["instrument_name"] for element in group if element["instrument_name"] is not None
+        )
+        for element in group:
+            part_name = element["part_name"]
+            if part_name is None and len(part_names) == 1:
+                part_name = next(iter(part_names))
+            instrument_name = element["instrument_name"]
+            if instrument_name is None and len(instrument_names) == 1:
+                instrument_name = next(iter(instrument_names))
+            name = part_name if part_name is not None else instrument_name
+            if name is not None:
+                return name
+    return None
+
+
+def _midi_track_to_part(events, ticks_per_quarter, conductor_elements):
+    """
+    Builds a part from a MIDI track with notes, mirroring `music21.midi.translate.midiTrackToStream`.
+
+    Args:
+        events (list): (tick, message) tuples.
+        ticks_per_quarter (int): Resolution of the MIDI file.
+        conductor_elements (list): Meta elements of the preceding tracks without notes.
+
+    Returns:
+        dict: The part name, the meters found in the track and the notes of each measure.
+    """
+    meta_elements = _get_meta_elements(events, ticks_per_quarter)
+    notes = _get_notes_from_events(events)
+    elements = list(meta_elements)
+
+    # Collect notes with similar start times into chords.
+    chord_tolerance = ticks_per_quarter / max(QUARTER_LENGTH_DIVISORS)
+    voices_required = False
+    gathered = set()
+    index = 0
+    while index < len(notes):
+        if index in gathered:
+            index += 1
+            continue
+        tick_on, tick_off, pitch, channel = notes[index]
+        chord_notes = []
+        for other_index in range(index + 1, len(notes)):
+            other_tick_on, other_tick_off = notes[other_index][:2]
+            if abs(other_tick_on - tick_on) < chord_tolerance:
+                if abs(other_tick_off - tick_off) > chord_tolerance:
+                    voices_required = True
+                    continue
+                if not chord_notes:
+                    chord_notes = [notes[index]]
+                    gathered.add(index)
+                chord_notes.append(notes[other_index])
+                gathered.add(other_index)
+                continue
+            break
+
+        if chord_notes:
+            # Chords are not notes, preprocess_music21_measure skips them. They still take up time.
+            tick_off = chord_notes[-1][1] - chord_notes[-1][0] + tick_on
+            pitch = None
+        elif channel == 9:
+            # Unpitched percussion is skipped as well.
+            pitch = None
+        elements.append(
+            {
+                "class": "note",
+                "offset": _op_frac(tick_on / ticks_per_quarter),
+                "quarter_length": _op_frac(float(tick_off - tick_on) / ticks_per_quarter),
+                "grace": tick_off == tick_on,
+                "pitch": pitch,
+                "sort_order": _SORT_ORDER_NOTE,
+            }
+        )
+        index += 1
+
+    # Sort like music21 does. Python's sort is stable, so insertion order breaks ties.
+    elements.sort(key=lambda element: (element["offset"], element["sort_order"], not element.get("grace", False)))
+    _quantize(elements)
+
+    # Conductor events are inserted after quantization.
+    for element in conductor_elements:
+        elements.append(dict(element))
+
+    meters = _get_part_meters(elements, conductor_elements)
+    instruments = [element for element in elements if element["class"] == "instrument"]
+    measures = _make_measures(elements, voices_required)
+
+    return {"name": _get_part_name(instruments), "meters": meters, "measures": measures}
+
+
+def _get_part_meters(elements, conductor_elements):
+    """
+    Returns the meters of the time signatures music21 keeps in a part.
+
+    Without time signatures in the conductor tracks, the measures are made from the time signatures of the
+    part, which all stay. Otherwise, the measures are made from the conductor time signatures, and time
+    signatures of the part that fall on the start of a measure before the end of the part are dropped.
+    Only 4/4 measures matter, as songs with other conductor time signatures are rejected anyway.
+
+    Args:
+        elements (list): Quantized element dicts of the part, including the conductor elements.
+        conductor_elements (list): Meta elements of the preceding tracks without notes.
+
+    Returns:
+        set: The meters as "numerator/denominator" strings.
+    """
+    conductor_meters = set(element["meter"] for element in conductor_elements if element["class"] == "time_signature")
+    part_time_signatures = [
+        element
+        for element in elements[: len(elements) - len(conductor_elements)]
+        if element["class"] == "time_signature"
+    ]
+    if not conductor_meters:
+        return set(element["meter"] for element in part_time_signatures)
+
+    highest_time = max(element["offset"] + element.get("quarter_length", 0) for element in elements)
+    return conductor_meters | set(
+        element["meter"]
+        for element in part_time_signatures
+        if element["offset"] % BAR_QUARTER_LENGTH != 0 or element["offset"] >= highest_time
+    )
+
+
+def _quantize(elements):
+    """
+    Quantizes offsets and durations in place, mirroring `music21.stream.Stream.quantize`.
+
+    Args:
+        elements (list): Sorted element dicts.
+    """
+    raw_offsets = [float(element["offset"]) for element in elements]
+    quantized_offsets = [_best_match(offset) for offset in raw_offsets]
+
+    for index, element in enumerate(elements):
+        offset = quantized_offsets[index]
+        element["offset"] = _op_frac(offset)
+
+        if element["class"] != "note":
+            continue
+
+        # Look ahead to the next element that starts later, to avoid unnecessary gaps.
+        gap_to_fill = None
+        for next_index in range(index + 1, len(elements)):
+            if quantized_offsets[next_index] > offset:
+                gap_to_fill = _op_frac(quantized_offsets[next_index] - element["offset"])
+                break
+
+        quarter_length = max(float(element["quarter_length"]), 0)
+        zero_allowed = element["grace"]
+        if gap_to_fill is not None:
+            match = _best_match(quarter_length, zero_allowed, gap_to_fill)
+        else:
+            match = _best_match(quarter_length, zero_allowed)
+        element["quarter_length"] = _op_frac(match)
+
+
+def _make_measures(elements, voices_required):
+    """
+    Distributes the notes into 4/4 measures, mirroring `makeMeasures`, `makeVoices` and `makeTies`.
+
+    Args:
+        elements (list): Quantized element dicts.
+        voices_required (bool): Whether overlapping notes need to be separated into voices.
+
+    Returns:
+        list: For each measure, (pitch, offset, quarter length) tuples of the notes in iteration order.
+    """
+    ends = [element["offset"] + element.get("quarter_length", 0) for element in elements]
+    highest_time = max(ends) if ends else 0
+    measures_number = max(1, math.ceil(highest_time / BAR_QUARTER_LENGTH))
+
+    # Notes in sorted order. Insertion order breaks ties.
+    notes = [element for element in elements if element["class"] == "note"]
+    notes.sort(key=lambda element: (element["offset"], not element["grace"]))
+
+    # Each measure holds a list of top level notes and a list of voices.
+    measures = [{"notes": [], "voices": []} for _ in range(measures_number)]
+    for element in notes:
+        measure_index = int(element["offset"] // BAR_QUARTER_LENGTH)
+        offset = _op_frac(element["offset"] - measure_index * BAR_QUARTER_LENGTH)
+        measures[measure_index]["notes"].append([element["pitch"], offset, element["quarter_length"], element["grace"]])
+
+    if voices_required:
+        for measure in measures:
+            _make_voices(measure)
+
+    _make_ties(measures)
+
+    result = []
+    for measure in measures:
+        _flatten_unnecessary_voices(measure)
+        measure_notes = []
+        for voice in measure["voices"]:
+            measure_notes += _sorted_notes(voice)
+        measure_notes += _sorted_notes(measure["notes"])
+        result.append(
+            [(pitch, offset, quarter_length) for pitch, offset, quarter_length, _ in measure_notes if pitch is not None]
+        )
+    return result
+
+
+def _sorted_notes(notes):
+    return sorted(notes, key=lambda note: (note[1], not note[3]))
+
+
+def _note_end(note):
+    return _op_frac(note[1] + note[2])
+
+
+def _make_voices(measure):
+    """
+    Separates overlapping notes of a measure into voices, mirroring `music21.stream.Stream.makeVoices`.
+
+    Args:
+        measure (dict): The measure.
+    """
+    notes = _sorted_notes(measure["notes"])
+    spans = [(note[1], _note_end(note)) for note in notes]
+
+    # Find the overlapping notes like music21 does, only looking ahead while notes overlap.
+    overlap_map = [[] for _ in spans]
+    for source_index, source_span in enumerate(spans):
+        for destination_index in range(source_index + 1, len(spans)):
+            first, second = sorted([source_span, spans[destination_index]])
+            if second[0] < first[1]:
+                overlap_map[source_index].append(destination_index)
+                overlap_map[destination_index].append(source_index)
+            else:
+                break
+
+    # Group the overlaps by the offset of their first member.
+    groups = {}
+    for source_index, indices in enumerate(sorted(indices) for indices in overlap_map):
+        if not indices:
+            continue
+        destination_offset = None
+        for index in indices:
+            stored = False
+            for key, group in groups.items():
+                if index in group:
+                    stored = True
+                    destination_offset = key
+                    break
+            if destination_offset is None:
+                destination_offset = notes[source_index][1]
+            if not stored:
+                groups.setdefault(destination_offset, []).append(index)
+        if not any(source_index in group for group in groups.values()):
+            if destination_offset is None:
+                destination_offset = notes[source_index][1]
+            groups.setdefault(destination_offset, []).append(source_index)
+
+    voices_number = max([len(group) for group in groups.values()] + [1])
+    if voices_number == 1:
+        return
+
+    voices = [[] for _ in range(voices_number)]
+    for note in notes:
+        for voice in voices:
+            highest_time = max([_note_end(voice_note) for voice_note in voice] + [0.0])
+            if highest_time <= note[1]:
+                voice.append(note)
+                break
+
+    measure["notes"] = []
+    measure["voices"] = [voice for voice in voices if voice]
+
+
+def _make_ties(measures):
+    """
+    Splits notes that cross a bar line, mirroring `music21.stream.makeNotation.makeTies`.
+
+    Args:
+        measures (list): The measures.
+    """
+    for measure_index, measure in enumerate(measures):
+        if measure_index + 1 < len(measures):
+            next_measure = measures[measure_index + 1]
+        else:
+            next_measure = {"notes": [], "voices": []}
+        next_measure_has_voices = bool(next_measure["voices"])
+        measure_has_voices = bool(measure["voices"])
+
+        bundle = measure["voices"] if measure_has_voices else [measure["notes"]]
+        for voice in bundle:
+            for note in _sorted_notes(voice):
+                offset = note[1]
+                end = _note_end(note)
+                if end - BAR_QUARTER_LENGTH <= 0 or offset >= BAR_QUARTER_LENGTH:
+                    continue
+
+                # Split the note at the bar line and move the remainder to the next measure.
+                quarter_length_within_measure = _op_frac(BAR_QUARTER_LENGTH - offset)
+                remainder = [note[0], 0.0, _op_frac(note[2] - quarter_length_within_measure), False]
+                note[2] = quarter_length_within_measure
+
+                if next_measure_has_voices:
+                    # music21 fails to match the voice ids, so the remainder ends up at measure level.
+                    destination = next_measure["notes"] if measure_has_voices else next_measure["voices"][0]
+                elif measure_has_voices:
+                    if next_measure["notes"]:
+                        next_measure["voices"].insert(0, next_measure["notes"])
+                        next_measure["notes"] = []
+                    elif not next_measure["voices"]:
+                        next_measure["voices"].append([])
+                    destination = next_measure["voices"][0]
+                else:
+                    destination = next_measure["notes"]
+                destination.append(remainder)
+
+
+def _flatten_unnecessary_voices(measure):
+    """
+    Moves the notes of a single remaining voice back to measure level.
+
+    Args:
+        measure (dict): The measure.
+    """
+    voices = [voice for voice in measure["voices"] if voice]
+    if len(voices) == 1:
+        measure["notes"] = measure["notes"] + voices[0]
+        voices = []
+    measure["voices"] = voices
@@ -19,11 +19,16 @@ from music21 import converter
 from .. import logging
 from music21.midi import MidiFile
 from .preprocessutilities import events_to_events_data
-from concurrent.futures import ThreadPoolExecutor
+from .processpool import TimeoutProcessPool, imap_threads
+from .parsecache import get_cache_keys, is_cached, iterate_songs_data
+from .midiscan import prescan_midi_file
 import threading
 
 logger = logging.create_logger("music21jsb")
 
+# Identifies the song data produced by this module in the parse cache. Bump it when the output changes.
+PARSER_VERSION = f"music21jsb-1-music21-{music21.__version__}"
+
 
 class ParseTimeoutError(Exception):
     """Exception raised when MIDI parsing exceeds the allowed timeout."""
@@ -96,50 +101,188 @@ def is_valid_midi(file_path):
         return False
 
 
-def preprocess_music21(midi_files):
+def preprocess_music21(midi_files, backend="thread", max_workers=8, timeout=None, cache=None, rejections=None):
     """
     Preprocesses a list of MIDI files into training and validation datasets.
 
     Args:
         midi_files (list): List of file paths to MIDI files.
+        backend (str, optional): "thread" parses with a thread pool, "process" parses and converts
+            in worker processes that are killed once they exceed the timeout. Defaults to "thread".
+        max_workers (int, optional): Number of parsing threads or processes. Defaults to 8.
+        timeout (float, optional): Maximum parsing time per file in seconds. Defaults to None.
+        cache (ParseCache, optional): Parse cache to look up and store song data. Defaults to None.
+        rejections (collections.Counter, optional): Counts the rejected files by stage, see
+            `midiscan.REJECTION_STAGES`. Defaults to None.
 
     Returns:
         tuple: (training data, validation data, flag indicating if no valid files were found).
     """
-    valid_midi_files = [file for file in midi_files if is_valid_midi(file)]
+    cache_keys = get_cache_keys(cache, midi_files, PARSER_VERSION)
+    valid_midi_files = get_valid_midi_files(midi_files, cache_keys, rejections)
 
     if not valid_midi_files:
         return [], [], True
 
     logger.info(f"Processing {len(valid_midi_files)} MIDI files.")
 
-    with ThreadPoolExecutor(max_workers=8) as executor:
-        songs = list(executor.map(parse_midi_file, valid_midi_files))
+    songs_data = [
+        song_data
+        for _, song_data in _iterate_valid_music21(
+            valid_midi_files, cache_keys, backend, max_workers, timeout, cache, rejections
+        )
+    ]
 
-    songs = [song for song in songs if song is not None]
+    # Split on the parsed songs, then drop the rejected ones.
+    split_index = int(0.8 * len(songs_data))
+    songs_data_train = [song_data for song_data in songs_data[:split_index] if song_data is not None]
+    songs_data_valid = [song_data for song_data in songs_data[split_index:] if song_data is not None]
 
-    split_index = int(0.8 * len(songs))
-    songs_train = songs[:split_index]
-    songs_valid = songs[split_index:]
+    return songs_data_train, songs_data_valid, False
 
-    songs_data_train = preprocess_music21_songs(songs_train)
-    songs_data_valid = preprocess_music21_songs(songs_valid)
 
-    return songs_data_train, songs_data_valid, False
+def iterate_music21(midi_files, backend="thread", max_workers=8, timeout=None, cache=None, rejections=None):
+    """
+    Preprocesses MIDI files one at a time, yielding the song data of each file as soon as it is converted.
 
+    Each music21 score is converted right after parsing and dropped, and only a few files are in flight
+    at once, so memory does not grow with the number of files.
 
-def parse_midi_file(midi_file):
+    Args:
+        midi_files (list): List of file paths to MIDI files.
+        backend (str, optional): "thread" or "process", see `preprocess_music21`. Defaults to "thread".
+        max_workers (int, optional): Number of parsing threads or processes. Defaults to 8.
+        timeout (float, optional): Maximum parsing time per file in seconds. Defaults to None.
+        cache (ParseCache, optional): Parse cache to look up and store song data. Defaults to None.
+        rejections (collections.Counter, optional): Counts the rejected files by stage, see
+            `midiscan.REJECTION_STAGES`. Defaults to None.
+
+    Yields:
+        tuple: (path, song data or None if the song was rejected), in input order. Invalid files and files
+            that failed to parse are skipped.
+    """
+    cache_keys = get_cache_keys(cache, midi_files, PARSER_VERSION)
+    valid_midi_files = get_valid_midi_files(midi_files, cache_keys, rejections)
+    yield from _iterate_valid_music21(valid_midi_files, cache_keys, backend, max_workers, timeout, cache, rejections)
+
+
+def get_valid_midi_files(midi_files, cache_keys, rejections=None):
+    """
+    Selects the MIDI files worth parsing. Cached files were valid when they were parsed. The others are
+    first checked from their raw bytes, which rejects broken files and files that are not in 4/4 without
+    any music21 work, and then decoded with music21.
+
+    Args:
+        midi_files (list): List of file paths to MIDI files.
+        cache_keys (dict): Result of `get_cache_keys`.
+        rejections (collections.Counter, optional): Counts the rejected files by stage. Defaults to None.
+
+    Returns:
+        list: The valid MIDI files.
+    """
+    valid_midi_files = []
+    for midi_file in midi_files:
+        if is_cached(cache_keys, midi_file):
+            valid_midi_files.append(midi_file)
+            continue
+
+        stage = prescan_midi_file(midi_file)
+        if stage is None and not is_valid_midi(midi_file):
+            stage = "decode"
+
+        if stage is None:
+            valid_midi_files.append(midi_file)
+        elif rejections is not None:
+            rejections[stage] += 1
+    return valid_midi_files
+
+
+def _iterate_valid_music21(valid_midi_files, cache_keys, backend, max_workers, timeout, cache, rejections=None):
+    """
+    Yields the song data of validated MIDI files in order, parsing the files that are not cached.
+
+    Args:
+        valid_midi_files (list): Paths to the validated MIDI files.
+        cache_keys (dict): Result of `get_cache_keys`.
+        backend (str): "thread" or "process".
+        max_workers (int): Number of parsing threads or processes.
+        timeout (float): Maximum parsing time per file in seconds, or None.
+        cache (ParseCache): Parse cache, or None.
+        rejections (collections.Counter, optional): Counts the rejected files by stage. Defaults to None.
+
+    Yields:
+        tuple: (path, song data or None if the song was rejected).
+    """
+    midi_files_to_parse = [file for file in valid_midi_files if not is_cached(cache_keys, file)]
+
+    if backend == "thread":
+        parse_results = imap_threads(lambda file: preprocess_midi_file(file, timeout), midi_files_to_parse, max_workers)
+    elif backend == "process":
+        pool = TimeoutProcessPool(parse_and_preprocess_midi_file, max_workers=max_workers, timeout=timeout)
+        parse_results = pool.imap(midi_files_to_parse)
+    else:
+        error_string = f"Unexpected parse backend {backend}."
+        logger.error(error_string)
+        raise Exception(error_string)
+
+    yield from iterate_songs_data(
+        cache,
+        valid_midi_files,
+        cache_keys,
+        parse_results,
+        lambda file: preprocess_midi_file(file, timeout),
+        rejections,
+    )
+
+
+def preprocess_midi_file(midi_file, timeout=None):
+    """
+    Parses a MIDI file and converts it into song data right away, so that the music21 score can be dropped.
+
+    Args:
+        midi_file (str): Path to the MIDI file.
+        timeout (float, optional): Maximum allowed parsing time in seconds. Defaults to None.
+
+    Returns:
+        tuple: (path of the MIDI file, song data or None if the song was rejected), or None if parsing failed.
+    """
+    song = parse_midi_file(midi_file, timeout)
+    if song is None:
+        return None
+    return midi_file, preprocess_music21_song(song)
+
+
+def parse_and_preprocess_midi_file(midi_file):
+    """
+    Parses a MIDI file and converts it into song data in one go. Used by the process backend, so that
+    only the picklable song data and not the music21 score crosses the process boundary.
+
+    Args:
+        midi_file (str): Path to the MIDI file.
+
+    Returns:
+        tuple: (path of the MIDI file, song data or None if the song was rejected).
+
+    Raises:
+        Exception: If parsing fails.
+    """
+    song = converter.parse(midi_file)
+    return midi_file, preprocess_music21_song(song)
+
+
+def parse_midi_file(midi_file, timeout=None):
     """
     Parses a MIDI file into a music21 stream.Score.
 
     Args:
         midi_file (str): Path to the MIDI file.
+        timeout (float, optional): Maximum allowed parsing time in seconds. Defaults to None.
 
     Returns:
         music21.stream.Score: Parsed music21 score, or None if parsing fails.
     """
     try:
-        return parse_with_timeout(midi_file)
+        return parse_with_timeout(midi_file, timeout)
     except ParseTimeoutError as e:
         logger.warning(str(e))
     except Exception as e:
@@ -207,11 +350,7 @@ def preprocess_music21_part(part, part_index):
     """
     track_data = {"name": part.partName, "number": part_index, "bars": []}
 
-    for measure_index in range(1, 1000):  # music21 uses 1-based indexing for measures
-        measure = part.measure(measure_index)
-        if measure is None:
-            break
-
+    for measure in get_measures(part):
         bar_data = preprocess_music21_measure(measure)
         if not bar_data["events"]:
             bar_data = {"events": [{"type": "TIME_DELTA", "delta": 16.0}]}
@@ -224,6 +363,31 @@ def preprocess_music21_part(part, part_index):
     return track_data
 
 
+def get_measures(part):
+    """
+    Collects the measures of a part in a single pass over its elements.
+
+    Returns the same measures as calling `part.measure(1)`, `part.measure(2)`, ... until a number is
+    missing, without scanning the part once per measure.
+
+    Args:
+        part (music21.stream.Part): A music21 part object.
+
+    Returns:
+        list: The music21.stream.Measure objects numbered 1, 2, ... in order.
+    """
+    measures_by_number = {}
+    for measure in part.getElementsByClass(music21.stream.Measure):
+        measures_by_number.setdefault(measure.number, measure)
+
+    measures = []
+    measure_number = 1  # music21 uses 1-based indexing for measures
+    while measure_number in measures_by_number:
+        measures.append(measures_by_number[measure_number])
+        measure_number += 1
+    return measures
+
+
 def preprocess_music21_measure(measure):
     """
     Preprocesses a music21 measure into tokenized bar data.
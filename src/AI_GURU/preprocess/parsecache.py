@@ -0,0 +1,336 @@
+# Copyright 2021 Tristan Behrens.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Lint as: python3
+
+import os
+import time
+import zlib
+import pickle
+import hashlib
+import tempfile
+from .. import logging
+
+logger = logging.create_logger("parsecache")
+
+# File extension of cache entries: zlib compressed pickles.
+CACHE_ENTRY_EXTENSION = ".pkl.z"
+
+# When the cache is full, it is shrunk to this fraction of its maximum size, so that not every put evicts.
+EVICTION_TARGET_FRACTION = 0.9
+
+
+class ParseCache:
+    """
+    A persistent cache of song data on disk, keyed by the content of the MIDI file and the parser version.
+
+    Entries are zlib compressed pickles stored under the SHA-256 of the parser version and the file content,
+    so renamed or copied files still hit, and changing the parser invalidates its entries. Songs the parser
+    rejected are cached as None as well. Once the cache exceeds its maximum size, the least recently used
+    entries are evicted.
+
+    Attributes:
+        cache_path (str): Directory holding the cache entries.
+        max_size_bytes (int): Maximum total size of the entries in bytes, or None for no limit.
+    """
+
+    def __init__(self, cache_path, max_size_bytes=None):
+        """
+        Initializes the ParseCache and creates its directory.
+
+        Args:
+            cache_path (str): Directory holding the cache entries.
+            max_size_bytes (int, optional): Maximum total size of the entries in bytes. Defaults to None.
+        """
+        if max_size_bytes is not None and (not isinstance(max_size_bytes, int) or max_size_bytes < 0):
+            raise ValueError(f"max_size_bytes must be a non negative integer or None, but is {max_size_bytes}.")
+
+        self.cache_path = cache_path
+        self.max_size_bytes = max_size_bytes
+        self.size_bytes = None
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(cache_path, exist_ok=True)
+
+    def key(self, midi_file, parser_version):
+        """
+        Computes the cache key of a MIDI file.
+
+        Args:
+            midi_file (str): Path to the MIDI file.
+            parser_version (str): Name and version of the parser producing the song data.
+
+        Returns:
+            str: Hexadecimal SHA-256 digest of the parser version and the file content.
+        """
+        digest = hashlib.sha256(parser_version.encode("utf-8") + b"\0")
+        with open(midi_file, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def get(self, key):
+        """
+        Looks up song data.
+
+        Args:
+            key (str): Cache key from `key`.
+
+        Returns:
+            tuple: (True, song data) on a hit, (False, None) on a miss.
+        """
+        entry_path = self.__entry_path(key)
+        try:
+            with open(entry_path, "rb") as f:
+                song_data = pickle.loads(zlib.decompress(f.read()))
+        except FileNotFoundError:
+            self.misses += 1
+            return False, None
+        except Exception as e:
+            logger.warning(f"Removing unreadable cache entry {entry_path}. Reason: {e}")
+            self.__remove_entry(entry_path)
+            self.misses += 1
+            return False, None
+
+        # Mark the entry as recently used for the eviction.
+        os.utime(entry_path)
+        self.hits += 1
+        return True, song_data
+
+    def contains(self, key):
+        """
+        Checks whether an entry exists without loading it.
+
+        Args:
+            key (str): Cache key from `key`.
+
+        Returns:
+            bool: True if the entry exists.
+        """
+        return os.path.exists(self.__entry_path(key))
+
+    def put(self, key, song_data):
+        """
+        Stores song data and evicts old entries if the cache grew too large.
+
+        Args:
+            key (str): Cache key from `key`.
+            song_data (dict): Song data, or None if the parser rejected the song.
+        """
+        entry_path = self.__entry_path(key)
+        os.makedirs(os.path.dirname(entry_path), exist_ok=True)
+        data = zlib.compress(pickle.dumps(song_data, protocol=pickle.HIGHEST_PROTOCOL))
+
+        # Write to a temporary file first, so that readers never see partial entries.
+        file_descriptor, temporary_path = tempfile.mkstemp(dir=os.path.dirname(entry_path))
+        with os.fdopen(file_descriptor, "wb") as f:
+            f.write(data)
+        previous_size = os.path.getsize(entry_path) if os.path.exists(entry_path) else 0
+        os.replace(temporary_path, entry_path)
+
+        if self.size_bytes is not None:
+            self.size_bytes += len(data) - previous_size
+        if self.max_size_bytes is not None and self.get_size() > self.max_size_bytes:
+            self.evict(int(EVICTION_TARGET_FRACTION * self.max_size_bytes))
+
+    def entries(self):
+        """
+        Lists all cache entries.
+
+        Returns:
+            list: (path, size in bytes, last access time) tuples, least recently used first.
+        """
+        entries = []
+        for directory, _, file_names in os.walk(self.cache_path):
+            for file_name in file_names:
+                if not file_name.endswith(CACHE_ENTRY_EXTENSION):
+                    continue
+                stat = os.stat(os.path.join(directory, file_name))
+                entries.append((os.path.join(directory, file_name), stat.st_size, stat.st_mtime))
+        entries.sort(key=lambda entry: entry[2])
+        return entries
+
+    def get_size(self):
+        """
+        Returns the total size of the cache entries in bytes.
+
+        Returns:
+            int: Size in bytes.
+        """
+        if self.size_bytes is None:
+            self.size_bytes = sum(size for _, size, _ in self.entries())
+        return self.size_bytes
+
+    def evict(self, max_size_bytes):
+        """
+        Removes the least recently used entries until the cache is not larger than the given size.
+
+        Args:
+            max_size_bytes (int): Size in bytes to shrink the cache to.
+
+        Returns:
+            int: Number of removed entries.
+        """
+        entries = self.entries()
+        size_bytes = sum(size for _, size, _ in entries)
+        removed_number = 0
+        for entry_path, size, _ in entries:
+            if size_bytes <= max_size_bytes:
+                break
+            self.__remove_entry(entry_path)
+            size_bytes -= size
+            removed_number += 1
+
+        self.size_bytes = size_bytes
+        if removed_number:
+            logger.info(f"Evicted {removed_number} entries from the parse cache {self.cache_path}.")
+        return removed_number
+
+    def prune(self, max_age_seconds):
+        """
+        Removes entries that have not been used for the given time.
+
+        Args:
+            max_age_seconds (float): Maximum time since the last access in seconds.
+
+        Returns:
+            int: Number of removed entries.
+        """
+        oldest_access_time = time.time() - max_age_seconds
+        removed_number = 0
+        for entry_path, _, access_time in self.entries():
+            if access_time >= oldest_access_time:
+                break
+            self.__remove_entry(entry_path)
+            removed_number += 1
+
+        self.size_bytes = None
+        return removed_number
+
+    def clear(self):
+        """
+        Removes all entries.
+
+        Returns:
+            int: Number of removed entries.
+        """
+        return self.evict(0)
+
+    def __entry_path(self, key):
+        """
+        Returns the path of the entry with the given key. Entries are spread over subdirectories by key prefix.
+
+        Args:
+            key (str): Cache key.
+
+        Returns:
+            str: Path of the entry.
+        """
+        return os.path.join(self.cache_path, key[:2], key + CACHE_ENTRY_EXTENSION)
+
+    def __remove_entry(self, entry_path):
+        """
+        Removes an entry if it still exists.
+
+        Args:
+            entry_path (str): Path of the entry.
+        """
+        try:
+            os.remove(entry_path)
+        except FileNotFoundError:
+            pass
+
+
+def get_cache_keys(cache, midi_files, parser_version):
+    """
+    Computes the cache keys of MIDI files and checks which of them are cached, without loading any song data.
+
+    Args:
+        cache (ParseCache): The parse cache, or None.
+        midi_files (list): Paths to the MIDI files.
+        parser_version (str): Name and version of the parser producing the song data.
+
+    Returns:
+        dict: MIDI file path to (cache key, whether the file is cached). Unreadable files are left out.
+    """
+    cache_keys = {}
+    if cache is None:
+        return cache_keys
+
+    for midi_file in midi_files:
+        try:
+            key = cache.key(midi_file, parser_version)
+        except OSError as e:
+            logger.warning(f"Failed to read MIDI file: {midi_file}. Reason: {e}")
+            continue
+        cache_keys[midi_file] = (key, cache.contains(key))
+
+    cached_number = sum(cached for _, cached in cache_keys.values())
+    cache.misses += len(cache_keys) - cached_number
+    logger.info(f"Parse cache: {cached_number} hits, {len(cache_keys) - cached_number} misses.")
+    return cache_keys
+
+
+def is_cached(cache_keys, midi_file):
+    """
+    Checks whether a MIDI file is cached according to `get_cache_keys`.
+
+    Args:
+        cache_keys (dict): Result of `get_cache_keys`.
+        midi_file (str): Path to the MIDI file.
+
+    Returns:
+        bool: True if the file is cached.
+    """
+    return cache_keys.get(midi_file, (None, False))[1]
+
+
+def iterate_songs_data(cache, midi_files, cache_keys, parse_results, preprocess_file, rejections=None):
+    """
+    Yields the song data of MIDI files in order, taking the cached files from the cache and the others from
+    the results of parsing them. Parsed song data is stored in the cache.
+
+    Args:
+        cache (ParseCache): The parse cache, or None.
+        midi_files (list): Paths to the MIDI files.
+        cache_keys (dict): Result of `get_cache_keys`.
+        parse_results (iterator): For each file that is not cached, in order, (path, song data) or None
+            if parsing failed.
+        preprocess_file (callable): Parses a single file the same way. Used for entries that were evicted
+            after `get_cache_keys`.
+        rejections (collections.Counter, optional): Counts the files that failed to parse as "parse" and
+            the rejected songs as "song". Defaults to None.
+
+    Yields:
+        tuple: (path, song data or None if the parser rejected the song). Files that failed to parse are skipped.
+    """
+    for midi_file in midi_files:
+        key, cached = cache_keys.get(midi_file, (None, False))
+        if cached:
+            hit, song_data = cache.get(key)
+            result = (midi_file, song_data) if hit else preprocess_file(midi_file)
+        else:
+            hit = False
+            result = next(parse_results)
+
+        if result is None:
+            if rejections is not None:
+                rejections["parse"] += 1
+            continue
+        _, song_data = result
+        if key is not None and not hit:
+            cache.put(key, song_data)
+        if song_data is None and rejections is not None:
+            rejections["song"] += 1
+        yield midi_file, song_data
@@ -15,12 +15,19 @@
 # Lint as: python3
 
 
+from operator import itemgetter
+
+
 def events_to_events_data(events):
     """
     This function takes a list of musical events, sorts them chronologically, and generates a structured
     representation in the form of dictionaries. Additionally, it ensures that timing information is preserved
     through the introduction of "TIME_DELTA" events, which represent the time elapsed between successive events.
 
+    The sort is stable, so simultaneous events keep their input order. Each delta is emitted right before the
+    event it leads to, so the sorted events are walked only once. Deltas have the type the subtraction of the
+    times has in Python, so Fraction times yield Fraction deltas.
+
     Args:
         events (list): A list of tuples representing musical events. Each tuple contains:
             - type (str): The type of event, e.g., "NOTE_ON", "NOTE_OFF".
@@ -33,25 +40,18 @@ def events_to_events_data(events):
             - "pitch" (int, optional): The pitch value (for note events).
             - "delta" (float, optional): The time difference between events.
     """
-
-    events = sorted(events, key=lambda event: event[2])
-
     events_data = []
-    for event_index, event, event_next in zip(range(len(events)), events, events[1:] + [None]):
-        if event_index == 0 and event[2] != 0.0:
-            event_data = {"type": "TIME_DELTA", "delta": event[2]}
-            events_data += [event_data]
-
-        event_data = {"type": event[0], "pitch": event[1]}
-        events_data += [event_data]
-
-        if event_next is None:
-            continue
-
-        delta = event_next[2] - event[2]
-        assert delta >= 0, events
-        if delta != 0.0:
-            event_data = {"type": "TIME_DELTA", "delta": delta}
-            events_data += [event_data]
+    previous_time = None
+    for event in sorted(events, key=itemgetter(2)):
+        time = event[2]
+        if previous_time is None:
+            if time != 0.0:
+                events_data.append({"type": "TIME_DELTA", "delta": time})
+        else:
+            delta = time - previous_time
+            if delta != 0.0:
+                events_data.append({"type": "TIME_DELTA", "delta": delta})
+        events_data.append({"type": event[0], "pitch": event[1]})
+        previous_time = time
 
     return events_data
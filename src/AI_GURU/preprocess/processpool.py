@@ -0,0 +1,432 @@
+# Copyright 2021 Tristan Behrens.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Lint as: python3
+
+import time
+import queue
+import threading
+import collections
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing.connection import wait
+from .. import logging
+
+logger = logging.create_logger("processpool")
+
+
+def _worker_loop(function, connection):
+    """
+    Runs in a worker process. Receives items, applies the function and sends back the results.
+
+    Args:
+        function (callable): Picklable function applied to each item.
+        connection (multiprocessing.connection.Connection): Pipe end shared with the parent process.
+    """
+    while True:
+        try:
+            item = connection.recv()
+        except EOFError:
+            break
+        if item is None:
+            break
+        try:
+            result = (True, function(item))
+        except Exception as e:
+            result = (False, f"{type(e).__name__}: {e}")
+        connection.send(result)
+    connection.close()
+
+
+def imap_threads(function, items, max_workers):
+    """
+    Lazily applies a function to items in a thread pool, yielding results in input order.
+
+    Unlike `ThreadPoolExecutor.map`, which submits all items at once and keeps every result until it is
+    consumed, at most twice as many items as there are workers are in flight at any time.
+
+    Args:
+        function (callable): Function applied to each item.
+        items (iterable): The items.
+        max_workers (int): Number of threads.
+
+    Yields:
+        Result of the function for each item.
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = collections.deque()
+        for item in items:
+            futures.append(executor.submit(function, item))
+            if len(futures) >= 2 * max_workers:
+                yield futures.popleft().result()
+        while futures:
+            yield futures.popleft().result()
+
+
+class PipelineStage:
+    """
+    A pipeline stage running a generator in a background thread, which hands its items to the consumer through
+    a bounded queue. Chaining stages lets each one work on the next items while the following stage is busy.
+
+    The stage measures how long its generator was busy, how long it was blocked on a full queue because the
+    consumer was slower, and how long the consumer waited on an empty queue because the stage was slower.
+    Exceptions raised by the generator are raised again in the consumer. Closing a stage ends the iteration of a
+    consumer still reading it, so closing the stages of a chain in any order does not leave a stage waiting.
+
+    Attributes:
+        name (str): Name of the stage in the statistics.
+        max_queue_size (int): Maximum number of items waiting in the queue.
+    """
+
+    def __init__(self, name, items, max_queue_size):
+        """
+        Initializes the PipelineStage and starts its thread.
+
+        Args:
+            name (str): Name of the stage in the statistics.
+            items (iterable): The items, typically a generator doing the work of the stage.
+            max_queue_size (int): Maximum number of items waiting in the queue.
+        """
+        if not isinstance(max_queue_size, int) or max_queue_size < 1:
+            raise ValueError(f"max_queue_size must be a positive integer, but is {max_queue_size}.")
+
+        self.name = name
+        self.max_queue_size = max_queue_size
+        self.__items = items
+        self.__queue = queue.Queue(maxsize=max_queue_size)
+        self.__stop_event = threading.Event()
+        self.__items_number = 0
+        self.__busy_seconds = 0.0
+        self.__blocked_seconds = 0.0
+        self.__waiting_seconds = 0.0
+        self.__queue_depths_sum = 0
+        self.__max_queue_depth = 0
+        self.__start_time = time.perf_counter()
+        self.__end_time = None
+        self.__thread = threading.Thread(target=self.__run, name=f"pipeline-{name}", daemon=True)
+        self.__thread.start()
+
+    def __iter__(self):
+        while True:
+            start_time = time.perf_counter()
+            try:
+                kind, value = self.__get()
+            finally:
+                self.__waiting_seconds += time.perf_counter() - start_time
+            if kind == "item":
+                yield value
+            elif kind == "error":
+                raise value
+            else:
+                return
+
+    def __get(self):
+        """
+        Gets the next entry of the queue, polling so that a closed stage or a finished thread whose end marker
+        was drained by `close` ends the iteration.
+
+        Returns:
+            tuple: (kind, value) entry.
+        """
+        while True:
+            try:
+                return self.__queue.get(timeout=0.1)
+            except queue.Empty:
+                pass
+            if self.__stop_event.is_set() or not self.__thread.is_alive():
+                try:
+                    return self.__queue.get_nowait()
+                except queue.Empty:
+                    return ("end", None)
+
+    def close(self):
+        """
+        Stops the stage after the item it is working on and waits for its thread.
+        """
+        self.__stop_event.set()
+        while self.__thread.is_alive():
+            try:
+                self.__queue.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        self.__thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def get_stats(self):
+        """
+        Reports the throughput of the stage and how long it and its consumer waited for each other.
+
+        Returns:
+            dict: The number of "items", the "busy_seconds" of the stage, the "blocked_seconds" it waited on a
+            full queue, the "waiting_seconds" the consumer waited on an empty queue, the "items_per_second"
+            over the lifetime of the stage, and the "mean_queue_depth" and "max_queue_depth" after each put.
+        """
+        seconds = (self.__end_time or time.perf_counter()) - self.__start_time
+        return {
+            "items": self.__items_number,
+            "busy_seconds": self.__busy_seconds,
+            "blocked_seconds": self.__blocked_seconds,
+            "waiting_seconds": self.__waiting_seconds,
+            "items_per_second": self.__items_number / seconds if seconds > 0 else 0.0,
+            "mean_queue_depth": self.__queue_depths_sum / self.__items_number if self.__items_number else 0.0,
+            "max_queue_depth": self.__max_queue_depth,
+        }
+
+    def __run(self):
+        """
+        Runs in the thread of the stage. Puts the items into the queue until they are exhausted or the stage
+        is closed, followed by an error or the end marker, which is delivered even if the stage is closed.
+        """
+        items = iter(self.__items)
+        try:
+            while not self.__stop_event.is_set():
+                start_time = time.perf_counter()
+                try:
+                    item = next(items)
+                except StopIteration:
+                    break
+                finally:
+                    self.__busy_seconds += time.perf_counter() - start_time
+                if not self.__put(("item", item)):
+                    break
+                queue_depth = self.__queue.qsize()
+                self.__items_number += 1
+                self.__queue_depths_sum += queue_depth
+                self.__max_queue_depth = max(self.__max_queue_depth, queue_depth)
+            self.__put_last(("end", None))
+        except BaseException as e:
+            self.__put_last(("error", e))
+        finally:
+            self.__end_time = time.perf_counter()
+            # Let a generator clean up, e.g. stop its process pool, in the thread it ran in.
+            if hasattr(items, "close"):
+                items.close()
+
+    def __put(self, entry):
+        """
+        Puts an entry into the queue, waiting while it is full unless the stage is closed.
+
+        Args:
+            entry (tuple): (kind, value) entry.
+
+        Returns:
+            bool: Whether the entry was put.
+        """
+        start_time = time.perf_counter()
+        try:
+            while not self.__stop_event.is_set():
+                try:
+                    self.__queue.put(entry, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+        finally:
+            self.__blocked_seconds += time.perf_counter() - start_time
+
+    def __put_last(self, entry):
+        """
+        Puts the end marker or error into the queue. If the stage is closed, the queue is emptied to make room,
+        so that a consumer still reading the stage stops instead of waiting for more items.
+
+        Args:
+            entry (tuple): (kind, value) entry.
+        """
+        if self.__put(entry):
+            return
+        while True:
+            try:
+                self.__queue.get_nowait()
+            except queue.Empty:
+                break
+        try:
+            self.__queue.put_nowait(entry)
+        except queue.Full:
+            pass
+
+
+class TimeoutProcessPool:
+    """
+    A process pool that enforces a hard timeout per item.
+
+    Unlike `concurrent.futures.ProcessPoolExecutor`, a worker that exceeds its timeout is terminated
+    and replaced by a fresh process, so hanging items cannot keep burning CPU in the background.
+
+    Attributes:
+        function (callable): Picklable function applied to each item.
+        max_workers (int): Number of worker processes.
+        timeout (float): Maximum time in seconds a single item may take, or None for no limit.
+    """
+
+    def __init__(self, function, max_workers, timeout=None):
+        """
+        Initializes the TimeoutProcessPool.
+
+        Args:
+            function (callable): Picklable, module level function applied to each item.
+            max_workers (int): Number of worker processes.
+            timeout (float, optional): Per item timeout in seconds. Defaults to None.
+        """
+        if not isinstance(max_workers, int) or max_workers < 1:
+            raise ValueError(f"max_workers must be a positive integer, but is {max_workers}.")
+
+        self.function = function
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.context = multiprocessing.get_context()
+
+    def map(self, items):
+        """
+        Applies the function to all items.
+
+        Args:
+            items (iterable): Picklable items.
+
+        Returns:
+            list: Results in input order. Items that failed, crashed or timed out yield None.
+        """
+        return list(self.imap(items))
+
+    def imap(self, items):
+        """
+        Lazily applies the function to all items, yielding results in input order.
+
+        Args:
+            items (iterable): Picklable items.
+
+        Yields:
+            Result of the function for each item, or None if it failed, crashed or timed out.
+        """
+        items = iter(items)
+        workers = [self.__start_worker() for _ in range(self.max_workers)]
+        pending = {}
+        next_index = 0
+        next_yield_index = 0
+        exhausted = False
+
+        try:
+            while True:
+                # Hand out work to idle workers.
+                for worker in workers:
+                    if worker["task"] is not None or exhausted:
+                        continue
+                    try:
+                        item = next(items)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    worker["connection"].send(item)
+                    worker["task"] = (next_index, item)
+                    worker["deadline"] = None if self.timeout is None else time.monotonic() + self.timeout
+                    next_index += 1
+
+                # Yield everything that is ready in order.
+                while next_yield_index in pending:
+                    yield pending.pop(next_yield_index)
+                    next_yield_index += 1
+
+                busy_workers = [worker for worker in workers if worker["task"] is not None]
+                if not busy_workers:
+                    if exhausted:
+                        break
+                    continue
+
+                # Wait for results or for the closest deadline.
+                deadlines = [worker["deadline"] for worker in busy_workers if worker["deadline"] is not None]
+                wait_timeout = max(0.0, min(deadlines) - time.monotonic()) if deadlines else None
+                ready = wait([worker["connection"] for worker in busy_workers], timeout=wait_timeout)
+
+                for worker_index, worker in enumerate(workers):
+                    if worker["task"] is None:
+                        continue
+                    task_index, item = worker["task"]
+
+                    if worker["connection"] in ready:
+                        try:
+                            success, result = worker["connection"].recv()
+                        except (EOFError, OSError):
+                            logger.warning(f"Worker crashed while processing {item}.")
+                            pending[task_index] = None
+                            workers[worker_index] = self.__restart_worker(worker)
+                            continue
+                        if not success:
+                            logger.warning(f"Failed to process {item}. Reason: {result}")
+                            result = None
+                        pending[task_index] = result
+                        worker["task"] = None
+
+                    elif worker["deadline"] is not None and time.monotonic() >= worker["deadline"]:
+                        logger.warning(f"Timeout while processing {item}. Terminating worker.")
+                        pending[task_index] = None
+                        workers[worker_index] = self.__restart_worker(worker)
+
+            while next_yield_index in pending:
+                yield pending.pop(next_yield_index)
+                next_yield_index += 1
+        finally:
+            for worker in workers:
+                self.__stop_worker(worker)
+
+    def __start_worker(self):
+        """
+        Starts a new worker process.
+
+        Returns:
+            dict: Worker state with the process, the parent pipe end, the current task and its deadline.
+        """
+        parent_connection, child_connection = self.context.Pipe()
+        process = self.context.Process(target=_worker_loop, args=(self.function, child_connection), daemon=True)
+        process.start()
+        child_connection.close()
+        return {"process": process, "connection": parent_connection, "task": None, "deadline": None}
+
+    def __restart_worker(self, worker):
+        """
+        Kills a worker and starts a replacement.
+
+        Args:
+            worker (dict): Worker state to replace.
+
+        Returns:
+            dict: State of the new worker.
+        """
+        worker["process"].terminate()
+        worker["process"].join()
+        worker["connection"].close()
+        return self.__start_worker()
+
+    def __stop_worker(self, worker):
+        """
+        Stops a worker. Busy workers are terminated, idle ones are asked to exit.
+
+        Args:
+            worker (dict): Worker state to stop.
+        """
+        if worker["task"] is not None:
+            worker["process"].terminate()
+        else:
+            try:
+                worker["connection"].send(None)
+            except (BrokenPipeError, OSError):
+                pass
+        worker["process"].join(timeout=5)
+        if worker["process"].is_alive():
+            worker["process"].terminate()
+            worker["process"].join()
+        worker["connection"].close()
@@ -0,0 +1,281 @@
+# Copyright 2021 Tristan Behrens.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Lint as: python3
+
+"""
+Compact representation of song data.
+
+Instead of one dict per event, each track holds a single NumPy structured array with all events of all its
+bars, plus the offsets at which its bars start. Songs and tracks can still be read like the dicts produced by
+`preprocess_music21`, which materializes the requested part on access.
+"""
+
+from fractions import Fraction
+import numpy as np
+
+# Event types and their codes in the event arrays.
+EVENT_TYPES = ["NOTE_ON", "NOTE_OFF", "TIME_DELTA"]
+NOTE_ON, NOTE_OFF, TIME_DELTA = range(len(EVENT_TYPES))
+EVENT_TYPE_CODES = {event_type: code for code, event_type in enumerate(EVENT_TYPES)}
+
+# One event. Deltas that are Fractions in the dict form keep their denominator, all other deltas have 0.
+EVENT_DTYPE = np.dtype([("type", np.uint8), ("pitch", np.int16), ("delta", np.float64), ("denominator", np.uint32)])
+
+
+class TrackArray:
+    """
+    A track whose events are stored in one structured array.
+
+    Attributes:
+        name (str): Name of the track.
+        number (int): Index of the track in the song.
+        events (numpy.ndarray): Events of all bars with dtype `EVENT_DTYPE`.
+        bar_offsets (numpy.ndarray): Index of the first event of each bar, followed by the number of events.
+        drums (bool): Whether the track holds drums.
+        note_on_offsets (numpy.ndarray): Number of note on events before each bar, followed by the total.
+    """
+
+    __slots__ = ["name", "number", "events", "bar_offsets", "drums", "note_on_offsets"]
+
+    def __init__(self, name, number, events, bar_offsets, drums=False):
+        """
+        Initializes the TrackArray.
+
+        Args:
+            name (str): Name of the track.
+            number (int): Index of the track in the song.
+            events (numpy.ndarray): Events of all bars with dtype `EVENT_DTYPE`.
+            bar_offsets (numpy.ndarray): Index of the first event of each bar, followed by the number of events.
+            drums (bool, optional): Whether the track holds drums. Defaults to False.
+        """
+        self.name = name
+        self.number = number
+        self.events = events
+        self.bar_offsets = bar_offsets
+        self.drums = drums
+
+        note_on_counts = np.concatenate([[0], np.cumsum(events["type"] == NOTE_ON)])
+        self.note_on_offsets = note_on_counts[bar_offsets]
+
+    @property
+    def bars_number(self):
+        return len(self.bar_offsets) - 1
+
+    def get_bar_events(self, bar_index):
+        """
+        Returns the events of a bar as a view into the event array.
+
+        Args:
+            bar_index (int): Index of the bar.
+
+        Returns:
+            numpy.ndarray: The events with dtype `EVENT_DTYPE`.
+        """
+        return self.events[self.bar_offsets[bar_index] : self.bar_offsets[bar_index + 1]]
+
+    def to_lists(self):
+        """
+        Expands the arrays into Python lists, which are faster to slice and iterate for many short windows.
+
+        Returns:
+            tuple: (list of (type, pitch, delta, denominator) tuples, list of bar offsets).
+        """
+        return self.events.tolist(), self.bar_offsets.tolist()
+
+    def count_note_on_events(self, bar_start_index, bar_end_index):
+        """
+        Counts the note on events in a range of bars.
+
+        Args:
+            bar_start_index (int): Index of the first bar.
+            bar_end_index (int): Index after the last bar. May exceed the number of bars.
+
+        Returns:
+            int: Number of note on events.
+        """
+        bars_number = len(self.note_on_offsets) - 1
+        note_on_start = int(self.note_on_offsets[min(bar_start_index, bars_number)])
+        note_on_end = int(self.note_on_offsets[min(bar_end_index, bars_number)])
+        return max(note_on_end - note_on_start, 0)
+
+    def get(self, key, default=None):
+        return self[key] if key in self.keys() else default
+
+    def keys(self):
+        return ["name", "number", "bars", "drums"] if self.drums else ["name", "number", "bars"]
+
+    def __getitem__(self, key):
+        if key == "bars":
+            return [{"events": events_array_to_events_data(self.get_bar_events(i))} for i in range(self.bars_number)]
+        elif key in self.keys():
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def __contains__(self, key):
+        return key in self.keys()
+
+    def to_dict(self):
+        return {key: self[key] for key in self.keys()}
+
+
+class SongArray:
+    """
+    A song whose tracks are TrackArrays.
+
+    Attributes:
+        title (str): Title of the song.
+        number (int): Number of the song.
+        tracks (list): The TrackArrays.
+    """
+
+    __slots__ = ["title", "number", "tracks"]
+
+    def __init__(self, title, number, tracks):
+        """
+        Initializes the SongArray.
+
+        Args:
+            title (str): Title of the song.
+            number (int): Number of the song.
+            tracks (list): The TrackArrays.
+        """
+        self.title = title
+        self.number = number
+        self.tracks = tracks
+
+    def get(self, key, default=None):
+        return self[key] if key in self.keys() else default
+
+    def keys(self):
+        return ["title", "number", "tracks"]
+
+    def __getitem__(self, key):
+        if key in self.keys():
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def __contains__(self, key):
+        return key in self.keys()
+
+    def to_dict(self):
+        return {"title": self.title, "number": self.number, "tracks": [track.to_dict() for track in self.tracks]}
+
+
+def events_data_to_events_array(events_data):
+    """
+    Converts the event dicts of a bar into an event array.
+
+    Args:
+        events_data (list): Event dicts as produced by `events_to_events_data`.
+
+    Returns:
+        numpy.ndarray: The events with dtype `EVENT_DTYPE`.
+    """
+    return np.array(_events_data_to_rows(events_data), dtype=EVENT_DTYPE)
+
+
+def _events_data_to_rows(events_data):
+    """
+    Converts event dicts into tuples matching `EVENT_DTYPE`.
+
+    Args:
+        events_data (list): Event dicts.
+
+    Returns:
+        list: (type, pitch, delta, denominator) tuples.
+    """
+    rows = []
+    for event_data in events_data:
+        if event_data["type"] == "TIME_DELTA":
+            delta = event_data["delta"]
+            denominator = delta.denominator if isinstance(delta, Fraction) else 0
+            rows.append((TIME_DELTA, 0, float(delta), denominator))
+        else:
+            rows.append((EVENT_TYPE_CODES[event_data["type"]], event_data["pitch"], 0.0, 0))
+    return rows
+
+
+def events_array_to_events_data(events):
+    """
+    Converts an event array back into event dicts.
+
+    Args:
+        events (numpy.ndarray): Events with dtype `EVENT_DTYPE`.
+
+    Returns:
+        list: Event dicts as produced by `events_to_events_data`.
+    """
+    events_data = []
+    for event_type, pitch, delta, denominator in events.tolist():
+        if event_type == TIME_DELTA:
+            events_data.append({"type": "TIME_DELTA", "delta": to_delta(delta, denominator)})
+        else:
+            events_data.append({"type": EVENT_TYPES[event_type], "pitch": pitch})
+    return events_data
+
+
+def to_delta(delta, denominator):
+    """
+    Restores a delta in the type it had in the dict form.
+
+    Args:
+        delta (float): The delta.
+        denominator (int): Denominator of a Fraction delta, or 0.
+
+    Returns:
+        float/Fraction: The delta.
+    """
+    if denominator:
+        return Fraction(round(delta * denominator), denominator)
+    return delta
+
+
+def song_data_to_array(song_data):
+    """
+    Converts song data into its compact representation.
+
+    Args:
+        song_data (dict): Song data as produced by `preprocess_music21`.
+
+    Returns:
+        SongArray: The compact song.
+    """
+    tracks = []
+    for track_data in song_data["tracks"]:
+        rows = []
+        bar_offsets = np.zeros(len(track_data["bars"]) + 1, dtype=np.int64)
+        for bar_index, bar_data in enumerate(track_data["bars"]):
+            rows += _events_data_to_rows(bar_data["events"])
+            bar_offsets[bar_index + 1] = len(rows)
+        events = np.array(rows, dtype=EVENT_DTYPE)
+        tracks.append(
+            TrackArray(
+                track_data["name"], track_data["number"], events, bar_offsets, drums=track_data.get("drums", False)
+            )
+        )
+    return SongArray(song_data["title"], song_data["number"], tracks)
+
+
+def songs_data_to_arrays(songs_data):
+    """
+    Converts a list of song data into compact songs.
+
+    Args:
+        songs_data (list): Song data dicts.
+
+    Returns:
+        list: SongArrays.
+    """
+    return [song_data_to_array(song_data) for song_data in songs_data]
@@ -0,0 +1,400 @@
+# Copyright 2021 Tristan Behrens.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Lint as: python3
+
+"""
+Sharded on-disk store of song data.
+
+A store is a directory of shards. Each shard is a data file of binary song records and an index file with
+the offset of each record, followed by the end of the last one. A record holds the metadata of the song as
+JSON, and the bar offsets and event array of each track in the layout of `TrackArray`, so reading a song
+from a memory-mapped shard only wraps the mapped bytes in arrays.
+
+Record layout, little endian, padded to 8 bytes before each bar offset array and after each record:
+
+    uint32 metadata length, metadata JSON {"title", "number", "tracks": [{"name", "number", "drums"}]}
+    for each track: uint64 bars number, uint64 events number, int64 bar offsets, events with `EVENT_DTYPE`
+"""
+
+import os
+import glob
+import json
+import mmap
+import struct
+import numpy as np
+from .. import logging
+from .songarray import EVENT_DTYPE, SongArray, TrackArray, song_data_to_array
+
+logger = logging.create_logger("songstore")
+
+# Magic bytes and format version at the start of each shard data file.
+SHARD_MAGIC = b"SONGS\x00\x00\x01"
+
+# Shards are closed once they reach this size, so that a store can be copied and read in parts.
+DEFAULT_MAX_SHARD_SIZE_BYTES = 1 << 28
+
+METADATA_LENGTH = struct.Struct("<I")
+TRACK_HEADER = struct.Struct("<QQ")
+OFFSET_DTYPE = np.dtype("<u8")
+
+
+class SongStoreReader:
+    """
+    Random access to the songs of a store through memory-mapped shards.
+
+    Songs are returned as SongArrays whose arrays are views into the mapped shards, so they are only valid
+    while the reader is open. Only the records listed in the index files are read, so a reader never sees
+    a record that is still being written.
+
+    Attributes:
+        store_path (str): Directory of the store.
+    """
+
+    def __init__(self, store_path):
+        """
+        Opens a store.
+
+        Args:
+            store_path (str): Directory of the store.
+        """
+        if not os.path.isdir(store_path):
+            error_string = f"Song store {store_path} does not exist."
+            logger.error(error_string)
+            raise Exception(error_string)
+
+        self.store_path = store_path
+        self.__shards = []
+        for data_path, offsets in get_shards(store_path):
+            if len(offsets) < 2:
+                continue
+            with open(data_path, "rb") as f:
+                shard_mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            if shard_mmap[: len(SHARD_MAGIC)] != SHARD_MAGIC:
+                shard_mmap.close()
+                error_string = f"Song store shard {data_path} is not in a supported format."
+                logger.error(error_string)
+                raise Exception(error_string)
+            self.__shards.append((shard_mmap, offsets))
+        self.__shard_starts = np.cumsum([0] + [len(offsets) - 1 for _, offsets in self.__shards])
+
+    def __len__(self):
+        return int(self.__shard_starts[-1])
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(f"Song index {index} is out of range for a store of {len(self)} songs.")
+
+        shard_index = int(np.searchsorted(self.__shard_starts, index, side="right")) - 1
+        shard_mmap, offsets = self.__shards[shard_index]
+        return read_song_record(shard_mmap, int(offsets[index - self.__shard_starts[shard_index]]))
+
+    def __iter__(self):
+        # Read the records in file order, which is sequential I/O.
+        for shard_mmap, offsets in self.__shards:
+            for offset in offsets[:-1].tolist():
+                yield read_song_record(shard_mmap, offset)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """
+        Closes the shards. Shards still referenced by songs are unmapped once the songs are garbage collected.
+        """
+        for shard_mmap, _ in self.__shards:
+            try:
+                shard_mmap.close()
+            except BufferError:
+                pass
+        self.__shards = []
+        self.__shard_starts = np.zeros(1, dtype=np.int64)
+
+
+class SongStoreWriter:
+    """
+    Appends songs to a store.
+
+    Added songs are buffered in the current shard and become visible to readers once `flush` writes the
+    index file. A writer opened on an existing store first discards records that were written but never
+    flushed, and can truncate the store to the songs a caller knows to be committed.
+
+    Attributes:
+        store_path (str): Directory of the store.
+        max_shard_size_bytes (int): Size after which a new shard is started.
+        songs_number (int): Number of songs in the store, including those not flushed yet.
+    """
+
+    def __init__(self, store_path, songs_number=None, max_shard_size_bytes=DEFAULT_MAX_SHARD_SIZE_BYTES):
+        """
+        Opens a store for appending and creates its directory.
+
+        Args:
+            store_path (str): Directory of the store.
+            songs_number (int, optional): Number of songs to keep from an existing store. Defaults to None,
+                keeping all flushed songs.
+            max_shard_size_bytes (int, optional): Size after which a new shard is started.
+                Defaults to `DEFAULT_MAX_SHARD_SIZE_BYTES`.
+        """
+        os.makedirs(store_path, exist_ok=True)
+        self.store_path = store_path
+        self.max_shard_size_bytes = max_shard_size_bytes
+        self.__shard_file = None
+        self.__offsets = None
+
+        shards = get_shards(store_path)
+        stored_songs_number = sum(len(offsets) - 1 for _, offsets in shards)
+        if songs_number is None:
+            songs_number = stored_songs_number
+        elif songs_number > stored_songs_number:
+            error_string = (
+                f"Song store {store_path} holds {stored_songs_number} songs, but {songs_number} were expected."
+            )
+            logger.error(error_string)
+            raise Exception(error_string)
+
+        # Remove the shards that were never flushed and truncate the others to the songs to keep.
+        indexed_data_paths = {data_path for data_path, _ in shards}
+        for data_path in glob.glob(os.path.join(store_path, "shard_*.bin")):
+            if data_path not in indexed_data_paths:
+                os.remove(data_path)
+        kept_songs_number = 0
+        for data_path, offsets in shards:
+            keep = min(len(offsets) - 1, songs_number - kept_songs_number)
+            if keep <= 0:
+                os.remove(get_index_path(data_path))
+                os.remove(data_path)
+                continue
+            kept_songs_number += keep
+            if keep < len(offsets) - 1 or os.path.getsize(data_path) != offsets[-1]:
+                with open(data_path, "r+b") as f:
+                    f.truncate(int(offsets[keep]))
+                write_index(data_path, offsets[: keep + 1])
+
+        self.songs_number = songs_number
+        self.__shard_index = len(get_shards(store_path))
+
+    def add(self, song_data):
+        """
+        Appends a song.
+
+        Args:
+            song_data (dict/SongArray): Song data or compact song.
+        """
+        if self.__shard_file is None:
+            self.__open_shard()
+        self.__shard_file.write(song_data_to_record(song_data))
+        self.__offsets.append(self.__shard_file.tell())
+        self.songs_number += 1
+
+        if self.__offsets[-1] >= self.max_shard_size_bytes:
+            self.flush()
+            self.__close_shard()
+            self.__shard_index += 1
+
+    def flush(self):
+        """
+        Flushes the added songs to disk and writes the index, which makes them visible to readers.
+        """
+        if self.__shard_file is None:
+            return
+        self.__shard_file.flush()
+        os.fsync(self.__shard_file.fileno())
+        write_index(self.__shard_file.name, np.array(self.__offsets, dtype=OFFSET_DTYPE))
+
+    def close(self):
+        """
+        Flushes the added songs and closes the current shard.
+        """
+        self.flush()
+        self.__close_shard()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __open_shard(self):
+        """
+        Opens the last shard for appending if it is not full, or starts a new one.
+        """
+        shards = get_shards(self.store_path)
+        if shards and shards[-1][1][-1] < self.max_shard_size_bytes:
+            data_path, offsets = shards[-1]
+            self.__shard_file = open(data_path, "ab")
+            self.__offsets = offsets.tolist()
+            return
+
+        data_path = os.path.join(self.store_path, f"shard_{self.__shard_index:05d}.bin")
+        self.__shard_file = open(data_path, "wb")
+        self.__shard_file.write(SHARD_MAGIC)
+        self.__offsets = [len(SHARD_MAGIC)]
+
+    def __close_shard(self):
+        if self.__shard_file is not None:
+            self.__shard_file.close()
+        self.__shard_file = None
+        self.__offsets = None
+
+
+def get_index_path(data_path):
+    """
+    Returns the path of the index file of a shard.
+
+    Args:
+        data_path (str): Path to the data file of the shard.
+
+    Returns:
+        str: Path to the index file.
+    """
+    return data_path[: -len(".bin")] + ".idx"
+
+
+def get_shards(store_path):
+    """
+    Lists the shards of a store that have an index file, in order.
+
+    Args:
+        store_path (str): Directory of the store.
+
+    Returns:
+        list: (path to the data file, record offsets followed by the end of the last record) tuples.
+    """
+    shards = []
+    for data_path in sorted(glob.glob(os.path.join(store_path, "shard_*.bin"))):
+        index_path = get_index_path(data_path)
+        if os.path.exists(index_path):
+            shards.append((data_path, np.fromfile(index_path, dtype=OFFSET_DTYPE)))
+    return shards
+
+
+def write_index(data_path, offsets):
+    """
+    Writes the index file of a shard, replacing the previous one atomically.
+
+    Args:
+        data_path (str): Path to the data file of the shard.
+        offsets (numpy.ndarray): Record offsets followed by the end of the last record.
+    """
+    index_path = get_index_path(data_path)
+    with open(index_path + ".tmp", "wb") as f:
+        f.write(np.asarray(offsets, dtype=OFFSET_DTYPE).tobytes())
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(index_path + ".tmp", index_path)
+
+
+def song_data_to_record(song_data):
+    """
+    Serializes a song into a record.
+
+    Args:
+        song_data (dict/SongArray): Song data or compact song.
+
+    Returns:
+        bytes: The record.
+    """
+    if not isinstance(song_data, SongArray):
+        song_data = song_data_to_array(song_data)
+
+    metadata = {
+        "title": song_data.title,
+        "number": song_data.number,
+        "tracks": [{"name": track.name, "number": track.number, "drums": track.drums} for track in song_data.tracks],
+    }
+    metadata_bytes = json.dumps(metadata).encode("utf-8")
+    parts = [
+        METADATA_LENGTH.pack(len(metadata_bytes)),
+        metadata_bytes,
+        _padding(METADATA_LENGTH.size + len(metadata_bytes)),
+    ]
+    for track in song_data.tracks:
+        events = np.ascontiguousarray(track.events, dtype=EVENT_DTYPE).tobytes()
+        parts += [
+            TRACK_HEADER.pack(track.bars_number, len(track.events)),
+            np.ascontiguousarray(track.bar_offsets, dtype="<i8").tobytes(),
+            events,
+            _padding(len(events)),
+        ]
+    return b"".join(parts)
+
+
+def read_song_record(buffer, offset):
+    """
+    Reads a record into a compact song whose arrays are views into the buffer.
+
+    Args:
+        buffer (buffer): Shard data, e.g. a memory map.
+        offset (int): Offset of the record.
+
+    Returns:
+        SongArray: The song.
+    """
+    (metadata_length,) = METADATA_LENGTH.unpack_from(buffer, offset)
+    offset += METADATA_LENGTH.size
+    metadata = json.loads(bytes(buffer[offset : offset + metadata_length]))
+    offset += metadata_length
+    offset += len(_padding(METADATA_LENGTH.size + metadata_length))
+
+    tracks = []
+    for track_metadata in metadata["tracks"]:
+        bars_number, events_number = TRACK_HEADER.unpack_from(buffer, offset)
+        offset += TRACK_HEADER.size
+        bar_offsets = np.frombuffer(buffer, dtype="<i8", count=bars_number + 1, offset=offset)
+        offset += bar_offsets.nbytes
+        events = np.frombuffer(buffer, dtype=EVENT_DTYPE, count=events_number, offset=offset)
+        offset += events.nbytes + len(_padding(events.nbytes))
+        tracks.append(
+            TrackArray(
+                track_metadata["name"], track_metadata["number"], events, bar_offsets, drums=track_metadata["drums"]
+            )
+        )
+    return SongArray(metadata["title"], metadata["number"], tracks)
+
+
+def write_song_store(songs_data, store_path, max_shard_size_bytes=DEFAULT_MAX_SHARD_SIZE_BYTES):
+    """
+    Writes songs to a new store.
+
+    Args:
+        songs_data (iterable): Song data or compact songs.
+        store_path (str): Directory of the store. Must not hold a store yet.
+        max_shard_size_bytes (int, optional): Size after which a new shard is started.
+            Defaults to `DEFAULT_MAX_SHARD_SIZE_BYTES`.
+
+    Returns:
+        int: Number of written songs.
+    """
+    if os.path.isdir(store_path) and get_shards(store_path):
+        error_string = f"Song store {store_path} already exists."
+        logger.error(error_string)
+        raise Exception(error_string)
+
+    with SongStoreWriter(store_path, max_shard_size_bytes=max_shard_size_bytes) as writer:
+        for song_data in songs_data:
+            writer.add(song_data)
+    return writer.songs_number
+
+
+def _padding(length):
+    """
+    Returns the zero bytes that pad the given length to a multiple of 8.
+    """
+    return b"\x00" * (-length % 8)
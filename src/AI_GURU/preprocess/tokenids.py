@@ -0,0 +1,406 @@
+# Copyright 2021 Tristan Behrens.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Lint as: python3
+
+"""
+Encoding of song data straight into the token IDs of a fixed vocabulary.
+
+`encode.py` builds every token as a string, which the tokenizer then splits and looks up again. Here each
+distinct token is looked up once, and every track is turned into one array of IDs with its bars wrapped in
+BAR_START and BAR_END, so that the tracks of each window are slices of that array.
+"""
+
+import json
+import itertools
+import random
+import numpy as np
+from .. import logging
+from .encode import get_bar_indices, get_bars_number, get_window_densities
+from .songarray import TrackArray, EVENT_TYPES, NOTE_ON, NOTE_OFF, TIME_DELTA, to_delta
+
+logger = logging.create_logger("tokenids")
+
+
+class TokenIdEncoder:
+    """
+    Maps tokens to the IDs of a word level vocabulary, as `tokenizer.encode(" ".join(tokens))` does with the
+    tokenizers saved by the DatasetCreator.
+
+    Attributes:
+        vocabulary (dict): ID of each token.
+        unk_token_id (int): ID of tokens missing from the vocabulary.
+        added_tokens (list): Tokens the tokenizer matches in the text before splitting it.
+    """
+
+    def __init__(self, vocabulary, unk_token="[UNK]", added_tokens=None):
+        """
+        Initializes the TokenIdEncoder.
+
+        Args:
+            vocabulary (dict): ID of each token.
+            unk_token (str, optional): Token for tokens missing from the vocabulary. Defaults to "[UNK]".
+            added_tokens (list, optional): Tokens the tokenizer matches in the text before splitting it.
+                Defaults to None.
+        """
+        self.vocabulary = vocabulary
+        self.unk_token_id = vocabulary[unk_token]
+        self.added_tokens = added_tokens or []
+        self.__token_ids = {}
+        self.__event_ids = {}
+        self.__time_delta_ids = {}
+
+    @classmethod
+    def from_tokenizer_json(cls, tokenizer_json):
+        """
+        Creates a TokenIdEncoder from the JSON of a tokenizer.
+
+        Only tokenizers that split on whitespace and look the words up in a word level vocabulary, without
+        normalization or post processing, map tokens one to one and are supported.
+
+        Args:
+            tokenizer_json (str): Content of a tokenizer.json file.
+
+        Returns:
+            TokenIdEncoder: The encoder.
+
+        Raises:
+            Exception: If the tokenizer is not supported.
+        """
+        tokenizer_data = json.loads(tokenizer_json)
+        model = tokenizer_data["model"]
+        pre_tokenizer = tokenizer_data.get("pre_tokenizer") or {}
+        if (
+            model.get("type") != "WordLevel"
+            or pre_tokenizer.get("type") != "WhitespaceSplit"
+            or tokenizer_data.get("normalizer") is not None
+            or tokenizer_data.get("post_processor") is not None
+        ):
+            error_string = (
+                f"Tokenizer with model {model.get('type')} and pre tokenizer {pre_tokenizer.get('type')} is not "
+                f"supported. Only WordLevel tokenizers splitting on whitespace map tokens to IDs one to one."
+            )
+            logger.error(error_string)
+            raise Exception(error_string)
+
+        added_tokens = [added_token["content"] for added_token in tokenizer_data.get("added_tokens", [])]
+        return cls(model["vocab"], unk_token=model["unk_token"], added_tokens=added_tokens)
+
+    @classmethod
+    def from_file(cls, tokenizer_path):
+        """
+        Creates a TokenIdEncoder from a tokenizer.json file.
+
+        Args:
+            tokenizer_path (str): Path to the tokenizer file.
+
+        Returns:
+            TokenIdEncoder: The encoder.
+        """
+        with open(tokenizer_path, "r") as f:
+            return cls.from_tokenizer_json(f.read())
+
+    def get_token_id(self, token):
+        """
+        Looks up the ID of a token.
+
+        Args:
+            token (str): The token.
+
+        Returns:
+            int: The ID, or the ID of the unknown token.
+
+        Raises:
+            Exception: If the token contains an added token, which the tokenizer would split it at.
+        """
+        token_id = self.__token_ids.get(token)
+        if token_id is None:
+            if any(added_token in token and added_token != token for added_token in self.added_tokens):
+                error_string = f"Token {token} contains an added token and cannot be encoded to a single ID."
+                logger.error(error_string)
+                raise Exception(error_string)
+            token_id = self.vocabulary.get(token, self.unk_token_id)
+            self.__token_ids[token] = token_id
+        return token_id
+
+    def get_event_id(self, event_type, pitch):
+        """
+        Looks up the ID of a NOTE_ON or NOTE_OFF event.
+
+        Args:
+            event_type (str): "NOTE_ON" or "NOTE_OFF".
+            pitch (int): Transposed pitch.
+
+        Returns:
+            int: The ID.
+        """
+        token_id = self.__event_ids.get((event_type, pitch))
+        if token_id is None:
+            token_id = self.get_token_id(f"{event_type}={pitch}")
+            self.__event_ids[(event_type, pitch)] = token_id
+        return token_id
+
+    def get_time_delta_id(self, delta):
+        """
+        Looks up the ID of a TIME_DELTA event.
+
+        Args:
+            delta (float/Fraction): The delta. Equal floats and Fractions are different tokens.
+
+        Returns:
+            int: The ID.
+        """
+        key = (type(delta), delta)
+        token_id = self.__time_delta_ids.get(key)
+        if token_id is None:
+            token_id = self.get_token_id(f"TIME_DELTA={delta}")
+            self.__time_delta_ids[key] = token_id
+        return token_id
+
+    def encode_tokens(self, tokens):
+        """
+        Maps tokens to their IDs.
+
+        Args:
+            tokens (list): The tokens.
+
+        Returns:
+            numpy.ndarray: The IDs as int64.
+        """
+        return np.array([self.get_token_id(token) for token in tokens], dtype=np.int64)
+
+
+def encode_song_data_ids(
+    song_data, token_id_encoder, transpositions, permute, window_size_bars, hop_length_bars, density_bins, rng=None
+):
+    """
+    Encodes a single song into token ID sequences with dataset context. Gives the IDs of the tokens of
+    `encode_song_data` without bar fill, and permutes the tracks with the same random calls.
+
+    Args:
+        song_data (dict/SongArray): Dictionary representing a single song, or a compact song.
+        token_id_encoder (TokenIdEncoder): The vocabulary.
+        transpositions (list): List of transposition values.
+        permute (bool): Whether to permute tracks randomly.
+        window_size_bars (int): Number of bars in a window.
+        hop_length_bars (int): Hop length between consecutive windows.
+        density_bins (list): Density bins for note events.
+        rng (random.Random, optional): Random generator for permuting the tracks. Defaults to None, using the
+            global random state.
+
+    Returns:
+        list: Token ID sequences for the song as int64 arrays.
+    """
+    if rng is None:
+        rng = random
+
+    bar_indices = get_bar_indices(get_bars_number(song_data), window_size_bars, hop_length_bars)
+    tracks = song_data["tracks"]
+
+    piece_start_id = token_id_encoder.get_token_id("PIECE_START")
+    track_start_id = token_id_encoder.get_token_id("TRACK_START")
+    track_end_id = token_id_encoder.get_token_id("TRACK_END")
+    instrument_ids = [token_id_encoder.get_token_id(get_instrument_token(track_data)) for track_data in tracks]
+    tracks_density_ids = [
+        [token_id_encoder.get_token_id(f"DENSITY={density}") for density in densities]
+        for densities in (get_window_densities(track_data, bar_indices, density_bins) for track_data in tracks)
+    ]
+
+    # The bars of each track are encoded once per transposition. Drums are never transposed.
+    tracks_bar_ids = {}
+
+    token_id_sequences = []
+    for (window_index, (bar_start_index, bar_end_index)), transposition in itertools.product(
+        enumerate(bar_indices), transpositions
+    ):
+        track_data_indices = list(range(len(tracks)))
+        if permute:
+            rng.shuffle(track_data_indices)
+
+        parts = [[piece_start_id]]
+        for track_data_index in track_data_indices:
+            track_data = tracks[track_data_index]
+            track_transposition = 0 if track_data.get("drums", False) else transposition
+            key = (track_data_index, track_transposition)
+            if key not in tracks_bar_ids:
+                tracks_bar_ids[key] = encode_track_bars_ids(track_data, token_id_encoder, track_transposition)
+            bar_ids, bar_offsets = tracks_bar_ids[key]
+
+            bars_number = len(bar_offsets) - 1
+            start = bar_offsets[min(bar_start_index, bars_number)]
+            end = bar_offsets[min(bar_end_index, bars_number)]
+            parts += [
+                [track_start_id, instrument_ids[track_data_index], tracks_density_ids[track_data_index][window_index]],
+                bar_ids[start:end],
+                [track_end_id],
+            ]
+        token_id_sequences += [np.concatenate(parts).astype(np.int64, copy=False)]
+
+    return token_id_sequences
+
+
+def encode_song_data_singular_ids(song_data, density, token_id_encoder):
+    """
+    Encodes song data of one MIDI file into token IDs. Gives the IDs of the tokens of `encode_song_data_singular`.
+
+    Args:
+        song_data (dict/SongArray): Dictionary representing a single song, or a compact song.
+        density (int): Density bin for the song.
+        token_id_encoder (TokenIdEncoder): The vocabulary.
+
+    Returns:
+        numpy.ndarray: The token IDs as int64.
+    """
+    parts = [[token_id_encoder.get_token_id("PIECE_START")]]
+    if song_data is None:
+        return np.array(parts[0], dtype=np.int64)
+
+    density_id = token_id_encoder.get_token_id(f"DENSITY={density}")
+    for track_data in song_data["tracks"]:
+        bar_ids, _ = encode_track_bars_ids(track_data, token_id_encoder, 0)
+        parts += [
+            [
+                token_id_encoder.get_token_id("TRACK_START"),
+                token_id_encoder.get_token_id(get_instrument_token(track_data)),
+                density_id,
+            ],
+            bar_ids,
+            [token_id_encoder.get_token_id("TRACK_END")],
+        ]
+    return np.concatenate(parts).astype(np.int64, copy=False)
+
+
+def encode_track_bars_ids(track_data, token_id_encoder, transposition):
+    """
+    Encodes all bars of a track into one array, each bar wrapped in BAR_START and BAR_END.
+
+    Args:
+        track_data (dict/TrackArray): Track data or compact track.
+        token_id_encoder (TokenIdEncoder): The vocabulary.
+        transposition (int): Transposition value.
+
+    Returns:
+        tuple: (numpy.ndarray of the token IDs, list of the index of each bar in it followed by the length).
+    """
+    if isinstance(track_data, TrackArray):
+        event_ids = encode_events_array_ids(track_data.events, token_id_encoder, transposition)
+        event_offsets = track_data.bar_offsets
+    else:
+        bars_events = [bar_data["events"] for bar_data in track_data["bars"]]
+        event_ids = np.array(
+            [
+                encode_event_data_id(event_data, token_id_encoder, transposition)
+                for events in bars_events
+                for event_data in events
+            ],
+            dtype=np.int64,
+        )
+        event_offsets = np.cumsum([0] + [len(events) for events in bars_events])
+
+    # Every bar before an event adds a BAR_START and a BAR_END in front of it, its own bar a BAR_START.
+    bars_number = len(event_offsets) - 1
+    bar_offsets = event_offsets + 2 * np.arange(bars_number + 1)
+    bar_ids = np.empty(bar_offsets[-1], dtype=np.int64)
+    bar_ids[bar_offsets[:-1]] = token_id_encoder.get_token_id("BAR_START")
+    bar_ids[bar_offsets[1:] - 1] = token_id_encoder.get_token_id("BAR_END")
+    event_bar_indices = np.repeat(np.arange(bars_number), np.diff(event_offsets))
+    bar_ids[np.arange(len(event_ids)) + 2 * event_bar_indices + 1] = event_ids
+    return bar_ids, bar_offsets.tolist()
+
+
+def encode_events_array_ids(events, token_id_encoder, transposition):
+    """
+    Encodes compact events into token IDs, looking up each distinct event once.
+
+    Args:
+        events (numpy.ndarray): Events with dtype `EVENT_DTYPE`.
+        token_id_encoder (TokenIdEncoder): The vocabulary.
+        transposition (int): Transposition value.
+
+    Returns:
+        numpy.ndarray: The token IDs as int64.
+    """
+    event_ids = np.empty(len(events), dtype=np.int64)
+    for event_type in [NOTE_ON, NOTE_OFF]:
+        mask = events["type"] == event_type
+        pitches, inverse = np.unique(events["pitch"][mask].astype(np.int64) + transposition, return_inverse=True)
+        pitch_ids = [token_id_encoder.get_event_id(EVENT_TYPES[event_type], pitch) for pitch in pitches.tolist()]
+        event_ids[mask] = np.array(pitch_ids, dtype=np.int64)[inverse.reshape(-1)]
+
+    mask = events["type"] == TIME_DELTA
+    deltas = np.stack([events["delta"][mask], events["denominator"][mask].astype(np.float64)], axis=1)
+    deltas, inverse = np.unique(deltas, axis=0, return_inverse=True)
+    delta_ids = [
+        token_id_encoder.get_time_delta_id(to_delta(delta, int(denominator))) for delta, denominator in deltas.tolist()
+    ]
+    event_ids[mask] = np.array(delta_ids, dtype=np.int64)[inverse.reshape(-1)]
+    return event_ids
+
+
+def encode_event_data_id(event_data, token_id_encoder, transposition):
+    """
+    Encodes an event dict into its token ID.
+
+    Args:
+        event_data (dict): The event.
+        token_id_encoder (TokenIdEncoder): The vocabulary.
+        transposition (int): Transposition value.
+
+    Returns:
+        int: The token ID.
+    """
+    if event_data["type"] == "TIME_DELTA":
+        return token_id_encoder.get_time_delta_id(event_data["delta"])
+    return token_id_encoder.get_event_id(event_data["type"], event_data["pitch"] + transposition)
+
+
+def get_instrument_token(track_data):
+    """
+    Returns the instrument token of a track.
+
+    Args:
+        track_data (dict/TrackArray): Track data or compact track.
+
+    Returns:
+        str: "INST=DRUMS" or "INST=" followed by the number of the track.
+    """
+    if track_data.get("drums", False):
+        return "INST=DRUMS"
+    return f"INST={track_data['number']}"
+
+
+def check_token_ids(tokenizer, tokens, token_ids):
+    """
+    Checks that token IDs are identical to encoding the joined tokens with the tokenizer.
+
+    Args:
+        tokenizer: A `tokenizers.Tokenizer` or a `PreTrainedTokenizerFast`.
+        tokens (list): The tokens.
+        token_ids (numpy.ndarray): Their IDs from a TokenIdEncoder.
+
+    Returns:
+        bool: True if the IDs are int64 and equal to the ones of the tokenizer.
+    """
+    encoding = tokenizer.encode(" ".join(tokens))
+    expected_token_ids = np.array(getattr(encoding, "ids", encoding), dtype=np.int64)
+    token_ids = np.asarray(token_ids)
+    if token_ids.dtype != np.int64 or not np.array_equal(token_ids, expected_token_ids):
+        mismatches = np.flatnonzero(token_ids[: len(expected_token_ids)] != expected_token_ids[: len(token_ids)])
+        index = int(mismatches[0]) if len(mismatches) else min(len(token_ids), len(expected_token_ids))
+        logger.error(
+            f"Token IDs differ from the tokenizer at index {index} of {len(expected_token_ids)}, "
+            f"dtype {token_ids.dtype}."
+        )
+        return False
+    return True
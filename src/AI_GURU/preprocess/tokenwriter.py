@@ -0,0 +1,126 @@
+# Copyright 2021 Tristan Behrens.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Lint as: python3
+
+import time
+
+# Size of the buffer collecting token sequences before they are written to the file.
+DEFAULT_BUFFER_SIZE_BYTES = 1 << 22
+
+
+class TokenSequenceWriter:
+    """
+    Writes token sequences to a file, one line per sequence, through a large buffer.
+
+    Sequences are joined into lines as they come, so a generator of sequences is written without holding more
+    than the buffer in memory. The writer counts the written sequences and bytes for reporting the throughput.
+
+    Attributes:
+        file: File opened for writing or appending in binary mode.
+        buffer_size_bytes (int): Size of the buffer in bytes.
+        sequences_number (int): Number of written sequences.
+        bytes_number (int): Number of written bytes, including those still in the buffer.
+    """
+
+    def __init__(self, file, buffer_size_bytes=DEFAULT_BUFFER_SIZE_BYTES):
+        """
+        Initializes the TokenSequenceWriter.
+
+        Args:
+            file: File opened for writing or appending in binary mode.
+            buffer_size_bytes (int, optional): Size of the buffer in bytes. Defaults to `DEFAULT_BUFFER_SIZE_BYTES`.
+        """
+        self.file = file
+        self.buffer_size_bytes = buffer_size_bytes
+        self.sequences_number = 0
+        self.bytes_number = 0
+        self.__buffer = bytearray()
+        self.__start_time = time.perf_counter()
+
+    @property
+    def name(self):
+        return self.file.name
+
+    def write(self, token_sequence):
+        """
+        Writes a token sequence.
+
+        Args:
+            token_sequence (list): The tokens.
+        """
+        line = (" ".join(token_sequence) + "\n").encode("utf-8")
+        self.__buffer += line
+        self.sequences_number += 1
+        self.bytes_number += len(line)
+        if len(self.__buffer) >= self.buffer_size_bytes:
+            self.__write_buffer()
+
+    def write_all(self, token_sequences):
+        """
+        Writes token sequences one at a time.
+
+        Args:
+            token_sequences (iterable): The token sequences, e.g. from `iterate_token_sequences`.
+        """
+        for token_sequence in token_sequences:
+            self.write(token_sequence)
+
+    def tell(self):
+        """
+        Returns the position in the file after the last written sequence, including the buffered ones.
+
+        Returns:
+            int: The position in bytes.
+        """
+        return self.file.tell() + len(self.__buffer)
+
+    def flush(self):
+        """
+        Writes the buffer to the file and flushes the file.
+        """
+        self.__write_buffer()
+        self.file.flush()
+
+    def close(self):
+        """
+        Writes the buffer to the file and closes the file.
+        """
+        self.__write_buffer()
+        self.file.close()
+
+    def get_stats(self):
+        """
+        Reports the throughput since the writer was created.
+
+        Returns:
+            dict: The "sequences" and "bytes" written, the "seconds" elapsed, and the "sequences_per_second"
+            and "bytes_per_second".
+        """
+        seconds = time.perf_counter() - self.__start_time
+        return {
+            "sequences": self.sequences_number,
+            "bytes": self.bytes_number,
+            "seconds": seconds,
+            "sequences_per_second": self.sequences_number / seconds if seconds > 0 else 0.0,
+            "bytes_per_second": self.bytes_number / seconds if seconds > 0 else 0.0,
+        }
+
+    def __write_buffer(self):
+        """
+        Writes the buffer to the file and empties it.
+        """
+        if self.__buffer:
+            self.file.write(self.__buffer)
+            self.__buffer = bytearray()
@@ -0,0 +1,111 @@
+# Copyright 2021 Tristan Behrens.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Lint as: python3
+
+"""
+Word level tokenizers built from token counts instead of trained on the token sequence files.
+
+The vocabulary of the encoding is a closed set, so the tokenizer does not need to read the corpus again. The
+counts gathered while the token sequences are written give the same vocabulary and IDs as training a
+`WordLevelTrainer` on them: the special tokens first, then the tokens by decreasing count, ties by token.
+"""
+
+from tokenizers import Tokenizer
+from tokenizers.models import WordLevel
+from tokenizers.pre_tokenizers import WhitespaceSplit
+from .. import logging
+
+logger = logging.create_logger("vocabulary")
+
+# Special tokens at the start of the vocabulary of the tokenizers saved by the DatasetCreator.
+SPECIAL_TOKENS = ["[UNK]", "[CLS]", "[SEP]", "[PAD]", "[MASK]"]
+
+# Tokens without a value, which structure the token sequences.
+STRUCTURAL_TOKENS = ["PIECE_START", "TRACK_START", "TRACK_END", "BAR_START", "BAR_END"]
+
+# Number of MIDI programs and pitches.
+MIDI_VALUES_NUMBER = 128
+
+
+def get_grammar_tokens(density_bins_number, transpositions):
+    """
+    Lists the tokens the encoding can produce, except for the time deltas, which depend on the quantization.
+
+    Args:
+        density_bins_number (int): Number of density bins.
+        transpositions (list): Transpositions the songs are encoded with.
+
+    Returns:
+        list: The tokens.
+    """
+    tokens = list(STRUCTURAL_TOKENS)
+    tokens += [f"INST={number}" for number in range(MIDI_VALUES_NUMBER)] + ["INST=DRUMS"]
+
+    # The densities are the bin indices of `np.digitize`, from 0 to the number of thresholds.
+    thresholds_number = len(range(100 // density_bins_number, 100, 100 // density_bins_number))
+    tokens += [f"DENSITY={density}" for density in range(thresholds_number + 1)]
+
+    pitches = range(min([0, *transpositions]), MIDI_VALUES_NUMBER + max([0, *transpositions]))
+    for event_type in ["NOTE_ON", "NOTE_OFF"]:
+        tokens += [f"{event_type}={pitch}" for pitch in pitches]
+    return tokens
+
+
+def get_vocabulary(token_counts, grammar_tokens=None, special_tokens=SPECIAL_TOKENS):
+    """
+    Assigns the IDs of the tokens as `WordLevelTrainer` does.
+
+    Args:
+        token_counts (dict): Number of occurrences of each token in the token sequences.
+        grammar_tokens (list, optional): Tokens to add even if they do not occur, after those that do.
+            Defaults to None.
+        special_tokens (list, optional): Tokens with the first IDs. Defaults to SPECIAL_TOKENS.
+
+    Returns:
+        dict: ID of each token.
+    """
+    counts = {token: 0 for token in grammar_tokens or []}
+    counts.update(token_counts)
+    tokens = [token for token in counts if token not in special_tokens]
+    tokens = list(special_tokens) + sorted(tokens, key=lambda token: (-counts[token], token))
+    return {token: token_id for token_id, token in enumerate(tokens)}
+
+
+def create_tokenizer(token_counts, grammar_tokens=None, special_tokens=SPECIAL_TOKENS, unk_token="[UNK]"):
+    """
+    Creates a word level tokenizer splitting on whitespace, like one trained on the token sequences.
+
+    Args:
+        token_counts (dict): Number of occurrences of each token in the token sequences.
+        grammar_tokens (list, optional): Tokens to add even if they do not occur. Defaults to None.
+        special_tokens (list, optional): Special tokens, with the first IDs. Defaults to SPECIAL_TOKENS.
+        unk_token (str, optional): Token for tokens missing from the vocabulary. Defaults to "[UNK]".
+
+    Returns:
+        Tokenizer: The tokenizer.
+
+    Raises:
+        Exception: If the unknown token is not a special token.
+    """
+    if unk_token not in special_tokens:
+        error_string = f"Unknown token {unk_token} must be one of the special tokens {special_tokens}."
+        logger.error(error_string)
+        raise Exception(error_string)
+
+    vocabulary = get_vocabulary(token_counts, grammar_tokens, special_tokens)
+    tokenizer = Tokenizer(WordLevel(vocab=vocabulary, unk_token=unk_token))
+    tokenizer.pre_tokenizer = WhitespaceSplit()
+    tokenizer.add_special_tokens(special_tokens)
+    return tokenizer
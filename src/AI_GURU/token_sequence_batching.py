@@ -0,0 +1,239 @@
+# Copyright 2021 Tristan Behrens.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Lint as: python3
+
+"""
+Batching token sequences of similar lengths, padded to the longest sequence of each batch.
+
+Padding every example to the block size spends most of the attention on padding when the sequences are much
+shorter. The LengthGroupedBatchSampler batches examples of similar lengths and the DynamicPaddingCollator pads
+each batch only to its longest example, masking the padding out of the attention and of the loss.
+"""
+
+import numpy as np
+import torch
+from torch.utils.data import DataLoader, Sampler
+from transformers import Trainer
+from transformers.trainer_utils import seed_worker
+from . import logging
+
+logger = logging.create_logger("token_sequence_batching")
+
+# Label ignored by the loss of the transformers models.
+IGNORED_LABEL_ID = -100
+
+
+def get_padding_fraction(lengths, batches, pad_length=None):
+    """
+    Computes the fraction of the padded tokens in batches.
+
+    Args:
+        lengths (np.ndarray): Number of tokens of each example.
+        batches (iterable): Lists of the indices of the examples of each batch.
+        pad_length (int, optional): Length every example is padded to. Defaults to None, for padding every batch
+            to its longest example.
+
+    Returns:
+        float: Fraction of the tokens of the batches that are padding.
+    """
+    lengths = np.asarray(lengths)
+    tokens_number = 0
+    padded_tokens_number = 0
+    for batch in batches:
+        batch_lengths = lengths[batch]
+        tokens_number += int(batch_lengths.sum())
+        padded_tokens_number += len(batch_lengths) * (pad_length or int(batch_lengths.max()))
+    return 1.0 - tokens_number / padded_tokens_number if padded_tokens_number else 0.0
+
+
+def report_padding_fraction(lengths, batch_size, pad_length):
+    """
+    Logs the fraction of padding when padding every example to the block size and with length-grouped batches.
+
+    Args:
+        lengths (np.ndarray): Number of tokens of each example.
+        batch_size (int): Number of examples of a batch.
+        pad_length (int): Block size the examples were padded to.
+
+    Returns:
+        tuple: The padding fraction before and after grouping.
+    """
+    batches = list(LengthGroupedBatchSampler(lengths, batch_size))
+    before = get_padding_fraction(lengths, batches, pad_length)
+    after = get_padding_fraction(lengths, batches)
+    logger.info(f"Padding fraction {before:.1%} when padded to {pad_length} tokens, {after:.1%} with dynamic padding.")
+    return before, after
+
+
+class LengthGroupedBatchSampler(Sampler):
+    """
+    Batch sampler grouping examples of similar lengths.
+
+    The examples are shuffled and split into megabatches of `megabatch_size` batches. Each megabatch is sorted
+    by length and split into batches, and the batches are shuffled, so the batches stay random while their
+    examples have similar lengths. The batch with the longest example comes first, so that running out of memory
+    happens at once.
+
+    Attributes:
+        lengths (np.ndarray): Number of tokens of each example.
+        batch_size (int): Number of examples of a batch.
+        megabatch_size (int): Number of batches sorted together.
+        drop_last (bool): Whether to drop the last batch if it is incomplete.
+        seed (int): Seed of the shuffling.
+        epoch (int): Epoch, mixed into the seed so that each epoch is shuffled differently.
+    """
+
+    def __init__(self, lengths, batch_size, megabatch_size=50, drop_last=False, seed=0):
+        """
+        Initializes the LengthGroupedBatchSampler.
+
+        Args:
+            lengths (np.ndarray): Number of tokens of each example.
+            batch_size (int): Number of examples of a batch.
+            megabatch_size (int): Number of batches sorted together. Default is 50.
+            drop_last (bool): Whether to drop the last batch if it is incomplete. Default is False.
+            seed (int): Seed of the shuffling. Default is 0.
+        """
+        if batch_size < 1 or megabatch_size < 1:
+            error_string = f"Invalid batch size {batch_size} or megabatch size {megabatch_size}."
+            logger.error(error_string)
+            raise Exception(error_string)
+        self.lengths = np.asarray(lengths)
+        self.batch_size = batch_size
+        self.megabatch_size = megabatch_size
+        self.drop_last = drop_last
+        self.seed = seed
+        self.epoch = 0
+
+    def set_epoch(self, epoch):
+        """
+        Sets the epoch, called by the trainer before each epoch.
+
+        Args:
+            epoch (int): The epoch.
+        """
+        self.epoch = epoch
+
+    def __iter__(self):
+        generator = np.random.default_rng([self.seed, self.epoch])
+        indices = generator.permutation(len(self.lengths))
+        if self.drop_last:
+            indices = indices[: len(self) * self.batch_size]
+
+        # Sort the megabatches by decreasing length and split them into batches.
+        batches = []
+        megabatch_length = self.batch_size * self.megabatch_size
+        for start in range(0, len(indices), megabatch_length):
+            megabatch = indices[start : start + megabatch_length]
+            megabatch = megabatch[np.argsort(-self.lengths[megabatch], kind="stable")]
+            batches += [megabatch[i : i + self.batch_size] for i in range(0, len(megabatch), self.batch_size)]
+        if not batches:
+            return
+
+        # Shuffle the batches, starting with the longest one.
+        order = generator.permutation(len(batches))
+        longest = int(np.argmax([self.lengths[batches[index][0]] for index in order]))
+        order[0], order[longest] = order[longest], order[0]
+        for index in order:
+            yield batches[index].tolist()
+
+    def __len__(self):
+        if self.drop_last:
+            return len(self.lengths) // self.batch_size
+        return (len(self.lengths) + self.batch_size - 1) // self.batch_size
+
+
+class DynamicPaddingCollator:
+    """
+    Collates unpadded examples, padding them to the longest example of the batch.
+
+    The padding is masked out of the attention and its labels are ignored by the loss.
+
+    Attributes:
+        pad_token_id (int): ID of the padding token.
+        pad_to_multiple_of (int): If set, the padded length is rounded up to a multiple of it.
+    """
+
+    def __init__(self, pad_token_id, pad_to_multiple_of=None):
+        """
+        Initializes the DynamicPaddingCollator.
+
+        Args:
+            pad_token_id (int): ID of the padding token.
+            pad_to_multiple_of (int, optional): If set, the padded length is rounded up to a multiple of it.
+                Defaults to None.
+        """
+        self.pad_token_id = pad_token_id
+        self.pad_to_multiple_of = pad_to_multiple_of
+
+    def __call__(self, features):
+        """
+        Pads a batch.
+
+        Args:
+            features (list): Dictionaries with the unpadded `input_ids` of each example.
+
+        Returns:
+            dict: The `input_ids`, `attention_mask` and `labels` tensors of the batch.
+        """
+        lengths = [len(feature["input_ids"]) for feature in features]
+        length = max(lengths)
+        if self.pad_to_multiple_of:
+            length = -(-length // self.pad_to_multiple_of) * self.pad_to_multiple_of
+
+        input_ids = torch.full((len(features), length), self.pad_token_id, dtype=torch.long)
+        attention_mask = torch.zeros((len(features), length), dtype=torch.long)
+        for row, (feature, feature_length) in enumerate(zip(features, lengths)):
+            input_ids[row, :feature_length] = torch.as_tensor(feature["input_ids"], dtype=torch.long)
+            attention_mask[row, :feature_length] = 1
+        labels = input_ids.masked_fill(attention_mask == 0, IGNORED_LABEL_ID)
+        return {"input_ids": input_ids, "attention_mask": attention_mask, "labels": labels}
+
+
+class LengthGroupedTrainer(Trainer):
+    """
+    Trainer batching the training examples with a LengthGroupedBatchSampler.
+
+    The training dataset must provide the `lengths` of its examples, as the TokenSequenceDataset does.
+    """
+
+    def get_train_dataloader(self):
+        """
+        Returns the training DataLoader, batching the examples by length.
+
+        Returns:
+            DataLoader: The training DataLoader.
+        """
+        if self.train_dataset is None:
+            error_string = "Trainer: training requires a train_dataset."
+            logger.error(error_string)
+            raise Exception(error_string)
+
+        batch_sampler = LengthGroupedBatchSampler(
+            self.train_dataset.lengths,
+            self._train_batch_size,
+            drop_last=self.args.dataloader_drop_last,
+            seed=self.args.seed,
+        )
+        dataloader = DataLoader(
+            self.train_dataset,
+            batch_sampler=batch_sampler,
+            collate_fn=self.data_collator,
+            num_workers=self.args.dataloader_num_workers,
+            pin_memory=self.args.dataloader_pin_memory,
+            persistent_workers=self.args.dataloader_persistent_workers,
+            worker_init_fn=seed_worker,
+        )
+        return self.accelerator.prepare(dataloader)
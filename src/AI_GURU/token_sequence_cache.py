@@ -0,0 +1,322 @@
+# Copyright 2021 Tristan Behrens.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Lint as: python3
+
+"""
+Pre-tokenized token sequence files, built once and memory-mapped.
+
+A token sequence file is tokenized in batches of lines into a flat file of token IDs and an index of where each
+line starts. Both are opened with `np.memmap`, so opening a cached file of any size is immediate and only the pages
+of the lines that are read are held in memory. The cache is keyed by the data file and the tokenizer, so a
+changed file or tokenizer is tokenized again.
+"""
+
+import os
+import json
+import hashlib
+import tempfile
+import itertools
+import numpy as np
+from . import logging
+from .preprocess.processpool import imap_threads
+
+logger = logging.create_logger("token_sequence_cache")
+
+# Version of the cache format, part of the cache key.
+CACHE_VERSION = 1
+
+# Name of the cache directory next to the token sequence files.
+DEFAULT_CACHE_DIR_NAME = "token_cache"
+
+# Data type of the line offsets.
+OFFSET_DTYPE = np.int64
+
+# Number of lines encoded together.
+DEFAULT_TOKENIZATION_BATCH_SIZE = 1000
+
+
+def get_tokenizer_json(tokenizer):
+    """
+    Serializes a tokenizer, for keying the cache.
+
+    Args:
+        tokenizer: A `PreTrainedTokenizerFast` or a `tokenizers.Tokenizer`.
+
+    Returns:
+        str: The JSON of the tokenizer.
+    """
+    return getattr(tokenizer, "backend_tokenizer", tokenizer).to_str()
+
+
+def get_token_dtype(vocabulary_size):
+    """
+    Chooses the smallest unsigned integer type holding every token ID.
+
+    Args:
+        vocabulary_size (int): Number of tokens.
+
+    Returns:
+        np.dtype: uint16 for vocabularies of up to 65536 tokens, uint32 otherwise.
+    """
+    return np.dtype(np.uint16 if vocabulary_size <= np.iinfo(np.uint16).max + 1 else np.uint32)
+
+
+def get_cache_key(dataset_path, tokenizer):
+    """
+    Hashes what the cached tokens of a token sequence file depend on.
+
+    The file is identified by its path, size and modification time rather than its content, so that opening
+    a cached file does not read it.
+
+    Args:
+        dataset_path (str): Path to the token sequence file.
+        tokenizer: The tokenizer.
+
+    Returns:
+        str: Hexadecimal SHA-256 digest.
+    """
+    stat = os.stat(dataset_path)
+    key = hashlib.sha256()
+    for part in [CACHE_VERSION, os.path.realpath(dataset_path), stat.st_size, stat.st_mtime_ns]:
+        key.update(f"{part}\0".encode("utf-8"))
+    key.update(get_tokenizer_json(tokenizer).encode("utf-8"))
+    return key.hexdigest()
+
+
+class TokenSequenceCache:
+    """
+    Memory-mapped token IDs of the lines of a token sequence file.
+
+    Lines with unknown tokens are skipped when the cache is built, as the TokenSequenceDataset skips them.
+
+    Attributes:
+        cache_path (str): Path of the cache files without their extensions.
+        metadata (dict): Data type, number of lines and statistics of the cached file.
+        tokens (np.memmap): Token IDs of all lines, one after the other.
+        offsets (np.memmap): Start of each line in `tokens`, followed by the number of tokens.
+    """
+
+    def __init__(self, cache_path):
+        """
+        Opens a built cache. Use `open` to build it if needed.
+
+        Args:
+            cache_path (str): Path of the cache files without their extensions.
+        """
+        self.cache_path = cache_path
+        with open(cache_path + ".json", "r") as f:
+            self.metadata = json.load(f)
+        self.offsets = np.memmap(cache_path + ".offsets", dtype=OFFSET_DTYPE, mode="r")
+
+        # A file without tokens cannot be mapped.
+        dtype = np.dtype(self.metadata["dtype"])
+        if self.offsets[-1] == 0:
+            self.tokens = np.zeros(0, dtype=dtype)
+        else:
+            self.tokens = np.memmap(cache_path + ".tokens", dtype=dtype, mode="r")
+
+    @classmethod
+    def open(cls, tokenizer, dataset_path, cache_dir=None, batch_size=DEFAULT_TOKENIZATION_BATCH_SIZE, threads=1):
+        """
+        Opens the cache of a token sequence file, tokenizing the file first if it is not cached yet.
+
+        Args:
+            tokenizer (PreTrainedTokenizerFast): Tokenizer for encoding the lines.
+            dataset_path (str): Path to the token sequence file.
+            cache_dir (str, optional): Directory of the cache. Defaults to None, for a "token_cache"
+                directory next to the file.
+            batch_size (int): Number of lines encoded together. Default is 1000.
+            threads (int): Number of threads encoding batches. Default is 1.
+
+        Returns:
+            TokenSequenceCache: The cache.
+        """
+        if cache_dir is None:
+            cache_dir = os.path.join(os.path.dirname(os.path.abspath(dataset_path)), DEFAULT_CACHE_DIR_NAME)
+        key = get_cache_key(dataset_path, tokenizer)
+        cache_path = os.path.join(cache_dir, f"{os.path.basename(dataset_path)}.{key[:16]}")
+
+        # The metadata is written last, so a cache with metadata is complete.
+        if os.path.exists(cache_path + ".json"):
+            logger.info(f"Opening the token cache {cache_path} of {dataset_path}.")
+        else:
+            logger.info(f"Tokenizing {dataset_path} into the token cache {cache_path}.")
+            os.makedirs(cache_dir, exist_ok=True)
+            build_cache(tokenizer, dataset_path, cache_path, batch_size, threads)
+        return cls(cache_path)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        """
+        Gets the token IDs of a line, without copying them from the mapped file.
+
+        Args:
+            index (int): Index of the line.
+
+        Returns:
+            np.ndarray: The token IDs.
+        """
+        return self.tokens[self.offsets[index] : self.offsets[index + 1]]
+
+    def get_lengths(self):
+        """
+        Gets the number of tokens of every line.
+
+        Returns:
+            np.ndarray: The lengths.
+        """
+        return np.diff(self.offsets)
+
+
+def read_line_batches(dataset_path, batch_size):
+    """
+    Reads the non-empty lines of a file in batches.
+
+    Args:
+        dataset_path (str): Path to the file.
+        batch_size (int): Number of lines of a batch.
+
+    Yields:
+        list: The stripped lines of each batch.
+    """
+    with open(dataset_path, "r") as f:
+        lines = (line.strip() for line in f)
+        lines = (line for line in lines if line != "")
+        while True:
+            batch = list(itertools.islice(lines, batch_size))
+            if not batch:
+                return
+            yield batch
+
+
+def encode_line_batch(tokenizer, lines, unk_token_id, dtype):
+    """
+    Encodes a batch of lines and drops the lines with unknown tokens.
+
+    The lines are encoded together by the tokenizer backend, which releases the GIL, without computing the
+    character offsets if the backend can skip them. The lines with unknown tokens are found with array operations
+    on the token IDs of the whole batch.
+
+    Args:
+        tokenizer (PreTrainedTokenizerFast): Tokenizer for encoding the lines.
+        lines (list): The lines.
+        unk_token_id (int): ID of the unknown token.
+        dtype (np.dtype): Data type of the token IDs.
+
+    Returns:
+        tuple: The token IDs and the lengths of the kept lines, and the number of dropped lines.
+    """
+    backend_tokenizer = getattr(tokenizer, "backend_tokenizer", tokenizer)
+    encodings = getattr(backend_tokenizer, "encode_batch_fast", backend_tokenizer.encode_batch)(lines)
+    lengths = np.fromiter((len(encoding.ids) for encoding in encodings), dtype=OFFSET_DTYPE, count=len(encodings))
+    token_ids = np.fromiter(
+        itertools.chain.from_iterable(encoding.ids for encoding in encodings), dtype=np.int64, count=lengths.sum()
+    )
+
+    # Find the lines with unknown tokens.
+    line_indices = np.repeat(np.arange(len(lines)), lengths)
+    unknown_token_lines = np.bincount(line_indices[token_ids == unk_token_id], minlength=len(lines)) > 0
+    token_ids = token_ids[~unknown_token_lines[line_indices]].astype(dtype)
+    return token_ids, lengths[~unknown_token_lines], int(unknown_token_lines.sum())
+
+
+def open_temporary_file(cache_path, extension, mode):
+    """
+    Creates a uniquely named temporary file next to the cache files, so that processes building the same cache
+    at once, such as the ranks of a distributed training, do not write to each other's files.
+
+    Args:
+        cache_path (str): Path of the cache files without their extensions.
+        extension (str): Extension of the cache file the temporary file becomes.
+        mode (str): Mode to open the file with.
+
+    Returns:
+        tuple: The open file and its path.
+    """
+    file_descriptor, path = tempfile.mkstemp(
+        suffix=extension + ".tmp", prefix=os.path.basename(cache_path) + ".", dir=os.path.dirname(cache_path)
+    )
+    # The cache files are shared, unlike the private temporary files.
+    os.chmod(path, 0o644)
+    return os.fdopen(file_descriptor, mode), path
+
+
+def build_cache(tokenizer, dataset_path, cache_path, batch_size=DEFAULT_TOKENIZATION_BATCH_SIZE, threads=1):
+    """
+    Tokenizes a token sequence file into the files of a cache.
+
+    The lines are encoded in batches by `threads` threads. The files are written under unique temporary names
+    and renamed when all of them are complete, the metadata last.
+
+    Args:
+        tokenizer (PreTrainedTokenizerFast): Tokenizer for encoding the lines.
+        dataset_path (str): Path to the token sequence file.
+        cache_path (str): Path of the cache files without their extensions.
+        batch_size (int): Number of lines encoded together. Default is 1000.
+        threads (int): Number of threads encoding batches. Default is 1.
+
+    Returns:
+        dict: The metadata of the cache.
+    """
+    unk_token_id = tokenizer.encode("[UNK]")[0]
+    dtype = get_token_dtype(len(tokenizer))
+
+    offsets = [np.zeros(1, dtype=OFFSET_DTYPE)]
+    tokens_number = 0
+    lines_number = 0
+    unknown_token_lines_number = 0
+    encoded_batches = imap_threads(
+        lambda lines: (len(lines),) + encode_line_batch(tokenizer, lines, unk_token_id, dtype),
+        read_line_batches(dataset_path, batch_size),
+        threads,
+    )
+    temporary_paths = {}
+    try:
+        tokens_file, temporary_paths[".tokens"] = open_temporary_file(cache_path, ".tokens", "wb")
+        with tokens_file:
+            for batch_lines_number, token_ids, lengths, batch_unknown_token_lines_number in encoded_batches:
+                token_ids.tofile(tokens_file)
+                offsets.append(tokens_number + np.cumsum(lengths))
+                tokens_number += int(lengths.sum())
+                lines_number += batch_lines_number
+                unknown_token_lines_number += batch_unknown_token_lines_number
+
+        offsets_file, temporary_paths[".offsets"] = open_temporary_file(cache_path, ".offsets", "wb")
+        with offsets_file:
+            np.concatenate(offsets).astype(OFFSET_DTYPE).tofile(offsets_file)
+
+        metadata = {
+            "version": CACHE_VERSION,
+            "dataset_path": os.path.realpath(dataset_path),
+            "dtype": dtype.name,
+            "lines_number": lines_number,
+            "unknown_token_lines_number": unknown_token_lines_number,
+            "tokens_number": tokens_number,
+        }
+        metadata_file, temporary_paths[".json"] = open_temporary_file(cache_path, ".json", "w")
+        with metadata_file:
+            json.dump(metadata, metadata_file, indent=4)
+
+        for extension, temporary_path in temporary_paths.items():
+            os.replace(temporary_path, cache_path + extension)
+    finally:
+        for temporary_path in temporary_paths.values():
+            if os.path.exists(temporary_path):
+                os.remove(temporary_path)
+    if unknown_token_lines_number:
+        logger.warning(f"Skipped {unknown_token_lines_number} of {lines_number} lines with unknown tokens.")
+    return metadata
@@ -2,18 +2,43 @@ import random
 import os
 import numpy as np
 import torch
-from torch.utils.data.dataset import Dataset
+from torch.utils.data import get_worker_info
+from torch.utils.data.dataset import Dataset, IterableDataset
+from . import logging
+from .token_sequence_cache import DEFAULT_TOKENIZATION_BATCH_SIZE, TokenSequenceCache
+from .token_sequence_batching import IGNORED_LABEL_ID
+
+logger = logging.create_logger("token_sequence_dataset")
 
 
 class TokenSequenceDataset(Dataset):
     """
     A custom PyTorch Dataset for processing tokenized sequences.
 
+    The files are tokenized once into memory-mapped caches, and the examples are padded when they are read, so
+    only the token IDs of the examples in use are held in memory.
+
     Attributes:
-        examples (list): A list of processed examples, each containing `input_ids` and `labels`.
+        caches (list): A TokenSequenceCache of each file.
+        examples (np.ndarray): Index of the cache and of the line of each example.
+        lengths (np.ndarray): Number of tokens of each example.
+        skipped_lines (dict): Number of lines skipped for unknown tokens and for being longer than `block_size`.
+        block_size (int): Length of the examples after padding.
+        padding (bool): Whether the examples are padded to `block_size`.
+        pad_token_id (int): ID of the padding token.
     """
 
-    def __init__(self, tokenizer, dataset_paths, block_size, simulate=False):
+    def __init__(
+        self,
+        tokenizer,
+        dataset_paths,
+        block_size,
+        simulate=False,
+        cache_dir=None,
+        padding=True,
+        tokenization_batch_size=DEFAULT_TOKENIZATION_BATCH_SIZE,
+        tokenization_threads=1,
+    ):
         """
         Initializes the TokenSequenceDataset.
 
@@ -22,71 +47,56 @@ class TokenSequenceDataset(Dataset):
             dataset_paths (list): List of file paths to load the dataset from.
             block_size (int): Maximum sequence length after padding and truncation.
             simulate (bool): If True, limits the dataset to a small subset for debugging.
+            cache_dir (str, optional): Directory of the token caches. Defaults to None, for a "token_cache"
+                directory next to each file.
+            padding (bool): If False, the examples are not padded, for padding each batch with a
+                DynamicPaddingCollator. Default is True.
+            tokenization_batch_size (int): Number of lines encoded together when tokenizing a file that is not
+                cached yet. Default is 1000.
+            tokenization_threads (int): Number of threads encoding batches of lines. Default is 1.
         """
+        self.block_size = block_size
+        self.padding = padding
+        self.pad_token_id = tokenizer.encode("[PAD]")[0]
 
-        pad_token_id = tokenizer.encode("[PAD]")[0]
-        unk_token_id = tokenizer.encode("[UNK]")[0]
-
-        # Read all lines from all files.
-        lines = []
+        # Tokenize the files that are not cached yet.
+        self.caches = []
         for dataset_path in dataset_paths:
             assert os.path.isfile(dataset_path), f"Input file path {dataset_path} not found"
-            lines += open(dataset_path, "r").readlines()
+            self.caches += [
+                TokenSequenceCache.open(
+                    tokenizer, dataset_path, cache_dir, tokenization_batch_size, tokenization_threads
+                )
+            ]
 
-        # In simulation just use a few samples.
-        if simulate:
-            random.shuffle(lines)
-            lines = lines[:10]
-
-        # Turn lines into training examples. Also gather some statistics.
-        self.examples = []
-        unknown_tokens_set = []
-        unknown_tokens = []
-        tokens_count = 0
-        unknown_token_lines_count = 0
+        # Skip sequences that are too long.
+        examples = []
+        lengths = []
         too_long_lines_count = 0
-        encoded_lengths = []
-        for line in lines:
-
-            # Skip empty lines.
-            line = line.strip()
-            if line == "":
-                continue
-
-            # Encode the line.
-            encoded_line = tokenizer.encode(line)
-            encoded_lengths += [len(encoded_line)]
-            tokens_count += len(encoded_line)
-
-            # Create a warning about unknown tokens. And then skip the line.
-            if unk_token_id in encoded_line:
-                index = encoded_line.index(unk_token_id)
-                token = tokenizer.decode(encoded_line[index])
-                token = line.split()[index]
-                if token not in unknown_tokens_set:
-                    unknown_tokens_set += [token]
-                # logger.warning(f"Skipping line because of unknown token {token}")
-                unknown_tokens += [token]
-                unknown_token_lines_count += 1
-                continue
-
-            # Skip sequence if it is too long.
-            if len(encoded_line) > block_size:
-                # logger.warning(f"Skipping line because it is too long... {len(encoded_line)} > {block_size}")
-                too_long_lines_count += 1
-                continue
+        for cache_index, cache in enumerate(self.caches):
+            cache_lengths = cache.get_lengths()
+            line_indices = np.flatnonzero(cache_lengths <= block_size)
+            too_long_lines_count += len(cache_lengths) - len(line_indices)
+            examples += [np.stack([np.full_like(line_indices, cache_index), line_indices], axis=1)]
+            lengths += [cache_lengths[line_indices]]
+        self.examples = np.concatenate(examples) if examples else np.zeros((0, 2), dtype=np.int64)
+        self.lengths = np.concatenate(lengths) if lengths else np.zeros(0, dtype=np.int64)
+        self.skipped_lines = {
+            "unknown_token": sum(cache.metadata["unknown_token_lines_number"] for cache in self.caches),
+            "too_long": too_long_lines_count,
+        }
+        if any(self.skipped_lines.values()):
+            logger.info(
+                f"Skipped {self.skipped_lines['unknown_token']} lines with unknown tokens and "
+                f"{self.skipped_lines['too_long']} lines longer than {block_size} tokens."
+            )
 
-            # Pad and truncate.
-            tensor = np.full((block_size,), pad_token_id, dtype=np.longlong)
-            tensor[: len(encoded_line)] = encoded_line
-            assert len(tensor) == block_size
-
-            self.examples += [
-                {
-                    "input_ids": torch.tensor(tensor, dtype=torch.long),
-                    "labels": torch.tensor(tensor, dtype=torch.long),
-                }
-            ]
+        # In simulation just use a few samples.
+        if simulate:
+            indices = list(range(len(self.examples)))
+            random.shuffle(indices)
+            self.examples = self.examples[indices[:10]]
+            self.lengths = self.lengths[indices[:10]]
 
     def __len__(self):
         """
@@ -105,6 +115,261 @@ class TokenSequenceDataset(Dataset):
             i (int): Index of the example to retrieve.
 
         Returns:
-            dict: A dictionary containing `input_ids` and `labels` tensors.
+            dict: A dictionary containing `input_ids` and `labels` tensors, which share their storage.
+        """
+        cache_index, line_index = self.examples[i]
+        token_ids = self.caches[cache_index][line_index]
+        if not self.padding:
+            tensor = torch.from_numpy(token_ids.astype(np.int64))
+            return {"input_ids": tensor, "labels": tensor}
+
+        # Pad.
+        tensor = torch.full((self.block_size,), self.pad_token_id, dtype=torch.long)
+        tensor[: len(token_ids)] = torch.from_numpy(token_ids.astype(np.int64))
+        return {"input_ids": tensor, "labels": tensor}
+
+
+class PackedTokenSequenceDataset(TokenSequenceDataset):
+    """
+    A TokenSequenceDataset packing consecutive sequences into blocks of `block_size` tokens.
+
+    Instead of padding each sequence, the sequences that fit in a block are concatenated and cut into blocks, so
+    only the last block is padded. A sequence cut at the end of a block continues at the start of the next one.
+    The position IDs restart at the start of each sequence, and the label of the first token of each sequence is
+    ignored, so the loss never predicts a sequence from the end of the previous one. The attention still spans
+    the sequences of a block.
+
+    Attributes:
+        offsets (np.ndarray): Start of each example in the packed tokens, followed by the number of tokens.
+    """
+
+    def __init__(
+        self,
+        tokenizer,
+        dataset_paths,
+        block_size,
+        simulate=False,
+        cache_dir=None,
+        tokenization_batch_size=DEFAULT_TOKENIZATION_BATCH_SIZE,
+        tokenization_threads=1,
+    ):
+        """
+        Initializes the PackedTokenSequenceDataset.
+
+        Args:
+            tokenizer: A tokenizer object for encoding text lines.
+            dataset_paths (list): List of file paths to load the dataset from.
+            block_size (int): Number of tokens of each block.
+            simulate (bool): If True, limits the dataset to a small subset for debugging.
+            cache_dir (str, optional): Directory of the token caches. Defaults to None, for a "token_cache"
+                directory next to each file.
+            tokenization_batch_size (int): Number of lines encoded together when tokenizing a file that is not
+                cached yet. Default is 1000.
+            tokenization_threads (int): Number of threads encoding batches of lines. Default is 1.
+        """
+        super().__init__(
+            tokenizer,
+            dataset_paths,
+            block_size,
+            simulate=simulate,
+            cache_dir=cache_dir,
+            padding=False,
+            tokenization_batch_size=tokenization_batch_size,
+            tokenization_threads=tokenization_threads,
+        )
+        self.offsets = np.concatenate([[0], np.cumsum(self.lengths)])
+        padding_fraction = 1.0 - self.offsets[-1] / (len(self) * block_size) if len(self) else 0.0
+        logger.info(
+            f"Packed {len(self.lengths)} sequences of {self.offsets[-1]} tokens into {len(self)} blocks, "
+            f"padding fraction {padding_fraction:.1%}."
+        )
+
+    def __len__(self):
+        """
+        Returns the number of blocks in the dataset.
+
+        Returns:
+            int: Number of blocks.
+        """
+        return -(-int(self.offsets[-1]) // self.block_size)
+
+    def __getitem__(self, i):
+        """
+        Retrieves the i-th block of the dataset.
+
+        Args:
+            i (int): Index of the block to retrieve.
+
+        Returns:
+            dict: A dictionary containing `input_ids`, `position_ids`, `attention_mask` and `labels` tensors.
+        """
+        start = i * self.block_size
+        end = min(start + self.block_size, int(self.offsets[-1]))
+        input_ids = torch.full((self.block_size,), self.pad_token_id, dtype=torch.long)
+        position_ids = torch.zeros(self.block_size, dtype=torch.long)
+
+        # Copy the pieces of the sequences overlapping the block.
+        example_index = int(np.searchsorted(self.offsets, start, side="right")) - 1
+        position = start
+        while position < end:
+            cache_index, line_index = self.examples[example_index]
+            token_ids = self.caches[cache_index][line_index]
+            begin = position - int(self.offsets[example_index])
+            length = min(len(token_ids) - begin, end - position)
+            block_begin = position - start
+            input_ids[block_begin : block_begin + length] = torch.from_numpy(
+                token_ids[begin : begin + length].astype(np.int64)
+            )
+            position_ids[block_begin : block_begin + length] = torch.arange(begin, begin + length)
+            position += length
+            example_index += 1
+
+        # Mask the padding and the predictions across sequences.
+        attention_mask = (torch.arange(self.block_size) < end - start).long()
+        labels = input_ids.masked_fill((position_ids == 0) | (attention_mask == 0), IGNORED_LABEL_ID)
+        return {
+            "input_ids": input_ids,
+            "position_ids": position_ids,
+            "attention_mask": attention_mask,
+            "labels": labels,
+        }
+
+
+class StreamingTokenSequenceDataset(IterableDataset):
+    """
+    An iterable PyTorch Dataset reading and tokenizing the token sequence files while iterating.
+
+    Nothing is read before the iteration starts and only a shuffle buffer of examples is held in memory, so the
+    corpus can be larger than the memory and the first batch does not wait for the whole corpus. The examples are
+    shuffled through the buffer, so the shuffling is only local to `shuffle_buffer_size` examples, and the order
+    of the files is shuffled every epoch. The files are split across the DataLoader workers, or their lines if
+    there are fewer files than workers.
+
+    Attributes:
+        tokenizer: The tokenizer encoding the lines.
+        dataset_paths (list): Paths to the token sequence files.
+        block_size (int): Length of the examples after padding. Longer lines are skipped.
+        shuffle_buffer_size (int): Number of examples shuffled together.
+        seed (int): Seed of the shuffling.
+        epoch (int): Epoch, mixed into the seed so that each epoch is shuffled differently.
+        simulate (bool): Whether to stop after a few examples.
+        padding (bool): Whether the examples are padded to `block_size`.
+        pad_token_id (int): ID of the padding token.
+        unk_token_id (int): ID of the unknown token.
+    """
+
+    def __init__(
+        self, tokenizer, dataset_paths, block_size, shuffle_buffer_size=10000, seed=0, simulate=False, padding=True
+    ):
+        """
+        Initializes the StreamingTokenSequenceDataset.
+
+        Args:
+            tokenizer: A tokenizer object for encoding text lines.
+            dataset_paths (list): List of file paths to stream the dataset from.
+            block_size (int): Maximum sequence length after padding.
+            shuffle_buffer_size (int): Number of examples shuffled together. Default is 10000.
+            seed (int): Seed of the shuffling. Default is 0.
+            simulate (bool): If True, stops after a few examples for debugging.
+            padding (bool): If False, the examples are not padded to block_size, for padding each batch with a
+                DynamicPaddingCollator. Default is True.
+        """
+        for dataset_path in dataset_paths:
+            assert os.path.isfile(dataset_path), f"Input file path {dataset_path} not found"
+        self.tokenizer = tokenizer
+        self.dataset_paths = list(dataset_paths)
+        self.block_size = block_size
+        self.shuffle_buffer_size = max(shuffle_buffer_size, 1)
+        self.seed = seed
+        self.epoch = 0
+        self.simulate = simulate
+        self.padding = padding
+        self.pad_token_id = tokenizer.encode("[PAD]")[0]
+        self.unk_token_id = tokenizer.encode("[UNK]")[0]
+
+    def set_epoch(self, epoch):
+        """
+        Sets the epoch, called by the trainer before each epoch.
+
+        Args:
+            epoch (int): The epoch.
+        """
+        self.epoch = epoch
+
+    def __iter__(self):
+        """
+        Iterates over the examples of the files of this worker, shuffled through the buffer.
+
+        Yields:
+            dict: A dictionary containing `input_ids` and `labels` tensors, which share their storage.
+        """
+        worker_info = get_worker_info()
+        worker_id = 0 if worker_info is None else worker_info.id
+
+        # Every worker shuffles the files in the same order before taking its share.
+        order = np.random.default_rng([self.seed, self.epoch]).permutation(len(self.dataset_paths))
+        dataset_paths = [self.dataset_paths[i] for i in order]
+        generator = np.random.default_rng([self.seed, self.epoch, worker_id])
+
+        examples_number = 0
+        buffer = []
+        for encoded_line in self.__read_lines(dataset_paths, worker_info):
+            if len(buffer) < self.shuffle_buffer_size:
+                buffer.append(encoded_line)
+                continue
+            index = generator.integers(len(buffer))
+            encoded_line, buffer[index] = buffer[index], encoded_line
+            yield self.__get_example(encoded_line)
+            examples_number += 1
+            if self.simulate and examples_number == 10:
+                return
+
+        # Empty the buffer.
+        generator.shuffle(buffer)
+        for encoded_line in buffer[: 10 - examples_number] if self.simulate else buffer:
+            yield self.__get_example(encoded_line)
+
+    def __read_lines(self, dataset_paths, worker_info):
+        """
+        Reads and tokenizes the lines of the files of this worker, skipping empty lines, lines with unknown tokens
+        and lines longer than the block size.
+
+        Args:
+            dataset_paths (list): Paths to the token sequence files, in the order of the epoch.
+            worker_info: The DataLoader worker information, or None in the main process.
+
+        Yields:
+            list: The token IDs of each line.
+        """
+        # Split the files across the workers, or their lines if there are fewer files.
+        line_step, line_offset = 1, 0
+        if worker_info is not None and len(dataset_paths) >= worker_info.num_workers:
+            dataset_paths = dataset_paths[worker_info.id :: worker_info.num_workers]
+        elif worker_info is not None:
+            line_step, line_offset = worker_info.num_workers, worker_info.id
+
+        for dataset_path in dataset_paths:
+            with open(dataset_path, "r") as f:
+                for line_index, line in enumerate(f):
+                    line = line.strip()
+                    if line_index % line_step != line_offset or line == "":
+                        continue
+                    encoded_line = self.tokenizer.encode(line)
+                    if self.unk_token_id in encoded_line or len(encoded_line) > self.block_size:
+                        continue
+                    yield encoded_line
+
+    def __get_example(self, encoded_line):
+        """
+        Turns the token IDs of a line into an example, padded if needed.
+
+        Args:
+            encoded_line (list): The token IDs.
+
+        Returns:
+            dict: A dictionary containing `input_ids` and `labels` tensors, which share their storage.
         """
-        return self.examples[i]
+        if self.padding:
+            encoded_line = encoded_line + [self.pad_token_id] * (self.block_size - len(encoded_line))
+        tensor = torch.tensor(encoded_line, dtype=torch.long)
+        return {"input_ids": tensor, "labels": tensor}
@@ -0,0 +1,119 @@
+"""
+Benchmarks encoding a long multi-track song with overlapping windows, reusing the tokens of each bar
+across windows versus encoding every bar of every window again.
+"""
+
+import os
+import sys
+import random
+import timeit
+import argparse
+import itertools
+
+# Sometimes, it may be necessary to add the project root to ensure the imports work correctly
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+sys.path.insert(0, project_root)
+
+from src.AI_GURU.preprocess.songarray import song_data_to_array
+from src.AI_GURU.preprocess.encode import (
+    encode_song_data,
+    encode_track_data,
+    get_bar_indices,
+    get_bars_number,
+    get_density_bins,
+    get_window_densities,
+)
+
+
+def encode_song_data_per_window(song_data, transpositions, window_size_bars, hop_length_bars, density_bins):
+    """
+    The previous implementation, encoding the bars of every window and transposition again.
+    """
+    bar_indices = get_bar_indices(get_bars_number(song_data), window_size_bars, hop_length_bars)
+    tracks_lists = [
+        track_data.to_lists() if hasattr(track_data, "to_lists") else None for track_data in song_data["tracks"]
+    ]
+    tracks_densities = [
+        get_window_densities(track_data, bar_indices, density_bins) for track_data in song_data["tracks"]
+    ]
+    token_sequences = []
+    for (window_index, (bar_start_index, bar_end_index)), transposition in itertools.product(
+        enumerate(bar_indices), transpositions
+    ):
+        token_sequence = ["PIECE_START"]
+        for track_data_index, track_data in enumerate(song_data["tracks"]):
+            token_sequence += encode_track_data(
+                track_data,
+                density_bins,
+                bar_start_index,
+                bar_end_index,
+                transposition,
+                tracks_lists[track_data_index],
+                tracks_densities[track_data_index][window_index],
+            )
+        token_sequences += [token_sequence]
+    return token_sequences
+
+
+def create_song_data(bars_number, tracks_number, notes_per_bar, generator):
+    """
+    Creates a song with the given number of bars and tracks, the last one being drums.
+    """
+    tracks = []
+    for track_index in range(tracks_number):
+        bars = []
+        for _ in range(bars_number):
+            events = []
+            for _ in range(generator.randint(1, 2 * notes_per_bar)):
+                pitch = generator.randint(40, 80)
+                events += [
+                    {"type": "NOTE_ON", "pitch": pitch},
+                    {"type": "TIME_DELTA", "delta": 0.5},
+                    {"type": "NOTE_OFF", "pitch": pitch},
+                ]
+            bars.append({"events": events})
+        track_data = {"name": "Piano", "number": track_index, "bars": bars}
+        if track_index == tracks_number - 1:
+            track_data["drums"] = True
+        tracks.append(track_data)
+    return {"title": "benchmark", "number": 0, "tracks": tracks}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark reusing bar encodings across windows.")
+    parser.add_argument("--bars", type=int, default=128)
+    parser.add_argument("--tracks", type=int, default=4)
+    parser.add_argument("--notes_per_bar", type=int, default=8)
+    parser.add_argument("--windows", type=str, nargs="+", default=["8:8", "8:2", "8:1"], help="size:hop pairs.")
+    parser.add_argument("--transpositions", type=int, default=25)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    song_data = create_song_data(args.bars, args.tracks, args.notes_per_bar, random.Random(0))
+    transpositions = list(range(-(args.transpositions // 2), args.transpositions - args.transpositions // 2))
+    print(f"{args.bars} bars, {args.tracks} tracks, {len(transpositions)} transpositions.")
+    print(f"{'form':>8} {'window':>7} {'per window s':>13} {'bar cache s':>12} {'speedup':>8}")
+    for form, song in [("dict", song_data), ("compact", song_data_to_array(song_data))]:
+        for window in args.windows:
+            window_size_bars, hop_length_bars = map(int, window.split(":"))
+            density_bins = get_density_bins([song], window_size_bars, hop_length_bars, 5)
+
+            def encode_per_window():
+                return encode_song_data_per_window(
+                    song, transpositions, window_size_bars, hop_length_bars, density_bins
+                )
+
+            def encode_with_bar_cache():
+                return encode_song_data(
+                    song, transpositions, False, window_size_bars, hop_length_bars, density_bins, False
+                )
+
+            assert encode_per_window() == encode_with_bar_cache()
+            per_window_time = min(timeit.repeat(encode_per_window, number=1, repeat=args.repeat))
+            bar_cache_time = min(timeit.repeat(encode_with_bar_cache, number=1, repeat=args.repeat))
+            speedup = per_window_time / bar_cache_time
+            print(f"{form:>8} {window:>7} {per_window_time:>13.3f} {bar_cache_time:>12.3f} {speedup:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Benchmarks creating the track and bar datasets one after the other versus together from one parse of the MIDI
+files, and checks that both write the same token sequences.
+"""
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import logging as std_logging
+
+# Sometimes, it may be necessary to add the project root to ensure the imports work correctly
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+sys.path.insert(0, project_root)
+
+from src.AI_GURU import logging
+from src.AI_GURU.datasetcreator import DatasetCreator
+from src.AI_GURU.datasetcreatorconfig import JSBDatasetCreatorBarConfig, JSBDatasetCreatorTrackConfig
+
+
+def create_configs(prefix, args):
+    """
+    Creates the configurations of the datasets, named with a prefix.
+    """
+    configs = []
+    for config_class in [JSBDatasetCreatorTrackConfig, JSBDatasetCreatorBarConfig]:
+        config = config_class(parse_workers=args.parse_workers)
+        config.dataset_name = f"{prefix}_{config.dataset_name}"
+        config.json_data_method = args.method
+        config.transpositions_train = list(range(args.transpositions))
+        config.window_size_bars = args.window_size_bars
+        config.hop_length_bars = 1
+        configs.append(config)
+    return configs
+
+
+def read_token_sequences(datasets_path, configs):
+    token_sequences = []
+    for config in configs:
+        with open(os.path.join(datasets_path, config.dataset_name, "token_sequences_train.txt")) as f:
+            token_sequences.append(f.read())
+    return token_sequences
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark creating several datasets from one parse.")
+    parser.add_argument("--midi_dir", type=str, default=os.path.join(project_root, "data", "sanity"))
+    parser.add_argument("--repeat", type=int, default=3, help="How many times to copy the MIDI files.")
+    parser.add_argument("--method", type=str, default="preprocess_music21")
+    parser.add_argument("--parse_workers", type=int, default=2)
+    parser.add_argument("--transpositions", type=int, default=1)
+    parser.add_argument("--window_size_bars", type=int, default=1)
+    args = parser.parse_args()
+
+    logging.set_log_level("all", std_logging.WARNING)
+
+    midi_files = [os.path.join(args.midi_dir, f) for f in sorted(os.listdir(args.midi_dir)) if f.endswith(".mid")]
+    with tempfile.TemporaryDirectory() as datasets_path:
+        midi_files_path = os.path.join(datasets_path, "midi_files")
+        os.makedirs(midi_files_path)
+        for copy_index in range(args.repeat):
+            for midi_file in midi_files:
+                shutil.copy(midi_file, os.path.join(midi_files_path, f"{copy_index}_{os.path.basename(midi_file)}"))
+        print(f"Creating the track and bar datasets from {len(midi_files) * args.repeat} files.")
+
+        separate_configs = create_configs("separate", args)
+        start = time.perf_counter()
+        for config in separate_configs:
+            DatasetCreator(config).create(datasets_path)
+        separate_time = time.perf_counter() - start
+
+        together_configs = create_configs("together", args)
+        start = time.perf_counter()
+        DatasetCreator(together_configs).create(datasets_path)
+        together_time = time.perf_counter() - start
+
+        identical = read_token_sequences(datasets_path, separate_configs) == read_token_sequences(
+            datasets_path, together_configs
+        )
+        print(f"{'separate s':>11} {'together s':>11} {'speedup':>8} {'identical':>10}")
+        speedup = separate_time / together_time
+        print(f"{separate_time:>11.2f} {together_time:>11.2f} {speedup:>7.2f}x {str(identical):>10}")
+
+
+if __name__ == "__main__":
+    main()
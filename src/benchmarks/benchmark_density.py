@@ -0,0 +1,109 @@
+"""
+Benchmarks computing the density bins and encoding long songs with short hops, counting the note on events
+of each window from prefix sums versus counting them bar by bar for every window.
+"""
+
+import os
+import sys
+import random
+import timeit
+import argparse
+import numpy as np
+
+# Sometimes, it may be necessary to add the project root to ensure the imports work correctly
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+sys.path.insert(0, project_root)
+
+from src.AI_GURU.preprocess.encode import (
+    count_note_on_events,
+    encode_song_data,
+    get_bar_indices,
+    get_bars_number,
+    get_density_bins,
+    get_density_bins_from_counts,
+)
+
+
+def get_density_bins_per_window(songs_data, window_size_bars, hop_length_bars, bins):
+    """
+    The previous implementation, scanning the bars of every window.
+    """
+    distribution = []
+    for song_data in songs_data:
+        bar_indices = get_bar_indices(get_bars_number(song_data), window_size_bars, hop_length_bars)
+        for track_data in song_data["tracks"]:
+            for bar_start_index, bar_end_index in bar_indices:
+                count = count_note_on_events(track_data, bar_start_index, bar_end_index)
+                if count != 0:
+                    distribution += [count]
+    return get_density_bins_from_counts(distribution, bins)
+
+
+def create_song_data(bars_number, tracks_number, notes_per_bar, generator):
+    """
+    Creates a song with the given number of bars and tracks.
+    """
+    tracks = []
+    for track_index in range(tracks_number):
+        bars = []
+        for _ in range(bars_number):
+            events = []
+            for _ in range(generator.randint(0, 2 * notes_per_bar)):
+                pitch = generator.randint(40, 80)
+                events += [
+                    {"type": "NOTE_ON", "pitch": pitch},
+                    {"type": "TIME_DELTA", "delta": 0.5},
+                    {"type": "NOTE_OFF", "pitch": pitch},
+                ]
+            bars.append({"events": events})
+        tracks.append({"name": "Piano", "number": track_index, "bars": bars})
+    return {"title": "benchmark", "number": 0, "tracks": tracks}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark density counting from prefix sums.")
+    parser.add_argument("--bars", type=int, nargs="+", default=[64, 256, 1024])
+    parser.add_argument("--tracks", type=int, default=4)
+    parser.add_argument("--notes_per_bar", type=int, default=8)
+    parser.add_argument("--window_size_bars", type=int, default=8)
+    parser.add_argument("--hop_length_bars", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    generator = random.Random(0)
+    window_size_bars, hop_length_bars = args.window_size_bars, args.hop_length_bars
+    print(f"{'bars':>6} {'bins per window s':>18} {'bins prefix sum s':>18} {'encode s':>10}")
+    for bars_number in args.bars:
+        songs_data = [create_song_data(bars_number, args.tracks, args.notes_per_bar, generator) for _ in range(4)]
+        density_bins = get_density_bins(songs_data, window_size_bars, hop_length_bars, 5)
+        assert np.allclose(density_bins, get_density_bins_per_window(songs_data, window_size_bars, hop_length_bars, 5))
+
+        per_window_time = min(
+            timeit.repeat(
+                lambda: get_density_bins_per_window(songs_data, window_size_bars, hop_length_bars, 5),
+                number=1,
+                repeat=args.repeat,
+            )
+        )
+        prefix_sum_time = min(
+            timeit.repeat(
+                lambda: get_density_bins(songs_data, window_size_bars, hop_length_bars, 5),
+                number=1,
+                repeat=args.repeat,
+            )
+        )
+        encode_time = min(
+            timeit.repeat(
+                lambda: [
+                    encode_song_data(song_data, [0], False, window_size_bars, hop_length_bars, density_bins, False)
+                    for song_data in songs_data
+                ],
+                number=1,
+                repeat=args.repeat,
+            )
+        )
+        print(f"{bars_number:>6} {per_window_time:>18.4f} {prefix_sum_time:>18.4f} {encode_time:>10.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Benchmarks computing global density bins from a streaming DensitySketch versus keeping every note on count
+in a list for np.percentile, reporting the time, the memory held and the error against the exact bins.
+"""
+
+import os
+import sys
+import random
+import timeit
+import argparse
+import tracemalloc
+
+# Sometimes, it may be necessary to add the project root to ensure the imports work correctly
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+sys.path.insert(0, project_root)
+
+from src.AI_GURU.preprocess.densitysketch import DensitySketch
+from src.AI_GURU.preprocess.encode import get_density_bins_from_counts
+
+
+def get_density_bins_from_list(chunks, bins):
+    """
+    The exact implementation, holding all counts in memory.
+    """
+    distribution = []
+    for counts in chunks:
+        distribution += counts
+    return get_density_bins_from_counts(distribution, bins)
+
+
+def get_density_bins_from_sketch(chunks, bins, max_size):
+    sketch = DensitySketch(max_size=max_size)
+    for counts in chunks:
+        sketch.add(counts)
+    return sketch.get_density_bins(bins), sketch.error_bound
+
+
+def create_chunks(windows_number, maximum, generator):
+    """
+    Creates skewed note on counts, in chunks of the size of the windows of a song.
+    """
+    chunks = []
+    while windows_number > 0:
+        length = min(generator.randint(20, 400), windows_number)
+        chunks.append([int(generator.paretovariate(1.2)) % maximum + 1 for _ in range(length)])
+        windows_number -= length
+    return chunks
+
+
+def measure_peak_memory(function):
+    tracemalloc.start()
+    function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the streaming density sketch.")
+    parser.add_argument("--windows", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--maximum", type=int, default=500)
+    parser.add_argument("--bins", type=int, default=5)
+    parser.add_argument("--max_size", type=int, nargs="+", default=[4096, 64])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    generator = random.Random(0)
+    print(f"{'windows':>9} {'max size':>9} {'list s':>8} {'sketch s':>9} {'list MB':>8} {'sketch MB':>10} {'error':>6}")
+    for windows_number in args.windows:
+        chunks = create_chunks(windows_number, args.maximum, generator)
+        exact_bins = get_density_bins_from_list(chunks, args.bins)
+        list_time = min(
+            timeit.repeat(lambda: get_density_bins_from_list(chunks, args.bins), number=1, repeat=args.repeat)
+        )
+        list_memory = measure_peak_memory(lambda: get_density_bins_from_list(chunks, args.bins))
+
+        for max_size in args.max_size:
+            sketch_bins, error_bound = get_density_bins_from_sketch(chunks, args.bins, max_size)
+            error = max(abs(sketch_bin - exact_bin) for sketch_bin, exact_bin in zip(sketch_bins, exact_bins))
+            assert error <= error_bound
+
+            sketch_time = min(
+                timeit.repeat(
+                    lambda: get_density_bins_from_sketch(chunks, args.bins, max_size), number=1, repeat=args.repeat
+                )
+            )
+            sketch_memory = measure_peak_memory(lambda: get_density_bins_from_sketch(chunks, args.bins, max_size))
+            print(
+                f"{windows_number:>9} {max_size:>9} {list_time:>8.4f} {sketch_time:>9.4f} "
+                f"{list_memory / 2**20:>8.2f} {sketch_memory / 2**20:>10.3f} {error:>6.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Benchmarks training steps of a small GPT-2 model on random batches padded to the block size, as the trainer used to
+pad them, versus length-grouped batches padded to their longest sequence, and reports the padding fraction of both.
+The sequence lengths are read from a token sequence file if given, or drawn from a distribution of mostly short
+sequences.
+"""
+
+import os
+import sys
+import time
+import argparse
+import numpy as np
+import torch
+from transformers import GPT2Config, GPT2LMHeadModel
+
+# Sometimes, it may be necessary to add the project root to ensure the imports work correctly
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+sys.path.insert(0, project_root)
+
+from src.AI_GURU.token_sequence_batching import (
+    IGNORED_LABEL_ID,
+    DynamicPaddingCollator,
+    LengthGroupedBatchSampler,
+    get_padding_fraction,
+)
+
+
+def get_random_batches(lengths, batch_size, generator):
+    """
+    The previous batching, drawing random batches.
+    """
+    indices = generator.permutation(len(lengths))
+    return [indices[start : start + batch_size].tolist() for start in range(0, len(indices), batch_size)]
+
+
+def get_lengths(args, generator):
+    """
+    Reads the number of tokens of each line of a token sequence file, or draws them.
+    """
+    if args.dataset_path is not None:
+        with open(args.dataset_path, "r") as f:
+            lengths = np.array([len(line.split()) for line in f if line.strip() != ""])
+        return lengths[lengths <= args.block_size]
+    lengths = generator.lognormal(np.log(args.block_size / 6), 0.8, args.sequences)
+    return np.clip(lengths, 1, args.block_size).astype(int)
+
+
+def time_steps(model, optimizer, batches, lengths, collator, pad_length=None):
+    """
+    Times forward and backward passes over batches, padded by the collator or to a fixed length.
+    """
+    start = time.perf_counter()
+    for batch in batches:
+        features = [{"input_ids": torch.randint(3, 100, (lengths[index],))} for index in batch]
+        inputs = collator(features)
+        if pad_length is not None:
+            padding = (0, pad_length - inputs["input_ids"].shape[1])
+            values = {"input_ids": collator.pad_token_id, "attention_mask": 0, "labels": IGNORED_LABEL_ID}
+            inputs = {name: torch.nn.functional.pad(inputs[name], padding, value=values[name]) for name in values}
+        model(**inputs).loss.backward()
+        optimizer.step()
+        optimizer.zero_grad()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark length-grouped batches with dynamic padding.")
+    parser.add_argument("--dataset_path", type=str, default=None)
+    parser.add_argument("--sequences", type=int, default=2000)
+    parser.add_argument("--block_size", type=int, default=768)
+    parser.add_argument("--batch_size", type=int, default=8)
+    parser.add_argument("--steps", type=int, default=20)
+    args = parser.parse_args()
+
+    generator = np.random.default_rng(0)
+    lengths = get_lengths(args, generator)
+    random_batches = get_random_batches(lengths, args.batch_size, generator)
+    grouped_batches = list(LengthGroupedBatchSampler(lengths, args.batch_size))
+    print(f"examples {len(lengths)}, mean length {lengths.mean():.1f}, block size {args.block_size}")
+    for name, batches, pad_length in [
+        ("padded to block size", random_batches, args.block_size),
+        ("random batches, dynamic", random_batches, None),
+        ("grouped batches, dynamic", grouped_batches, None),
+    ]:
+        print(f"padding fraction {name:<25} {get_padding_fraction(lengths, batches, pad_length):.1%}")
+
+    torch.manual_seed(0)
+    model = GPT2LMHeadModel(GPT2Config(vocab_size=100, n_layer=2, n_head=4, n_embd=128, n_positions=args.block_size))
+    optimizer = torch.optim.AdamW(model.parameters())
+    collator = DynamicPaddingCollator(pad_token_id=1)
+
+    # Time the same random steps of both batchings.
+    steps = generator.choice(len(grouped_batches), size=args.steps, replace=False)
+    padded_batches = [random_batches[step] for step in steps]
+    padded_time = time_steps(model, optimizer, padded_batches, lengths, collator, args.block_size)
+    grouped_time = time_steps(model, optimizer, [grouped_batches[step] for step in steps], lengths, collator)
+    print(f"{args.steps} steps padded to block size {padded_time:.2f} s, grouped and padded {grouped_time:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Benchmarks events_to_events_data against its previous implementation for different bar sizes.
+"""
+
+import os
+import sys
+import random
+import timeit
+import argparse
+
+# Sometimes, it may be necessary to add the project root to ensure the imports work correctly
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+sys.path.insert(0, project_root)
+
+from src.AI_GURU.preprocess.preprocessutilities import events_to_events_data
+
+
+def events_to_events_data_python(events):
+    """
+    The previous implementation, sorting Python tuples and handling one event at a time.
+    """
+    events = sorted(events, key=lambda event: event[2])
+
+    events_data = []
+    for event_index, event, event_next in zip(range(len(events)), events, events[1:] + [None]):
+        if event_index == 0 and event[2] != 0.0:
+            event_data = {"type": "TIME_DELTA", "delta": event[2]}
+            events_data += [event_data]
+
+        event_data = {"type": event[0], "pitch": event[1]}
+        events_data += [event_data]
+
+        if event_next is None:
+            continue
+
+        delta = event_next[2] - event[2]
+        assert delta >= 0, events
+        if delta != 0.0:
+            event_data = {"type": "TIME_DELTA", "delta": delta}
+            events_data += [event_data]
+
+    return events_data
+
+
+def create_bars(notes_number, bars_number, seed=0):
+    """
+    Creates the events of bars with the given number of sixteenth notes at random positions.
+
+    Args:
+        notes_number (int): Number of notes per bar.
+        bars_number (int): Number of bars.
+        seed (int, optional): Random seed. Defaults to 0.
+
+    Returns:
+        list: The events of each bar.
+    """
+    rng = random.Random(seed)
+    bars = []
+    for _ in range(bars_number):
+        events = []
+        for _ in range(notes_number):
+            start = rng.randint(0, 15) * 1.0
+            events.append(("NOTE_ON", rng.randint(36, 84), start))
+            events.append(("NOTE_OFF", events[-1][1], start + rng.randint(1, 4) * 1.0))
+        bars.append(events)
+    return bars
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark events_to_events_data.")
+    parser.add_argument("--notes", type=int, nargs="+", default=[1, 4, 8, 16, 32, 64, 256])
+    parser.add_argument("--bars", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'notes/bar':>10} {'previous us/bar':>16} {'current us/bar':>15} {'speedup':>8}")
+    for notes_number in args.notes:
+        bars = create_bars(notes_number, args.bars)
+        for events in bars:
+            assert events_to_events_data(events) == events_to_events_data_python(events)
+
+        timings = []
+        for method in [events_to_events_data_python, events_to_events_data]:
+            seconds = min(timeit.repeat(lambda: [method(events) for events in bars], number=1, repeat=args.repeat))
+            timings.append(seconds / len(bars) * 1e6)
+        print(f"{notes_number:>10} {timings[0]:>16.1f} {timings[1]:>15.1f} {timings[0] / timings[1]:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
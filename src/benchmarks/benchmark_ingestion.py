@@ -0,0 +1,57 @@
+"""
+Benchmarks MIDI ingestion throughput (files/sec) of music21 and mido and checks that both produce the same song data.
+"""
+
+import os
+import sys
+import time
+import argparse
+import logging as std_logging
+
+# Sometimes, it may be necessary to add the project root to ensure the imports work correctly
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+sys.path.insert(0, project_root)
+
+from src.AI_GURU import logging
+from src.AI_GURU.preprocess.music21jsb import preprocess_music21
+from src.AI_GURU.preprocess.midojsb import preprocess_mido
+
+
+def benchmark_ingestion(preprocess_method, midi_files):
+    """
+    Measures how many files per second an ingestion method processes.
+
+    Args:
+        preprocess_method (callable): `preprocess_music21` or `preprocess_mido`.
+        midi_files (list): Paths to the MIDI files.
+
+    Returns:
+        tuple: (files per second, training data, validation data).
+    """
+    start = time.perf_counter()
+    songs_data_train, songs_data_valid, _ = preprocess_method(midi_files, backend="thread", max_workers=1)
+    return len(midi_files) / (time.perf_counter() - start), songs_data_train, songs_data_valid
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark MIDI ingestion with music21 and mido.")
+    parser.add_argument("--midi_dir", type=str, default=os.path.join(project_root, "data", "sanity"))
+    parser.add_argument("--repeat", type=int, default=10, help="How many times to repeat the file list.")
+    args = parser.parse_args()
+
+    logging.set_log_level("all", std_logging.WARNING)
+
+    midi_files = [os.path.join(args.midi_dir, f) for f in sorted(os.listdir(args.midi_dir)) if f.endswith(".mid")]
+    midi_files = midi_files * args.repeat
+    print(f"Ingesting {len(midi_files)} files from {args.midi_dir}.")
+
+    music21_rate, music21_train, music21_valid = benchmark_ingestion(preprocess_music21, midi_files)
+    mido_rate, mido_train, mido_valid = benchmark_ingestion(preprocess_mido, midi_files)
+    identical = music21_train == mido_train and music21_valid == mido_valid
+
+    print(f"{'music21 files/s':>16} {'mido files/s':>13} {'speedup':>8} {'identical':>10}")
+    print(f"{music21_rate:>16.1f} {mido_rate:>13.1f} {mido_rate / music21_rate:>7.2f}x {str(identical):>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Benchmarks encoding songs with permuted tracks and many transpositions in one process with the global random
+state versus in several processes with per-song seeds, checking that the output does not depend on the number
+of processes.
+"""
+
+import os
+import sys
+import random
+import timeit
+import argparse
+
+# Sometimes, it may be necessary to add the project root to ensure the imports work correctly
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+sys.path.insert(0, project_root)
+
+from src.AI_GURU.preprocess.encode import encode_songs_data, get_density_bins, iterate_token_sequences
+
+
+def create_song_data(bars_number, tracks_number, notes_per_bar, generator):
+    """
+    Creates a song with the given number of bars and tracks.
+    """
+    tracks = []
+    for track_index in range(tracks_number):
+        bars = []
+        for _ in range(bars_number):
+            events = []
+            for _ in range(generator.randint(0, 2 * notes_per_bar)):
+                pitch = generator.randint(40, 80)
+                events += [
+                    {"type": "NOTE_ON", "pitch": pitch},
+                    {"type": "TIME_DELTA", "delta": 0.5},
+                    {"type": "NOTE_OFF", "pitch": pitch},
+                ]
+            bars.append({"events": events})
+        tracks.append({"name": "Piano", "number": track_index, "bars": bars})
+    return {"title": "benchmark", "number": 0, "tracks": tracks}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark deterministic multi-process encoding.")
+    parser.add_argument("--songs", type=int, default=32)
+    parser.add_argument("--bars", type=int, default=32)
+    parser.add_argument("--tracks", type=int, default=4)
+    parser.add_argument("--transpositions", type=int, default=13)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    generator = random.Random(0)
+    songs_data = [create_song_data(args.bars, args.tracks, 8, generator) for _ in range(args.songs)]
+    density_bins = get_density_bins(songs_data, 8, 2, 5)
+    transpositions = list(range(-(args.transpositions // 2), args.transpositions - args.transpositions // 2))
+
+    def encode(max_workers):
+        return list(
+            iterate_token_sequences(
+                songs_data, transpositions, True, 8, 2, density_bins, False, seed=0, max_workers=max_workers
+            )
+        )
+
+    global_random_time = min(
+        timeit.repeat(
+            lambda: encode_songs_data(songs_data, transpositions, True, 8, 2, density_bins, False),
+            number=1,
+            repeat=args.repeat,
+        )
+    )
+    print(f"{'global random state':>20} {global_random_time:>8.3f} s")
+
+    expected = encode(1)
+    for max_workers in args.workers:
+        assert encode(max_workers) == expected
+        seeded_time = min(timeit.repeat(lambda: encode(max_workers), number=1, repeat=args.repeat))
+        print(f"{f'{max_workers} workers':>20} {seeded_time:>8.3f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Benchmarks MIDI parsing throughput (files/sec) of the thread and process backends of preprocess_music21.
+"""
+
+import os
+import sys
+import time
+import argparse
+import logging as std_logging
+
+# Sometimes, it may be necessary to add the project root to ensure the imports work correctly
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+sys.path.insert(0, project_root)
+
+from src.AI_GURU import logging
+from src.AI_GURU.preprocess.music21jsb import preprocess_music21
+
+
+def benchmark_backend(midi_files, backend, max_workers, timeout=None):
+    """
+    Measures how many files per second a parsing backend processes.
+
+    Args:
+        midi_files (list): Paths to the MIDI files.
+        backend (str): "thread" or "process".
+        max_workers (int): Number of threads or processes.
+        timeout (float, optional): Per file timeout in seconds. Defaults to None.
+
+    Returns:
+        float: Files per second.
+    """
+    start = time.perf_counter()
+    preprocess_music21(midi_files, backend=backend, max_workers=max_workers, timeout=timeout)
+    return len(midi_files) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the MIDI parsing backends.")
+    parser.add_argument("--midi_dir", type=str, default=os.path.join(project_root, "data", "sanity"))
+    parser.add_argument("--repeat", type=int, default=10, help="How many times to repeat the file list.")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--timeout", type=float, default=None)
+    args = parser.parse_args()
+
+    logging.set_log_level("all", std_logging.WARNING)
+
+    midi_files = [os.path.join(args.midi_dir, f) for f in sorted(os.listdir(args.midi_dir)) if f.endswith(".mid")]
+    midi_files = midi_files * args.repeat
+    print(f"Parsing {len(midi_files)} files from {args.midi_dir}.")
+
+    print(f"{'workers':>8} {'thread files/s':>15} {'process files/s':>16} {'speedup':>8}")
+    for max_workers in args.workers:
+        thread_rate = benchmark_backend(midi_files, "thread", max_workers, args.timeout)
+        process_rate = benchmark_backend(midi_files, "process", max_workers, args.timeout)
+        print(f"{max_workers:>8} {thread_rate:>15.1f} {process_rate:>16.1f} {process_rate / thread_rate:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
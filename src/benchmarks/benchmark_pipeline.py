@@ -0,0 +1,80 @@
+"""
+Benchmarks creating a dataset with parsing, encoding and writing run one after the other versus as pipelined
+stages, and checks that both write the same token sequences.
+"""
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import logging as std_logging
+
+# Sometimes, it may be necessary to add the project root to ensure the imports work correctly
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+sys.path.insert(0, project_root)
+
+from src.AI_GURU import logging
+from src.AI_GURU import datasetcreator
+from src.AI_GURU.datasetcreator import DatasetCreator
+from src.AI_GURU.datasetcreatorconfig import JSBDatasetCreatorBarConfig
+
+
+def create_dataset(datasets_path, dataset_name, pipeline_depth, args):
+    """
+    Creates a dataset and returns how long it took and its training token sequences.
+    """
+    config = JSBDatasetCreatorBarConfig(
+        parse_backend=args.parse_backend,
+        parse_workers=args.parse_workers,
+        encode_workers=args.encode_workers,
+        streaming=args.streaming,
+        pipeline_depth=pipeline_depth,
+    )
+    config.dataset_name = dataset_name
+    config.json_data_method = args.method
+    start = time.perf_counter()
+    DatasetCreator(config).create(datasets_path)
+    seconds = time.perf_counter() - start
+    with open(os.path.join(datasets_path, dataset_name, "token_sequences_train.txt")) as f:
+        return seconds, f.read()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark pipelined dataset creation.")
+    parser.add_argument("--midi_dir", type=str, default=os.path.join(project_root, "data", "sanity"))
+    parser.add_argument("--repeat", type=int, default=5, help="How many times to copy the MIDI files.")
+    parser.add_argument("--batch_size", type=int, default=20)
+    parser.add_argument("--method", type=str, default="preprocess_mido")
+    parser.add_argument("--parse_backend", type=str, default="process")
+    parser.add_argument("--parse_workers", type=int, default=2)
+    parser.add_argument("--encode_workers", type=int, default=1)
+    parser.add_argument("--streaming", action="store_true")
+    parser.add_argument("--pipeline_depths", type=int, nargs="+", default=[0, 1, 2])
+    args = parser.parse_args()
+
+    logging.set_log_level("all", std_logging.WARNING)
+    datasetcreator.BATCH_SIZE = args.batch_size
+
+    midi_files = [os.path.join(args.midi_dir, f) for f in sorted(os.listdir(args.midi_dir)) if f.endswith(".mid")]
+    with tempfile.TemporaryDirectory() as datasets_path:
+        midi_files_path = os.path.join(datasets_path, "midi_files")
+        os.makedirs(midi_files_path)
+        for copy_index in range(args.repeat):
+            for midi_file in midi_files:
+                shutil.copy(midi_file, os.path.join(midi_files_path, f"{copy_index}_{os.path.basename(midi_file)}"))
+        print(f"Creating datasets from {len(midi_files) * args.repeat} files in batches of {args.batch_size}.")
+
+        print(f"{'depth':>6} {'seconds':>8} {'speedup':>8} {'identical':>10}")
+        expected_seconds, expected = None, None
+        for pipeline_depth in args.pipeline_depths:
+            seconds, token_sequences = create_dataset(datasets_path, f"depth_{pipeline_depth}", pipeline_depth, args)
+            if expected is None:
+                expected_seconds, expected = seconds, token_sequences
+            identical = token_sequences == expected
+            print(f"{pipeline_depth:>6} {seconds:>8.2f} {expected_seconds / seconds:>7.2f}x {str(identical):>10}")
+
+
+if __name__ == "__main__":
+    main()
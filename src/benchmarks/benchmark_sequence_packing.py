@@ -0,0 +1,99 @@
+"""
+Benchmarks training a small GPT-2 model on sequences padded to the block size, as the trainer used to pad them,
+versus length-grouped batches with dynamic padding and blocks of packed sequences, and reports the number of real
+tokens trained on per second of each mode.
+"""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+import collections
+import numpy as np
+import torch
+from torch.utils.data import DataLoader
+from transformers import GPT2Config, GPT2LMHeadModel, PreTrainedTokenizerFast, default_data_collator
+
+# Sometimes, it may be necessary to add the project root to ensure the imports work correctly
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+sys.path.insert(0, project_root)
+
+from src.AI_GURU.token_sequence_batching import DynamicPaddingCollator, LengthGroupedBatchSampler
+from src.AI_GURU.token_sequence_dataset import PackedTokenSequenceDataset, TokenSequenceDataset
+from src.AI_GURU.preprocess.vocabulary import create_tokenizer, get_grammar_tokens
+
+
+def write_token_sequences(path, sequences_number, block_size, generator):
+    """
+    Writes random token sequences of mostly short random lengths and returns the counts of their tokens.
+    """
+    tokens = get_grammar_tokens(5, [0])
+    lengths = np.clip(generator.lognormal(np.log(block_size / 6), 0.8, sequences_number), 1, block_size).astype(int)
+    token_counts = collections.Counter()
+    with open(path, "w") as f:
+        for length in lengths:
+            token_sequence = list(generator.choice(tokens, size=length))
+            token_counts.update(token_sequence)
+            f.write(" ".join(token_sequence) + "\n")
+    return token_counts
+
+
+def time_training(dataloader, vocabulary_size, pad_token_id, block_size, steps):
+    """
+    Trains a fresh model for a number of steps and returns the number of real tokens trained on per second.
+    """
+    torch.manual_seed(0)
+    model_config = GPT2Config(vocab_size=vocabulary_size, n_layer=2, n_head=4, n_embd=128, n_positions=block_size)
+    model = GPT2LMHeadModel(model_config)
+    optimizer = torch.optim.AdamW(model.parameters())
+    tokens_number = 0
+    start = time.perf_counter()
+    for _, batch in zip(range(steps), dataloader):
+        model(**batch).loss.backward()
+        optimizer.step()
+        optimizer.zero_grad()
+        tokens_number += int((batch["input_ids"] != pad_token_id).sum())
+    return tokens_number / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark training on packed sequences.")
+    parser.add_argument("--sequences", type=int, default=2000)
+    parser.add_argument("--block_size", type=int, default=768)
+    parser.add_argument("--batch_size", type=int, default=8)
+    parser.add_argument("--steps", type=int, default=10)
+    args = parser.parse_args()
+
+    generator = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "token_sequences_train.txt")
+        token_counts = write_token_sequences(path, args.sequences, args.block_size, generator)
+        tokenizer_path = os.path.join(directory, "tokenizer.json")
+        create_tokenizer(token_counts).save(tokenizer_path)
+        tokenizer = PreTrainedTokenizerFast(tokenizer_file=tokenizer_path)
+
+        padded_dataset = TokenSequenceDataset(tokenizer, [path], args.block_size)
+        dataset = TokenSequenceDataset(tokenizer, [path], args.block_size, padding=False)
+        packed_dataset = PackedTokenSequenceDataset(tokenizer, [path], args.block_size)
+        collator = DynamicPaddingCollator(pad_token_id=dataset.pad_token_id)
+        dataloaders = {
+            "padded": DataLoader(padded_dataset, batch_size=args.batch_size, shuffle=True),
+            "dynamic": DataLoader(
+                dataset, batch_sampler=LengthGroupedBatchSampler(dataset.lengths, args.batch_size), collate_fn=collator
+            ),
+            "packed": DataLoader(
+                packed_dataset, batch_size=args.batch_size, shuffle=True, collate_fn=default_data_collator
+            ),
+        }
+
+        # Only the real tokens are counted, not the padding.
+        for name, dataloader in dataloaders.items():
+            tokens_per_second = time_training(
+                dataloader, len(tokenizer), dataset.pad_token_id, args.block_size, args.steps
+            )
+            print(f"{name:>8} {tokens_per_second:>10.0f} real tokens/s")
+
+
+if __name__ == "__main__":
+    main()
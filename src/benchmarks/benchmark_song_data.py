@@ -0,0 +1,92 @@
+"""
+Benchmarks peak memory (RSS) and encoding time of song data held as dicts versus compact arrays.
+"""
+
+import os
+import sys
+import time
+import pickle
+import resource
+import argparse
+import multiprocessing
+import logging as std_logging
+
+# Sometimes, it may be necessary to add the project root to ensure the imports work correctly
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+sys.path.insert(0, project_root)
+
+from src.AI_GURU import logging
+from src.AI_GURU.preprocess.midojsb import preprocess_mido
+from src.AI_GURU.preprocess.songarray import song_data_to_array
+from src.AI_GURU.preprocess.encode import encode_songs_data, get_density_bins
+
+
+def get_peak_rss_megabytes():
+    """
+    Returns the peak resident set size of the current process in MB.
+
+    Returns:
+        float: Peak RSS in MB.
+    """
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def measure(songs_blobs, compact, transpositions, result_queue):
+    """
+    Loads the songs in one form, then encodes them. Runs in a fresh process, so that peak RSS is per form.
+
+    Args:
+        songs_blobs (list): Pickled song data.
+        compact (bool): Whether to hold the songs as compact arrays.
+        transpositions (list): Transpositions for the encoding.
+        result_queue (multiprocessing.Queue): Queue receiving (peak RSS increase, load time, encode time, tokens).
+    """
+    baseline_rss = get_peak_rss_megabytes()
+
+    start = time.perf_counter()
+    if compact:
+        songs_data = [song_data_to_array(pickle.loads(song_blob)) for song_blob in songs_blobs]
+    else:
+        songs_data = [pickle.loads(song_blob) for song_blob in songs_blobs]
+    load_time = time.perf_counter() - start
+    songs_rss = get_peak_rss_megabytes() - baseline_rss
+
+    start = time.perf_counter()
+    density_bins = get_density_bins(songs_data, 2, 2, 5)
+    tokens_number = 0
+    for song_data in songs_data:
+        token_sequences = encode_songs_data([song_data], transpositions, False, 2, 2, density_bins, False)
+        tokens_number += sum(len(token_sequence) for token_sequence in token_sequences)
+    encode_time = time.perf_counter() - start
+
+    result_queue.put((songs_rss, load_time, encode_time, tokens_number))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark dict and compact song data.")
+    parser.add_argument("--midi_dir", type=str, default=os.path.join(project_root, "data", "time_delta_comparison"))
+    parser.add_argument("--copies", type=int, default=200, help="How many copies of the songs to hold in memory.")
+    parser.add_argument("--transpositions", type=int, nargs="+", default=[0])
+    args = parser.parse_args()
+
+    logging.set_log_level("all", std_logging.WARNING)
+
+    midi_files = [os.path.join(args.midi_dir, f) for f in sorted(os.listdir(args.midi_dir)) if f.endswith(".mid")]
+    songs_data_train, songs_data_valid, _ = preprocess_mido(midi_files)
+    songs_blobs = [pickle.dumps(song_data) for song_data in songs_data_train + songs_data_valid] * args.copies
+    print(f"Holding {len(songs_blobs)} songs from {args.midi_dir}.")
+
+    context = multiprocessing.get_context("spawn")
+    print(f"{'form':>8} {'peak RSS MB':>12} {'load s':>8} {'encode s':>9} {'tokens':>10}")
+    for compact in [False, True]:
+        result_queue = context.Queue()
+        process = context.Process(target=measure, args=(songs_blobs, compact, args.transpositions, result_queue))
+        process.start()
+        songs_rss, load_time, encode_time, tokens_number = result_queue.get()
+        process.join()
+        form = "compact" if compact else "dict"
+        print(f"{form:>8} {songs_rss:>12.1f} {load_time:>8.2f} {encode_time:>9.2f} {tokens_number:>10}")
+
+
+if __name__ == "__main__":
+    main()
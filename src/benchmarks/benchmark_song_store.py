@@ -0,0 +1,88 @@
+"""
+Benchmarks reading a corpus of songs for computing the density bins, from one JSON file per song versus from
+a memory-mapped song store.
+"""
+
+import os
+import sys
+import json
+import random
+import timeit
+import argparse
+import tempfile
+
+# Sometimes, it may be necessary to add the project root to ensure the imports work correctly
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+sys.path.insert(0, project_root)
+
+from src.AI_GURU.preprocess.encode import get_density_bins, get_density_bins_from_json_files
+from src.AI_GURU.preprocess.songstore import SongStoreReader, write_song_store
+
+
+def create_song_data(bars_number, tracks_number, notes_per_bar, generator):
+    """
+    Creates a song with the given number of bars and tracks.
+    """
+    tracks = []
+    for track_index in range(tracks_number):
+        bars = []
+        for _ in range(bars_number):
+            events = []
+            for _ in range(generator.randint(0, 2 * notes_per_bar)):
+                pitch = generator.randint(40, 80)
+                events += [
+                    {"type": "NOTE_ON", "pitch": pitch},
+                    {"type": "TIME_DELTA", "delta": 0.5},
+                    {"type": "NOTE_OFF", "pitch": pitch},
+                ]
+            bars.append({"events": events})
+        tracks.append({"name": "Piano", "number": track_index, "bars": bars})
+    return {"title": "benchmark", "number": 0, "tracks": tracks}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark reading songs from a song store.")
+    parser.add_argument("--songs", type=int, nargs="+", default=[100, 1000])
+    parser.add_argument("--bars", type=int, default=32)
+    parser.add_argument("--tracks", type=int, default=4)
+    parser.add_argument("--notes_per_bar", type=int, default=8)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    generator = random.Random(0)
+    print(f"{'songs':>6} {'json files s':>13} {'song store s':>13} {'json MB':>8} {'store MB':>9}")
+    for songs_number in args.songs:
+        songs_data = [
+            create_song_data(args.bars, args.tracks, args.notes_per_bar, generator) for _ in range(songs_number)
+        ]
+        with tempfile.TemporaryDirectory() as directory:
+            json_paths = []
+            for song_index, song_data in enumerate(songs_data):
+                json_path = os.path.join(directory, f"{song_index}.json")
+                with open(json_path, "w") as f:
+                    json.dump(song_data, f)
+                json_paths.append(json_path)
+            store_path = os.path.join(directory, "store")
+            write_song_store(songs_data, store_path)
+
+            def read_store():
+                with SongStoreReader(store_path) as reader:
+                    return get_density_bins(reader, 8, 1, 5)
+
+            assert read_store() == get_density_bins_from_json_files(json_paths, 8, 1, 5)
+            json_time = min(
+                timeit.repeat(
+                    lambda: get_density_bins_from_json_files(json_paths, 8, 1, 5), number=1, repeat=args.repeat
+                )
+            )
+            store_time = min(timeit.repeat(read_store, number=1, repeat=args.repeat))
+            json_size = sum(os.path.getsize(json_path) for json_path in json_paths)
+            store_size = sum(os.path.getsize(os.path.join(store_path, name)) for name in os.listdir(store_path))
+            print(
+                f"{songs_number:>6} {json_time:>13.4f} {store_time:>13.4f} "
+                f"{json_size / 2**20:>8.2f} {store_size / 2**20:>9.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Benchmarks the time to the first training batch of growing token sequence corpora when the corpus is loaded into a
+TokenSequenceDataset first versus streamed through a StreamingTokenSequenceDataset with a shuffle buffer, and the
+time to iterate over a whole epoch of both.
+"""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+import collections
+import numpy as np
+from torch.utils.data import DataLoader
+from transformers import PreTrainedTokenizerFast
+
+# Sometimes, it may be necessary to add the project root to ensure the imports work correctly
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+sys.path.insert(0, project_root)
+
+from src.AI_GURU.token_sequence_dataset import StreamingTokenSequenceDataset, TokenSequenceDataset
+from src.AI_GURU.preprocess.vocabulary import create_tokenizer, get_grammar_tokens
+
+
+def write_token_sequences(paths, sequences_number, block_size, generator):
+    """
+    Writes random token sequences of random lengths into files and returns the counts of their tokens.
+    """
+    tokens = get_grammar_tokens(5, [0])
+    token_counts = collections.Counter()
+    for path in paths:
+        with open(path, "w") as f:
+            for _ in range(sequences_number // len(paths)):
+                token_sequence = list(generator.choice(tokens, size=generator.integers(1, block_size)))
+                token_counts.update(token_sequence)
+                f.write(" ".join(token_sequence) + "\n")
+    return token_counts
+
+
+def time_first_batch_and_epoch(create_dataset, batch_size, num_workers, shuffle):
+    """
+    Times creating a dataset and getting its first batch, then iterating over the rest of the epoch.
+    """
+    start = time.perf_counter()
+    dataloader = DataLoader(create_dataset(), batch_size=batch_size, num_workers=num_workers, shuffle=shuffle)
+    iterator = iter(dataloader)
+    next(iterator)
+    first_batch_time = time.perf_counter() - start
+    for _ in iterator:
+        pass
+    return first_batch_time, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark streaming token sequence datasets.")
+    parser.add_argument("--sequences", type=int, nargs="+", default=[2000, 8000])
+    parser.add_argument("--files", type=int, default=4)
+    parser.add_argument("--block_size", type=int, default=768)
+    parser.add_argument("--batch_size", type=int, default=8)
+    parser.add_argument("--shuffle_buffer_size", type=int, default=200)
+    parser.add_argument("--num_workers", type=int, default=2)
+    args = parser.parse_args()
+
+    # The workers are forked after the tokenizer was used.
+    os.environ["TOKENIZERS_PARALLELISM"] = "false"
+    generator = np.random.default_rng(0)
+    print(
+        f"{'sequences':>10} {'loaded first s':>15} {'loaded epoch s':>15} {'streamed first s':>17} "
+        f"{'streamed epoch s':>17}"
+    )
+    for sequences_number in args.sequences:
+        with tempfile.TemporaryDirectory() as directory:
+            paths = [os.path.join(directory, f"token_sequences_train_{index}.txt") for index in range(args.files)]
+            token_counts = write_token_sequences(paths, sequences_number, args.block_size, generator)
+            tokenizer_path = os.path.join(directory, "tokenizer.json")
+            create_tokenizer(token_counts).save(tokenizer_path)
+            tokenizer = PreTrainedTokenizerFast(tokenizer_file=tokenizer_path)
+
+            loaded_times = time_first_batch_and_epoch(
+                lambda: TokenSequenceDataset(tokenizer, paths, args.block_size), args.batch_size, args.num_workers, True
+            )
+            streamed_times = time_first_batch_and_epoch(
+                lambda: StreamingTokenSequenceDataset(tokenizer, paths, args.block_size, args.shuffle_buffer_size),
+                args.batch_size,
+                args.num_workers,
+                False,
+            )
+            print(
+                f"{sequences_number:>10} {loaded_times[0]:>15.3f} {loaded_times[1]:>15.3f} {streamed_times[0]:>17.3f} "
+                f"{streamed_times[1]:>17.3f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Benchmarks encoding songs into token IDs through token strings and the tokenizer versus directly from the
+vocabulary, for dict and compact song data.
+"""
+
+import os
+import sys
+import timeit
+import argparse
+import tempfile
+import logging as std_logging
+from tokenizers import Tokenizer
+from tokenizers.models import WordLevel
+from tokenizers.pre_tokenizers import WhitespaceSplit
+from tokenizers.trainers import WordLevelTrainer
+
+# Sometimes, it may be necessary to add the project root to ensure the imports work correctly
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+sys.path.insert(0, project_root)
+
+from src.AI_GURU import logging
+from src.AI_GURU.preprocess.midojsb import preprocess_mido
+from src.AI_GURU.preprocess.songarray import songs_data_to_arrays
+from src.AI_GURU.preprocess.encode import encode_song_data, get_density_bins
+from src.AI_GURU.preprocess.tokenids import TokenIdEncoder, check_token_ids, encode_song_data_ids
+
+
+def train_tokenizer(token_sequences):
+    """
+    Trains a tokenizer like the DatasetCreator does.
+    """
+    with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False) as f:
+        for token_sequence in token_sequences:
+            print(" ".join(token_sequence), file=f)
+    tokenizer = Tokenizer(WordLevel(unk_token="[UNK]"))
+    tokenizer.pre_tokenizer = WhitespaceSplit()
+    trainer = WordLevelTrainer(special_tokens=["[UNK]", "[CLS]", "[SEP]", "[PAD]", "[MASK]"])
+    tokenizer.train(files=[f.name], trainer=trainer)
+    os.remove(f.name)
+    return tokenizer
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark encoding into token IDs.")
+    parser.add_argument("--midi_dir", type=str, default=os.path.join(project_root, "data", "time_delta_comparison"))
+    parser.add_argument("--transpositions", type=int, nargs="+", default=list(range(-3, 4)))
+    parser.add_argument("--window_size_bars", type=int, default=4)
+    parser.add_argument("--hop_length_bars", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    logging.set_log_level("all", std_logging.WARNING)
+
+    midi_files = [os.path.join(args.midi_dir, f) for f in sorted(os.listdir(args.midi_dir)) if f.endswith(".mid")]
+    songs_data_train, songs_data_valid, _ = preprocess_mido(midi_files)
+    songs_data = songs_data_train + songs_data_valid
+    window_size_bars, hop_length_bars = args.window_size_bars, args.hop_length_bars
+    density_bins = get_density_bins(songs_data, window_size_bars, hop_length_bars, 5)
+
+    def encode_strings(songs_data):
+        return [
+            token_sequence
+            for song_data in songs_data
+            for token_sequence in encode_song_data(
+                song_data, args.transpositions, False, window_size_bars, hop_length_bars, density_bins, False
+            )
+        ]
+
+    token_sequences = encode_strings(songs_data)
+    tokenizer = train_tokenizer(token_sequences)
+    token_id_encoder = TokenIdEncoder.from_tokenizer_json(tokenizer.to_str())
+
+    def encode_through_tokenizer(songs_data):
+        return [tokenizer.encode(" ".join(token_sequence)).ids for token_sequence in encode_strings(songs_data)]
+
+    def encode_ids(songs_data):
+        return [
+            token_ids
+            for song_data in songs_data
+            for token_ids in encode_song_data_ids(
+                song_data, token_id_encoder, args.transpositions, False, window_size_bars, hop_length_bars, density_bins
+            )
+        ]
+
+    for token_sequence, token_ids in zip(token_sequences, encode_ids(songs_data)):
+        assert check_token_ids(tokenizer, token_sequence, token_ids)
+
+    tokens_number = sum(len(token_sequence) for token_sequence in token_sequences)
+    print(f"{len(token_sequences)} sequences with {tokens_number} tokens.")
+    print(f"{'form':>8} {'strings + tokenizer s':>22} {'token IDs s':>12}")
+    for form, songs in [("dict", songs_data), ("compact", songs_data_to_arrays(songs_data))]:
+        tokenizer_time = min(timeit.repeat(lambda: encode_through_tokenizer(songs), number=1, repeat=args.repeat))
+        ids_time = min(timeit.repeat(lambda: encode_ids(songs), number=1, repeat=args.repeat))
+        print(f"{form:>8} {tokenizer_time:>22.3f} {ids_time:>12.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Benchmarks loading a token sequence file into a TokenSequenceDataset by tokenizing and padding every line in memory
+versus building and reopening the memory-mapped token cache, and checks that both yield the same examples. The
+memory is the size of the padded tensors held by the previous implementation versus the size of the example index
+held by the dataset, next to the size of the mapped token file, whose pages are only loaded when read.
+"""
+
+import os
+import sys
+import random
+import timeit
+import argparse
+import tempfile
+import collections
+import torch
+from transformers import PreTrainedTokenizerFast
+
+# Sometimes, it may be necessary to add the project root to ensure the imports work correctly
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+sys.path.insert(0, project_root)
+
+from src.AI_GURU.token_sequence_dataset import TokenSequenceDataset
+from src.AI_GURU.preprocess.vocabulary import create_tokenizer, get_grammar_tokens
+
+
+def load_examples(tokenizer, path, block_size):
+    """
+    The previous implementation, holding a padded tensor of every line.
+    """
+    pad_token_id = tokenizer.encode("[PAD]")[0]
+    unk_token_id = tokenizer.encode("[UNK]")[0]
+    examples = []
+    with open(path, "r") as f:
+        for line in f:
+            line = line.strip()
+            if line == "":
+                continue
+            encoded_line = tokenizer.encode(line)
+            if unk_token_id in encoded_line or len(encoded_line) > block_size:
+                continue
+            encoded_line += [pad_token_id] * (block_size - len(encoded_line))
+            examples += [torch.tensor(encoded_line, dtype=torch.long)]
+    return examples
+
+
+def write_token_sequences(path, sequences_number, block_size, generator):
+    """
+    Writes random token sequences of random lengths drawn from the grammar and returns the counts of their tokens.
+    """
+    tokens = get_grammar_tokens(5, [0])
+    token_counts = collections.Counter()
+    with open(path, "w") as f:
+        for _ in range(sequences_number):
+            token_sequence = generator.choices(tokens, k=generator.randint(1, block_size))
+            token_counts.update(token_sequence)
+            f.write(" ".join(token_sequence) + "\n")
+    return token_counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the memory-mapped token cache.")
+    parser.add_argument("--sequences", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--block_size", type=int, default=2048)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    generator = random.Random(0)
+    print(
+        f"{'sequences':>10} {'previous s':>11} {'previous MB':>12} {'build s':>8} {'reopen s':>9} "
+        f"{'index MB':>9} {'mapped MB':>10} {'identical':>10}"
+    )
+    for sequences_number in args.sequences:
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "token_sequences_train.txt")
+            token_counts = write_token_sequences(path, sequences_number, args.block_size, generator)
+            tokenizer_path = os.path.join(directory, "tokenizer.json")
+            create_tokenizer(token_counts).save(tokenizer_path)
+            tokenizer = PreTrainedTokenizerFast(tokenizer_file=tokenizer_path)
+
+            previous_time = min(
+                timeit.repeat(lambda: load_examples(tokenizer, path, args.block_size), number=1, repeat=args.repeat)
+            )
+            examples = load_examples(tokenizer, path, args.block_size)
+            previous_memory = sum(example.nbytes for example in examples) / 2**20
+
+            # The first dataset builds the cache, the next ones open it.
+            build_time = timeit.timeit(lambda: TokenSequenceDataset(tokenizer, [path], args.block_size), number=1)
+            reopen_time = min(
+                timeit.repeat(
+                    lambda: TokenSequenceDataset(tokenizer, [path], args.block_size), number=1, repeat=args.repeat
+                )
+            )
+            dataset = TokenSequenceDataset(tokenizer, [path], args.block_size)
+            cache_memory = dataset.examples.nbytes / 2**20
+            cache_disk = sum(os.path.getsize(cache.tokens.filename) for cache in dataset.caches) / 2**20
+            identical = len(dataset) == len(examples) and all(
+                torch.equal(dataset[i]["input_ids"], example) for i, example in enumerate(examples)
+            )
+            print(
+                f"{sequences_number:>10} {previous_time:>11.3f} {previous_memory:>12.1f} {build_time:>8.3f} "
+                f"{reopen_time:>9.4f} {cache_memory:>9.2f} {cache_disk:>10.2f} {str(identical):>10}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Benchmarks encoding songs with many transpositions and saving the token sequences, collecting all sequences
+in a list before writing them versus streaming them through a buffered TokenSequenceWriter.
+"""
+
+import os
+import sys
+import random
+import timeit
+import argparse
+import tempfile
+import tracemalloc
+
+# Sometimes, it may be necessary to add the project root to ensure the imports work correctly
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+sys.path.insert(0, project_root)
+
+from src.AI_GURU.preprocess.encode import encode_songs_data, get_density_bins, iterate_token_sequences
+from src.AI_GURU.preprocess.tokenwriter import TokenSequenceWriter
+
+
+def save_encoded_data_list(songs_data, path, density_bins, transpositions):
+    """
+    The previous implementation, encoding all songs before printing the sequences.
+    """
+    token_sequences = encode_songs_data(songs_data, transpositions, False, 8, 2, density_bins, False)
+    with open(path, "w") as file:
+        for token_sequence in token_sequences:
+            print(" ".join(token_sequence), file=file)
+
+
+def save_encoded_data_streaming(songs_data, path, density_bins, transpositions):
+    token_sequences = iterate_token_sequences(songs_data, transpositions, False, 8, 2, density_bins, False)
+    token_writer = TokenSequenceWriter(open(path, "wb"))
+    token_writer.write_all(token_sequences)
+    token_writer.close()
+    return token_writer.get_stats()
+
+
+def create_song_data(bars_number, tracks_number, notes_per_bar, generator):
+    """
+    Creates a song with the given number of bars and tracks.
+    """
+    tracks = []
+    for track_index in range(tracks_number):
+        bars = []
+        for _ in range(bars_number):
+            events = []
+            for _ in range(generator.randint(0, 2 * notes_per_bar)):
+                pitch = generator.randint(40, 80)
+                events += [
+                    {"type": "NOTE_ON", "pitch": pitch},
+                    {"type": "TIME_DELTA", "delta": 0.5},
+                    {"type": "NOTE_OFF", "pitch": pitch},
+                ]
+            bars.append({"events": events})
+        tracks.append({"name": "Piano", "number": track_index, "bars": bars})
+    return {"title": "benchmark", "number": 0, "tracks": tracks}
+
+
+def measure_peak_memory(function):
+    tracemalloc.start()
+    function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark streaming token sequence writes.")
+    parser.add_argument("--songs", type=int, nargs="+", default=[10, 40])
+    parser.add_argument("--bars", type=int, default=32)
+    parser.add_argument("--tracks", type=int, default=4)
+    parser.add_argument("--transpositions", type=int, default=25)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    generator = random.Random(0)
+    transpositions = list(range(-(args.transpositions // 2), args.transpositions - args.transpositions // 2))
+    print(f"{'songs':>6} {'list s':>8} {'stream s':>9} {'list MB':>8} {'stream MB':>10} {'sequences/s':>12}")
+    with tempfile.TemporaryDirectory() as directory:
+        list_path = os.path.join(directory, "list.txt")
+        streaming_path = os.path.join(directory, "streaming.txt")
+        for songs_number in args.songs:
+            songs_data = [create_song_data(args.bars, args.tracks, 8, generator) for _ in range(songs_number)]
+            density_bins = get_density_bins(songs_data, 8, 2, 5)
+
+            save_encoded_data_list(songs_data, list_path, density_bins, transpositions)
+            stats = save_encoded_data_streaming(songs_data, streaming_path, density_bins, transpositions)
+            with open(list_path, "rb") as f, open(streaming_path, "rb") as g:
+                assert f.read() == g.read()
+
+            list_time = min(
+                timeit.repeat(
+                    lambda: save_encoded_data_list(songs_data, list_path, density_bins, transpositions),
+                    number=1,
+                    repeat=args.repeat,
+                )
+            )
+            streaming_time = min(
+                timeit.repeat(
+                    lambda: save_encoded_data_streaming(songs_data, streaming_path, density_bins, transpositions),
+                    number=1,
+                    repeat=args.repeat,
+                )
+            )
+            list_memory = measure_peak_memory(
+                lambda: save_encoded_data_list(songs_data, list_path, density_bins, transpositions)
+            )
+            streaming_memory = measure_peak_memory(
+                lambda: save_encoded_data_streaming(songs_data, streaming_path, density_bins, transpositions)
+            )
+            print(
+                f"{songs_number:>6} {list_time:>8.3f} {streaming_time:>9.3f} {list_memory / 2**20:>8.1f} "
+                f"{streaming_memory / 2**20:>10.1f} {stats['sequences_per_second']:>12.0f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
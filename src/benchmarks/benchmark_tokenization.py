@@ -0,0 +1,100 @@
+"""
+Benchmarks tokenizing a token sequence file into a token cache line by line, as the cache used to be built, versus in
+batches of lines encoded together by the tokenizer backend with several batch sizes and thread counts, and checks
+that the cached token IDs are identical.
+"""
+
+import os
+import sys
+import timeit
+import argparse
+import tempfile
+import collections
+import numpy as np
+from transformers import PreTrainedTokenizerFast
+
+# Sometimes, it may be necessary to add the project root to ensure the imports work correctly
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+sys.path.insert(0, project_root)
+
+from src.AI_GURU.token_sequence_cache import TokenSequenceCache, build_cache, get_token_dtype
+from src.AI_GURU.preprocess.vocabulary import create_tokenizer, get_grammar_tokens
+
+
+def build_cache_line_by_line(tokenizer, dataset_path, cache_path):
+    """
+    The previous implementation, encoding every line on its own and scanning it for unknown tokens.
+    """
+    unk_token_id = tokenizer.encode("[UNK]")[0]
+    dtype = get_token_dtype(len(tokenizer))
+    offsets = [0]
+    with open(dataset_path, "r") as dataset_file, open(cache_path + ".tokens", "wb") as tokens_file:
+        for line in dataset_file:
+            line = line.strip()
+            if line == "":
+                continue
+            encoded_line = tokenizer.encode(line)
+            if unk_token_id in encoded_line:
+                continue
+            np.asarray(encoded_line, dtype=dtype).tofile(tokens_file)
+            offsets.append(offsets[-1] + len(encoded_line))
+    return np.fromfile(cache_path + ".tokens", dtype=dtype), np.asarray(offsets)
+
+
+def write_token_sequences(path, sequences_number, sequence_length, generator):
+    """
+    Writes random token sequences drawn from the grammar, some with an unknown token, and returns the token counts.
+    """
+    tokens = get_grammar_tokens(5, [0])
+    token_counts = collections.Counter()
+    with open(path, "w") as f:
+        for index in range(sequences_number):
+            token_sequence = list(generator.choice(tokens, size=generator.integers(1, sequence_length)))
+            token_counts.update(token_sequence)
+            f.write(" ".join(token_sequence + (["UNKNOWN"] if index % 100 == 0 else [])) + "\n")
+    return token_counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark batched tokenization of token sequence files.")
+    parser.add_argument("--sequences", type=int, default=20000)
+    parser.add_argument("--sequence_length", type=int, default=768)
+    parser.add_argument("--batch_sizes", type=int, nargs="+", default=[100, 1000])
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    generator = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "token_sequences_train.txt")
+        token_counts = write_token_sequences(path, args.sequences, args.sequence_length, generator)
+        tokenizer_path = os.path.join(directory, "tokenizer.json")
+        create_tokenizer(token_counts).save(tokenizer_path)
+        tokenizer = PreTrainedTokenizerFast(tokenizer_file=tokenizer_path)
+        cache_path = os.path.join(directory, "cache")
+
+        line_time = min(
+            timeit.repeat(lambda: build_cache_line_by_line(tokenizer, path, cache_path), number=1, repeat=args.repeat)
+        )
+        tokens, offsets = build_cache_line_by_line(tokenizer, path, cache_path)
+        print(f"{'batch size':>10} {'threads':>8} {'seconds':>8} {'speedup':>8} {'identical':>10}")
+        print(f"{'line':>10} {1:>8} {line_time:>8.3f} {1.0:>8.2f} {'':>10}")
+        for batch_size in args.batch_sizes:
+            for threads in args.threads:
+                batched_time = min(
+                    timeit.repeat(
+                        lambda: build_cache(tokenizer, path, cache_path, batch_size, threads),
+                        number=1,
+                        repeat=args.repeat,
+                    )
+                )
+                cache = TokenSequenceCache(cache_path)
+                identical = np.array_equal(cache.tokens, tokens) and np.array_equal(cache.offsets, offsets)
+                print(
+                    f"{batch_size:>10} {threads:>8} {batched_time:>8.3f} {line_time / batched_time:>8.2f} "
+                    f"{str(identical):>10}"
+                )
+
+
+if __name__ == "__main__":
+    main()
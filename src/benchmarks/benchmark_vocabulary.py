@@ -0,0 +1,73 @@
+"""
+Benchmarks building the tokenizer of a dataset by training a WordLevelTrainer on the token sequence file versus
+from the token counts gathered while the sequences are written, and checks that both tokenizers are equal.
+"""
+
+import os
+import sys
+import random
+import timeit
+import argparse
+import tempfile
+import collections
+from tokenizers import Tokenizer
+from tokenizers.models import WordLevel
+from tokenizers.pre_tokenizers import WhitespaceSplit
+from tokenizers.trainers import WordLevelTrainer
+
+# Sometimes, it may be necessary to add the project root to ensure the imports work correctly
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+sys.path.insert(0, project_root)
+
+from src.AI_GURU.preprocess.vocabulary import SPECIAL_TOKENS, create_tokenizer, get_grammar_tokens
+
+
+def train_tokenizer(path):
+    """
+    The previous implementation, reading the token sequence file again.
+    """
+    tokenizer = Tokenizer(WordLevel(unk_token="[UNK]"))
+    tokenizer.pre_tokenizer = WhitespaceSplit()
+    tokenizer.train(files=[path], trainer=WordLevelTrainer(special_tokens=SPECIAL_TOKENS))
+    return tokenizer
+
+
+def write_token_sequences(path, sequences_number, sequence_length, generator):
+    """
+    Writes random token sequences drawn from the grammar and returns the counts of their tokens.
+    """
+    tokens = get_grammar_tokens(5, [0]) + [f"TIME_DELTA={delta / 4}" for delta in range(1, 17)]
+    token_counts = collections.Counter()
+    with open(path, "w") as f:
+        for _ in range(sequences_number):
+            token_sequence = generator.choices(tokens, k=sequence_length)
+            token_counts.update(token_sequence)
+            f.write(" ".join(token_sequence) + "\n")
+    return token_counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark building tokenizers from token counts.")
+    parser.add_argument("--sequences", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--sequence_length", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    generator = random.Random(0)
+    print(f"{'sequences':>10} {'file MB':>8} {'trained s':>10} {'counts s':>9} {'identical':>10}")
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "token_sequences_train.txt")
+        for sequences_number in args.sequences:
+            token_counts = write_token_sequences(path, sequences_number, args.sequence_length, generator)
+            identical = train_tokenizer(path).to_str() == create_tokenizer(token_counts).to_str()
+
+            trained_time = min(timeit.repeat(lambda: train_tokenizer(path), number=1, repeat=args.repeat))
+            counts_time = min(timeit.repeat(lambda: create_tokenizer(token_counts), number=1, repeat=args.repeat))
+            print(
+                f"{sequences_number:>10} {os.path.getsize(path) / 2**20:>8.1f} {trained_time:>10.3f} "
+                f"{counts_time:>9.4f} {str(identical):>10}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,18 @@
+import io
 import os
-import shutil
+import sys
 import logging
 import threading
 from concurrent.futures import ThreadPoolExecutor
 from music21 import converter
-from music21.midi import MidiFile
 import mido
 import pretty_midi
 
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+sys.path.insert(0, project_root)
+
+from src.AI_GURU.preprocess.midiscan import check_midi_structure
+
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 logger = logging.getLogger("filter_midi")
 
@@ -18,13 +23,14 @@ class ParseTimeoutError(Exception):
     pass
 
 
-def parse_with_timeout(file_path, timeout=20):
+def parse_with_timeout(file_path, timeout=20, data=None):
     """
     Parses a MIDI file within a specified timeout.
 
     Args:
         file_path (str): Path to the MIDI file to parse.
         timeout (int, optional): Maximum allowed parsing time in seconds. Defaults to 20.
+        data (bytes, optional): Content of the MIDI file, if already read. Defaults to None.
 
     Returns:
         music21.stream.Score: Parsed MIDI file.
@@ -38,7 +44,10 @@ def parse_with_timeout(file_path, timeout=20):
 
     def parse_file():
         try:
-            result[0] = converter.parse(file_path)
+            if data is None:
+                result[0] = converter.parse(file_path)
+            else:
+                result[0] = converter.parseData(data, format="midi")
         except Exception as e:
             exception[0] = e
 
@@ -56,43 +65,27 @@ def parse_with_timeout(file_path, timeout=20):
     return result[0]
 
 
-def is_valid_midi_music21(file_path):
+def read_midi_file(file_path):
     """
-    Checks if a MIDI file is valid.
-
-    Args:
-        file_path (str): Path to the MIDI file to validate.
-
-    Returns:
-        bool: True if the file is a valid MIDI, False otherwise.
-    """
-    try:
-        mf = MidiFile()
-        mf.open(file_path)
-        mf.read()
-        mf.close()
-        return True
-    except Exception as e:
-        logger.warning(f"Invalid MIDI file: {file_path}. Error: {e}")
-        return False
-
+    Reads a MIDI file once, checks its structure and decodes its events with mido.
 
-def is_valid_midi_mido(file_path):
-    """
-    Validates the structure of a MIDI file using mido.
+    The structural check rejects the headers and chunk layouts music21's MIDI reader rejects, and decoding
+    the events rejects what mido rejects.
 
     Args:
         file_path (str): Path to the MIDI file.
 
     Returns:
-        bool: True if the file is valid, False otherwise.
+        tuple: (content of the file, decoded mido.MidiFile), or None if the file is invalid.
     """
     try:
-        mido.MidiFile(file_path)
-        return True  # File is valid
+        with open(file_path, "rb") as f:
+            data = f.read()
+        check_midi_structure(data)
+        return data, mido.MidiFile(file=io.BytesIO(data))
     except Exception as e:
         logger.warning(f"Invalid MIDI file: {file_path}. Error: {e}")
-        return False
+        return None
 
 
 def find_midi_files(directories):
@@ -115,10 +108,23 @@ def find_midi_files(directories):
 
 
 def extract_midi_segment(midi_file, segment_duration=20):
+    """
+    Extracts the notes starting within a segment around the middle of a MIDI file.
+
+    Args:
+        midi_file (str/mido.MidiFile): Path to the MIDI file, or the already decoded file.
+        segment_duration (int, optional): Duration of the segment in seconds. Defaults to 20.
+
+    Returns:
+        pretty_midi.PrettyMIDI: The extracted segment.
+    """
     if segment_duration <= 0:
         raise ValueError("segment_duration must be greater than 0.")
 
-    midi = pretty_midi.PrettyMIDI(midi_file)
+    if isinstance(midi_file, mido.MidiFile):
+        midi = pretty_midi.PrettyMIDI(mido_object=midi_file)
+    else:
+        midi = pretty_midi.PrettyMIDI(midi_file)
     total_duration = midi.get_end_time()
     middle_time = total_duration / 2
     segment_start = max(0, middle_time - segment_duration / 2)
@@ -142,36 +148,41 @@ def extract_midi_segment(midi_file, segment_duration=20):
     return extracted_midi
 
 
-def process_midi_file(midi_file, output_directory, copy_only=True, segment_duration=20):
+def process_midi_file(midi_file, output_directory, copy_only=True, segment_duration=20, music21_check=True):
     """
     Processes a MIDI file, validates and parses it, and either copies it to the output directory or extracts a segment.
 
+    The file is read from disk once, and music21 parses the content already in memory.
+
     Args:
         midi_file (str): Path to the MIDI file to process.
         output_directory (str): Directory to copy or save processed MIDI files.
         copy_only (bool, optional): If True, copies the file. If False, extracts the middle segment. Defaults to True.
+        segment_duration (int, optional): Duration of the extracted segment in seconds. Defaults to 20.
+        music21_check (bool, optional): If True, also requires music21 to parse the file within 20 seconds.
+            Defaults to True.
 
     Returns:
         str or None: Path to the processed file if successful, otherwise None.
     """
-    if not is_valid_midi_music21(midi_file):
-        logger.warning(f"Skipping invalid MIDI file (music21 check): {midi_file}")
-        return None
-
-    if not is_valid_midi_mido(midi_file):
-        logger.warning(f"Skipping invalid MIDI file (mido check): {midi_file}")
+    midi = read_midi_file(midi_file)
+    if midi is None:
+        logger.warning(f"Skipping invalid MIDI file: {midi_file}")
         return None
+    data, midi_data = midi
 
     try:
-        _ = parse_with_timeout(midi_file, timeout=20)
+        if music21_check:
+            _ = parse_with_timeout(midi_file, timeout=20, data=data)
         output_path = os.path.join(output_directory, os.path.basename(midi_file))
 
         if copy_only:
             logger.info(f"Copying full MIDI file: {midi_file}")
-            shutil.copyfile(midi_file, output_path)
+            with open(output_path, "wb") as f:
+                f.write(data)
         else:
             logger.info(f"Extracting {segment_duration}s segment from MIDI file: {midi_file}")
-            extracted_midi = extract_midi_segment(midi_file, segment_duration)
+            extracted_midi = extract_midi_segment(midi_data, segment_duration)
             extracted_midi.write(output_path)
 
         logger.info(f"Processed file: {midi_file} to {output_path}")
@@ -184,7 +195,9 @@ def process_midi_file(midi_file, output_directory, copy_only=True, segment_durat
     return None
 
 
-def filter_and_collect_midi(midi_files, output_directory, max_workers=8, copy_only=True, segment_duration=20):
+def filter_and_collect_midi(
+    midi_files, output_directory, max_workers=8, copy_only=True, segment_duration=20, music21_check=True
+):
     """
     Filters and processes a list of MIDI files, copying or extracting valid ones to the output directory.
 
@@ -193,6 +206,8 @@ def filter_and_collect_midi(midi_files, output_directory, max_workers=8, copy_on
         output_directory (str): Directory to store processed MIDI files.
         max_workers (int, optional): Number of threads to use for concurrent processing. Defaults to 4.
         copy_only (bool, optional): If True, copies the files. If False, extracts middle segments. Defaults to True.
+        segment_duration (int, optional): Duration of the extracted segments in seconds. Defaults to 20.
+        music21_check (bool, optional): If True, also requires music21 to parse the files. Defaults to True.
 
     Returns:
         list of str: List of paths to successfully processed MIDI files.
@@ -205,7 +220,8 @@ def filter_and_collect_midi(midi_files, output_directory, max_workers=8, copy_on
     processed_files = []
     with ThreadPoolExecutor(max_workers=max_workers) as executor:
         futures = [
-            executor.submit(process_midi_file, f, output_directory, copy_only, segment_duration) for f in midi_files
+            executor.submit(process_midi_file, f, output_directory, copy_only, segment_duration, music21_check)
+            for f in midi_files
         ]
         for future in futures:
             try:
@@ -254,7 +270,13 @@ if __name__ == "__main__":
     logger.info(f"Processing part {part_to_run}/{total_parts} with {len(files_for_this_run)} files.")
 
     copy_only_mode = input("Copy only (y/n)? ").strip().lower() == "y"
+    music21_check_mode = input("Require a full music21 parse (Y/n)? ").strip().lower() != "n"
 
     filter_and_collect_midi(
-        files_for_this_run, output_directory, max_workers=8, copy_only=copy_only_mode, segment_duration=20
+        files_for_this_run,
+        output_directory,
+        max_workers=8,
+        copy_only=copy_only_mode,
+        segment_duration=20,
+        music21_check=music21_check_mode,
     )
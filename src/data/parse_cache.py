@@ -0,0 +1,66 @@
+"""
+This script inspects and prunes the parse cache holding the song data of already parsed MIDI files.
+"""
+
+import os
+import sys
+import argparse
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+sys.path.insert(0, project_root)
+
+from src.AI_GURU.preprocess.parsecache import ParseCache
+
+BYTES_PER_MEGABYTE = 1024 * 1024
+SECONDS_PER_DAY = 24 * 60 * 60
+
+
+def print_cache_info(cache):
+    """
+    Prints the number of entries and the size of the parse cache.
+
+    Args:
+        cache (ParseCache): The parse cache.
+    """
+    entries = cache.entries()
+    size_bytes = sum(size for _, size, _ in entries)
+    print(f"Parse cache: {cache.cache_path}")
+    print(f"Entries: {len(entries)}")
+    print(f"Size: {size_bytes / BYTES_PER_MEGABYTE:.2f} MB")
+    if entries:
+        print(f"Average entry size: {size_bytes / len(entries) / 1024:.1f} KB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect and prune the parse cache.")
+    parser.add_argument("cache_path", type=str, help="Directory of the parse cache.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("info", help="Show the number of entries and the size of the cache.")
+    evict_parser = subparsers.add_parser("evict", help="Remove least recently used entries down to a size.")
+    evict_parser.add_argument("--max_size_mb", type=float, required=True, help="Size to shrink the cache to in MB.")
+    prune_parser = subparsers.add_parser("prune", help="Remove entries not used for some time.")
+    prune_parser.add_argument("--max_age_days", type=float, required=True, help="Maximum days since last use.")
+    subparsers.add_parser("clear", help="Remove all entries.")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.cache_path):
+        print(f"Error: The parse cache '{args.cache_path}' does not exist.", file=sys.stderr)
+        sys.exit(1)
+
+    cache = ParseCache(args.cache_path)
+    if args.command == "info":
+        print_cache_info(cache)
+        return
+    elif args.command == "evict":
+        removed_number = cache.evict(int(args.max_size_mb * BYTES_PER_MEGABYTE))
+    elif args.command == "prune":
+        removed_number = cache.prune(args.max_age_days * SECONDS_PER_DAY)
+    else:
+        removed_number = cache.clear()
+
+    print(f"Removed {removed_number} entries.")
+    print_cache_info(cache)
+
+
+if __name__ == "__main__":
+    main()
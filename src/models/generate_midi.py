@@ -8,16 +8,23 @@ import json
 import sys
 from pathlib import Path
 import note_seq
+import mido
+import torch
 from src.models.errors import InvalidFileFormatError, UnknownModelError
 from transformers import PreTrainedTokenizerFast, GPT2LMHeadModel
 from music21 import converter, tempo, stream
 from huggingface_hub import hf_hub_download
 from src.AI_GURU.preprocess.music21jsb import preprocess_music21_song
+from src.AI_GURU.preprocess.midojsb import preprocess_mido_song
+from src.AI_GURU.preprocess import music21jsb, midojsb
+from src.AI_GURU.preprocess.parsecache import ParseCache
 from src.AI_GURU.preprocess.encode import encode_song_data_singular
+from src.AI_GURU.preprocess.tokenids import TokenIdEncoder, encode_song_data_singular_ids
 from src.AI_GURU.token_sequence_helpers import token_sequence_to_note_sequence
 from src.models.models_list import models
 
 TOKENIZER_FILENAME = "tokenizer.json"
+INGESTION_METHODS = ["music21", "mido"]
 
 
 def verify_paths(path_to_midi, output_path):
@@ -81,7 +88,43 @@ def combine_note_sequneces(note_sequence1, note_sequence2):
     return combined_sequence
 
 
-def generate_midi_score(midi, density, tokenizer_repo, model_repo, max_length=1000, save_tokens=False):
+def load_song_data(midi, ingestion="music21", cache_path=None):
+    """
+    Reads a MIDI file into song data.
+
+    Args:
+        midi (str): Path to the input MIDI file.
+        ingestion (str): "music21" or "mido". Both produce the same song data, mido is faster. Default is music21
+        cache_path (str): Directory of a parse cache to look up and store the song data. Default is None
+
+    Returns:
+        dict: The song data.
+    """
+    if ingestion not in INGESTION_METHODS:
+        raise ValueError(f"{ingestion} is not an available ingestion method. Available: {INGESTION_METHODS}")
+
+    cache, key = None, None
+    if cache_path is not None:
+        cache = ParseCache(cache_path)
+        parser_version = music21jsb.PARSER_VERSION if ingestion == "music21" else midojsb.PARSER_VERSION
+        key = cache.key(midi, parser_version)
+        hit, song_data = cache.get(key)
+        if hit:
+            return song_data
+
+    if ingestion == "music21":
+        song_data = preprocess_music21_song(converter.parse(midi))
+    else:
+        song_data = preprocess_mido_song(mido.MidiFile(midi))
+
+    if cache is not None:
+        cache.put(key, song_data)
+    return song_data
+
+
+def generate_midi_score(
+    midi, density, tokenizer_repo, model_repo, max_length=1000, save_tokens=False, ingestion="music21", cache_path=None
+):
     """
     Generates an enriched MIDI score using the specified model and tokenizer.
 
@@ -92,13 +135,13 @@ def generate_midi_score(midi, density, tokenizer_repo, model_repo, max_length=10
         model_repo (str): Hugging Face repository ID for the model.
         max_length (int): Maximum length of the generated sequence. Default is 1000
         save_tokens (boolean): If true, the tokens from original and generated midi get saved in data.json
+        ingestion (str): "music21" or "mido" for reading the input MIDI file. Default is music21
+        cache_path (str): Directory of a parse cache for the input MIDI file. Default is None
 
     Returns:
         note_seq.NoteSequence: The generated note sequence.
     """
-    score = converter.parse(midi)
-    song_data = preprocess_music21_song(score)
-    parsed_midi = encode_song_data_singular(song_data, density)
+    song_data = load_song_data(midi, ingestion, cache_path)
 
     repo_type = "model" if tokenizer_repo == model_repo else "dataset"
     tokenizer_path = hf_hub_download(repo_id=tokenizer_repo, filename=TOKENIZER_FILENAME, repo_type=repo_type)
@@ -107,13 +150,16 @@ def generate_midi_score(midi, density, tokenizer_repo, model_repo, max_length=10
 
     model = GPT2LMHeadModel.from_pretrained(model_repo)
 
-    input_ids = tokenizer.encode(" ".join(parsed_midi), return_tensors="pt")
+    # Encode the song straight into token IDs, without joining and splitting token strings.
+    token_id_encoder = TokenIdEncoder.from_file(tokenizer_path)
+    input_ids = torch.from_numpy(encode_song_data_singular_ids(song_data, density, token_id_encoder)).unsqueeze(0)
     generated_sequence = model.generate(input_ids, max_length=max_length, do_sample=True)
     decoded_sequence = tokenizer.decode(generated_sequence[0])
 
     generated_note_sequence = token_sequence_to_note_sequence(decoded_sequence, use_program=True, use_drums=True)
 
     if save_tokens:
+        parsed_midi = encode_song_data_singular(song_data, density)
         data = {"original": " ".join(parsed_midi), "generated": decoded_sequence}
         with open(os.path.join(".", "data.json"), "w+") as f:
             json.dump(data, f)
@@ -121,7 +167,9 @@ def generate_midi_score(midi, density, tokenizer_repo, model_repo, max_length=10
     return generated_note_sequence
 
 
-def generate_orchestrified_midi(midi, density, tokenizer_repo, model_repo, max_length=1000, save_tokens=False):
+def generate_orchestrified_midi(
+    midi, density, tokenizer_repo, model_repo, max_length=1000, save_tokens=False, ingestion="music21"
+):
     """
     Generates an enriched MIDI score and overlays it over the original audio.
 
@@ -132,12 +180,15 @@ def generate_orchestrified_midi(midi, density, tokenizer_repo, model_repo, max_l
         model_repo (str): Hugging Face repository ID for the model.
         max_length (int): Maximum length of the generated sequence. Default is 1000
         save_tokens (boolean): If true, the tokens from original and generated midi get saved in data.json
+        ingestion (str): "music21" or "mido" for reading the input MIDI file. Default is music21
 
     Returns:
         note_seq.NoteSequence: The generated note sequence combined with the original audio.
     """
     original_note_sequence = note_seq.midi_io.midi_file_to_note_sequence(midi)
-    generated_note_sequence = generate_midi_score(midi, density, tokenizer_repo, model_repo, max_length, save_tokens)
+    generated_note_sequence = generate_midi_score(
+        midi, density, tokenizer_repo, model_repo, max_length, save_tokens, ingestion
+    )
 
     return combine_note_sequneces(original_note_sequence, generated_note_sequence)
 
@@ -148,6 +199,14 @@ def main():
     parser.add_argument("--output_path", type=str, required=True, help="Path to save the output.")
     parser.add_argument("--model", type=str, required=True, help="Name of the model to use.")
     parser.add_argument("--density", type=float, required=True, help="Density value for generation.")
+    parser.add_argument(
+        "--ingestion",
+        type=str,
+        default="music21",
+        choices=INGESTION_METHODS,
+        help="Library used to read the MIDI file.",
+    )
+    parser.add_argument("--parse_cache", type=str, default=None, help="Directory of the parse cache.")
 
     args = parser.parse_args()
 
@@ -164,7 +223,9 @@ def main():
         sys.exit(1)
 
     repos = models[model_name]
-    generated_note_sequence = generate_midi_score(midi_path, density, repos["tokenizer"], repos["model"])
+    generated_note_sequence = generate_midi_score(
+        midi_path, density, repos["tokenizer"], repos["model"], ingestion=args.ingestion, cache_path=args.parse_cache
+    )
 
     note_seq.note_seq.sequence_proto_to_midi_file(
         generated_note_sequence, os.path.join(output_path, f"{Path(midi_path).stem}_generated.mid")
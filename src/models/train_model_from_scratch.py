@@ -28,6 +28,10 @@ def train_model(
     batch_size=16,
     epochs=10,
     simulate=False,
+    dynamic_padding=False,
+    sequence_packing=False,
+    streaming=False,
+    max_steps=-1,
 ):
     """
     Trains a model using the specified dataset and configuration.
@@ -39,10 +43,18 @@ def train_model(
         tokenizer_file (str): Path to the tokenizer file.
         output_path (str): Directory where the trained model will be saved.
         pad_length (int): Padding length for input sequences. Default is 768.
-        shuffle_buffer_size (int): Buffer size for shuffling the dataset. Default is 10000.
+        shuffle_buffer_size (int): Buffer size for shuffling the streamed dataset. Default is 10000.
         batch_size (int): Batch size for training. Default is 16.
         epochs (int): Number of training epochs. Default is 10.
         simulate (bool): If True, simulates training without actual updates.
+        dynamic_padding (bool): If True, pads each batch of similar lengths to its longest sequence instead of
+            padding every sequence to `pad_length`. Default is False.
+        sequence_packing (bool): If True, packs consecutive sequences into blocks of `pad_length` tokens instead of
+            padding them. Default is False.
+        streaming (bool): If True, reads the training data while training, shuffled through a buffer of
+            `shuffle_buffer_size` sequences, instead of loading it first. Default is False.
+        max_steps (int): Number of training steps, replacing `epochs` if positive. Required when streaming.
+            Default is -1.
 
     Returns:
         None
@@ -59,6 +71,10 @@ def train_model(
         shuffle_buffer_size=shuffle_buffer_size,
         batch_size=batch_size,
         epochs=epochs,
+        dynamic_padding=dynamic_padding,
+        sequence_packing=sequence_packing,
+        streaming=streaming,
+        max_steps=max_steps,
     )
 
     trainer = MMMTrainer(trainer_config)
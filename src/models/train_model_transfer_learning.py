@@ -15,8 +15,10 @@ from transformers import (
     DataCollatorWithPadding,
     Trainer,
     TrainingArguments,
+    default_data_collator,
 )
-from src.AI_GURU.token_sequence_dataset import TokenSequenceDataset
+from src.AI_GURU.token_sequence_dataset import PackedTokenSequenceDataset, TokenSequenceDataset
+from src.AI_GURU.token_sequence_batching import DynamicPaddingCollator, LengthGroupedTrainer, report_padding_fraction
 
 
 def transfer_learn_model(
@@ -33,6 +35,8 @@ def transfer_learn_model(
     weight_decay=0.01,
     save_steps=500,
     logging_steps=500,
+    dynamic_padding=False,
+    sequence_packing=False,
 ):
     """
     Fine-tunes a pre-trained model using transfer learning.
@@ -51,6 +55,10 @@ def transfer_learn_model(
         weight_decay (float): Weight decay for optimizer. Default is 0.01.
         save_steps (int): Number of steps before saving a checkpoint. Default is 500.
         logging_steps (int): Number of steps before logging. Default is 500.
+        dynamic_padding (bool): Whether to batch the training examples by length and pad each batch to its longest
+            example, masking the padding out of the loss. Default is False.
+        sequence_packing (bool): Whether to pack consecutive sequences into blocks of `block_size` tokens instead
+            of padding them, masking the loss across sequences. Default is False.
 
     Returns:
         None
@@ -59,20 +67,40 @@ def transfer_learn_model(
     tokenizer = PreTrainedTokenizerFast(tokenizer_file=tokenizer_path)
     tokenizer.add_special_tokens({"pad_token": "[PAD]"})
 
-    data_collator = DataCollatorWithPadding(tokenizer=tokenizer, padding="max_length", max_length=block_size)
-
-    dataset_train = TokenSequenceDataset(
-        tokenizer=tokenizer,
-        dataset_paths=[train_dataset_path],
-        block_size=block_size,
-        simulate=False,
-    )
-    dataset_valid = TokenSequenceDataset(
-        tokenizer=tokenizer,
-        dataset_paths=[valid_dataset_path],
-        block_size=block_size,
-        simulate=False,
-    )
+    if dynamic_padding and sequence_packing:
+        error_string = "Dynamic padding and sequence packing cannot be enabled together."
+        raise Exception(error_string)
+
+    if sequence_packing:
+        dataset_train = PackedTokenSequenceDataset(
+            tokenizer=tokenizer, dataset_paths=[train_dataset_path], block_size=block_size, simulate=False
+        )
+        dataset_valid = PackedTokenSequenceDataset(
+            tokenizer=tokenizer, dataset_paths=[valid_dataset_path], block_size=block_size, simulate=False
+        )
+    else:
+        dataset_train = TokenSequenceDataset(
+            tokenizer=tokenizer,
+            dataset_paths=[train_dataset_path],
+            block_size=block_size,
+            simulate=False,
+            padding=not dynamic_padding,
+        )
+        dataset_valid = TokenSequenceDataset(
+            tokenizer=tokenizer,
+            dataset_paths=[valid_dataset_path],
+            block_size=block_size,
+            simulate=False,
+            padding=not dynamic_padding,
+        )
+
+    if sequence_packing:
+        data_collator = default_data_collator
+    elif dynamic_padding:
+        report_padding_fraction(dataset_train.lengths, batch_size, block_size)
+        data_collator = DynamicPaddingCollator(pad_token_id=dataset_train.pad_token_id)
+    else:
+        data_collator = DataCollatorWithPadding(tokenizer=tokenizer, padding="max_length", max_length=block_size)
 
     model.resize_token_embeddings(len(tokenizer))
 
@@ -111,7 +139,8 @@ def transfer_learn_model(
         weight_decay=weight_decay,
     )
 
-    trainer = Trainer(
+    trainer_class = LengthGroupedTrainer if dynamic_padding else Trainer
+    trainer = trainer_class(
         model=model,
         args=training_args,
         data_collator=data_collator,
@@ -147,4 +176,6 @@ if __name__ == "__main__":
         weight_decay=0.01,
         save_steps=500,
         logging_steps=500,
+        dynamic_padding=False,
+        sequence_packing=False,
     )
@@ -0,0 +1,148 @@
+import os
+import sys
+import glob
+import shutil
+import collections
+import numpy as np
+import pytest
+from transformers import PreTrainedTokenizerFast
+
+# Add project root to the path for module imports
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+sys.path.insert(0, project_root)
+
+from src.AI_GURU import datasetcreator
+from src.AI_GURU.preprocess import encode
+from src.AI_GURU.datasetcreatorconfig import JSBDatasetCreatorBarConfig
+from src.AI_GURU.preprocess.music21jsb import preprocess_music21
+from src.AI_GURU.preprocess.vocabulary import create_tokenizer, get_grammar_tokens
+
+SANITY_MIDI_FILES = sorted(glob.glob(os.path.join(project_root, "data", "sanity", "*.mid")))
+
+
+@pytest.fixture
+def small_batches(monkeypatch):
+    """
+    Fixture splitting the sanity files into three batches.
+    """
+    monkeypatch.setattr(datasetcreator, "BATCH_SIZE", 5)
+
+
+@pytest.fixture
+def copy_midi_files(tmp_path):
+    """
+    Fixture providing a function that copies MIDI files, all sanity files by default, into the MIDI files
+    directory of tmp_path, where the DatasetCreator looks for them.
+    """
+
+    def copy(midi_files=SANITY_MIDI_FILES):
+        midi_files_path = tmp_path / "midi_files"
+        midi_files_path.mkdir(exist_ok=True)
+        for midi_file in midi_files:
+            shutil.copy(midi_file, midi_files_path)
+        return midi_files_path
+
+    return copy
+
+
+@pytest.fixture
+def sanity_midi_files(copy_midi_files):
+    """
+    Fixture copying all sanity files into the MIDI files directory of tmp_path.
+    """
+    return copy_midi_files()
+
+
+@pytest.fixture
+def create_config():
+    """
+    Fixture providing a function that creates a bar configuration with one bar windows, as the sanity songs are
+    only a few bars long. Without track permutation, the output does not depend on the random state.
+    """
+
+    def create(dataset_name=None, permute_tracks=True, **kwargs):
+        config = JSBDatasetCreatorBarConfig(parse_workers=2, **kwargs)
+        if dataset_name is not None:
+            config.dataset_name = dataset_name
+        config.window_size_bars = 1
+        config.hop_length_bars = 1
+        config.permute_tracks = permute_tracks
+        return config
+
+    return create
+
+
+@pytest.fixture
+def parsed_files(monkeypatch):
+    """
+    Fixture recording the MIDI files the DatasetCreator parses with music21.
+    """
+    parsed_files = []
+    iterate_music21 = datasetcreator.ITERATE_METHODS[preprocess_music21]
+
+    def record(midi_files, **kwargs):
+        parsed_files.extend(midi_files)
+        return iterate_music21(midi_files, **kwargs)
+
+    monkeypatch.setitem(datasetcreator.ITERATE_METHODS, preprocess_music21, record)
+    return parsed_files
+
+
+@pytest.fixture
+def interrupt_encoding(monkeypatch):
+    """
+    Fixture providing a function that creates datasets and interrupts the creation while encoding a song,
+    the seventh by default.
+    """
+
+    def create_interrupted(dataset_creator, datasets_path, songs_number=7):
+        calls = []
+        encode_song_data = encode.encode_song_data
+
+        def interrupt(*args, **kwargs):
+            calls.append(args)
+            if len(calls) == songs_number:
+                raise KeyboardInterrupt()
+            return encode_song_data(*args, **kwargs)
+
+        monkeypatch.setattr(encode, "encode_song_data", interrupt)
+        try:
+            with pytest.raises(KeyboardInterrupt):
+                dataset_creator.create(str(datasets_path))
+        finally:
+            monkeypatch.setattr(encode, "encode_song_data", encode_song_data)
+
+    return create_interrupted
+
+
+@pytest.fixture
+def write_token_sequences(tmp_path):
+    """
+    Fixture providing a function that writes files of token sequences of random lengths into tmp_path, and
+    returns their paths and a tokenizer of their tokens with a padding token.
+
+    The function takes the file names, the number of lines of each file, the maximum number of tokens of a line,
+    a prefix of every line, and extra lines appended to each file whose tokens the tokenizer does not count.
+    """
+
+    def write(file_names, lines_number, max_length, prefix="", extra_lines=()):
+        generator = np.random.default_rng(0)
+        tokens = get_grammar_tokens(5, [0])
+        paths = []
+        token_counts = collections.Counter()
+        for file_name in file_names:
+            lines = [
+                prefix + " ".join(generator.choice(tokens, size=generator.integers(1, max_length)))
+                for _ in range(lines_number)
+            ]
+            token_counts.update(" ".join(lines).split())
+            path = tmp_path / file_name
+            path.write_text("\n".join(lines + list(extra_lines)) + "\n")
+            paths += [str(path)]
+        tokenizer_path = str(tmp_path / "tokenizer.json")
+        create_tokenizer(token_counts).save(tokenizer_path)
+        tokenizer = PreTrainedTokenizerFast(tokenizer_file=tokenizer_path)
+        tokenizer.add_special_tokens({"pad_token": "[PAD]"})
+        return paths, tokenizer
+
+    return write
@@ -0,0 +1,58 @@
+import os
+import sys
+import random
+import pytest
+
+# Add project root to the path for module imports
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+sys.path.insert(0, project_root)
+
+from src.AI_GURU.preprocess.encode import encode_track_data, get_density_bins
+from src.AI_GURU.preprocess.songarray import song_data_to_array
+
+
+def create_song_data():
+    """
+    Helper function creating a song with a drum track and tracks of different lengths.
+    """
+    generator = random.Random(0)
+    tracks = []
+    for track_index, bars_number in enumerate([12, 7, 12]):
+        bars = []
+        for _ in range(bars_number):
+            events = []
+            for _ in range(generator.randint(0, 4)):
+                pitch = generator.randint(40, 80)
+                events += [
+                    {"type": "NOTE_ON", "pitch": pitch},
+                    {"type": "TIME_DELTA", "delta": 0.5},
+                    {"type": "NOTE_OFF", "pitch": pitch},
+                ]
+            bars.append({"events": events})
+        tracks.append({"name": "Piano", "number": track_index, "bars": bars})
+    tracks[-1]["drums"] = True
+    return {"title": "bar_cache", "number": 0, "tracks": tracks}
+
+
+@pytest.mark.parametrize("compact", [False, True], ids=["dict", "compact"])
+def test_cached_bars_match_encoding_each_window(compact):
+    """
+    Test that tracks assembled from cached bars match encoding the bars of each window, and that drums
+    share their bars across transpositions.
+    """
+    song_data = create_song_data()
+    if compact:
+        song_data = song_data_to_array(song_data)
+    density_bins = get_density_bins([song_data], 4, 1, 5)
+
+    bar_caches = [{} for _ in song_data["tracks"]]
+    for bar_start_index in range(12):
+        for transposition in [-2, 0, 3]:
+            for track_data, bar_cache in zip(song_data["tracks"], bar_caches):
+                arguments = (track_data, density_bins, bar_start_index, bar_start_index + 4, transposition)
+                tokens = encode_track_data(*arguments, bar_cache=bar_cache)
+                assert tokens == encode_track_data(*arguments)
+
+    assert len(bar_caches[0]) == 12 * 3
+    assert len(bar_caches[1]) == 7 * 3
+    assert len(bar_caches[2]) == 12
@@ -0,0 +1,98 @@
+import os
+import sys
+import glob
+import json
+import pytest
+
+# Add project root to the path for module imports
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+sys.path.insert(0, project_root)
+
+from src.AI_GURU.datasetcreator import DatasetCreator
+from src.AI_GURU.datasetmanifest import DatasetManifest, MANIFEST_FILE_NAME
+
+SANITY_MIDI_FILES = sorted(glob.glob(os.path.join(project_root, "data", "sanity", "*.mid")))
+
+
+def read_dataset(dataset_path):
+    dataset = {}
+    for file_name in ["token_sequences_train.txt", "token_sequences_valid.txt", "tokenizer.json"]:
+        with open(os.path.join(dataset_path, file_name), "rb") as f:
+            dataset[file_name] = f.read()
+    return dataset
+
+
+def open_manifest(dataset_path):
+    """
+    Helper function opening a manifest with the settings it was written with.
+    """
+    with open(os.path.join(dataset_path, MANIFEST_FILE_NAME)) as f:
+        settings = json.loads(f.readline())["settings"]
+    return DatasetManifest.open(str(dataset_path), settings)
+
+
+def test_interrupted_build_resumes(tmp_path, small_batches, sanity_midi_files, create_config, interrupt_encoding):
+    """
+    Test that a build interrupted after a committed batch and a partly written one resumes to the same dataset.
+    """
+    DatasetCreator(create_config("complete", permute_tracks=False)).create(str(tmp_path))
+    expected_dataset = read_dataset(tmp_path / "complete")
+
+    # Fail while encoding the second batch, after part of its songs were written.
+    interrupt_encoding(DatasetCreator(create_config("resumed", permute_tracks=False)), tmp_path)
+
+    manifest = open_manifest(tmp_path / "resumed")
+    assert len(manifest.files) == 5
+    assert os.path.getsize(tmp_path / "resumed" / "token_sequences_train.txt") > manifest.sizes["train"]
+
+    DatasetCreator(create_config("resumed", permute_tracks=False)).create(str(tmp_path))
+
+    assert read_dataset(tmp_path / "resumed") == expected_dataset
+
+
+def test_new_files_are_appended(tmp_path, small_batches, copy_midi_files, create_config, parsed_files):
+    """
+    Test that only MIDI files added since the last build are processed and appended, and that the
+    manifest records where the token sequences of each file are.
+    """
+    copy_midi_files(SANITY_MIDI_FILES[:10])
+    config = create_config("incremental", permute_tracks=False)
+    DatasetCreator(config).create(str(tmp_path))
+    dataset = read_dataset(tmp_path / "incremental")
+
+    parsed_files.clear()
+    copy_midi_files(SANITY_MIDI_FILES[10:])
+    DatasetCreator(config).create(str(tmp_path))
+
+    assert [os.path.basename(midi_file) for midi_file in parsed_files] == [
+        os.path.basename(midi_file) for midi_file in SANITY_MIDI_FILES[10:]
+    ]
+    new_dataset = read_dataset(tmp_path / "incremental")
+    for file_name in ["token_sequences_train.txt", "token_sequences_valid.txt"]:
+        assert new_dataset[file_name].startswith(dataset[file_name])
+
+    manifest = open_manifest(tmp_path / "incremental")
+    assert sorted(manifest.files) == [os.path.basename(midi_file) for midi_file in SANITY_MIDI_FILES]
+    with open(tmp_path / "incremental" / "token_sequences_train.txt", "rb") as f:
+        train_data = f.read()
+    byte_ranges = sorted(record["train"] for record in manifest.files.values() if "train" in record)
+    assert b"".join(train_data[start:end] for start, end in byte_ranges) == train_data
+
+    tokenizer_vocabulary = set(json.loads(new_dataset["tokenizer.json"])["model"]["vocab"])
+    assert manifest.vocabulary <= tokenizer_vocabulary
+
+
+def test_other_settings_are_rejected(tmp_path, copy_midi_files, create_config):
+    """
+    Test that a dataset is not resumed with settings that would produce other token sequences.
+    """
+    copy_midi_files(SANITY_MIDI_FILES[:5])
+    config = create_config("settings", permute_tracks=False)
+    DatasetCreator(config).create(str(tmp_path))
+
+    config.transpositions_train = [0]
+    with pytest.raises(Exception, match="other settings"):
+        DatasetCreator(config).create(str(tmp_path))
+
+    DatasetCreator(config).create(str(tmp_path), overwrite=True)
+    assert os.path.exists(tmp_path / "settings" / MANIFEST_FILE_NAME)
@@ -0,0 +1,94 @@
+import os
+import sys
+import glob
+import pytest
+
+# Add project root to the path for module imports
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+sys.path.insert(0, project_root)
+
+from src.AI_GURU.datasetcreator import DatasetCreator, DENSITY_BINS_FILE_NAME
+from src.AI_GURU.datasetcreatorconfig import JSBDatasetCreatorBarConfig, JSBDatasetCreatorTrackConfig
+
+SANITY_MIDI_FILES = sorted(glob.glob(os.path.join(project_root, "data", "sanity", "*.mid")))
+
+
+def create_configs(prefix, **kwargs):
+    """
+    Helper function creating a track and two bar configurations with different windows.
+    """
+    configs = [JSBDatasetCreatorTrackConfig(parse_workers=2, **kwargs)]
+    for window_size_bars in [1, 2]:
+        config = JSBDatasetCreatorBarConfig(parse_workers=2, **kwargs)
+        config.window_size_bars = window_size_bars
+        config.hop_length_bars = 1
+        config.dataset_name = f"jsb_mmmbar_{window_size_bars}"
+        configs.append(config)
+    for config in configs:
+        config.dataset_name = f"{prefix}_{config.dataset_name}"
+    return configs
+
+
+def read_dataset(dataset_path):
+    dataset = {}
+    file_names = ["token_sequences_train.txt", "token_sequences_valid.txt", "tokenizer.json", DENSITY_BINS_FILE_NAME]
+    for file_name in file_names:
+        with open(os.path.join(dataset_path, file_name), "rb") as f:
+            dataset[file_name] = f.read()
+    return dataset
+
+
+def test_variants_match_separate_datasets(tmp_path, small_batches, sanity_midi_files, parsed_files):
+    """
+    Test that datasets created together parse each file once and equal the datasets created one by one.
+    """
+    DatasetCreator(create_configs("together")).create(str(tmp_path))
+    assert sorted(parsed_files) == sorted(map(str, (tmp_path / "midi_files").iterdir()))
+
+    for config in create_configs("separate"):
+        DatasetCreator(config).create(str(tmp_path))
+    for config in create_configs("together"):
+        separate_name = config.dataset_name.replace("together", "separate", 1)
+        assert read_dataset(tmp_path / config.dataset_name) == read_dataset(tmp_path / separate_name)
+
+
+def test_variants_resume_separately(tmp_path, small_batches, sanity_midi_files, parsed_files):
+    """
+    Test that a dataset already created is kept while the other datasets are created with it.
+    """
+    configs = create_configs("together", pipeline_depth=0)
+    DatasetCreator(configs[1]).create(str(tmp_path))
+    created = read_dataset(tmp_path / configs[1].dataset_name)
+    parsed_files.clear()
+
+    DatasetCreator(configs).create(str(tmp_path))
+    assert len(parsed_files) == len(SANITY_MIDI_FILES)
+    assert read_dataset(tmp_path / configs[1].dataset_name) == created
+    assert read_dataset(tmp_path / configs[0].dataset_name)
+
+
+def test_variants_with_parse_cache(tmp_path, small_batches, sanity_midi_files):
+    """
+    Test that with a parse cache, the datasets created together are created one by one through the cache and
+    equal the datasets created without it.
+    """
+    DatasetCreator(create_configs("together", parse_cache_path=str(tmp_path / "cache"))).create(str(tmp_path))
+    assert os.listdir(tmp_path / "cache")
+
+    for config in create_configs("separate"):
+        DatasetCreator(config).create(str(tmp_path))
+    for config in create_configs("together"):
+        separate_name = config.dataset_name.replace("together", "separate", 1)
+        assert read_dataset(tmp_path / config.dataset_name) == read_dataset(tmp_path / separate_name)
+
+
+def test_variants_must_share_parsing(tmp_path):
+    configs = create_configs("together")
+    configs[1].parse_backend = "process"
+    with pytest.raises(Exception, match="parse_backend"):
+        DatasetCreator(configs).create(str(tmp_path))
+
+    configs = create_configs("together")
+    configs[1].dataset_name = configs[0].dataset_name
+    with pytest.raises(Exception, match="different names"):
+        DatasetCreator(configs).create(str(tmp_path))
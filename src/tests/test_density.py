@@ -0,0 +1,96 @@
+import os
+import sys
+import random
+import pytest
+import numpy as np
+
+# Add project root to the path for module imports
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+sys.path.insert(0, project_root)
+
+from src.AI_GURU.preprocess.encode import (
+    count_note_on_events,
+    encode_song_data,
+    get_bar_indices,
+    get_bars_number,
+    get_density_bins,
+    get_note_on_counts,
+)
+from src.AI_GURU.preprocess.songarray import song_data_to_array
+
+
+def random_song_data(seed):
+    """
+    Helper function generating a song whose tracks have different numbers of bars, some of them empty.
+    """
+    generator = random.Random(seed)
+    tracks = []
+    for track_index in range(generator.randint(1, 4)):
+        bars = []
+        for _ in range(generator.randint(1, 40)):
+            events = []
+            for _ in range(generator.choice([0, 0, 1, 3, 8])):
+                pitch = generator.randint(40, 80)
+                events += [
+                    {"type": "NOTE_ON", "pitch": pitch},
+                    {"type": "TIME_DELTA", "delta": 1.0},
+                    {"type": "NOTE_OFF", "pitch": pitch},
+                ]
+            bars.append({"events": events})
+        tracks.append({"name": "Piano", "number": track_index, "bars": bars})
+    return {"title": f"random_{seed}", "number": seed, "tracks": tracks}
+
+
+def get_note_on_counts_per_window(song_data, window_size_bars, hop_length_bars):
+    """
+    Helper function counting the note on events of each window separately, as the counts used to be computed.
+    """
+    counts = []
+    bar_indices = get_bar_indices(get_bars_number(song_data), window_size_bars, hop_length_bars)
+    for track_data in song_data["tracks"]:
+        for bar_start_index, bar_end_index in bar_indices:
+            count = count_note_on_events(track_data, bar_start_index, bar_end_index)
+            if count != 0:
+                counts += [count]
+    return counts
+
+
+@pytest.mark.parametrize("compact", [False, True], ids=["dict", "compact"])
+@pytest.mark.parametrize("window_size_bars, hop_length_bars", [(1, 1), (4, 1), (8, 2), (8, 8)])
+def test_note_on_counts_match_per_window_counts(compact, window_size_bars, hop_length_bars):
+    """
+    Test that the prefix sum counts match counting each window, also for windows past the end of short tracks.
+    """
+    for seed in range(20):
+        song_data = random_song_data(seed)
+        if compact:
+            song_data = song_data_to_array(song_data)
+
+        counts = get_note_on_counts(song_data, window_size_bars, hop_length_bars)
+
+        assert counts == get_note_on_counts_per_window(song_data, window_size_bars, hop_length_bars)
+        assert all(type(count) is int for count in counts)
+
+
+@pytest.mark.parametrize("compact", [False, True], ids=["dict", "compact"])
+def test_window_densities_match_per_window_digitize(compact):
+    """
+    Test that the density tokens binned once per track match binning the count of each window.
+    """
+    songs_data = [random_song_data(seed) for seed in range(10)]
+    if compact:
+        songs_data = [song_data_to_array(song_data) for song_data in songs_data]
+    density_bins = get_density_bins(songs_data, 4, 1, 5)
+
+    for song_data in songs_data:
+        bar_indices = get_bar_indices(get_bars_number(song_data), 4, 1)
+        token_sequences = encode_song_data(song_data, [0, 2], False, 4, 1, density_bins, False)
+
+        expected_densities = []
+        for bar_start_index, bar_end_index in bar_indices:
+            for _ in range(2):
+                for track_data in song_data["tracks"]:
+                    count = count_note_on_events(track_data, bar_start_index, bar_end_index)
+                    expected_densities.append(f"DENSITY={np.digitize(count, density_bins)}")
+        densities = [token for token_sequence in token_sequences for token in token_sequence if "DENSITY" in token]
+        assert densities == expected_densities
@@ -0,0 +1,140 @@
+import os
+import sys
+import glob
+import json
+import random
+import pytest
+import numpy as np
+
+# Add project root to the path for module imports
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+sys.path.insert(0, project_root)
+
+from src.AI_GURU import datasetcreator
+from src.AI_GURU.preprocess import encode
+from src.AI_GURU.datasetcreator import DatasetCreator, DENSITY_BINS_FILE_NAME
+from src.AI_GURU.preprocess.densitysketch import DensitySketch
+from src.AI_GURU.preprocess.encode import get_density_bins_from_counts, get_note_on_counts
+from src.AI_GURU.preprocess.music21jsb import iterate_music21
+
+SANITY_MIDI_FILES = sorted(glob.glob(os.path.join(project_root, "data", "sanity", "*.mid")))
+
+
+def random_counts(seed, size, maximum):
+    """
+    Helper function generating skewed note on counts, split into chunks of random length.
+    """
+    generator = random.Random(seed)
+    counts = [int(generator.paretovariate(1.5)) % maximum + 1 for _ in range(size)]
+    chunks = []
+    while counts:
+        length = generator.randint(1, 50)
+        chunks.append(counts[:length])
+        counts = counts[length:]
+    return chunks
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("bins", [3, 5, 10])
+def test_sketch_matches_exact_density_bins(seed, bins):
+    """
+    Test that the sketch gives the exact density bins while the counts fit into its buckets.
+    """
+    chunks = random_counts(seed, 2000, 200)
+    sketch = DensitySketch()
+    for counts in chunks:
+        sketch.add(counts)
+
+    distribution = [count for counts in chunks for count in counts]
+    assert sketch.error_bound == 0
+    assert sketch.counts_number == len(distribution)
+    assert sketch.get_density_bins(bins) == get_density_bins_from_counts(distribution, bins)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_sketch_error_is_bounded(seed):
+    """
+    Test that the quantiles of a full sketch are within its error bound of the exact quantiles.
+    """
+    chunks = random_counts(seed, 5000, 1000)
+    sketch = DensitySketch(max_size=16)
+    for counts in chunks:
+        sketch.add(counts)
+
+    distribution = [count for counts in chunks for count in counts]
+    assert len(sketch.frequencies) <= 16
+    assert sketch.error_bound > 0
+    for percentile in [0, 1, 10, 25, 50, 75, 90, 99, 100]:
+        exact = np.percentile(distribution, percentile)
+        assert abs(sketch.get_quantile(percentile) - exact) <= sketch.error_bound
+
+
+def test_empty_sketch_raises():
+    with pytest.raises(ValueError):
+        DensitySketch().get_density_bins(5)
+
+
+def test_global_density_bins_are_saved_and_reused(tmp_path, small_batches, copy_midi_files, create_config, monkeypatch):
+    """
+    Test that the density bins are computed from the training songs of all batches, saved with the dataset,
+    and used again to encode files added later.
+    """
+    copy_midi_files(SANITY_MIDI_FILES[:10])
+    DatasetCreator(create_config("global", permute_tracks=False)).create(str(tmp_path))
+
+    distribution = []
+    for batch_index in range(2):
+        results = list(iterate_music21(SANITY_MIDI_FILES[batch_index * 5 : (batch_index + 1) * 5]))
+        for _, song_data in results[: int(0.8 * len(results))]:
+            if song_data is not None:
+                distribution += get_note_on_counts(song_data, 1, 1)
+
+    density_bins_path = tmp_path / "global" / DENSITY_BINS_FILE_NAME
+    with open(density_bins_path) as f:
+        saved = json.load(f)
+    assert saved["density_bins"] == get_density_bins_from_counts(distribution, 5)
+    assert saved["windows_number"] == len(distribution)
+    assert saved["error_bound"] == 0
+
+    # Files added later are encoded with the saved bins.
+    used_density_bins = []
+    encode_song_data = encode.encode_song_data
+
+    def record(*args, **kwargs):
+        used_density_bins.append(args[5])
+        return encode_song_data(*args, **kwargs)
+
+    monkeypatch.setattr(encode, "encode_song_data", record)
+    copy_midi_files(SANITY_MIDI_FILES[10:])
+    DatasetCreator(create_config("global", permute_tracks=False)).create(str(tmp_path))
+
+    assert used_density_bins
+    assert all(density_bins == saved["density_bins"] for density_bins in used_density_bins)
+    with open(density_bins_path) as f:
+        assert json.load(f) == saved
+
+
+@pytest.mark.parametrize("streaming, stage_names", [(False, ["parse", "encode"]), (True, ["parse and encode"])])
+def test_global_density_bins_keep_pipeline(
+    tmp_path, small_batches, copy_midi_files, create_config, parsed_files, monkeypatch, streaming, stage_names
+):
+    """
+    Test that after the counting pass of the global density bins, the files are parsed again by the pipelined
+    stages, or by the streaming stage.
+    """
+    names = []
+    pipeline_stage = datasetcreator.PipelineStage
+
+    def record(name, *args):
+        names.append(name)
+        return pipeline_stage(name, *args)
+
+    monkeypatch.setattr(datasetcreator, "PipelineStage", record)
+    copy_midi_files(SANITY_MIDI_FILES[:10])
+    DatasetCreator(create_config("global", streaming=streaming)).create(str(tmp_path))
+
+    assert names == stage_names
+    assert sorted(os.path.basename(path) for path in parsed_files) == sorted(
+        os.path.basename(path) for path in SANITY_MIDI_FILES[:10] * 2
+    )
+    assert (tmp_path / "global" / DENSITY_BINS_FILE_NAME).exists()
@@ -0,0 +1,110 @@
+import os
+import sys
+import random
+import pytest
+from fractions import Fraction
+
+# Add project root to the path for module imports
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+sys.path.insert(0, project_root)
+
+from src.AI_GURU.preprocess.preprocessutilities import events_to_events_data
+
+
+def events_to_events_data_reference(events):
+    """
+    Reference implementation with Python sorting and one event at a time.
+    """
+    events = sorted(events, key=lambda event: event[2])
+
+    events_data = []
+    for event_index, event, event_next in zip(range(len(events)), events, events[1:] + [None]):
+        if event_index == 0 and event[2] != 0.0:
+            event_data = {"type": "TIME_DELTA", "delta": event[2]}
+            events_data += [event_data]
+
+        event_data = {"type": event[0], "pitch": event[1]}
+        events_data += [event_data]
+
+        if event_next is None:
+            continue
+
+        delta = event_next[2] - event[2]
+        assert delta >= 0, events
+        if delta != 0.0:
+            event_data = {"type": "TIME_DELTA", "delta": delta}
+            events_data += [event_data]
+
+    return events_data
+
+
+def create_random_events(rng, time_kind):
+    """
+    Helper function creating note on and note off events on a coarse grid, so that many of them coincide.
+    """
+    events = []
+    for _ in range(rng.randint(1, 40)):
+        pitch = rng.randint(0, 127)
+        if time_kind == "float":
+            start = rng.randint(0, 16) * 0.25
+            end = start + rng.randint(0, 8) * 0.5
+        elif time_kind == "fraction":
+            start = Fraction(rng.randint(0, 24), 3)
+            end = start + Fraction(rng.randint(0, 6), rng.choice([1, 3]))
+        else:
+            start = rng.choice([rng.randint(0, 16) * 0.25, Fraction(rng.randint(0, 24), 3)])
+            end = start + rng.choice([rng.randint(0, 8) * 0.5, Fraction(rng.randint(0, 6), 3)])
+        events.append(("NOTE_ON", pitch, start))
+        events.append(("NOTE_OFF", pitch, end))
+    rng.shuffle(events)
+    return events
+
+
+def assert_same_events_data(events_data, expected_events_data):
+    """
+    Helper function checking that event data are equal, including the types of the deltas.
+    """
+    assert events_data == expected_events_data
+    for event_data, expected_event_data in zip(events_data, expected_events_data):
+        if event_data["type"] == "TIME_DELTA":
+            assert type(event_data["delta"]) is type(expected_event_data["delta"])
+
+
+@pytest.mark.parametrize("time_kind", ["float", "fraction", "mixed"])
+def test_matches_reference(time_kind):
+    """
+    Test that random events yield the same event data as the reference implementation.
+    """
+    rng = random.Random(time_kind)
+    for _ in range(300):
+        events = create_random_events(rng, time_kind)
+        assert_same_events_data(events_to_events_data(events), events_to_events_data_reference(events))
+
+
+def test_simultaneous_events_keep_their_order():
+    """
+    Test that events at the same time keep their input order.
+    """
+    events = [("NOTE_OFF", 64, 2.0), ("NOTE_ON", 67, 1.0), ("NOTE_ON", 60, 1.0), ("NOTE_OFF", 60, 2.0)]
+    assert events_to_events_data(events) == [
+        {"type": "TIME_DELTA", "delta": 1.0},
+        {"type": "NOTE_ON", "pitch": 67},
+        {"type": "NOTE_ON", "pitch": 60},
+        {"type": "TIME_DELTA", "delta": 1.0},
+        {"type": "NOTE_OFF", "pitch": 64},
+        {"type": "NOTE_OFF", "pitch": 60},
+    ]
+
+
+def test_edge_cases():
+    """
+    Test empty input, a single event and events that all happen at once.
+    """
+    assert events_to_events_data([]) == []
+    for events in [
+        [("NOTE_ON", 60, 0.0)],
+        [("NOTE_ON", 60, 3.5)],
+        [("NOTE_ON", 60, 2.0), ("NOTE_ON", 64, 2.0), ("NOTE_OFF", 60, 2.0)],
+        [("NOTE_ON", 60, 0), ("NOTE_OFF", 60, 4)],
+    ]:
+        assert_same_events_data(events_to_events_data(events), events_to_events_data_reference(events))
@@ -0,0 +1,189 @@
+import os
+import sys
+import glob
+import struct
+import collections
+import pytest
+import mido
+import pretty_midi
+from music21 import converter
+
+# Add project root to the path for module imports
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+sys.path.insert(0, project_root)
+
+from src.AI_GURU.preprocess.midiscan import check_midi_structure, scan_meters, prescan_midi_file, InvalidMidiError
+from src.AI_GURU.preprocess.music21jsb import preprocess_music21, preprocess_music21_song
+from src.data import filter_dataset_chunks
+from src.data.filter_dataset_chunks import process_midi_file, read_midi_file
+
+SANITY_MIDI_FILES = sorted(glob.glob(os.path.join(project_root, "data", "sanity", "*.mid")))
+
+
+def read_bytes(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def write_tracks(path, tracks):
+    """
+    Helper function writing a type 1 MIDI file. Each track is a list of (time signature or None, has notes).
+    """
+    midi_file = mido.MidiFile(type=1, ticks_per_beat=480)
+    for time_signature, has_notes in tracks:
+        track = mido.MidiTrack()
+        if time_signature is not None:
+            numerator, denominator = time_signature
+            track.append(mido.MetaMessage("time_signature", numerator=numerator, denominator=denominator))
+        if has_notes:
+            for pitch in [60, 64, 67, 72]:
+                track.append(mido.Message("note_on", note=pitch, velocity=64, time=0))
+                track.append(mido.Message("note_off", note=pitch, velocity=0, time=480))
+        midi_file.tracks.append(track)
+    midi_file.save(path)
+
+
+@pytest.mark.parametrize("midi_file", SANITY_MIDI_FILES, ids=os.path.basename)
+def test_structure_of_valid_files(midi_file):
+    """
+    Test that valid files pass and that the track byte ranges cover the track chunks.
+    """
+    data = read_bytes(midi_file)
+    structure = check_midi_structure(data)
+
+    assert structure["format"] == mido.MidiFile(midi_file).type
+    assert structure["tracks_number"] == len(mido.MidiFile(midi_file).tracks)
+    assert structure["track_ranges"][-1][1] == len(data)
+
+
+@pytest.mark.parametrize(
+    "corrupt",
+    [
+        lambda data: b"RIFF" + data[4:],
+        lambda data: data[:4] + struct.pack(">L", 7) + data[8:],
+        lambda data: data[:8] + struct.pack(">H", 2) + data[10:],
+        lambda data: data[:10] + struct.pack(">H", 0) + data[12:],
+        lambda data: data[:10] + struct.pack(">H", 5) + data[12:],
+        lambda data: data[:14] + b"MTrX" + data[18:],
+        lambda data: data[:-10],
+    ],
+    ids=["header", "header length", "format 2", "no tracks", "missing tracks", "track header", "truncated"],
+)
+def test_structure_of_invalid_files(corrupt):
+    """
+    Test that structurally invalid files are rejected, as they are by music21 or mido.
+    """
+    data = corrupt(read_bytes(SANITY_MIDI_FILES[0]))
+
+    with pytest.raises(InvalidMidiError):
+        check_midi_structure(data)
+
+
+@pytest.mark.parametrize("copy_only", [True, False])
+def test_process_midi_file(tmp_path, copy_only):
+    """
+    Test that valid files are copied or cut and invalid ones are skipped.
+    """
+    midi_file = SANITY_MIDI_FILES[0]
+    invalid_midi_file = str(tmp_path / "invalid.mid")
+    with open(invalid_midi_file, "wb") as f:
+        f.write(read_bytes(midi_file)[:-10])
+    output_directory = tmp_path / "output"
+    output_directory.mkdir()
+
+    output_path = process_midi_file(midi_file, str(output_directory), copy_only=copy_only, segment_duration=2)
+
+    assert process_midi_file(invalid_midi_file, str(output_directory), copy_only=copy_only) is None
+    assert read_midi_file(invalid_midi_file) is None
+    if copy_only:
+        assert read_bytes(output_path) == read_bytes(midi_file)
+    else:
+        assert converter.parse(output_path) is not None
+        assert len(pretty_midi.PrettyMIDI(output_path).instruments[0].notes) > 0
+
+
+@pytest.mark.parametrize("music21_check", [True, False])
+def test_process_midi_file_music21_check(tmp_path, monkeypatch, music21_check):
+    """
+    Test that by default, the files music21 fails to parse are skipped.
+    """
+
+    def fail(*args, **kwargs):
+        raise Exception("music21 failed")
+
+    monkeypatch.setattr(filter_dataset_chunks.converter, "parseData", fail)
+    output_path = process_midi_file(SANITY_MIDI_FILES[0], str(tmp_path), music21_check=music21_check)
+
+    assert (output_path is None) == music21_check
+    if music21_check:
+        assert process_midi_file(SANITY_MIDI_FILES[0], str(tmp_path)) is None
+
+
+@pytest.mark.parametrize(
+    "tracks, meters",
+    [
+        ([(None, True)], {"4/4"}),
+        ([(None, False)], set()),
+        ([((3, 4), False), (None, True)], {"3/4"}),
+        ([((4, 4), False), (None, True), ((6, 8), True)], {"4/4"}),
+        ([(None, True), ((6, 8), True)], {"4/4", "6/8"}),
+        ([(None, True), ((3, 4), False)], {"4/4"}),
+    ],
+    ids=["no time signature", "no notes", "conductor", "conductor first", "part", "trailing track"],
+)
+def test_scan_meters(tmp_path, tracks, meters):
+    """
+    Test that the meters are read from the tracks music21 takes them from, and that the files are
+    rejected exactly when music21 rejects them.
+    """
+    midi_file = str(tmp_path / "meters.mid")
+    write_tracks(midi_file, tracks)
+
+    assert scan_meters(read_bytes(midi_file)) == meters
+    is_rejected = preprocess_music21_song(converter.parse(midi_file)) is None
+    assert (prescan_midi_file(midi_file) == "meter") == is_rejected
+
+
+@pytest.mark.parametrize("midi_file", SANITY_MIDI_FILES, ids=os.path.basename)
+def test_prescan_keeps_sanity_files(midi_file):
+    """
+    Test that the sanity files, which are all in 4/4, pass the prescan.
+    """
+    assert prescan_midi_file(midi_file) is None
+
+
+def test_prescan_leaves_undecodable_events_to_the_parser(tmp_path):
+    """
+    Test that events the scanner cannot walk raise in the scanner but do not reject the file.
+    """
+    data = read_bytes(SANITY_MIDI_FILES[0])
+    structure = check_midi_structure(data)
+    start, end = structure["track_ranges"][0]
+    # A data byte without a preceding status byte at the start of the first track.
+    data = data[:start] + b"\x00\x40\x40" + data[start + 3 :]
+    midi_file = str(tmp_path / "running_status.mid")
+    with open(midi_file, "wb") as f:
+        f.write(data)
+
+    with pytest.raises(InvalidMidiError):
+        scan_meters(data)
+    assert prescan_midi_file(midi_file) is None
+
+
+def test_rejections_are_counted_by_stage(tmp_path):
+    """
+    Test that preprocess_music21 counts the files it rejects at each stage.
+    """
+    waltz_file = str(tmp_path / "waltz.mid")
+    write_tracks(waltz_file, [((3, 4), False), (None, True)])
+    invalid_midi_file = str(tmp_path / "invalid.mid")
+    with open(invalid_midi_file, "wb") as f:
+        f.write(b"not a MIDI file")
+
+    rejections = collections.Counter()
+    songs_data_train, songs_data_valid, _ = preprocess_music21(
+        SANITY_MIDI_FILES + [waltz_file, invalid_midi_file], max_workers=2, rejections=rejections
+    )
+
+    assert rejections == {"structure": 1, "meter": 1}
+    assert len(songs_data_train) + len(songs_data_valid) == len(SANITY_MIDI_FILES)
@@ -0,0 +1,135 @@
+import os
+import sys
+import glob
+import time
+import mido
+import pytest
+import music21
+from music21 import converter
+
+# Add project root to the path for module imports
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+sys.path.insert(0, project_root)
+
+from src.AI_GURU.preprocess import midojsb
+from src.AI_GURU.preprocess.music21jsb import preprocess_music21, preprocess_music21_song
+from src.AI_GURU.preprocess.midojsb import MUSIC21_VERSION, preprocess_mido, preprocess_mido_song
+
+SANITY_MIDI_FILES = sorted(glob.glob(os.path.join(project_root, "data", "sanity", "*.mid")))
+
+
+def test_music21_version_matches_mirrored_version():
+    """
+    Test that music21 is the version the mido ingestion mirrors, so that the tests below compare against it.
+    """
+    assert music21.__version__ == MUSIC21_VERSION
+
+
+def write_midi_file(path, notes, ticks_per_beat=480, numerator=4, channel=0):
+    """
+    Helper function writing a type 1 MIDI file with a conductor track and one track of (start, end, pitch) notes.
+    """
+    midi_file = mido.MidiFile(type=1, ticks_per_beat=ticks_per_beat)
+    conductor_track = mido.MidiTrack()
+    conductor_track.append(mido.MetaMessage("time_signature", numerator=numerator, denominator=4, time=0))
+    midi_file.tracks.append(conductor_track)
+
+    track = mido.MidiTrack()
+    track.append(mido.MetaMessage("track_name", name="Lead", time=0))
+    events = [(start, 1, pitch) for start, _, pitch in notes] + [(end, 0, pitch) for _, end, pitch in notes]
+    last_tick = 0
+    for tick, is_on, pitch in sorted(events, key=lambda event: (event[0], event[1])):
+        message_type = "note_on" if is_on else "note_off"
+        track.append(
+            mido.Message(message_type, note=pitch, velocity=64 * is_on, channel=channel, time=tick - last_tick)
+        )
+        last_tick = tick
+    midi_file.tracks.append(track)
+    midi_file.save(path)
+
+
+@pytest.mark.parametrize("midi_file", SANITY_MIDI_FILES, ids=os.path.basename)
+def test_mido_song_data_matches_music21(midi_file):
+    """
+    Test that the mido ingestion produces exactly the song data of the music21 ingestion.
+    """
+    assert preprocess_mido_song(mido.MidiFile(midi_file)) == preprocess_music21_song(converter.parse(midi_file))
+
+
+@pytest.mark.parametrize(
+    "notes",
+    [
+        # Overlapping notes that need voices, a note tied over the bar line and a triplet.
+        [(0, 1920, 60), (0, 480, 64), (480, 960, 67), (1440, 2880, 72), (2880, 3040, 62), (3040, 3200, 64)],
+        # Notes with similar onsets forming chords, unquantized timing and a zero length note.
+        [(0, 960, 60), (10, 960, 64), (500, 700, 67), (700, 700, 69), (1000, 5000, 71), (1003, 1500, 48)],
+    ],
+)
+def test_mido_song_data_matches_music21_on_edge_cases(tmp_path, notes):
+    """
+    Test that voices, ties, chords and quantization are handled like music21 handles them.
+    """
+    midi_file = str(tmp_path / "edge_case.mid")
+    write_midi_file(midi_file, notes)
+
+    assert preprocess_mido_song(mido.MidiFile(midi_file)) == preprocess_music21_song(converter.parse(midi_file))
+
+
+def test_mido_skips_songs_not_in_4_4(tmp_path):
+    """
+    Test that songs in other meters are rejected.
+    """
+    midi_file = str(tmp_path / "waltz.mid")
+    write_midi_file(midi_file, [(0, 480, 60), (480, 960, 62)], numerator=3)
+
+    assert preprocess_music21_song(converter.parse(midi_file)) is None
+    assert preprocess_mido_song(mido.MidiFile(midi_file)) is None
+
+
+def test_mido_time_signatures_match_music21(tmp_path):
+    """
+    Test that songs without notes are rejected and that time signatures of a part are only dropped where
+    music21 drops them when the conductor track has its own.
+    """
+    midi_file = mido.MidiFile(type=1)
+    midi_file.tracks.append(mido.MidiTrack([mido.MetaMessage("time_signature", numerator=4, denominator=4)]))
+    midi_file.save(str(tmp_path / "empty.mid"))
+
+    for tick, time_signature in [(0, (2, 2)), (1920, (3, 4)), (2400, (3, 4)), (3840, (6, 8))]:
+        track = mido.MidiTrack()
+        events = [(0, mido.Message("note_on", note=60, velocity=64)), (3840, mido.Message("note_off", note=60))]
+        numerator, denominator = time_signature
+        events.append((tick, mido.MetaMessage("time_signature", numerator=numerator, denominator=denominator)))
+        last_tick = 0
+        for event_tick, message in sorted(events, key=lambda event: event[0]):
+            track.append(message.copy(time=event_tick - last_tick))
+            last_tick = event_tick
+        midi_file.tracks.append(track)
+        midi_file.save(str(tmp_path / f"time_signature_{tick}.mid"))
+        midi_file.tracks.pop()
+
+    for path in sorted(glob.glob(str(tmp_path / "*.mid"))):
+        assert preprocess_mido_song(mido.MidiFile(path)) == preprocess_music21_song(converter.parse(path)), path
+
+
+def test_preprocess_mido_matches_preprocess_music21():
+    """
+    Test that the dataset level functions return the same splits.
+    """
+    assert preprocess_mido(SANITY_MIDI_FILES) == preprocess_music21(SANITY_MIDI_FILES)
+
+
+def test_thread_backend_times_out(monkeypatch):
+    """
+    Test that the thread backend reads the files in several threads and rejects the files past the timeout.
+    """
+    preprocess_mido_file = midojsb.preprocess_mido_file
+
+    def read_slowly(midi_file):
+        if midi_file == SANITY_MIDI_FILES[1]:
+            time.sleep(2)
+        return preprocess_mido_file(midi_file)
+
+    monkeypatch.setattr(midojsb, "preprocess_mido_file", read_slowly)
+    results = list(midojsb.iterate_mido(SANITY_MIDI_FILES[:3], max_workers=2, timeout=0.5))
+    assert [midi_file for midi_file, _ in results] == [SANITY_MIDI_FILES[0], SANITY_MIDI_FILES[2]]
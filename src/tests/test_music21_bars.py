@@ -0,0 +1,83 @@
+import os
+import sys
+import glob
+import time
+import pytest
+from music21 import converter, stream, note, meter
+
+# Add project root to the path for module imports
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+sys.path.insert(0, project_root)
+
+from src.AI_GURU.preprocess.music21jsb import preprocess_music21_part, preprocess_music21_measure
+
+SANITY_MIDI_FILES = sorted(glob.glob(os.path.join(project_root, "data", "sanity", "*.mid")))
+
+
+def preprocess_music21_bars_by_lookup(part):
+    """
+    Reference implementation looking up every measure with `part.measure`, capped at 999 bars.
+    """
+    bars = []
+    for measure_index in range(1, 1000):
+        measure = part.measure(measure_index)
+        if measure is None:
+            break
+        bar_data = preprocess_music21_measure(measure)
+        if not bar_data["events"]:
+            bar_data = {"events": [{"type": "TIME_DELTA", "delta": 16.0}]}
+        bars.append(bar_data)
+    return bars
+
+
+def create_long_part(bars_number):
+    """
+    Helper function creating a part with quarter notes and occasional rests.
+    """
+    part = stream.Part()
+    part.append(meter.TimeSignature("4/4"))
+    for index in range(4 * bars_number):
+        if index % 7:
+            part.append(note.Note(60 + index % 12, quarterLength=1))
+        else:
+            part.append(note.Rest(quarterLength=1))
+    return part.makeMeasures()
+
+
+@pytest.mark.parametrize("midi_file", SANITY_MIDI_FILES, ids=os.path.basename)
+def test_bars_match_measure_lookup(midi_file):
+    """
+    Test that the single pass over the measures yields the same bars as looking up each measure.
+    """
+    for part_index, part in enumerate(converter.parse(midi_file).parts):
+        track_data = preprocess_music21_part(part, part_index)
+        assert track_data["bars"] == preprocess_music21_bars_by_lookup(part)
+
+
+def test_long_part_is_not_capped():
+    """
+    Test that parts longer than 999 bars keep all their bars.
+    """
+    part = create_long_part(1200)
+
+    track_data = preprocess_music21_part(part, 0)
+
+    assert len(track_data["bars"]) == 1200
+    assert track_data["bars"][:999] == preprocess_music21_bars_by_lookup(part)
+
+
+def test_long_part_is_faster_than_measure_lookup():
+    """
+    Test that the single pass scales better than looking up each measure on a long part.
+    """
+    part = create_long_part(500)
+
+    start = time.perf_counter()
+    preprocess_music21_part(part, 0)
+    single_pass_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    preprocess_music21_bars_by_lookup(part)
+    lookup_time = time.perf_counter() - start
+
+    assert single_pass_time * 3 < lookup_time
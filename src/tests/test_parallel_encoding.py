@@ -0,0 +1,83 @@
+import os
+import sys
+import glob
+import random
+import pytest
+
+# Add project root to the path for module imports
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+sys.path.insert(0, project_root)
+
+from src.AI_GURU.datasetcreator import DatasetCreator
+from src.AI_GURU.preprocess.encode import get_density_bins, iterate_encoded_songs, iterate_token_sequences
+from src.AI_GURU.preprocess.music21jsb import preprocess_music21
+from src.AI_GURU.preprocess.songarray import song_data_to_array
+
+SANITY_MIDI_FILES = sorted(glob.glob(os.path.join(project_root, "data", "sanity", "*.mid")))
+
+
+@pytest.fixture(scope="module")
+def songs():
+    songs_data_train, songs_data_valid, _ = preprocess_music21(SANITY_MIDI_FILES)
+    return [(f"song_{index}", song_data) for index, song_data in enumerate(songs_data_train + songs_data_valid)]
+
+
+def encode(songs, seed, max_workers, compact=False):
+    """
+    Helper function encoding songs with permuted tracks and returning the token sequences by song key.
+    """
+    if compact:
+        songs = [(song_key, song_data_to_array(song_data)) for song_key, song_data in songs]
+    density_bins = get_density_bins([song_data for _, song_data in songs], 1, 1, 5)
+    encoded_songs = iterate_encoded_songs(songs, [-1, 0, 1], True, 1, 1, density_bins, False, seed, max_workers)
+    return {song_key: token_sequences for song_key, _, token_sequences in encoded_songs}
+
+
+def test_encoding_does_not_depend_on_workers(songs):
+    """
+    Test that the token sequences of each song depend only on the seed and the song, not on the number of
+    workers, the other songs or the global random state.
+    """
+    random.seed(1)
+    expected = encode(songs, 7, 1)
+    random.seed(2)
+    assert encode(songs, 7, 1) == expected
+    assert encode(songs, 7, 3) == expected
+    assert encode(songs, 7, 2, compact=True) == expected
+    assert encode(songs[::-1], 7, 2) == expected
+
+
+def test_seed_permutes_tracks():
+    """
+    Test that the tracks are permuted by the generator of each song, so that the seeds change the order.
+    """
+    bar_data = {"events": [{"type": "NOTE_ON", "pitch": 60}, {"type": "NOTE_OFF", "pitch": 60}]}
+    tracks = [{"name": "Piano", "number": number, "bars": [bar_data, bar_data]} for number in range(4)]
+    songs = [("song", {"title": None, "number": None, "tracks": tracks})]
+    token_sequences = [encode(songs, seed, 1)["song"] for seed in range(5)]
+    assert token_sequences[0] == encode(songs, 0, 2)["song"]
+    assert any(token_sequence != token_sequences[0] for token_sequence in token_sequences[1:])
+
+
+def test_parallel_encoding_requires_seed(songs):
+    with pytest.raises(ValueError):
+        list(iterate_token_sequences([songs[0][1]], [0], True, 1, 1, [1, 2, 3, 4], False, max_workers=2))
+
+
+def test_dataset_does_not_depend_on_encode_workers(tmp_path, sanity_midi_files, create_config):
+    """
+    Test that the DatasetCreator writes the same token sequences with one and with several encoding processes.
+    """
+    token_sequences = {}
+    for encode_workers in [1, 3]:
+        config = create_config(f"workers_{encode_workers}", encode_workers=encode_workers)
+        random.seed(encode_workers)
+        DatasetCreator(config).create(str(tmp_path))
+
+        for split in ["train", "valid"]:
+            with open(tmp_path / config.dataset_name / f"token_sequences_{split}.txt") as f:
+                token_sequences[encode_workers, split] = f.read()
+
+    assert token_sequences[1, "train"]
+    assert token_sequences[1, "train"] == token_sequences[3, "train"]
+    assert token_sequences[1, "valid"] == token_sequences[3, "valid"]
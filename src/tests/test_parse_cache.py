@@ -0,0 +1,107 @@
+import os
+import sys
+import glob
+import time
+import pytest
+
+# Add project root to the path for module imports
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+sys.path.insert(0, project_root)
+
+from src.AI_GURU.preprocess import music21jsb
+from src.AI_GURU.preprocess.music21jsb import preprocess_music21
+from src.AI_GURU.preprocess.midojsb import preprocess_mido
+from src.AI_GURU.preprocess.parsecache import ParseCache
+
+SANITY_MIDI_FILES = sorted(glob.glob(os.path.join(project_root, "data", "sanity", "*.mid")))
+
+
+def test_cache_round_trip(tmp_path):
+    """
+    Test that stored song data, including rejected songs, is returned on a hit.
+    """
+    cache = ParseCache(str(tmp_path))
+    song_data = {"title": None, "number": None, "tracks": [{"name": "Piano", "number": 0, "bars": []}]}
+    key = cache.key(SANITY_MIDI_FILES[0], "parser-1")
+
+    assert cache.get(key) == (False, None)
+    cache.put(key, song_data)
+    assert cache.get(key) == (True, song_data)
+
+    rejected_key = cache.key(SANITY_MIDI_FILES[1], "parser-1")
+    cache.put(rejected_key, None)
+    assert cache.get(rejected_key) == (True, None)
+
+
+def test_cache_key_depends_on_content_and_parser_version(tmp_path):
+    """
+    Test that copies of a file share a key and that another parser version does not.
+    """
+    cache = ParseCache(str(tmp_path / "cache"))
+    copied_file = str(tmp_path / "copy.mid")
+    with open(SANITY_MIDI_FILES[0], "rb") as source, open(copied_file, "wb") as destination:
+        destination.write(source.read())
+
+    assert cache.key(copied_file, "parser-1") == cache.key(SANITY_MIDI_FILES[0], "parser-1")
+    assert cache.key(SANITY_MIDI_FILES[0], "parser-2") != cache.key(SANITY_MIDI_FILES[0], "parser-1")
+    assert cache.key(SANITY_MIDI_FILES[1], "parser-1") != cache.key(SANITY_MIDI_FILES[0], "parser-1")
+
+
+def test_cache_evicts_least_recently_used_entries(tmp_path):
+    """
+    Test that the cache stays below its maximum size by removing the entries used longest ago.
+    """
+    cache = ParseCache(str(tmp_path))
+    keys = [cache.key(midi_file, "parser-1") for midi_file in SANITY_MIDI_FILES[:4]]
+    song_data = {"tracks": list(range(1000))}
+    for index, key in enumerate(keys):
+        cache.put(key, song_data)
+        os.utime(cache.entries()[-1][0], (index, index))
+    entry_size = cache.get_size() // len(keys)
+
+    # Using the first entry makes the second one the least recently used.
+    cache.get(keys[0])
+    cache.max_size_bytes = 4 * entry_size
+    cache.put(cache.key(SANITY_MIDI_FILES[4], "parser-1"), song_data)
+
+    assert cache.get_size() <= 4 * entry_size
+    assert cache.get(keys[0])[0]
+    assert not cache.get(keys[1])[0]
+
+
+def test_cache_prune_and_clear(tmp_path):
+    """
+    Test that pruning removes old entries and clearing removes all of them.
+    """
+    cache = ParseCache(str(tmp_path))
+    for index, midi_file in enumerate(SANITY_MIDI_FILES[:3]):
+        cache.put(cache.key(midi_file, "parser-1"), {"index": index})
+    old_entry_path = cache.entries()[0][0]
+    os.utime(old_entry_path, (time.time() - 3600, time.time() - 3600))
+
+    assert cache.prune(60) == 1
+    assert len(cache.entries()) == 2
+    assert cache.clear() == 2
+    assert cache.entries() == []
+
+
+@pytest.mark.parametrize("preprocess_method", [preprocess_music21, preprocess_mido])
+def test_preprocess_uses_cache(tmp_path, monkeypatch, preprocess_method):
+    """
+    Test that a second run returns the same data from the cache without parsing.
+    """
+    cache = ParseCache(str(tmp_path))
+    uncached_result = preprocess_method(SANITY_MIDI_FILES)
+    first_result = preprocess_method(SANITY_MIDI_FILES, cache=cache)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("Cached files must not be parsed.")
+
+    monkeypatch.setattr(music21jsb, "parse_midi_file", fail)
+    monkeypatch.setattr(music21jsb, "is_valid_midi", fail)
+    monkeypatch.setattr("src.AI_GURU.preprocess.midojsb.preprocess_mido_file", fail)
+    second_result = preprocess_method(SANITY_MIDI_FILES, cache=cache)
+
+    assert first_result == uncached_result
+    assert second_result == uncached_result
+    assert cache.hits == len(SANITY_MIDI_FILES)
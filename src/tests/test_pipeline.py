@@ -0,0 +1,151 @@
+import os
+import sys
+import glob
+import time
+import pytest
+
+# Add project root to the path for module imports
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+sys.path.insert(0, project_root)
+
+from src.AI_GURU import datasetcreator
+from src.AI_GURU.datasetcreator import DatasetCreator
+from src.AI_GURU.datasetcreatorconfig import JSBDatasetCreatorBarConfig
+from src.AI_GURU.preprocess.processpool import PipelineStage
+
+SANITY_MIDI_FILES = sorted(glob.glob(os.path.join(project_root, "data", "sanity", "*.mid")))
+
+
+def test_stage_keeps_order_and_counts_items():
+    """
+    Test that a chain of stages yields the items in order and reports their number and queue depths.
+    """
+    with PipelineStage("first", range(100), 4) as first:
+        with PipelineStage("second", (item * 2 for item in first), 2) as second:
+            assert list(second) == [item * 2 for item in range(100)]
+
+    for stage in [first, second]:
+        stats = stage.get_stats()
+        assert stats["items"] == 100
+        assert stats["items_per_second"] > 0
+        assert 0 <= stats["mean_queue_depth"] <= stats["max_queue_depth"] <= stage.max_queue_size
+
+
+def test_stage_forwards_errors():
+    """
+    Test that an error raised while producing the items is raised to the consumer after the previous items.
+    """
+
+    def items():
+        yield 1
+        raise KeyboardInterrupt()
+
+    stage = PipelineStage("failing", items(), 2)
+    consumed = []
+    with pytest.raises(KeyboardInterrupt):
+        for item in stage:
+            consumed.append(item)
+    stage.close()
+    assert consumed == [1]
+
+
+def test_close_stops_a_blocked_stage():
+    """
+    Test that closing a stage whose queue is full stops its thread and closes its generator.
+    """
+    closed = []
+
+    def items():
+        try:
+            for item in range(1000):
+                yield item
+        finally:
+            closed.append(True)
+
+    stage = PipelineStage("blocked", items(), 1)
+    time.sleep(0.2)
+    stage.close()
+    assert closed == [True]
+    assert stage.get_stats()["items"] < 1000
+    assert stage.get_stats()["blocked_seconds"] > 0
+
+
+@pytest.mark.parametrize("close_order", [[0, 1], [1, 0]])
+def test_consumer_error_closes_chain_promptly(close_order):
+    """
+    Test that a chain of stages whose consumer fails partway through closes promptly in any order, ending the
+    iteration of a stage still reading a closed one.
+    """
+
+    def items():
+        item = 0
+        while True:
+            yield item
+            item += 1
+
+    first = PipelineStage("first", items(), 2)
+    second = PipelineStage("second", (item * 2 for item in first), 2)
+    start_time = time.perf_counter()
+    with pytest.raises(OSError):
+        try:
+            for item in second:
+                if item == 10:
+                    raise OSError("No space left on device")
+        finally:
+            for index in close_order:
+                [first, second][index].close()
+    assert time.perf_counter() - start_time < 2
+    assert first.get_stats()["items"] >= 5
+
+
+def test_dataset_error_does_not_hang(tmp_path, sanity_midi_files, create_config, monkeypatch):
+    """
+    Test that an error while writing a pipelined dataset is raised instead of leaving the stages waiting.
+    """
+    monkeypatch.setattr(datasetcreator, "BATCH_SIZE", 2)
+
+    def commit_batch(*args):
+        raise OSError("No space left on device")
+
+    monkeypatch.setattr(datasetcreator.DatasetManifest, "commit_batch", commit_batch)
+    config = create_config(pipeline_depth=2)
+    start_time = time.perf_counter()
+    with pytest.raises(OSError):
+        DatasetCreator(config).create(str(tmp_path))
+    assert time.perf_counter() - start_time < 60
+
+
+def read_token_sequences(dataset_path):
+    token_sequences = {}
+    for split in ["train", "valid"]:
+        with open(os.path.join(dataset_path, f"token_sequences_{split}.txt")) as f:
+            token_sequences[split] = f.read()
+    return token_sequences
+
+
+@pytest.mark.parametrize("streaming", [False, True])
+def test_dataset_does_not_depend_on_pipeline_depth(
+    streaming, tmp_path, small_batches, sanity_midi_files, create_config
+):
+    """
+    Test that the DatasetCreator writes the same token sequences and manifest with and without pipelining.
+    """
+    manifests = {}
+    token_sequences = {}
+    for pipeline_depth in [0, 2]:
+        config = create_config(f"depth_{pipeline_depth}", streaming=streaming, pipeline_depth=pipeline_depth)
+        DatasetCreator(config).create(str(tmp_path))
+
+        dataset_path = tmp_path / config.dataset_name
+        token_sequences[pipeline_depth] = read_token_sequences(dataset_path)
+        with open(dataset_path / datasetcreator.MANIFEST_FILE_NAME) as f:
+            manifests[pipeline_depth] = f.read()
+
+    assert token_sequences[0]["train"]
+    assert token_sequences[0] == token_sequences[2]
+    assert manifests[0] == manifests[2]
+
+
+def test_pipeline_depth_is_validated():
+    with pytest.raises(Exception, match="pipeline_depth"):
+        JSBDatasetCreatorBarConfig(pipeline_depth=-1)
@@ -0,0 +1,47 @@
+import os
+import sys
+import time
+import glob
+
+# Add project root to the path for module imports
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+sys.path.insert(0, project_root)
+
+from src.AI_GURU.preprocess.music21jsb import preprocess_music21
+from src.AI_GURU.preprocess.processpool import TimeoutProcessPool
+
+SANITY_MIDI_FILES = sorted(glob.glob(os.path.join(project_root, "data", "sanity", "*.mid")))
+
+
+def sleep_and_return(seconds):
+    """
+    Helper function for the process pool. Sleeps and returns the number of seconds.
+    """
+    time.sleep(seconds)
+    return seconds
+
+
+def test_process_backend_matches_thread_backend():
+    """
+    Test that the process backend produces the same song data as the thread backend.
+    """
+    thread_train, thread_valid, _ = preprocess_music21(SANITY_MIDI_FILES, backend="thread", max_workers=2)
+    process_train, process_valid, _ = preprocess_music21(SANITY_MIDI_FILES, backend="process", max_workers=2)
+
+    assert len(thread_train) > 0
+    assert process_train == thread_train
+    assert process_valid == thread_valid
+
+
+def test_process_pool_kills_workers_on_timeout():
+    """
+    Test that items exceeding the timeout yield None and that the pool keeps working afterwards.
+    """
+    pool = TimeoutProcessPool(sleep_and_return, max_workers=2, timeout=0.5)
+
+    start = time.monotonic()
+    results = pool.map([0, 30, 0, 0])
+    elapsed = time.monotonic() - start
+
+    assert results == [0, None, 0, 0]
+    assert elapsed < 10
@@ -0,0 +1,74 @@
+import os
+import sys
+import numpy as np
+import pytest
+import torch
+from transformers import GPT2Config, GPT2LMHeadModel, default_data_collator
+
+# Add project root to the path for module imports
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+sys.path.insert(0, project_root)
+
+from src.AI_GURU.mmmtrainerconfig import MMMTrainerBaseConfig
+from src.AI_GURU.token_sequence_batching import IGNORED_LABEL_ID
+from src.AI_GURU.token_sequence_dataset import PackedTokenSequenceDataset, TokenSequenceDataset
+
+
+@pytest.fixture
+def dataset_paths(write_token_sequences):
+    """
+    Writes token sequences of random lengths, some longer than a block, in two files and a tokenizer of their tokens.
+    """
+    return write_token_sequences(["token_sequences_train.txt", "token_sequences_more.txt"], 50, 48, "PIECE_START ")
+
+
+def test_packed_blocks(dataset_paths):
+    """
+    Test that the blocks hold the sequences that fit in a block one after the other, with the position IDs
+    restarting and the loss masked at the start of each sequence.
+    """
+    paths, tokenizer = dataset_paths
+    dataset = TokenSequenceDataset(tokenizer, paths, 32, padding=False)
+    packed_dataset = PackedTokenSequenceDataset(tokenizer, paths, 32)
+    sequences = [dataset[i]["input_ids"] for i in range(len(dataset))]
+    assert 0 < len(sequences) < 100
+    tokens_number = sum(len(sequence) for sequence in sequences)
+    assert len(packed_dataset) == -(-tokens_number // 32)
+
+    blocks = [packed_dataset[i] for i in range(len(packed_dataset))]
+    assert all(len(block["input_ids"]) == 32 for block in blocks)
+    attention_mask = torch.cat([block["attention_mask"] for block in blocks])
+    assert attention_mask.sum() == tokens_number
+    assert attention_mask[:tokens_number].all()
+
+    input_ids = torch.cat([block["input_ids"] for block in blocks])[:tokens_number]
+    assert torch.equal(input_ids, torch.cat(sequences))
+    position_ids = torch.cat([block["position_ids"] for block in blocks])[:tokens_number]
+    assert torch.equal(position_ids, torch.cat([torch.arange(len(sequence)) for sequence in sequences]))
+
+    labels = torch.cat([block["labels"] for block in blocks])
+    starts = np.cumsum([0] + [len(sequence) for sequence in sequences[:-1]])
+    assert set(np.flatnonzero(labels[:tokens_number] == IGNORED_LABEL_ID)) == set(starts)
+    assert (labels[tokens_number:] == IGNORED_LABEL_ID).all()
+    assert (torch.cat([block["input_ids"] for block in blocks])[tokens_number:] == packed_dataset.pad_token_id).all()
+
+
+def test_packed_batches_train(dataset_paths):
+    """
+    Test that collated blocks are a batch for a GPT-2 model, each sequence starting at position 0.
+    """
+    paths, tokenizer = dataset_paths
+    packed_dataset = PackedTokenSequenceDataset(tokenizer, paths, 32)
+    batch = default_data_collator([packed_dataset[i] for i in range(4)])
+    assert batch["input_ids"].shape == batch["position_ids"].shape == batch["labels"].shape == (4, 32)
+
+    torch.manual_seed(0)
+    model = GPT2LMHeadModel(GPT2Config(vocab_size=len(tokenizer), n_layer=1, n_head=2, n_embd=16, n_positions=32))
+    loss = model(**batch).loss
+    loss.backward()
+    assert torch.isfinite(loss)
+
+
+def test_packing_excludes_dynamic_padding():
+    with pytest.raises(Exception, match="cannot be enabled together"):
+        MMMTrainerBaseConfig(dynamic_padding=True, sequence_packing=True)
@@ -0,0 +1,116 @@
+import os
+import sys
+import glob
+import pytest
+
+# Add project root to the path for module imports
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+sys.path.insert(0, project_root)
+
+from src.AI_GURU.datasetcreator import DatasetCreator, SONG_STORE_NAMES
+from src.AI_GURU.preprocess.encode import encode_songs_data, get_density_bins
+from src.AI_GURU.preprocess.music21jsb import preprocess_music21
+from src.AI_GURU.preprocess.songarray import song_data_to_array
+from src.AI_GURU.preprocess.songstore import SongStoreReader, SongStoreWriter, write_song_store
+
+SANITY_MIDI_FILES = sorted(glob.glob(os.path.join(project_root, "data", "sanity", "*.mid")))
+
+
+@pytest.fixture(scope="module")
+def songs_data():
+    songs_data_train, songs_data_valid, _ = preprocess_music21(SANITY_MIDI_FILES)
+    return songs_data_train + songs_data_valid
+
+
+def to_dicts(songs_data):
+    return [song_data_to_array(song_data).to_dict() for song_data in songs_data]
+
+
+def test_store_round_trip(songs_data, tmp_path):
+    """
+    Test that songs read back from a store with several shards equal the written ones, in order and by index.
+    """
+    store_path = str(tmp_path / "store")
+    assert write_song_store(songs_data, store_path, max_shard_size_bytes=4096) == len(songs_data)
+    assert len(glob.glob(os.path.join(store_path, "shard_*.bin"))) > 1
+
+    with SongStoreReader(store_path) as reader:
+        assert len(reader) == len(songs_data)
+        assert to_dicts(reader) == to_dicts(songs_data)
+        assert to_dicts([reader[-1], reader[3]]) == to_dicts([songs_data[-1], songs_data[3]])
+        with pytest.raises(IndexError):
+            reader[len(songs_data)]
+
+
+def test_encoding_from_store_matches_lists(songs_data, tmp_path):
+    """
+    Test that density bins and token sequences computed from a store equal those computed from the lists.
+    """
+    store_path = str(tmp_path / "store")
+    write_song_store(songs_data, store_path)
+
+    with SongStoreReader(store_path) as reader:
+        density_bins = get_density_bins(reader, 1, 1, 5)
+        assert density_bins == get_density_bins(songs_data, 1, 1, 5)
+        assert encode_songs_data(reader, [0, 1], False, 1, 1, density_bins, False) == encode_songs_data(
+            songs_data, [0, 1], False, 1, 1, density_bins, False
+        )
+
+
+def test_writer_discards_unflushed_songs(songs_data, tmp_path):
+    """
+    Test that a writer drops songs that were never flushed, and truncates to a given number of songs.
+    """
+    store_path = str(tmp_path / "store")
+    writer = SongStoreWriter(store_path, max_shard_size_bytes=4096)
+    for song_data in songs_data[:6]:
+        writer.add(song_data)
+    writer.flush()
+    for song_data in songs_data[6:]:
+        writer.add(song_data)
+
+    with SongStoreReader(store_path) as reader:
+        assert len(reader) >= 6
+
+    with SongStoreWriter(store_path, songs_number=4, max_shard_size_bytes=4096) as writer:
+        writer.add(songs_data[-1])
+    with SongStoreReader(store_path) as reader:
+        assert to_dicts(reader) == to_dicts(songs_data[:4] + songs_data[-1:])
+
+    with pytest.raises(Exception, match="holds 5 songs"):
+        SongStoreWriter(store_path, songs_number=6)
+
+
+def read_token_sequences(dataset_path):
+    token_sequences = {}
+    for split in ["train", "valid"]:
+        with open(os.path.join(dataset_path, f"token_sequences_{split}.txt")) as f:
+            token_sequences[split] = f.read()
+    return token_sequences
+
+
+def test_dataset_song_stores(tmp_path, small_batches, sanity_midi_files, create_config, interrupt_encoding):
+    """
+    Test that an interrupted build with song stores resumes to stores holding each encoded song once, and that
+    encoding the stores again gives the same token sequences.
+    """
+    interrupt_encoding(DatasetCreator(create_config("stored", permute_tracks=False, song_store=True)), tmp_path)
+    DatasetCreator(create_config("stored", permute_tracks=False, song_store=True)).create(str(tmp_path))
+
+    songs_data_train, songs_data_valid = [], []
+    for batch_index in range(3):
+        batch_train, batch_valid, _ = preprocess_music21(SANITY_MIDI_FILES[batch_index * 5 : (batch_index + 1) * 5])
+        songs_data_train += batch_train
+        songs_data_valid += batch_valid
+
+    dataset_path = str(tmp_path / "stored")
+    readers = {split: SongStoreReader(os.path.join(dataset_path, name)) for split, name in SONG_STORE_NAMES.items()}
+    assert to_dicts(readers["train"]) == to_dicts(songs_data_train)
+    assert to_dicts(readers["valid"]) == to_dicts(songs_data_valid)
+
+    config = create_config("reencoded", permute_tracks=False, song_store=True)
+    config.json_data_method = lambda: (readers["train"], readers["valid"])
+    DatasetCreator(config).create(str(tmp_path))
+    assert read_token_sequences(tmp_path / "reencoded") == read_token_sequences(dataset_path)
+    for reader in readers.values():
+        reader.close()
@@ -0,0 +1,128 @@
+import os
+import sys
+import glob
+import pytest
+import numpy as np
+from fractions import Fraction
+
+# Add project root to the path for module imports
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+sys.path.insert(0, project_root)
+
+from src.AI_GURU.preprocess.music21jsb import preprocess_music21_song
+from src.AI_GURU.preprocess.encode import (
+    encode_bar_data,
+    encode_songs_data,
+    get_bars_number,
+    get_density_bins,
+)
+from src.AI_GURU.preprocess.songarray import (
+    TrackArray,
+    events_array_to_events_data,
+    events_data_to_events_array,
+    song_data_to_array,
+    songs_data_to_arrays,
+)
+from music21 import converter
+
+SANITY_MIDI_FILES = sorted(glob.glob(os.path.join(project_root, "data", "sanity", "*.mid")))
+
+
+@pytest.fixture(scope="module")
+def songs_data():
+    """
+    Fixture providing the song data of the sanity files plus a song with Fraction deltas.
+    """
+    songs_data = [preprocess_music21_song(converter.parse(midi_file)) for midi_file in SANITY_MIDI_FILES]
+    songs_data = [song_data for song_data in songs_data if song_data is not None]
+    songs_data.append(
+        {
+            "title": "triplets",
+            "number": 0,
+            "tracks": [
+                {
+                    "name": "Piano",
+                    "number": 0,
+                    "bars": [
+                        {
+                            "events": [
+                                {"type": "NOTE_ON", "pitch": 60},
+                                {"type": "TIME_DELTA", "delta": Fraction(4, 3)},
+                                {"type": "NOTE_OFF", "pitch": 60},
+                                {"type": "TIME_DELTA", "delta": 2.5},
+                            ]
+                        },
+                        {"events": [{"type": "TIME_DELTA", "delta": 16.0}]},
+                    ],
+                }
+            ],
+        }
+    )
+    return songs_data
+
+
+def test_round_trip(songs_data):
+    """
+    Test that converting to the compact representation and back yields the original song data.
+    """
+    for song_data in songs_data:
+        assert song_data_to_array(song_data).to_dict() == song_data
+
+
+def test_fraction_deltas_are_kept():
+    """
+    Test that Fraction deltas come back as Fractions and float deltas as floats.
+    """
+    events_data = [{"type": "TIME_DELTA", "delta": Fraction(4, 3)}, {"type": "TIME_DELTA", "delta": 0.25}]
+    restored = events_array_to_events_data(events_data_to_events_array(events_data))
+    assert restored == events_data
+    assert isinstance(restored[0]["delta"], Fraction)
+    assert isinstance(restored[1]["delta"], float)
+
+
+def test_dict_access(songs_data):
+    """
+    Test that the compact songs can be read like song data dicts.
+    """
+    song_array = song_data_to_array(songs_data[0])
+    assert song_array["title"] == songs_data[0]["title"]
+    assert "tracks" in song_array
+    track_array = song_array["tracks"][0]
+    assert isinstance(track_array, TrackArray)
+    assert track_array["bars"] == songs_data[0]["tracks"][0]["bars"]
+    assert track_array.get("drums", False) == songs_data[0]["tracks"][0].get("drums", False)
+    with pytest.raises(KeyError):
+        track_array["missing"]
+
+
+def test_encoding_matches(songs_data):
+    """
+    Test that the compact songs yield the same density bins and tokens as the song data dicts.
+    """
+    songs_arrays = songs_data_to_arrays(songs_data)
+    density_bins = get_density_bins(songs_data, 2, 1, 4)
+    assert np.array_equal(get_density_bins(songs_arrays, 2, 1, 4), density_bins)
+
+    for song_data, song_array in zip(songs_data, songs_arrays):
+        assert get_bars_number(song_array) == get_bars_number(song_data)
+
+    encoding_parameters = dict(
+        transpositions=[0, 2],
+        permute=False,
+        window_size_bars=2,
+        hop_length_bars=1,
+        density_bins=density_bins,
+        bar_fill=False,
+    )
+    assert encode_songs_data(songs_arrays, **encoding_parameters) == encode_songs_data(
+        songs_data, **encoding_parameters
+    )
+
+
+def test_bar_encoding_matches(songs_data):
+    """
+    Test that a bar encodes the same from its event array and from its event dicts.
+    """
+    track_array = song_data_to_array(songs_data[-1])["tracks"][0]
+    bar_data = songs_data[-1]["tracks"][0]["bars"][0]
+    assert encode_bar_data(track_array.get_bar_events(0), 3) == encode_bar_data(bar_data, 3)
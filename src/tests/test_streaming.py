@@ -0,0 +1,86 @@
+import os
+import sys
+import glob
+import random
+import pytest
+
+# Add project root to the path for module imports
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+sys.path.insert(0, project_root)
+
+from src.AI_GURU.datasetcreator import DatasetCreator
+from src.AI_GURU.preprocess.music21jsb import preprocess_music21, iterate_music21
+from src.AI_GURU.preprocess.midojsb import preprocess_mido, iterate_mido
+from src.AI_GURU.preprocess.parsecache import ParseCache
+from src.AI_GURU.preprocess.processpool import imap_threads
+
+SANITY_MIDI_FILES = sorted(glob.glob(os.path.join(project_root, "data", "sanity", "*.mid")))
+
+
+def split_songs_data(songs_data):
+    """
+    Helper function splitting streamed song data like the preprocessing methods do.
+    """
+    split_index = int(0.8 * len(songs_data))
+    songs_data_train = [song_data for song_data in songs_data[:split_index] if song_data is not None]
+    songs_data_valid = [song_data for song_data in songs_data[split_index:] if song_data is not None]
+    return songs_data_train, songs_data_valid
+
+
+@pytest.mark.parametrize(
+    "preprocess_method, iterate_method",
+    [(preprocess_music21, iterate_music21), (preprocess_mido, iterate_mido)],
+    ids=["music21", "mido"],
+)
+def test_iterate_matches_preprocess(preprocess_method, iterate_method, tmp_path):
+    """
+    Test that streaming yields the same song data as preprocessing the whole list, with and without cache.
+    """
+    invalid_midi_file = str(tmp_path / "invalid.mid")
+    with open(invalid_midi_file, "wb") as f:
+        f.write(b"not a MIDI file")
+    midi_files = SANITY_MIDI_FILES[:3] + [invalid_midi_file] + SANITY_MIDI_FILES[3:]
+
+    songs_data_train, songs_data_valid, _ = preprocess_method(midi_files, max_workers=2)
+
+    cache = ParseCache(str(tmp_path / "cache"))
+    for _ in range(2):
+        results = list(iterate_method(midi_files, max_workers=2, cache=cache))
+        assert [midi_file for midi_file, _ in results] == SANITY_MIDI_FILES
+        assert split_songs_data([song_data for _, song_data in results]) == (songs_data_train, songs_data_valid)
+    assert cache.hits == len(SANITY_MIDI_FILES)
+
+
+def test_imap_threads_is_lazy_and_ordered():
+    """
+    Test that the thread map keeps the input order and does not run far ahead of the consumer.
+    """
+    started = []
+
+    def record(item):
+        started.append(item)
+        return item * 2
+
+    results = imap_threads(record, range(100), max_workers=2)
+    assert next(results) == 0
+    assert len(started) <= 5
+    assert list(results) == [item * 2 for item in range(1, 100)]
+
+
+def test_streaming_dataset_matches_batch_dataset(tmp_path, sanity_midi_files, create_config):
+    """
+    Test that the streaming mode of the DatasetCreator writes the same token sequences as the batch mode.
+    """
+    token_sequences = {}
+    for streaming in [False, True]:
+        config = create_config(f"streaming_{streaming}", streaming=streaming)
+        random.seed(0)
+        DatasetCreator(config).create(str(tmp_path), overwrite=True)
+
+        for split in ["train", "valid"]:
+            with open(tmp_path / config.dataset_name / f"token_sequences_{split}.txt") as f:
+                token_sequences[streaming, split] = f.read()
+
+    assert token_sequences[True, "train"]
+    assert token_sequences[True, "train"] == token_sequences[False, "train"]
+    assert token_sequences[True, "valid"] == token_sequences[False, "valid"]
@@ -0,0 +1,93 @@
+import os
+import sys
+import pytest
+from torch.utils.data import DataLoader
+
+# Add project root to the path for module imports
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+sys.path.insert(0, project_root)
+
+from src.AI_GURU.mmmtrainerconfig import MMMTrainerBaseConfig
+from src.AI_GURU.token_sequence_batching import DynamicPaddingCollator
+from src.AI_GURU.token_sequence_dataset import StreamingTokenSequenceDataset, TokenSequenceDataset
+
+
+@pytest.fixture
+def dataset_paths(write_token_sequences):
+    """
+    Writes three files of token sequences of random lengths, with empty lines and unknown tokens, and a tokenizer.
+    """
+    file_names = [f"token_sequences_train_{file_index}.txt" for file_index in range(3)]
+    return write_token_sequences(file_names, 40, 40, extra_lines=["", "PIECE_START UNKNOWN"])
+
+
+def to_lists(examples):
+    """
+    Helper function turning examples into sorted lists of token IDs.
+    """
+    return sorted(example["input_ids"].tolist() for example in examples)
+
+
+def test_streaming_matches_dataset(dataset_paths):
+    """
+    Test that the streamed examples are the examples of the dataset, shuffled differently every epoch.
+    """
+    paths, tokenizer = dataset_paths
+    dataset = TokenSequenceDataset(tokenizer, paths, 32)
+    expected = to_lists(dataset[i] for i in range(len(dataset)))
+    assert 0 < len(expected) < 120
+
+    streaming_dataset = StreamingTokenSequenceDataset(tokenizer, paths, 32, shuffle_buffer_size=16)
+    examples = [example["input_ids"].tolist() for example in streaming_dataset]
+    assert sorted(examples) == expected
+    assert examples != [dataset[i]["input_ids"].tolist() for i in range(len(dataset))]
+    assert [example["input_ids"].tolist() for example in streaming_dataset] == examples
+
+    streaming_dataset.set_epoch(1)
+    assert [example["input_ids"].tolist() for example in streaming_dataset] != examples
+
+
+def test_streaming_is_lazy(dataset_paths):
+    """
+    Test that the first example only needs the shuffle buffer to be filled.
+    """
+    paths, tokenizer = dataset_paths
+    encoded_lines = []
+    encode = tokenizer.encode
+    tokenizer.encode = lambda line: encoded_lines.append(line) or encode(line)
+    streaming_dataset = StreamingTokenSequenceDataset(tokenizer, paths, 32, shuffle_buffer_size=4)
+    next(iter(streaming_dataset))
+    assert len(encoded_lines) < 10
+
+
+@pytest.mark.parametrize("files_number", [1, 3])
+def test_streaming_workers(dataset_paths, files_number):
+    """
+    Test that the workers split the files, or the lines of fewer files, without repeating or missing examples.
+    """
+    paths, tokenizer = dataset_paths
+    paths = paths[:files_number]
+    dataset = TokenSequenceDataset(tokenizer, paths, 32, padding=False)
+    streaming_dataset = StreamingTokenSequenceDataset(tokenizer, paths, 32, shuffle_buffer_size=8, padding=False)
+    collator = DynamicPaddingCollator(pad_token_id=dataset.pad_token_id)
+    dataloader = DataLoader(streaming_dataset, batch_size=4, num_workers=2, collate_fn=collator)
+    examples = [
+        input_ids[mask.bool()]
+        for batch in dataloader
+        for input_ids, mask in zip(batch["input_ids"], batch["attention_mask"])
+    ]
+    assert to_lists({"input_ids": example} for example in examples) == to_lists(dataset[i] for i in range(len(dataset)))
+
+
+def test_streaming_simulate(dataset_paths):
+    paths, tokenizer = dataset_paths
+    assert len(list(StreamingTokenSequenceDataset(tokenizer, paths, 32, shuffle_buffer_size=4, simulate=True))) == 10
+    assert len(list(StreamingTokenSequenceDataset(tokenizer, paths, 32, shuffle_buffer_size=1000, simulate=True))) == 10
+
+
+def test_streaming_config():
+    with pytest.raises(Exception, match="max_steps"):
+        MMMTrainerBaseConfig(streaming=True)
+    with pytest.raises(Exception, match="cannot be enabled together"):
+        MMMTrainerBaseConfig(streaming=True, sequence_packing=True, max_steps=10)
+    assert MMMTrainerBaseConfig(streaming=True, dynamic_padding=True, max_steps=10).streaming
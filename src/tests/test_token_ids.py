@@ -0,0 +1,167 @@
+import os
+import sys
+import glob
+import json
+import random
+import pytest
+import numpy as np
+from fractions import Fraction
+from tokenizers import Tokenizer
+from tokenizers.models import WordLevel
+from tokenizers.pre_tokenizers import WhitespaceSplit
+from tokenizers.trainers import WordLevelTrainer
+from music21 import converter
+
+# Add project root to the path for module imports
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+sys.path.insert(0, project_root)
+
+from src.AI_GURU.preprocess.music21jsb import preprocess_music21_song
+from src.AI_GURU.preprocess.encode import encode_song_data, encode_song_data_singular, get_density_bins
+from src.AI_GURU.preprocess.songarray import song_data_to_array
+from src.AI_GURU.preprocess.tokenids import (
+    TokenIdEncoder,
+    check_token_ids,
+    encode_song_data_ids,
+    encode_song_data_singular_ids,
+)
+
+SANITY_MIDI_FILES = sorted(glob.glob(os.path.join(project_root, "data", "sanity", "*.mid")))
+
+
+@pytest.fixture(scope="module")
+def songs_data():
+    """
+    Fixture providing the song data of the sanity files plus a song with drums and Fraction deltas.
+    """
+    songs_data = [preprocess_music21_song(converter.parse(midi_file)) for midi_file in SANITY_MIDI_FILES]
+    songs_data = [song_data for song_data in songs_data if song_data is not None]
+    bars = [
+        {
+            "events": [
+                {"type": "NOTE_ON", "pitch": 36},
+                {"type": "TIME_DELTA", "delta": Fraction(4, 3)},
+                {"type": "NOTE_OFF", "pitch": 36},
+                {"type": "TIME_DELTA", "delta": 2.0},
+                {"type": "TIME_DELTA", "delta": Fraction(2, 1)},
+            ]
+        },
+        {"events": []},
+        {"events": [{"type": "TIME_DELTA", "delta": 16.0}]},
+    ]
+    songs_data.append(
+        {
+            "title": "drums",
+            "number": 0,
+            "tracks": [
+                {"name": "Drums", "number": 9, "drums": True, "bars": bars},
+                {"name": "Piano", "number": 0, "bars": bars[:2]},
+            ],
+        }
+    )
+    return songs_data
+
+
+@pytest.fixture(scope="module")
+def tokenizer(songs_data, tmp_path_factory):
+    """
+    Fixture providing a tokenizer trained like the DatasetCreator does, on all but the last sanity song.
+    """
+    density_bins = get_density_bins(songs_data, 1, 1, 5)
+    token_sequences = []
+    for song_data in songs_data[:-2] + songs_data[-1:]:
+        token_sequences += encode_song_data(song_data, [0], False, 1, 1, density_bins, False)
+    token_sequences_path = tmp_path_factory.mktemp("tokenizer") / "token_sequences_train.txt"
+    with open(token_sequences_path, "w") as f:
+        for token_sequence in token_sequences:
+            print(" ".join(token_sequence), file=f)
+
+    tokenizer = Tokenizer(WordLevel(unk_token="[UNK]"))
+    tokenizer.pre_tokenizer = WhitespaceSplit()
+    trainer = WordLevelTrainer(special_tokens=["[UNK]", "[CLS]", "[SEP]", "[PAD]", "[MASK]"])
+    tokenizer.train(files=[str(token_sequences_path)], trainer=trainer)
+    return tokenizer
+
+
+@pytest.mark.parametrize("compact", [False, True], ids=["dict", "compact"])
+@pytest.mark.parametrize("permute", [False, True])
+def test_song_ids_match_tokenizer(songs_data, tokenizer, compact, permute):
+    """
+    Test that the token IDs match the tokenizer on the tokens, including transpositions to unknown pitches,
+    drums and windows past the end of short tracks.
+    """
+    token_id_encoder = TokenIdEncoder.from_tokenizer_json(tokenizer.to_str())
+    density_bins = get_density_bins(songs_data, 2, 1, 5)
+    transpositions = [-3, 0, 100]
+
+    for song_data in songs_data:
+        random.seed(0)
+        token_sequences = encode_song_data(song_data, transpositions, permute, 2, 1, density_bins, False)
+        if compact:
+            song_data = song_data_to_array(song_data)
+        random.seed(0)
+        token_id_sequences = encode_song_data_ids(
+            song_data, token_id_encoder, transpositions, permute, 2, 1, density_bins
+        )
+
+        assert len(token_id_sequences) == len(token_sequences)
+        for token_sequence, token_ids in zip(token_sequences, token_id_sequences):
+            assert check_token_ids(tokenizer, token_sequence, token_ids)
+
+
+def test_song_ids_use_random_generator(songs_data, tokenizer):
+    """
+    Test that the tracks are permuted with the given random generator, as `encode_song_data` permutes them.
+    """
+    token_id_encoder = TokenIdEncoder.from_tokenizer_json(tokenizer.to_str())
+    density_bins = get_density_bins(songs_data, 2, 1, 5)
+
+    for song_data in songs_data:
+        token_sequences = encode_song_data(song_data, [0], True, 2, 1, density_bins, False, rng=random.Random(1))
+        random.seed(0)
+        token_id_sequences = encode_song_data_ids(
+            song_data, token_id_encoder, [0], True, 2, 1, density_bins, rng=random.Random(1)
+        )
+        assert random.random() == random.Random(0).random()
+
+        assert len(token_id_sequences) == len(token_sequences)
+        for token_sequence, token_ids in zip(token_sequences, token_id_sequences):
+            assert check_token_ids(tokenizer, token_sequence, token_ids)
+
+
+@pytest.mark.parametrize("compact", [False, True], ids=["dict", "compact"])
+def test_singular_ids_match_tokenizer(songs_data, tokenizer, compact):
+    """
+    Test that the token IDs of whole songs match the tokenizer, also for songs the parser rejected.
+    """
+    token_id_encoder = TokenIdEncoder.from_tokenizer_json(tokenizer.to_str())
+
+    for song_data in songs_data + [None]:
+        tokens = encode_song_data_singular(song_data, 3)
+        if compact and song_data is not None:
+            song_data = song_data_to_array(song_data)
+        assert check_token_ids(tokenizer, tokens, encode_song_data_singular_ids(song_data, 3, token_id_encoder))
+
+
+def test_check_token_ids_detects_differences(tokenizer):
+    """
+    Test that the check fails on other IDs and on IDs that are not int64.
+    """
+    tokens = ["PIECE_START", "TRACK_START", "TRACK_END"]
+    token_ids = TokenIdEncoder.from_tokenizer_json(tokenizer.to_str()).encode_tokens(tokens)
+
+    assert check_token_ids(tokenizer, tokens, token_ids)
+    assert not check_token_ids(tokenizer, tokens, token_ids.astype(np.int32))
+    assert not check_token_ids(tokenizer, tokens, token_ids[::-1])
+    assert not check_token_ids(tokenizer, tokens, token_ids[:-1])
+
+
+def test_unsupported_tokenizers_are_rejected(tokenizer):
+    """
+    Test that tokenizers that do not map tokens one to one are rejected.
+    """
+    tokenizer_data = json.loads(tokenizer.to_str())
+    tokenizer_data["pre_tokenizer"] = {"type": "Whitespace"}
+
+    with pytest.raises(Exception, match="not supported"):
+        TokenIdEncoder.from_tokenizer_json(json.dumps(tokenizer_data))
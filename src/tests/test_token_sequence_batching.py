@@ -0,0 +1,99 @@
+import os
+import sys
+import numpy as np
+import pytest
+import torch
+from transformers import GPT2Config, GPT2LMHeadModel
+
+# Add project root to the path for module imports
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+sys.path.insert(0, project_root)
+
+from src.AI_GURU.token_sequence_batching import (
+    IGNORED_LABEL_ID,
+    DynamicPaddingCollator,
+    LengthGroupedBatchSampler,
+    get_padding_fraction,
+    report_padding_fraction,
+)
+from src.AI_GURU.token_sequence_dataset import TokenSequenceDataset
+
+
+@pytest.fixture
+def dataset_paths(write_token_sequences):
+    """
+    Writes token sequences of random lengths and a tokenizer of their tokens.
+    """
+    return write_token_sequences(["token_sequences_train.txt"], 200, 64)
+
+
+@pytest.mark.parametrize("drop_last", [False, True])
+def test_sampler_covers_examples(drop_last):
+    """
+    Test that the sampler yields every example once per epoch in batches of similar lengths.
+    """
+    lengths = np.random.default_rng(0).integers(1, 768, size=1003)
+    sampler = LengthGroupedBatchSampler(lengths, 8, megabatch_size=10, drop_last=drop_last)
+    batches = list(sampler)
+    assert len(batches) == len(sampler) == (125 if drop_last else 126)
+    indices = [index for batch in batches for index in batch]
+    assert len(indices) == len(set(indices)) == (1000 if drop_last else 1003)
+    assert sum(len(batch) != 8 for batch in batches) == (0 if drop_last else 1)
+    assert max(lengths[batches[0]]) == max(lengths[indices])
+
+    # Grouping by length cuts most of the padding of random batches.
+    random_batches = np.array_split(np.random.default_rng(1).permutation(1003), len(batches))
+    assert get_padding_fraction(lengths, batches) < get_padding_fraction(lengths, random_batches) / 5
+    padding_fraction = 1 - lengths[indices].sum() / (len(indices) * 768)
+    assert get_padding_fraction(lengths, batches, 768) == pytest.approx(padding_fraction)
+
+    # Each epoch is shuffled differently and reproducibly.
+    assert list(sampler) == batches
+    sampler.set_epoch(1)
+    assert list(sampler) != batches
+
+
+def test_collator_masks_padding():
+    """
+    Test that the collator pads to the longest example, masking the padding out of the attention and the loss.
+    """
+    collator = DynamicPaddingCollator(pad_token_id=1, pad_to_multiple_of=4)
+    batch = collator([{"input_ids": torch.tensor([5, 6, 7, 8, 9])}, {"input_ids": torch.tensor([5, 6])}])
+    assert batch["input_ids"].tolist() == [[5, 6, 7, 8, 9, 1, 1, 1], [5, 6, 1, 1, 1, 1, 1, 1]]
+    assert batch["attention_mask"].tolist() == [[1] * 5 + [0] * 3, [1] * 2 + [0] * 6]
+    assert batch["labels"].tolist() == [[5, 6, 7, 8, 9] + [IGNORED_LABEL_ID] * 3, [5, 6] + [IGNORED_LABEL_ID] * 6]
+
+
+def test_dynamic_padding_matches_fixed_padding_loss(dataset_paths):
+    """
+    Test that a batch padded to its longest example gives a model the loss of its padded-to-block-size batch
+    with the padding masked out.
+    """
+    paths, tokenizer = dataset_paths
+    padded_dataset = TokenSequenceDataset(tokenizer, paths, 128)
+    dataset = TokenSequenceDataset(tokenizer, paths, 128, padding=False)
+    assert np.array_equal(dataset.lengths, [len(dataset[i]["input_ids"]) for i in range(len(dataset))])
+    before, after = report_padding_fraction(dataset.lengths, 8, 128)
+    assert after < before
+
+    torch.manual_seed(0)
+    model = GPT2LMHeadModel(GPT2Config(vocab_size=len(tokenizer), n_layer=1, n_head=2, n_embd=16, n_positions=128))
+    model.eval()
+    indices = next(iter(LengthGroupedBatchSampler(dataset.lengths, 8)))
+    collator = DynamicPaddingCollator(pad_token_id=dataset.pad_token_id)
+    batch = collator([dataset[i] for i in indices])
+    assert batch["input_ids"].shape[1] == max(dataset.lengths[indices]) < 128
+    assert all(
+        torch.equal(padded_dataset[i]["input_ids"][: batch["input_ids"].shape[1]], input_ids)
+        for i, input_ids in zip(indices, batch["input_ids"])
+    )
+
+    # Pad the batch to the block size, masking the padding.
+    padding = (0, 128 - batch["input_ids"].shape[1])
+    padded_batch = {
+        "input_ids": torch.nn.functional.pad(batch["input_ids"], padding, value=dataset.pad_token_id),
+        "attention_mask": torch.nn.functional.pad(batch["attention_mask"], padding, value=0),
+        "labels": torch.nn.functional.pad(batch["labels"], padding, value=IGNORED_LABEL_ID),
+    }
+    with torch.no_grad():
+        assert model(**batch).loss.item() == pytest.approx(model(**padded_batch).loss.item(), rel=1e-5)
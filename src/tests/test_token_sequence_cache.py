@@ -0,0 +1,163 @@
+import os
+import sys
+import collections
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pytest
+import torch
+from transformers import PreTrainedTokenizerFast
+
+# Add project root to the path for module imports
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+sys.path.insert(0, project_root)
+
+from src.AI_GURU import token_sequence_cache
+from src.AI_GURU.token_sequence_cache import TokenSequenceCache, build_cache, get_token_dtype
+from src.AI_GURU.token_sequence_dataset import TokenSequenceDataset
+from src.AI_GURU.preprocess.vocabulary import create_tokenizer
+
+LINES = [
+    "PIECE_START TRACK_START INST=0 DENSITY=1 BAR_START NOTE_ON=60 TIME_DELTA=1.0 NOTE_OFF=60 BAR_END TRACK_END",
+    "",
+    "PIECE_START TRACK_START INST=0 DENSITY=2 BAR_START BAR_END TRACK_END",
+    "PIECE_START TRACK_START INST=0 DENSITY=2 BAR_START NOTE_ON=61 UNKNOWN BAR_END TRACK_END",
+    "PIECE_START " + "BAR_START BAR_END " * 10 + "TRACK_END",
+]
+
+
+@pytest.fixture
+def tokenizer(tmp_path):
+    token_counts = collections.Counter(token for line in LINES for token in line.split() if token != "UNKNOWN")
+    tokenizer_path = str(tmp_path / "tokenizer.json")
+    create_tokenizer(token_counts).save(tokenizer_path)
+    tokenizer = PreTrainedTokenizerFast(tokenizer_file=tokenizer_path)
+    tokenizer.add_special_tokens({"pad_token": "[PAD]"})
+    return tokenizer
+
+
+@pytest.fixture
+def dataset_path(tmp_path):
+    path = tmp_path / "token_sequences_train.txt"
+    path.write_text("\n".join(LINES) + "\n")
+    return str(path)
+
+
+def get_examples(tokenizer, lines, block_size):
+    """
+    Helper function padding the lines without unknown tokens that fit, as the dataset did without a cache.
+    """
+    pad_token_id = tokenizer.encode("[PAD]")[0]
+    unk_token_id = tokenizer.encode("[UNK]")[0]
+    examples = []
+    for line in lines:
+        encoded_line = tokenizer.encode(line.strip())
+        if line.strip() == "" or unk_token_id in encoded_line or len(encoded_line) > block_size:
+            continue
+        examples.append(encoded_line + [pad_token_id] * (block_size - len(encoded_line)))
+    return examples
+
+
+def test_dataset_matches_tokenized_lines(tokenizer, dataset_path, tmp_path):
+    """
+    Test that the cached dataset yields the padded lines that fit, with labels sharing the input IDs.
+    """
+    dataset = TokenSequenceDataset(tokenizer, [dataset_path, dataset_path], 16, cache_dir=str(tmp_path / "cache"))
+    expected = get_examples(tokenizer, LINES, 16)
+    assert len(expected) == 2
+    assert [dataset[i]["input_ids"].tolist() for i in range(len(dataset))] == expected * 2
+
+    example = dataset[0]
+    assert example["input_ids"].dtype == torch.long
+    assert example["labels"].data_ptr() == example["input_ids"].data_ptr()
+
+    cache = dataset.caches[0]
+    assert cache.tokens.dtype == np.uint16
+    assert cache.metadata["lines_number"] == 4
+    assert cache.metadata["unknown_token_lines_number"] == 1
+
+
+def test_cache_is_built_once(tokenizer, dataset_path, monkeypatch):
+    """
+    Test that a cached file is opened without tokenizing it again, and tokenized again once it changes.
+    """
+    TokenSequenceCache.open(tokenizer, dataset_path)
+    assert os.path.isdir(os.path.join(os.path.dirname(dataset_path), "token_cache"))
+
+    build_cache = token_sequence_cache.build_cache
+    calls = []
+
+    def count_builds(*args):
+        calls.append(args)
+        return build_cache(*args)
+
+    monkeypatch.setattr(token_sequence_cache, "build_cache", count_builds)
+    assert len(TokenSequenceCache.open(tokenizer, dataset_path)) == 3
+    assert calls == []
+
+    with open(dataset_path, "a") as f:
+        f.write(LINES[2] + "\n")
+    os.utime(dataset_path, ns=(0, os.stat(dataset_path).st_mtime_ns + 1))
+    assert len(TokenSequenceCache.open(tokenizer, dataset_path)) == 4
+    assert len(calls) == 1
+
+
+def test_empty_file(tokenizer, tmp_path):
+    path = tmp_path / "empty.txt"
+    path.write_text("\n")
+    dataset = TokenSequenceDataset(tokenizer, [str(path)], 16)
+    assert len(dataset) == 0
+
+
+def test_token_dtype():
+    assert get_token_dtype(65536) == np.uint16
+    assert get_token_dtype(65537) == np.uint32
+
+
+@pytest.mark.parametrize("batch_size, threads", [(1, 1), (2, 3), (1000, 1), (1000, 2)])
+def test_batched_tokenization(tokenizer, dataset_path, tmp_path, batch_size, threads):
+    """
+    Test that tokenizing in batches and threads keeps the lines and filtering of the line by line tokenization.
+    """
+    dataset = TokenSequenceDataset(
+        tokenizer,
+        [dataset_path],
+        16,
+        cache_dir=str(tmp_path / "cache"),
+        tokenization_batch_size=batch_size,
+        tokenization_threads=threads,
+    )
+    assert [dataset[i]["input_ids"].tolist() for i in range(len(dataset))] == get_examples(tokenizer, LINES, 16)
+    assert dataset.skipped_lines == {"unknown_token": 1, "too_long": 1}
+
+    cache = dataset.caches[0]
+    assert [cache[i].tolist() for i in range(len(cache))] == [
+        tokenizer.encode(line) for line in LINES if line != "" and "UNKNOWN" not in line
+    ]
+
+
+def test_concurrent_builds(tokenizer, dataset_path, tmp_path, monkeypatch):
+    """
+    Test that builds of the same cache at once write their own temporary files and publish a complete cache,
+    and that a failed build leaves no temporary files.
+    """
+    cache_path = str(tmp_path / "cache")
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        futures = [executor.submit(build_cache, tokenizer, dataset_path, cache_path, 1) for _ in range(4)]
+        assert all(future.result() == futures[0].result() for future in futures)
+    cache = TokenSequenceCache(cache_path)
+    assert [cache[i].tolist() for i in range(len(cache))] == [
+        tokenizer.encode(line) for line in LINES if line != "" and "UNKNOWN" not in line
+    ]
+    assert sorted(name for name in os.listdir(tmp_path) if name.startswith("cache")) == [
+        "cache.json",
+        "cache.offsets",
+        "cache.tokens",
+    ]
+
+    def fail(*args):
+        raise OSError("No space left on device")
+
+    monkeypatch.setattr(token_sequence_cache, "encode_line_batch", fail)
+    with pytest.raises(OSError):
+        build_cache(tokenizer, dataset_path, str(tmp_path / "failed"))
+    assert not any(name.startswith("failed") for name in os.listdir(tmp_path))
@@ -0,0 +1,57 @@
+import os
+import sys
+import glob
+import types
+import pytest
+
+# Add project root to the path for module imports
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+sys.path.insert(0, project_root)
+
+from src.AI_GURU.preprocess.encode import encode_songs_data, get_density_bins, iterate_token_sequences
+from src.AI_GURU.preprocess.music21jsb import preprocess_music21
+from src.AI_GURU.preprocess.tokenwriter import TokenSequenceWriter
+
+SANITY_MIDI_FILES = sorted(glob.glob(os.path.join(project_root, "data", "sanity", "*.mid")))
+
+
+@pytest.fixture(scope="module")
+def songs_data():
+    songs_data_train, _, _ = preprocess_music21(SANITY_MIDI_FILES[:6])
+    return songs_data_train
+
+
+def test_iterate_token_sequences_matches_encode_songs_data(songs_data):
+    """
+    Test that the generator yields the token sequences of `encode_songs_data` in the same order.
+    """
+    density_bins = get_density_bins(songs_data, 1, 1, 5)
+    token_sequences = iterate_token_sequences(songs_data, [-1, 0, 1], False, 1, 1, density_bins, False)
+    assert isinstance(token_sequences, types.GeneratorType)
+    assert list(token_sequences) == encode_songs_data(songs_data, [-1, 0, 1], False, 1, 1, density_bins, False)
+
+
+@pytest.mark.parametrize("buffer_size_bytes", [1, 100, 1 << 22])
+def test_writer_output_and_stats(songs_data, buffer_size_bytes, tmp_path):
+    """
+    Test that the writer writes one line per token sequence, reports its position including the buffer,
+    and counts the written sequences and bytes.
+    """
+    density_bins = get_density_bins(songs_data, 1, 1, 5)
+    token_sequences = encode_songs_data(songs_data, [0, 1], False, 1, 1, density_bins, False)
+    expected = "".join(" ".join(token_sequence) + "\n" for token_sequence in token_sequences).encode("utf-8")
+
+    path = tmp_path / "token_sequences.txt"
+    token_writer = TokenSequenceWriter(open(path, "wb"), buffer_size_bytes=buffer_size_bytes)
+    token_writer.write(token_sequences[0])
+    assert token_writer.tell() == len(" ".join(token_sequences[0])) + 1
+    token_writer.write_all(iter(token_sequences[1:]))
+    assert token_writer.tell() == len(expected)
+    token_writer.close()
+
+    with open(path, "rb") as f:
+        assert f.read() == expected
+    stats = token_writer.get_stats()
+    assert stats["sequences"] == len(token_sequences)
+    assert stats["bytes"] == len(expected)
+    assert stats["sequences_per_second"] > 0
@@ -0,0 +1,118 @@
+import os
+import sys
+import glob
+import json
+import collections
+import pytest
+from tokenizers import Tokenizer
+from tokenizers.models import WordLevel
+from tokenizers.pre_tokenizers import WhitespaceSplit
+from tokenizers.trainers import WordLevelTrainer
+from transformers import PreTrainedTokenizerFast
+
+# Add project root to the path for module imports
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+sys.path.insert(0, project_root)
+
+from src.AI_GURU.datasetcreator import DatasetCreator
+from src.AI_GURU.datasetcreatorconfig import JSBDatasetCreatorBarConfig
+from src.AI_GURU.datasetmanifest import DatasetManifest, MANIFEST_FILE_NAME
+from src.AI_GURU.preprocess.encode import encode_songs_data, get_density_bins
+from src.AI_GURU.preprocess.music21jsb import preprocess_music21
+from src.AI_GURU.preprocess.vocabulary import SPECIAL_TOKENS, create_tokenizer, get_grammar_tokens
+
+SANITY_MIDI_FILES = sorted(glob.glob(os.path.join(project_root, "data", "sanity", "*.mid")))
+
+
+@pytest.fixture(scope="module")
+def token_sequences():
+    songs_data_train, _, _ = preprocess_music21(SANITY_MIDI_FILES)
+    density_bins = get_density_bins(songs_data_train, 1, 1, 5)
+    return encode_songs_data(songs_data_train, [-1, 0, 1], False, 1, 1, density_bins, False)
+
+
+def train_tokenizer(path):
+    """
+    Helper function training a tokenizer on a token sequence file, as the DatasetCreator used to.
+    """
+    tokenizer = Tokenizer(WordLevel(unk_token="[UNK]"))
+    tokenizer.pre_tokenizer = WhitespaceSplit()
+    tokenizer.train(files=[str(path)], trainer=WordLevelTrainer(special_tokens=SPECIAL_TOKENS))
+    return tokenizer
+
+
+def test_tokenizer_from_counts_matches_trained_tokenizer(token_sequences, tmp_path):
+    """
+    Test that the tokenizer built from the token counts equals the one trained on the token sequences.
+    """
+    path = tmp_path / "token_sequences.txt"
+    path.write_text("".join(" ".join(token_sequence) + "\n" for token_sequence in token_sequences))
+    token_counts = collections.Counter(token for token_sequence in token_sequences for token in token_sequence)
+    assert create_tokenizer(token_counts).to_str() == train_tokenizer(path).to_str()
+
+
+def test_closed_vocabulary(token_sequences, tmp_path):
+    """
+    Test that a closed vocabulary holds the grammar tokens after the counted ones and loads in transformers.
+    """
+    token_counts = collections.Counter(token for token_sequence in token_sequences for token in token_sequence)
+    grammar_tokens = get_grammar_tokens(5, [-1, 0, 1])
+    assert {"INST=DRUMS", "DENSITY=0", "DENSITY=4", "NOTE_ON=-1", "NOTE_OFF=128"} <= set(grammar_tokens)
+    assert "DENSITY=5" not in grammar_tokens
+
+    tokenizer = create_tokenizer(token_counts, grammar_tokens)
+    vocabulary = tokenizer.get_vocab()
+    assert set(vocabulary) == set(SPECIAL_TOKENS) | set(token_counts) | set(grammar_tokens)
+    assert [vocabulary[token] for token in SPECIAL_TOKENS] == list(range(len(SPECIAL_TOKENS)))
+    assert max(vocabulary[token] for token in token_counts) < min(
+        vocabulary[token] for token in set(grammar_tokens) - set(token_counts)
+    )
+
+    tokenizer_path = str(tmp_path / "tokenizer.json")
+    tokenizer.save(tokenizer_path)
+    pretrained_tokenizer = PreTrainedTokenizerFast(tokenizer_file=tokenizer_path)
+    text = " ".join(token_sequences[0])
+    assert pretrained_tokenizer(text)["input_ids"] == tokenizer.encode(text).ids
+    assert pretrained_tokenizer("INST=127 UNSEEN")["input_ids"] == [vocabulary["INST=127"], vocabulary["[UNK]"]]
+
+
+def test_grammar_tokens_without_transpositions():
+    """
+    Test that no transpositions give the tokens of the untransposed pitches.
+    """
+    assert get_grammar_tokens(5, []) == get_grammar_tokens(5, [0])
+
+
+def open_manifest(dataset_path):
+    """
+    Helper function opening a manifest with the settings it was written with.
+    """
+    with open(os.path.join(dataset_path, MANIFEST_FILE_NAME)) as f:
+        settings = json.loads(f.readline())["settings"]
+    return DatasetManifest.open(str(dataset_path), settings)
+
+
+@pytest.mark.parametrize("closed_vocabulary", [False, True])
+def test_dataset_tokenizer_from_counts(closed_vocabulary, tmp_path, sanity_midi_files, create_config):
+    """
+    Test that the DatasetCreator counts the training tokens in the manifest and builds the tokenizer from them.
+    """
+    config = create_config(closed_vocabulary=closed_vocabulary)
+    config.transpositions_train = [0, 1]
+    DatasetCreator(config).create(str(tmp_path))
+
+    dataset_path = tmp_path / config.dataset_name
+    with open(dataset_path / "token_sequences_train.txt") as f:
+        token_counts = collections.Counter(f.read().split())
+    assert open_manifest(dataset_path).token_counts == token_counts
+
+    tokenizer = Tokenizer.from_file(str(dataset_path / "tokenizer.json"))
+    if closed_vocabulary:
+        assert set(tokenizer.get_vocab()) >= set(get_grammar_tokens(5, [0, 1]))
+    else:
+        assert tokenizer.to_str() == train_tokenizer(dataset_path / "token_sequences_train.txt").to_str()
+
+
+def test_closed_vocabulary_must_be_boolean():
+    with pytest.raises(Exception, match="closed_vocabulary"):
+        JSBDatasetCreatorBarConfig(closed_vocabulary="yes")
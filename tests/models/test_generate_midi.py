@@ -1,8 +1,9 @@
 import pytest
 import os
+import numpy as np
 from unittest.mock import MagicMock, Mock
 from src.models.errors import InvalidFileFormatError, UnknownModelError
-from src.models.generate_midi import verify_paths, verify_model, generate_midi_score
+from src.models.generate_midi import verify_paths, verify_model, generate_midi_score, load_song_data
 import note_seq
 from music21.stream.base import Score
 
@@ -69,6 +70,10 @@ def test_generate_midi(monkeypatch, save_tokens):
     monkeypatch.setattr("src.models.generate_midi.preprocess_music21_song", mock_preprocess)
     mock_encode = MagicMock(return_value=[])
     monkeypatch.setattr("src.models.generate_midi.encode_song_data_singular", mock_encode)
+    mock_encoder = Mock()
+    monkeypatch.setattr("src.models.generate_midi.TokenIdEncoder", mock_encoder)
+    mock_encode_ids = MagicMock(return_value=np.array([0], dtype=np.int64))
+    monkeypatch.setattr("src.models.generate_midi.encode_song_data_singular_ids", mock_encode_ids)
     mock_download = MagicMock(return_value="tokenizer_path")
     monkeypatch.setattr("src.models.generate_midi.hf_hub_download", mock_download)
     mock_tokenizer = Mock()
@@ -93,18 +98,57 @@ def test_generate_midi(monkeypatch, save_tokens):
 
     mock_parse.assert_called_once_with("/path/to/midi")
     mock_preprocess.assert_called_once()
-    mock_encode.assert_called_once()
     mock_download.assert_called_once_with(repo_id="tokenizer_repo", filename="tokenizer.json", repo_type="dataset")
     mock_tokenizer.assert_called_once_with(tokenizer_file="tokenizer_path")
     mock_tokenizer_obj.add_special_tokens.assert_called_once_with({"pad_token": "[PAD]"})
-    mock_tokenizer_obj.encode.assert_called_once()
+    mock_encoder.from_file.assert_called_once_with("tokenizer_path")
+    mock_encode_ids.assert_called_once()
+    mock_tokenizer_obj.encode.assert_not_called()
     mock_tokenizer_obj.decode.assert_called_once()
     mock_model_obj.generate.assert_called_once()
     mock_convert.assert_called_once()
 
     if save_tokens:
+        mock_encode.assert_called_once()
         mock_open.assert_called_once_with(os.path.join(".", "data.json"), "w+")
         mock_json_dump.assert_called_once()
     else:
+        mock_encode.assert_not_called()
         mock_open.assert_not_called()
         mock_json_dump.assert_not_called()
+
+
+def test_load_song_data_mido(monkeypatch):
+    mock_midi_file = MagicMock(return_value="midi_file")
+    monkeypatch.setattr("src.models.generate_midi.mido.MidiFile", mock_midi_file)
+    mock_preprocess = MagicMock(return_value={"tracks": []})
+    monkeypatch.setattr("src.models.generate_midi.preprocess_mido_song", mock_preprocess)
+    mock_parse = MagicMock()
+    monkeypatch.setattr("src.models.generate_midi.converter.parse", mock_parse)
+
+    assert load_song_data("/path/to/midi", ingestion="mido") == {"tracks": []}
+
+    mock_midi_file.assert_called_once_with("/path/to/midi")
+    mock_preprocess.assert_called_once_with("midi_file")
+    mock_parse.assert_not_called()
+
+
+def test_load_song_data_invalid_ingestion():
+    with pytest.raises(ValueError, match="is not an available ingestion method"):
+        load_song_data("/path/to/midi", ingestion="invalid")
+
+
+def test_load_song_data_uses_parse_cache(monkeypatch, tmp_path):
+    midi_path = tmp_path / "song.mid"
+    midi_path.write_bytes(b"MThd")
+    mock_parse = MagicMock(return_value=Score())
+    monkeypatch.setattr("src.models.generate_midi.converter.parse", mock_parse)
+    mock_preprocess = MagicMock(return_value={"tracks": []})
+    monkeypatch.setattr("src.models.generate_midi.preprocess_music21_song", mock_preprocess)
+
+    cache_path = str(tmp_path / "cache")
+    assert load_song_data(str(midi_path), cache_path=cache_path) == {"tracks": []}
+    assert load_song_data(str(midi_path), cache_path=cache_path) == {"tracks": []}
+
+    mock_parse.assert_called_once_with(str(midi_path))
+    mock_preprocess.assert_called_once()